@@ -43,14 +43,78 @@ class Settings(BaseSettings):
         default_factory=lambda: os.getenv("MINERU_API_BASE", "https://mineru.net/api/v4"),
         description="MinerU API Base URL"
     )
-    mineru_poll_interval: int = Field(
-        default_factory=lambda: int(os.getenv("MINERU_POLL_INTERVAL", "3")),
-        description="MinerU 轮询间隔（秒）"
+    mineru_poll_interval: float = Field(
+        default_factory=lambda: float(os.getenv("MINERU_POLL_INTERVAL", "3")),
+        description="MinerU 任务状态的最短（初始）轮询间隔（秒）"
+    )
+    mineru_poll_max_interval: float = Field(
+        default_factory=lambda: float(os.getenv("MINERU_POLL_MAX_INTERVAL", "15")),
+        description="MinerU 任务状态的最长轮询间隔（秒），进度没有变化时逐步退避到此间隔"
+    )
+    mineru_poll_backoff: float = Field(
+        default_factory=lambda: float(os.getenv("MINERU_POLL_BACKOFF", "1.5")),
+        description="进度没有变化时轮询间隔的增长倍数"
+    )
+    mineru_poll_qps: float = Field(
+        default_factory=lambda: float(os.getenv("MINERU_POLL_QPS", "5")),
+        description="所有 MinerU 任务合计的状态查询速率上限（次/秒）"
     )
     mineru_timeout: int = Field(
         default_factory=lambda: int(os.getenv("MINERU_TIMEOUT", "600")),
         description="MinerU 超时时间（秒）"
     )
+    mineru_max_connections: int = Field(
+        default_factory=lambda: int(os.getenv("MINERU_MAX_CONNECTIONS", "20")),
+        description="MinerU HTTP 连接池的最大连接数"
+    )
+    mineru_max_keepalive: int = Field(
+        default_factory=lambda: int(os.getenv("MINERU_MAX_KEEPALIVE", "10")),
+        description="MinerU HTTP 连接池保留的空闲长连接数"
+    )
+    mineru_keepalive_expiry: float = Field(
+        default_factory=lambda: float(os.getenv("MINERU_KEEPALIVE_EXPIRY", "30")),
+        description="空闲长连接的保留时间（秒）"
+    )
+    mineru_http2: bool = Field(
+        default_factory=lambda: os.getenv("MINERU_HTTP2", "False").lower() in ("true", "1", "yes"),
+        description="MinerU 请求是否启用 HTTP/2（需要安装 h2）"
+    )
+    mineru_batch_size: int = Field(
+        default_factory=lambda: int(os.getenv("MINERU_BATCH_SIZE", "50")),
+        description="同时到达的论文合并为一次批量提交的最大数量，1 表示不合并（实际批次大小还受 INGEST_MINERU_CONCURRENCY 限制）"
+    )
+    mineru_batch_linger: float = Field(
+        default_factory=lambda: float(os.getenv("MINERU_BATCH_LINGER", "1")),
+        description="批量提交前等待更多论文到达的时间（秒）"
+    )
+    mineru_model_version: str = Field(
+        default_factory=lambda: os.getenv("MINERU_MODEL_VERSION", "vlm"),
+        description="MinerU 解析模型版本（同时作为结果缓存键的一部分）"
+    )
+    mineru_cache_max_mb: int = Field(
+        default_factory=lambda: int(os.getenv("MINERU_CACHE_MAX_MB", "2048")),
+        description="MinerU 结果 zip 磁盘缓存的大小上限（MB），0 表示不缓存"
+    )
+    parse_engine: str = Field(
+        default_factory=lambda: os.getenv("PARSE_ENGINE", "mineru").lower(),
+        description="PDF 解析引擎: mineru / local（本地 PyMuPDF）/ auto（MinerU 失败或超时时改用本地解析）"
+    )
+    parse_auto_mineru_timeout: float = Field(
+        default_factory=lambda: float(os.getenv("PARSE_AUTO_MINERU_TIMEOUT", "180")),
+        description="auto 模式下等待 MinerU 的最长时间（秒），超过后改用本地解析"
+    )
+    local_parser_workers: int = Field(
+        default_factory=lambda: int(os.getenv("LOCAL_PARSER_WORKERS", str(min(4, os.cpu_count() or 1)))),
+        description="本地 PDF 解析的进程数"
+    )
+    cpu_workers: int = Field(
+        default_factory=lambda: int(os.getenv("CPU_WORKERS", str(min(4, os.cpu_count() or 1)))),
+        description="章节提取、分块、序列化等 CPU 密集步骤的进程数，0 表示在线程池中执行"
+    )
+    event_loop_lag_interval: float = Field(
+        default_factory=lambda: float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.5")),
+        description="事件循环延迟的采样间隔（秒），0 表示不采样"
+    )
     mineru_max_file_size: int = Field(
         default_factory=lambda: int(os.getenv("MINERU_MAX_FILE_SIZE", "10")),
         description="MinerU 直接上传文件的最大大小（MB），超过此大小建议使用 URL 方式"
@@ -101,6 +165,18 @@ class Settings(BaseSettings):
         default_factory=lambda: int(os.getenv("MAX_UPLOAD_SIZE", "50")),
         description="最大上传文件大小（MB）"
     )
+    upload_chunk_size: int = Field(
+        default_factory=lambda: int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024))),
+        description="上传文件流式写入的分块大小（字节）"
+    )
+    parsed_compression: str = Field(
+        default_factory=lambda: os.getenv("PARSED_COMPRESSION", "none"),
+        description="解析结果正文的压缩方式：none 或 zstd（需要安装 zstandard）"
+    )
+    parsed_cache_max_mb: int = Field(
+        default_factory=lambda: int(os.getenv("PARSED_CACHE_MAX_MB", "256")),
+        description="解析结果进程内缓存的内存上限（MB）"
+    )
     chunk_size: int = Field(
         default_factory=lambda: int(os.getenv("CHUNK_SIZE", "800")),
         description="文本分块大小（tokens）"
@@ -109,10 +185,26 @@ class Settings(BaseSettings):
         default_factory=lambda: int(os.getenv("CHUNK_OVERLAP", "100")),
         description="文本分块重叠大小（tokens）"
     )
+    chunk_exact_token_counts: bool = Field(
+        default_factory=lambda: os.getenv("CHUNK_EXACT_TOKEN_COUNTS", "false").lower() in ("true", "1", "yes"),
+        description="分块时每个段落和句子单独编码计数（与旧版分块边界完全一致，但较慢）；默认整节只编码一次"
+    )
+    chunk_child_size: int = Field(
+        default_factory=lambda: int(os.getenv("CHUNK_CHILD_SIZE", "200")),
+        description="小块大小（tokens）：按 CHUNK_SIZE 分出的父块再切分为小块做 Embedding，检索命中后扩展回父块；0 表示只索引父块"
+    )
+    embedding_batch_size: int = Field(
+        default_factory=lambda: int(os.getenv("EMBEDDING_BATCH_SIZE", "10")),
+        description="每次 Embedding 请求的文本数（通义千问最大为 10），每批完成后立即写入 Milvus"
+    )
     top_k_retrieval: int = Field(
         default_factory=lambda: int(os.getenv("TOP_K_RETRIEVAL", "5")),
         description="检索返回的 Top K 结果数"
     )
+    context_token_budget: int = Field(
+        default_factory=lambda: int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000")),
+        description="问答时检索上下文的 token 预算，命中的小块在预算内扩展为父块"
+    )
     
     # Agent Configuration
     agent_max_retrieval_rounds: int = Field(
@@ -128,6 +220,102 @@ class Settings(BaseSettings):
         description="Agent 完备性评估温度"
     )
     
+    # Job Queue Configuration
+    job_workers: int = Field(
+        default_factory=lambda: int(os.getenv("JOB_WORKERS", "2")),
+        description="后台任务并发执行数"
+    )
+    job_max_attempts: int = Field(
+        default_factory=lambda: int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+        description="后台任务最大尝试次数"
+    )
+    job_retry_base_delay: float = Field(
+        default_factory=lambda: float(os.getenv("JOB_RETRY_BASE_DELAY", "5")),
+        description="任务重试的初始退避时间（秒），之后按指数增长"
+    )
+    job_lease_seconds: int = Field(
+        default_factory=lambda: int(os.getenv("JOB_LEASE_SECONDS", "60")),
+        description="任务租约时长（秒），执行者失联超过该时间后任务会被重新调度"
+    )
+    job_poll_interval: float = Field(
+        default_factory=lambda: float(os.getenv("JOB_POLL_INTERVAL", "1.0")),
+        description="空闲时领取任务的轮询间隔（秒）"
+    )
+    job_ttl_hours: int = Field(
+        default_factory=lambda: int(os.getenv("JOB_TTL_HOURS", "24")),
+        description="已结束任务的保留时长（小时）"
+    )
+    job_queue_backend: str = Field(
+        default_factory=lambda: os.getenv("JOB_QUEUE_BACKEND", "sqlite").lower(),
+        description="任务队列后端：sqlite（单机）或 redis（多节点共享）"
+    )
+    job_run_in_api: bool = Field(
+        default_factory=lambda: os.getenv("JOB_RUN_IN_API", "True").lower() in ("true", "1", "yes"),
+        description="API 进程是否同时执行后台任务；使用独立 worker 进程时设为 False"
+    )
+    job_events_poll_interval: float = Field(
+        default_factory=lambda: float(os.getenv("JOB_EVENTS_POLL_INTERVAL", "1.0")),
+        description="进度推送（SSE / WebSocket）在服务端读取任务状态的间隔（秒），用于感知其他进程执行的任务"
+    )
+    redis_url: str = Field(
+        default_factory=lambda: os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+        description="Redis 连接地址（任务队列后端为 redis 时使用）"
+    )
+
+    # Ingest Pipeline Limits（每个进程内生效）
+    ingest_mineru_concurrency: int = Field(
+        default_factory=lambda: int(os.getenv("INGEST_MINERU_CONCURRENCY", "4")),
+        description="同时提交到 MinerU 解析的论文数"
+    )
+    ingest_mineru_rate: float = Field(
+        default_factory=lambda: float(os.getenv("INGEST_MINERU_RATE", "1")),
+        description="每秒向 MinerU 发起的提交请求数上限（一个批次算一次），0 表示不限速"
+    )
+    ingest_parse_concurrency: int = Field(
+        default_factory=lambda: int(os.getenv("INGEST_PARSE_CONCURRENCY", "2")),
+        description="同时进行章节提取等 CPU 处理的论文数"
+    )
+    ingest_llm_concurrency: int = Field(
+        default_factory=lambda: int(os.getenv("INGEST_LLM_CONCURRENCY", "4")),
+        description="入库时并发的 LLM 请求数（元数据提取）"
+    )
+    ingest_llm_rate: float = Field(
+        default_factory=lambda: float(os.getenv("INGEST_LLM_RATE", "2")),
+        description="入库时每秒的 LLM 请求数上限，0 表示不限速"
+    )
+    ingest_embed_concurrency: int = Field(
+        default_factory=lambda: int(os.getenv("INGEST_EMBED_CONCURRENCY", "4")),
+        description="并发的 Embedding 批次请求数"
+    )
+    ingest_embed_rate: float = Field(
+        default_factory=lambda: float(os.getenv("INGEST_EMBED_RATE", "5")),
+        description="每秒的 Embedding 批次请求数上限，0 表示不限速"
+    )
+    embedding_tpm: int = Field(
+        default_factory=lambda: int(os.getenv("EMBEDDING_TPM", "0")),
+        description="每分钟的 Embedding token 数上限（按提供商配额设置），0 表示不限速"
+    )
+    embedding_max_retries: int = Field(
+        default_factory=lambda: int(os.getenv("EMBEDDING_MAX_RETRIES", "3")),
+        description="单个 Embedding 批次遇到限流、超时或服务端错误时的最大重试次数（只重试失败的批次）"
+    )
+    ingest_index_concurrency: int = Field(
+        default_factory=lambda: int(os.getenv("INGEST_INDEX_CONCURRENCY", "2")),
+        description="并发写入 Milvus 的批次数"
+    )
+    ingest_preview: bool = Field(
+        default_factory=lambda: os.getenv("INGEST_PREVIEW", "True").lower() in ("true", "1", "yes"),
+        description="等待 MinerU 期间先用本地引擎解析前几页并入库，供对话和摘要提前使用（需要安装 PyMuPDF）"
+    )
+    ingest_preview_pages: int = Field(
+        default_factory=lambda: int(os.getenv("INGEST_PREVIEW_PAGES", "3")),
+        description="预览阶段解析的页数"
+    )
+    bulk_ingest_max_items: int = Field(
+        default_factory=lambda: int(os.getenv("BULK_INGEST_MAX_ITEMS", "500")),
+        description="单次批量入库请求的最大论文数"
+    )
+
     # Paths - 基于环境变量或使用默认路径
     base_dir: Path = Field(
         default_factory=lambda: Path(os.getenv("BASE_DIR", str(Path(__file__).parent.parent))),
@@ -149,6 +337,11 @@ class Settings(BaseSettings):
         """解析结果目录"""
         return Path(os.getenv("PARSED_DIR", str(self.data_dir / "parsed")))
     
+    @property
+    def mineru_cache_dir(self) -> Path:
+        """MinerU 结果缓存目录"""
+        return Path(os.getenv("MINERU_CACHE_DIR", str(self.data_dir / "mineru_cache")))
+    
     @property
     def embeddings_dir(self) -> Path:
         """向量嵌入目录"""
@@ -158,7 +351,17 @@ class Settings(BaseSettings):
     def summaries_dir(self) -> Path:
         """摘要目录"""
         return Path(os.getenv("SUMMARIES_DIR", str(self.data_dir / "summaries")))
-    
+
+    @property
+    def catalog_db_path(self) -> Path:
+        """论文目录数据库路径（内容哈希 / URL -> paper_id）"""
+        return Path(os.getenv("CATALOG_DB_PATH", str(self.data_dir / "catalog.db")))
+
+    @property
+    def job_db_path(self) -> Path:
+        """后台任务数据库路径"""
+        return Path(os.getenv("JOB_DB_PATH", str(self.data_dir / "jobs.db")))
+
     # Debug
     debug: bool = Field(
         default_factory=lambda: os.getenv("DEBUG", "False").lower() in ("true", "1", "yes"),
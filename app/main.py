@@ -10,8 +10,16 @@ from contextlib import asynccontextmanager
 # .env 文件已在 app.config 模块中自动加载
 from app.config import settings
 from app.utils.logger import log
-from app.routers import upload, translate, summary, chat
+from app.routers import upload, translate, summary, chat, jobs
 from app.services.milvus_service import milvus_service
+from app.services.mineru_client import mineru_client
+from app.services.local_pdf_parser import local_pdf_parser
+from app.services.embedding_service import embedding_scheduler
+from app.services.job_queue import job_manager
+from app.services.paper_catalog import paper_catalog
+from app.utils.async_helper import run_in_threadpool
+from app.utils.cpu_executor import cpu_executor, loop_lag_monitor
+from app.utils.parsed_cache import parsed_content_cache
 
 
 @asynccontextmanager
@@ -33,11 +41,42 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         log.warning(f"Milvus 预连接失败（将在首次使用时重试）: {e}")
     
+    # 为升级前已解析的论文补充列表索引
+    try:
+        await run_in_threadpool(paper_catalog.backfill_index)
+    except Exception as e:
+        log.warning(f"补充论文列表索引失败: {e}")
+    
+    # 采样事件循环延迟，预先启动 CPU 进程池
+    loop_lag_monitor.start()
+    if settings.job_run_in_api:
+        try:
+            await cpu_executor.warm_up()
+        except Exception as e:
+            log.warning(f"CPU 进程池预启动失败（将在首次使用时重试）: {e}")
+    
+    # 启动后台任务执行器（会恢复上次中断的任务）
+    # 使用独立 worker 进程（python -m app.worker）时 API 进程只负责提交任务
+    if settings.job_run_in_api:
+        await job_manager.start()
+    else:
+        log.info(f"后台任务由独立 worker 进程执行，任务队列后端: {settings.job_queue_backend}")
+    
     yield
     
     # 关闭时执行
     log.info("PaperWhisperer 正在关闭...")
     
+    # 停止后台任务执行器，未完成的任务在下次启动时继续
+    await job_manager.stop()
+    job_manager.store.close()
+    
+    # 关闭 MinerU 连接池、本地解析和 CPU 任务进程池
+    await mineru_client.close()
+    local_pdf_parser.close()
+    cpu_executor.close()
+    await loop_lag_monitor.stop()
+    
     # 断开 Milvus 连接
     try:
         await milvus_service.disconnect()
@@ -88,6 +127,22 @@ async def health_check():
     }
 
 
+# 运行统计
+@app.get("/api/stats")
+async def runtime_stats():
+    """进程内缓存、HTTP 连接复用、CPU 进程池和事件循环延迟等运行统计"""
+    return {
+        "parsed_cache": parsed_content_cache.stats(),
+        "mineru_http": mineru_client.http_stats(),
+        "mineru_poller": mineru_client.poller.stats(),
+        "mineru_batcher": mineru_client.batcher.stats(),
+        "mineru_cache": mineru_client.result_cache.stats(),
+        "cpu_executor": cpu_executor.stats(),
+        "embedding_scheduler": embedding_scheduler.stats(),
+        "event_loop_lag": loop_lag_monitor.stats()
+    }
+
+
 # 根路径
 @app.get("/")
 async def root():
@@ -104,6 +159,7 @@ app.include_router(upload.router, prefix="/api", tags=["上传与解析"])
 app.include_router(translate.router, prefix="/api", tags=["翻译"])
 app.include_router(summary.router, prefix="/api", tags=["摘要"])
 app.include_router(chat.router, prefix="/api", tags=["对话"])
+app.include_router(jobs.router, prefix="/api", tags=["任务"])
 
 # 挂载静态文件服务，用于提供论文中的图片
 # 图片路径格式: /api/images/{paper_id}/images/xxx.jpg
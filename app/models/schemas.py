@@ -15,6 +15,13 @@ class TaskStatus(str, Enum):
     FAILED = "failed"
 
 
+class ParseEngine(str, Enum):
+    """PDF 解析引擎"""
+    MINERU = "mineru"
+    LOCAL = "local"  # 本地 PyMuPDF 文本层提取
+    AUTO = "auto"  # MinerU 失败或超时时改用本地解析
+
+
 class LLMProvider(str, Enum):
     """LLM 提供商"""
     QWEN = "qwen"
@@ -43,6 +50,36 @@ class PaperSection(BaseModel):
     content: str
     level: int = 1  # 章节层级
     order: int  # 章节顺序
+    page_start: Optional[int] = None  # 起止页码（从 1 开始，仅结构化解析结果提供）
+    page_end: Optional[int] = None
+    start: Optional[int] = None  # 正文在 full_content 中的 [start, end) 字符偏移
+    end: Optional[int] = None
+    path: Optional[str] = None  # 章节树中的路径，如 "3.2.1"
+
+
+class SectionNode(BaseModel):
+    """章节树节点（按先序排列，与 sections 一一对应）"""
+    path: str  # 如 "3.2.1"，第 k 个子章节为 "<父路径>.k"
+    section_id: str
+    title: str
+    level: int
+    order: int
+    parent: Optional[str] = None  # 父节点路径，顶层章节为 None
+    children: List[str] = Field(default_factory=list)  # 子节点路径
+    subtree_end: int  # 子树覆盖 sections[order:subtree_end]
+    start: Optional[int] = None  # 子树（含所有子章节）在 full_content 中的 [start, end) 字符偏移
+    end: Optional[int] = None
+
+
+class PaperElement(BaseModel):
+    """论文中的图、表和公式"""
+    element_id: str
+    type: str  # figure / table / equation
+    page: Optional[int] = None
+    section_id: Optional[str] = None  # 所在章节
+    caption: Optional[str] = None
+    image_url: Optional[str] = None
+    content: Optional[str] = None  # 表格 HTML 或公式 LaTeX
 
 
 class PaperStructure(BaseModel):
@@ -51,6 +88,8 @@ class PaperStructure(BaseModel):
     metadata: PaperMetadata
     sections: List[PaperSection]
     full_content: str  # Markdown 格式的完整内容
+    elements: List[PaperElement] = Field(default_factory=list)
+    section_tree: List[SectionNode] = Field(default_factory=list)
 
 
 # ========== 上传相关模型 ==========
@@ -72,6 +111,36 @@ class ParseStatusResponse(BaseModel):
     error: Optional[str] = None
 
 
+class BulkIngestRequest(BaseModel):
+    """批量入库请求"""
+    urls: List[str] = Field(default_factory=list)  # 论文 URL（如 arXiv 链接）
+    file_ids: List[str] = Field(default_factory=list)  # 已通过 /upload 上传的文件ID
+    engine: Optional[ParseEngine] = None  # 解析引擎，默认使用 PARSE_ENGINE 配置
+
+
+class BulkIngestItem(BaseModel):
+    """批量入库中单篇论文的状态"""
+    paper_id: str
+    source: str
+    status: TaskStatus
+    progress: Optional[int] = None
+    stage: Optional[str] = None
+    error: Optional[str] = None
+    stage_durations: Dict[str, float] = Field(default_factory=dict)
+
+
+class BulkIngestStatusResponse(BaseModel):
+    """批量入库状态响应"""
+    batch_id: str
+    total: int
+    counts: Dict[str, int]  # 各状态的论文数
+    elapsed_seconds: float
+    papers_per_minute: Optional[float] = None
+    stage_avg_seconds: Dict[str, float] = Field(default_factory=dict)
+    stage_limits: Dict[str, Dict[str, Any]] = Field(default_factory=dict)  # 当前进程内各阶段的排队与执行情况
+    items: List[BulkIngestItem]
+
+
 # ========== 翻译相关模型 ==========
 
 class TranslationRequest(BaseModel):
@@ -0,0 +1,137 @@
+"""
+后台任务路由
+查询任务状态，并通过 Server-Sent Events / WebSocket 推送解析、翻译、摘要任务的进度
+"""
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from app.config import settings
+from app.models.schemas import TaskStatus
+from app.services.job_events import TERMINAL_STATUSES, job_event_bus, job_snapshot
+from app.services.job_queue import job_manager
+from app.utils.logger import log
+
+router = APIRouter()
+
+# 空闲时发送保活消息的间隔（秒），防止代理断开长连接
+KEEPALIVE_INTERVAL = 15.0
+
+
+def _event_type(snapshot: Dict[str, Any]) -> str:
+    """根据任务状态确定事件类型：progress / completed / failed"""
+    status = TaskStatus(snapshot["status"])
+    return status.value if status in TERMINAL_STATUSES else "progress"
+
+
+async def watch_job(job_id: str, poll_interval: Optional[float] = None) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """
+    持续产出任务快照，直到任务结束
+
+    本进程执行的任务通过事件总线即时推送；其他进程（独立 worker）执行的任务
+    按 poll_interval 在服务端读取任务存储，状态有变化时产出。
+    长时间没有变化时产出 None，供调用方发送保活消息。
+    """
+    poll_interval = poll_interval or settings.job_events_poll_interval
+
+    # 先订阅再读取当前状态，避免漏掉两者之间的事件
+    with job_event_bus.subscribe(job_id) as queue:
+        job = await job_manager.get(job_id)
+        if job is None:
+            return
+
+        last = job_snapshot(job)
+        last_sent = time.monotonic()
+        yield last
+
+        while TaskStatus(last["status"]) not in TERMINAL_STATUSES:
+            try:
+                snapshot = await asyncio.wait_for(queue.get(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                job = await job_manager.get(job_id)
+                if job is None:
+                    # 任务已被清理
+                    return
+                snapshot = job_snapshot(job)
+
+            if snapshot == last:
+                if time.monotonic() - last_sent >= KEEPALIVE_INTERVAL:
+                    last_sent = time.monotonic()
+                    yield None
+                continue
+
+            last = snapshot
+            last_sent = time.monotonic()
+            yield snapshot
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    查询任务状态（包含各阶段的耗时和细粒度进度）
+    """
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job_snapshot(job)
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request):
+    """
+    以 Server-Sent Events 推送任务进度
+
+    事件类型：progress（进度变化）、completed、failed（推送后连接关闭）
+    """
+    if await job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+    async def generate():
+        # 断线后浏览器 3 秒重连
+        yield "retry: 3000\n\n"
+        async for snapshot in watch_job(job_id):
+            if await request.is_disconnected():
+                break
+            if snapshot is None:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {_event_type(snapshot)}\ndata: {json.dumps(snapshot, ensure_ascii=False, default=str)}\n\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            # 关闭 nginx 缓冲，事件立即到达浏览器
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+
+@router.websocket("/jobs/{job_id}/ws")
+async def job_events_websocket(websocket: WebSocket, job_id: str):
+    """
+    以 WebSocket 推送任务进度，消息格式与 SSE 的 data 相同，并附带 type 字段
+    """
+    await websocket.accept()
+
+    if await job_manager.get(job_id) is None:
+        await websocket.send_json({"type": "error", "error": "任务不存在"})
+        await websocket.close(code=4404)
+        return
+
+    try:
+        async for snapshot in watch_job(job_id):
+            if snapshot is None:
+                continue
+            await websocket.send_text(
+                json.dumps({"type": _event_type(snapshot), **snapshot}, ensure_ascii=False, default=str)
+            )
+        await websocket.close()
+    except WebSocketDisconnect:
+        log.debug(f"任务进度 WebSocket 已断开: job_id={job_id}")
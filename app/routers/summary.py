@@ -2,37 +2,33 @@
 摘要路由
 处理论文摘要生成
 """
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from typing import Optional
+from fastapi import APIRouter, HTTPException
+from typing import Any, Dict, Optional
 
-from app.models.schemas import SummaryRequest, PaperSummary, TaskStatus, LLMProvider, PaperStructure, PaperSection, PaperMetadata
+from app.models.schemas import SummaryRequest, PaperSummary, LLMProvider, PaperStructure, PaperSection, PaperMetadata
 from app.services.summarizer import summarizer_service
+from app.services.job_queue import job_manager, JobContext, PermanentJobError
 from app.utils.file_manager import FileManager
 from app.utils.logger import log
 
 router = APIRouter()
 
-# 摘要任务状态
-summary_tasks = {}
+# 后台任务类型
+JOB_TYPE_SUMMARY = "summary"
 
 
-async def generate_summary_background(
-    task_id: str,
-    paper_id: str,
-    summary_type: str,
-    provider: Optional[str]
-):
+async def generate_summary_background(ctx: JobContext) -> Dict[str, Any]:
     """后台摘要生成任务"""
+    task_id = ctx.job_id
+    paper_id = ctx.payload["paper_id"]
+    summary_type = ctx.payload["summary_type"]
+    provider = ctx.payload.get("provider")
+    
     try:
-        summary_tasks[task_id] = {
-            "status": TaskStatus.PROCESSING,
-            "progress": 0
-        }
-        
         # 加载论文
         paper_data = await FileManager.load_parsed_content(paper_id)
         if not paper_data:
-            raise ValueError(f"论文不存在: {paper_id}")
+            raise PermanentJobError(f"论文不存在: {paper_id}")
         
         # 重建 PaperStructure
         metadata = PaperMetadata(**paper_data["metadata"])
@@ -45,38 +41,37 @@ async def generate_summary_background(
         )
         
         # 生成摘要
+        await ctx.update(progress=10, stage="summarize")
         result = await summarizer_service.summarize_paper(
             paper=paper,
             provider=provider,
             summary_type=summary_type
         )
         
-        # 保存摘要
-        await FileManager.save_summary(
-            paper_id,
-            result.dict()
-        )
+        # 基于预览生成时，完整解析可能已在生成期间完成，此时结果已过期，重试以基于完整解析重新生成
+        result_data = result.dict()
+        if paper_data.get("preview"):
+            if not await FileManager.is_preview(paper_id):
+                raise RuntimeError("论文解析结果已更新，重新生成摘要")
+            result_data["preview"] = True
         
-        summary_tasks[task_id] = {
-            "status": TaskStatus.COMPLETED,
-            "progress": 100
-        }
+        # 保存摘要
+        await FileManager.save_summary(paper_id, result_data)
         
         log.info(f"摘要生成完成: task_id={task_id}, paper_id={paper_id}")
+        return {"paper_id": paper_id}
         
     except Exception as e:
         log.error(f"摘要生成失败: task_id={task_id}, error={e}")
-        summary_tasks[task_id] = {
-            "status": TaskStatus.FAILED,
-            "progress": 0,
-            "error": str(e)
-        }
+        raise
+
+
+job_manager.register(JOB_TYPE_SUMMARY, generate_summary_background)
 
 
 @router.post("/summary/{paper_id}")
 async def generate_summary(
     paper_id: str,
-    background_tasks: BackgroundTasks,
     summary_type: str = "comprehensive",
     provider: Optional[LLMProvider] = None
 ):
@@ -84,8 +79,7 @@ async def generate_summary(
     生成论文摘要
     """
     # 检查论文是否存在
-    paper_data = await FileManager.load_parsed_content(paper_id)
-    if not paper_data:
+    if not FileManager.parsed_content_exists(paper_id):
         raise HTTPException(status_code=404, detail="论文不存在")
     
     # 检查是否已有摘要
@@ -100,18 +94,15 @@ async def generate_summary(
     # 创建摘要任务
     task_id = f"{paper_id}_summary"
     
-    summary_tasks[task_id] = {
-        "status": TaskStatus.PENDING,
-        "progress": 0
-    }
-    
     # 后台生成
-    background_tasks.add_task(
-        generate_summary_background,
-        task_id=task_id,
-        paper_id=paper_id,
-        summary_type=summary_type,
-        provider=provider.value if provider else None
+    await job_manager.submit(
+        JOB_TYPE_SUMMARY,
+        job_id=task_id,
+        payload={
+            "paper_id": paper_id,
+            "summary_type": summary_type,
+            "provider": provider.value if provider else None
+        }
     )
     
     return {
@@ -124,14 +115,14 @@ async def generate_summary(
 @router.get("/summary/status/{task_id}")
 async def get_summary_status(task_id: str):
     """获取摘要生成任务状态"""
-    if task_id not in summary_tasks:
+    job = await job_manager.get(task_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="任务不存在")
     
-    status_info = summary_tasks[task_id]
     return {
-        "status": status_info["status"].value if hasattr(status_info["status"], 'value') else status_info["status"],
-        "progress": status_info.get("progress", 0),
-        "error": status_info.get("error")
+        "status": job["status"].value,
+        "progress": job["progress"],
+        "error": job["error"]
     }
 
 
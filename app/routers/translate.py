@@ -2,56 +2,48 @@
 翻译路由
 处理论文翻译请求
 """
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from typing import Optional
+from fastapi import APIRouter, HTTPException
+from typing import Any, Dict, Optional
 
-from app.models.schemas import TranslationRequest, TranslationResult, TaskStatus, LLMProvider
+from app.models.schemas import TranslationRequest, TranslationResult, LLMProvider
 from app.services.translator import translation_service
 from app.services.paper_parser import PaperParser
+from app.services.job_queue import job_manager, JobContext, PermanentJobError
 from app.models.schemas import PaperStructure, PaperSection, PaperMetadata
 from app.utils.file_manager import FileManager
 from app.utils.logger import log
 
 router = APIRouter()
 
-# 翻译任务状态
-translation_tasks = {}
+# 后台任务类型
+JOB_TYPE_TRANSLATE = "translate"
 
 
-async def translate_paper_background(
-    task_id: str,
-    paper_id: str,
-    source_lang: str,
-    target_lang: str,
-    provider: Optional[str]
-):
+async def translate_paper_background(ctx: JobContext) -> Dict[str, Any]:
     """后台翻译任务"""
+    task_id = ctx.job_id
+    paper_id = ctx.payload["paper_id"]
+    source_lang = ctx.payload["source_lang"]
+    target_lang = ctx.payload["target_lang"]
+    provider = ctx.payload.get("provider")
+    
     try:
-        translation_tasks[task_id] = {
-            "status": TaskStatus.PROCESSING,
-            "progress": 0
-        }
-        
         # 加载论文
         paper_data = await FileManager.load_parsed_content(paper_id)
         if not paper_data:
-            raise ValueError(f"论文不存在: {paper_id}")
+            raise PermanentJobError(f"论文不存在: {paper_id}")
         
         # 重建 PaperStructure
-        # 从 full_content 重新解析章节，确保翻译的是原文而非可能被修改的 sections
+        # 按保存的章节偏移从 full_content 取出正文，确保翻译的是原文而非可能被修改的 sections；
+        # 旧版解析结果没有偏移时重新扫描一次全文
         metadata = PaperMetadata(**paper_data["metadata"])
         full_content = paper_data["full_content"]
-        sections_data = PaperParser.extract_sections(full_content)
-        sections = [
-            PaperSection(
-                section_id=s["section_id"],
-                title=s["title"],
-                content=s["content"],
-                level=s["level"],
-                order=s["order"]
-            )
-            for s in sections_data
-        ]
+        sections = PaperParser.sections_from_index(full_content, paper_data.get("sections") or [])
+        if sections is None:
+            sections = [
+                PaperSection(**s)
+                for s in PaperParser.extract_sections(full_content)
+            ]
         paper = PaperStructure(
             paper_id=paper_id,
             metadata=metadata,
@@ -60,39 +52,48 @@ async def translate_paper_background(
         )
         
         # 翻译
+        await ctx.update(progress=10, stage="translate")
+        
+        async def on_progress(done: int, total: int):
+            await ctx.update(
+                progress=10 + 85 * done // total,
+                stage="translate",
+                sections_done=done,
+                sections_total=total
+            )
+        
         result = await translation_service.translate_paper(
             paper=paper,
             source_lang=source_lang,
             target_lang=target_lang,
-            provider=provider
+            provider=provider,
+            progress_callback=on_progress
         )
         
-        # 保存翻译结果
-        await FileManager.save_translation(
-            paper_id,
-            result.dict()
-        )
+        # 基于预览生成时，完整解析可能已在生成期间完成，此时结果已过期，重试以基于完整解析重新生成
+        result_data = result.dict()
+        if paper_data.get("preview"):
+            if not await FileManager.is_preview(paper_id):
+                raise RuntimeError("论文解析结果已更新，重新生成翻译")
+            result_data["preview"] = True
         
-        translation_tasks[task_id] = {
-            "status": TaskStatus.COMPLETED,
-            "progress": 100
-        }
+        # 保存翻译结果
+        await FileManager.save_translation(paper_id, result_data)
         
         log.info(f"翻译完成: task_id={task_id}, paper_id={paper_id}")
+        return {"paper_id": paper_id}
         
     except Exception as e:
         log.error(f"翻译失败: task_id={task_id}, error={e}")
-        translation_tasks[task_id] = {
-            "status": TaskStatus.FAILED,
-            "progress": 0,
-            "error": str(e)
-        }
+        raise
+
+
+job_manager.register(JOB_TYPE_TRANSLATE, translate_paper_background)
 
 
 @router.post("/translate/{paper_id}")
 async def translate_paper(
     paper_id: str,
-    background_tasks: BackgroundTasks,
     source_lang: str = "英文",
     target_lang: str = "中文",
     provider: Optional[LLMProvider] = None
@@ -101,8 +102,7 @@ async def translate_paper(
     翻译论文
     """
     # 检查论文是否存在
-    paper_data = await FileManager.load_parsed_content(paper_id)
-    if not paper_data:
+    if not FileManager.parsed_content_exists(paper_id):
         raise HTTPException(status_code=404, detail="论文不存在")
     
     # 检查是否已有翻译
@@ -117,19 +117,16 @@ async def translate_paper(
     # 创建翻译任务
     task_id = f"{paper_id}_translation"
     
-    translation_tasks[task_id] = {
-        "status": TaskStatus.PENDING,
-        "progress": 0
-    }
-    
     # 后台翻译
-    background_tasks.add_task(
-        translate_paper_background,
-        task_id=task_id,
-        paper_id=paper_id,
-        source_lang=source_lang,
-        target_lang=target_lang,
-        provider=provider.value if provider else None
+    await job_manager.submit(
+        JOB_TYPE_TRANSLATE,
+        job_id=task_id,
+        payload={
+            "paper_id": paper_id,
+            "source_lang": source_lang,
+            "target_lang": target_lang,
+            "provider": provider.value if provider else None
+        }
     )
     
     return {
@@ -144,10 +141,17 @@ async def get_translation_status(task_id: str):
     """
     查询翻译状态
     """
-    if task_id not in translation_tasks:
+    job = await job_manager.get(task_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="任务不存在")
     
-    return translation_tasks[task_id]
+    status_info = {
+        "status": job["status"],
+        "progress": job["progress"]
+    }
+    if job["error"]:
+        status_info["error"] = job["error"]
+    return status_info
 
 
 @router.get("/translate/result/{paper_id}")
@@ -2,75 +2,259 @@
 上传与解析路由
 处理 PDF 上传和论文解析
 """
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
-from typing import Optional
 import asyncio
+import time
+import uuid
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from pathlib import Path
+from typing import Any, Dict, List, Optional
 
-from app.models.schemas import UploadResponse, ParseStatusResponse, TaskStatus, PaperMetadata
+from app.models.schemas import (
+    UploadResponse, ParseStatusResponse, TaskStatus, PaperMetadata, ParseEngine,
+    BulkIngestRequest, BulkIngestItem, BulkIngestStatusResponse
+)
 from app.services.mineru_client import mineru_client
+from app.services.local_pdf_parser import local_pdf_parser
 from app.services.paper_parser import paper_parser
 from app.services.vectorization_service import vectorization_service
-from app.utils.file_manager import FileManager
+from app.services.paper_catalog import PaperCatalog, paper_catalog
+from app.services.job_queue import job_manager, JobContext
+from app.services.ingest_limits import ingest_limits
+from app.utils.file_manager import FileManager, FileTooLargeError
+from app.utils.async_helper import gather_or_cancel, run_in_threadpool
+from app.utils.cpu_executor import cpu_executor
 from app.utils.logger import log
 from app.config import settings
 
 router = APIRouter()
 
-# 任务状态存储（简单实现，生产环境应使用 Redis）
-task_status = {}
+# 后台任务类型
+JOB_TYPE_PARSE = "parse"
 
 
-async def process_paper_background(task_id: str, file_id: str, file_path, is_url: bool = False):
-    """后台任务：处理论文"""
+async def process_paper_background(ctx: JobContext) -> Dict[str, Any]:
+    """
+    后台任务：处理论文（任务ID即论文ID）
+
+    MinerU 解析和章节提取完成后，LLM 元数据提取（及保存解析结果）与
+    分块 -> Embedding -> 写入 Milvus 两条互不依赖的流水线并行执行。
+
+    等待 MinerU 期间先用本地引擎解析前几页并入库（预览），对话和摘要可以立即使用；
+    MinerU 结果到达后替换预览的解析结果和文本块。
+    """
+    file_id = ctx.job_id
+    file_path = ctx.payload["file_path"]
+    is_url = ctx.payload.get("is_url", False)
+    
     try:
-        task_status[task_id] = {
-            "status": TaskStatus.PROCESSING,
-            "progress": 10,
-            "paper_id": None,
-            "metadata": None,
-            "error": None
-        }
+        await run_in_threadpool(paper_catalog.set_status, file_id, TaskStatus.PROCESSING)
+        await ctx.update(progress=10)
         
-        # 1. 调用 MinerU 解析
-        log.info(f"开始解析论文: task_id={task_id}")
+        # 1. 解析 PDF（MinerU 或本地引擎）
+        log.info(f"开始解析论文: task_id={file_id}")
         
-        if is_url:
-            mineru_result = await mineru_client.parse_pdf(url=file_path, paper_id=file_id)
-        else:
-            mineru_result = await mineru_client.parse_pdf(file_path=file_path, paper_id=file_id)
+        async def on_mineru_status(status_info: Dict[str, Any]):
+            # 按 MinerU 已解析页数推进 10 -> 50 的进度
+            extracted, total = status_info.get("extracted_pages"), status_info.get("total_pages")
+            progress = 10 + 40 * extracted // total if extracted and total else None
+            await ctx.update(
+                progress=progress,
+                stage="mineru",
+                mineru_state=status_info.get("state"),
+                extracted_pages=extracted,
+                total_pages=total
+            )
+        
+        engine = ParseEngine(ctx.payload.get("engine") or settings.parse_engine)
+        parse_task = asyncio.create_task(_parse_pdf(ctx, file_path, is_url, engine, on_mineru_status))
+        with_preview = (
+            settings.ingest_preview
+            and engine != ParseEngine.LOCAL
+            and local_pdf_parser.available
+        )
+        try:
+            if with_preview:
+                await _run_preview(ctx, file_path, is_url, parse_task)
+            mineru_result = await parse_task
+        finally:
+            if not parse_task.done():
+                parse_task.cancel()
         
-        task_status[task_id]["progress"] = 50
+        # 2. 解析论文结构（章节提取不依赖元数据，先用正则结果占位）
+        # 图片路径替换、章节提取等纯计算步骤在 CPU 进程池中执行，不阻塞事件循环
+        async with ingest_limits.parse.slot(), ctx.stage("parse", progress=55):
+            paper_structure = await cpu_executor.run(paper_parser.structure_from_result, file_id, mineru_result)
         
-        # 2. 解析论文结构
-        paper_structure = await paper_parser.parse_result(file_id, mineru_result)
+        # 3a. LLM 提取元数据后保存解析内容
+        async def extract_and_save():
+            async with ingest_limits.llm.slot(), ctx.stage("metadata"):
+                metadata_dict = await paper_parser.extract_metadata(paper_structure.full_content)
+                paper_structure.metadata = paper_parser.build_metadata(file_id, metadata_dict)
+            
+            async with ctx.stage("save"):
+                await FileManager.save_parsed_content(
+                    file_id,
+                    {
+                        "metadata": paper_structure.metadata.dict(),
+                        "sections": [s.dict() for s in paper_structure.sections],
+                        "full_content": paper_structure.full_content,
+                        "elements": [e.dict() for e in paper_structure.elements],
+                        "section_tree": [n.dict() for n in paper_structure.section_tree]
+                    }
+                )
+                await run_in_threadpool(paper_catalog.index_paper, file_id, paper_structure.metadata.dict())
+                if with_preview:
+                    # 基于预览内容生成的翻译和摘要不完整；之后才完成的预览结果在加载和保存时被识别为过期
+                    await run_in_threadpool(FileManager.delete_generated_results, file_id)
+        
+        # 3b. 分块、Embedding 并分批写入 Milvus
+        async def vectorize():
+            async def on_progress(stored: int, total: int):
+                await ctx.update(
+                    progress=55 + 40 * stored // total,
+                    stage="vectorize",
+                    chunks_embedded=stored,
+                    chunks_total=total
+                )
+            
+            log.info(f"开始向量化论文: {file_id}")
+            async with ctx.stage("vectorize", progress=95):
+                await vectorization_service.vectorize_and_store_paper(
+                    paper_structure,
+                    progress_callback=on_progress,
+                    replace_existing=with_preview
+                )
+        
+        await gather_or_cancel(extract_and_save(), vectorize())
+        
+        await run_in_threadpool(paper_catalog.set_status, file_id, TaskStatus.COMPLETED)
+        log.info(f"论文处理完成: task_id={file_id}, paper_id={file_id}")
+        
+        return {
+            "paper_id": file_id,
+            "metadata": paper_structure.metadata.dict()
+        }
+        
+    except Exception as e:
+        log.error(f"论文处理失败: task_id={file_id}, error={e}")
+        await run_in_threadpool(paper_catalog.set_status, file_id, TaskStatus.FAILED)
+        raise
+
+
+async def _local_pdf_path(paper_id: str, file_path: str, is_url: bool) -> Path:
+    """本地解析使用的 PDF 路径，URL 提交的论文先下载到上传目录"""
+    if not is_url:
+        return Path(file_path)
+    pdf_path = settings.upload_dir / f"{paper_id}.pdf"
+    if not pdf_path.exists():
+        await local_pdf_parser.download_pdf(PaperCatalog.canonicalize_url(file_path), pdf_path)
+    return pdf_path
+
+
+async def _parse_locally(ctx: JobContext, file_path: str, is_url: bool) -> Dict[str, Any]:
+    """使用本地引擎解析"""
+    async with ingest_limits.parse.slot(), ctx.stage("local_parse", progress=50):
+        pdf_path = await _local_pdf_path(ctx.job_id, file_path, is_url)
+        return await local_pdf_parser.parse_pdf(pdf_path, paper_id=ctx.job_id)
+
+
+async def _ingest_preview(ctx: JobContext, file_path: str, is_url: bool):
+    """本地解析前几页，保存解析结果并写入文本块（元数据使用正则提取，不调用 LLM）"""
+    paper_id = ctx.job_id
+    async with ctx.stage("preview"):
+        pdf_path = await _local_pdf_path(paper_id, file_path, is_url)
+        async with ingest_limits.parse.slot():
+            preview = await local_pdf_parser.parse_pdf(
+                pdf_path, paper_id=paper_id, max_pages=settings.ingest_preview_pages
+            )
+            paper_structure = await cpu_executor.run(paper_parser.structure_from_result, paper_id, preview)
         
-        # 3. 保存解析内容
         await FileManager.save_parsed_content(
-            file_id,
+            paper_id,
             {
                 "metadata": paper_structure.metadata.dict(),
                 "sections": [s.dict() for s in paper_structure.sections],
-                "full_content": paper_structure.full_content
+                "full_content": paper_structure.full_content,
+                "section_tree": [n.dict() for n in paper_structure.section_tree],
+                "preview": True
             }
         )
-        
-        task_status[task_id]["progress"] = 70
-        
-        # 4. 向量化并存储
-        log.info(f"开始向量化论文: {file_id}")
-        await vectorization_service.vectorize_and_store_paper(paper_structure)
-        
-        task_status[task_id]["progress"] = 100
-        task_status[task_id]["status"] = TaskStatus.COMPLETED
-        task_status[task_id]["paper_id"] = file_id
-        task_status[task_id]["metadata"] = paper_structure.metadata.dict()
-        
-        log.info(f"论文处理完成: task_id={task_id}, paper_id={file_id}")
-        
+        await run_in_threadpool(paper_catalog.index_paper, paper_id, paper_structure.metadata.dict())
+        await vectorization_service.vectorize_and_store_paper(paper_structure, replace_existing=True)
+    await ctx.update(stage="preview", preview_ready=True)
+    log.info(f"论文预览已入库: {paper_id}, 章节数={len(paper_structure.sections)}")
+
+
+async def _run_preview(ctx: JobContext, file_path: str, is_url: bool, parse_task: asyncio.Task):
+    """
+    与完整解析并行执行预览入库
+
+    完整解析先完成时（如命中 MinerU 结果缓存）取消预览；预览失败不影响完整解析
+    """
+    preview_task = asyncio.create_task(_ingest_preview(ctx, file_path, is_url))
+    try:
+        await asyncio.wait({preview_task, parse_task}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        if not preview_task.done():
+            preview_task.cancel()
+    try:
+        await preview_task
+    except asyncio.CancelledError:
+        if not parse_task.done():
+            # 任务本身被取消
+            raise
     except Exception as e:
-        log.error(f"论文处理失败: task_id={task_id}, error={e}")
-        task_status[task_id]["status"] = TaskStatus.FAILED
-        task_status[task_id]["error"] = str(e)
+        log.warning(f"论文预览失败，等待完整解析: task_id={ctx.job_id}, {e}")
+
+
+async def _parse_pdf(
+    ctx: JobContext,
+    file_path: str,
+    is_url: bool,
+    engine: ParseEngine,
+    on_mineru_status
+) -> Dict[str, Any]:
+    """
+    按解析引擎得到 Markdown 结果（与 MinerU 结果格式相同）
+
+    auto 模式先使用 MinerU，失败或超过 PARSE_AUTO_MINERU_TIMEOUT 时改用本地解析；
+    未安装 PyMuPDF 时 auto 等同于 mineru
+    """
+    if engine == ParseEngine.LOCAL:
+        return await _parse_locally(ctx, file_path, is_url)
+    
+    async def parse_with_mineru():
+        if is_url:
+            return await mineru_client.parse_pdf(
+                url=file_path, paper_id=ctx.job_id, on_status=on_mineru_status
+            )
+        return await mineru_client.parse_pdf(
+            file_path=Path(file_path), paper_id=ctx.job_id, on_status=on_mineru_status
+        )
+    
+    if engine == ParseEngine.MINERU or not local_pdf_parser.available:
+        async with ingest_limits.mineru.slot(), ctx.stage("mineru", progress=50):
+            return await parse_with_mineru()
+    
+    try:
+        async with ingest_limits.mineru.slot(), ctx.stage("mineru", progress=50):
+            return await asyncio.wait_for(parse_with_mineru(), timeout=settings.parse_auto_mineru_timeout)
+    except Exception as e:
+        reason = "超时" if isinstance(e, asyncio.TimeoutError) else str(e)
+        log.warning(f"MinerU 解析失败，改用本地解析: task_id={ctx.job_id}, 原因: {reason}")
+    return await _parse_locally(ctx, file_path, is_url)
+
+
+job_manager.register(JOB_TYPE_PARSE, process_paper_background)
+
+
+def _is_paper_ready(paper_id: str) -> bool:
+    """论文是否已完整入库（解析 + 向量化），可直接复用"""
+    status = paper_catalog.get_status(paper_id)
+    if status is None:
+        # 目录建立之前解析的论文没有状态记录，以解析结果是否存在为准
+        return FileManager.parsed_content_exists(paper_id)
+    return status == TaskStatus.COMPLETED
 
 
 @router.post("/upload")
@@ -85,39 +269,52 @@ async def upload_paper(
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="只支持 PDF 文件")
     
-    # 读取文件内容
-    content = await file.read()
-    file_size = len(content)
-    
-    # 检查文件大小（本地存储限制）
-    if not FileManager.check_file_size(file_size):
-        raise HTTPException(
-            status_code=413,
-            detail=f"文件太大，最大支持 {settings.max_upload_size}MB"
+    too_large_detail = f"文件太大，最大支持 {settings.max_upload_size}MB"
+
+    # 客户端声明了大小时直接拒绝，无需读取内容
+    if file.size is not None and not FileManager.check_file_size(file.size):
+        raise HTTPException(status_code=413, detail=too_large_detail)
+
+    # 流式保存文件（分块写盘并计算哈希，超限时提前中止）
+    try:
+        file_id, file_path, file_size, content_hash = await FileManager.save_upload_stream(
+            file, file.filename
         )
+    except FileTooLargeError:
+        raise HTTPException(status_code=413, detail=too_large_detail)
+
+    # 以内容哈希识别论文，相同 PDF 重复上传时复用已有结果或正在进行的任务
+    paper_id = await run_in_threadpool(paper_catalog.resolve_hash, content_hash)
     
-    # 保存文件
-    file_id, file_path = await FileManager.save_upload_file(content, file.filename)
-    
-    log.info(f"文件上传成功: {file.filename}, file_id={file_id}, size={file_size}")
+    log.info(f"文件上传成功: {file.filename}, file_id={file_id}, paper_id={paper_id}, size={file_size}, sha256={content_hash}")
     
-    return {
-        "file_id": file_id,
+    response = {
+        "file_id": paper_id,
         "filename": file.filename,
         "file_size": file_size,
+        "paper_id": None,
+        "status": TaskStatus.PENDING,
         "message": "文件上传成功，请点击解析按钮开始解析"
     }
+    
+    if await run_in_threadpool(_is_paper_ready, paper_id):
+        log.info(f"论文已存在，复用解析结果: paper_id={paper_id}")
+        response.update(
+            paper_id=paper_id,
+            status=TaskStatus.COMPLETED,
+            message="该论文已解析，直接复用已有结果"
+        )
+    elif await job_manager.is_active(paper_id):
+        response.update(
+            status=TaskStatus.PROCESSING,
+            message="该论文正在解析中..."
+        )
+    
+    return response
 
 
-@router.post("/parse/{file_id}", response_model=UploadResponse)
-async def start_parse(
-    file_id: str,
-    background_tasks: BackgroundTasks
-):
-    """
-    开始解析已上传的文件
-    """
-    # 获取文件路径
+def _get_upload_path(file_id: str) -> Path:
+    """获取已上传文件路径，并检查是否超过 MinerU 直接上传的大小限制"""
     file_path = settings.upload_dir / f"{file_id}.pdf"
     
     if not file_path.exists():
@@ -133,106 +330,220 @@ async def start_parse(
             detail=f"文件太大（{file_size / 1024 / 1024:.1f}MB），MinerU 解析服务最大支持 {settings.mineru_max_file_size}MB 的文件直接上传。建议使用 URL 方式解析较大的文件。"
         )
     
+    return file_path
+
+
+async def _submit_parse(task_id: str, source: str, is_url: bool, engine: Optional[ParseEngine] = None) -> UploadResponse:
+    """提交解析任务；已入库或正在处理的论文不会重复提交"""
+    # 已解析过的相同论文直接返回
+    if await run_in_threadpool(_is_paper_ready, task_id):
+        return UploadResponse(
+            task_id=task_id,
+            status=TaskStatus.COMPLETED,
+            message="该论文已解析完成"
+        )
+    
     # 检查是否已经在处理
-    if file_id in task_status and task_status[file_id]["status"] == TaskStatus.PROCESSING:
+    if await job_manager.is_active(task_id):
         return UploadResponse(
-            task_id=file_id,
+            task_id=task_id,
             status=TaskStatus.PROCESSING,
-            message="该文件正在解析中..."
+            message="该论文正在解析中..."
         )
     
-    # 创建任务
-    task_status[file_id] = {
-        "status": TaskStatus.PENDING,
-        "progress": 0,
-        "paper_id": None,
-        "metadata": None,
-        "error": None
-    }
-    
-    # 后台处理
-    background_tasks.add_task(
-        process_paper_background,
-        task_id=file_id,
-        file_id=file_id,
-        file_path=file_path,
-        is_url=False
-    )
-    
-    log.info(f"开始解析文件: file_id={file_id}")
+    # 创建后台任务
+    payload = {"file_path": source, "is_url": is_url}
+    if engine is not None:
+        payload["engine"] = engine.value
+    await job_manager.submit(JOB_TYPE_PARSE, job_id=task_id, payload=payload)
     
     return UploadResponse(
-        task_id=file_id,
+        task_id=task_id,
         status=TaskStatus.PENDING,
         message="解析任务已创建，正在处理中..."
     )
 
 
+@router.post("/parse/{file_id}", response_model=UploadResponse)
+async def start_parse(file_id: str, engine: Optional[ParseEngine] = None):
+    """
+    开始解析已上传的文件
+    
+    engine 指定解析引擎（mineru / local / auto），默认使用 PARSE_ENGINE 配置
+    """
+    file_path = _get_upload_path(file_id)
+    
+    response = await _submit_parse(file_id, str(file_path), is_url=False, engine=engine)
+    log.info(f"开始解析文件: file_id={file_id}, status={response.status.value}")
+    return response
+
+
 @router.post("/parse_url", response_model=UploadResponse)
-async def parse_url(
-    background_tasks: BackgroundTasks,
-    url: str
-):
+async def parse_url(url: str, engine: Optional[ParseEngine] = None):
     """
     通过 URL 解析论文（如 arXiv 链接）
-    """
-    import hashlib
     
-    # 生成任务ID
-    task_id = hashlib.md5(url.encode()).hexdigest()
+    engine 指定解析引擎（mineru / local / auto），默认使用 PARSE_ENGINE 配置
+    """
+    # 以规范化 URL 识别论文，同一论文的不同链接写法共享同一个任务
+    task_id = await run_in_threadpool(paper_catalog.resolve_url, url)
     
-    # 检查是否已经在处理
-    if task_id in task_status and task_status[task_id]["status"] == TaskStatus.PROCESSING:
-        return UploadResponse(
-            task_id=task_id,
-            status=TaskStatus.PROCESSING,
-            message="该论文正在解析中..."
+    response = await _submit_parse(task_id, url, is_url=True, engine=engine)
+    log.info(f"URL 解析任务创建: url={url}, task_id={task_id}, status={response.status.value}")
+    return response
+
+
+def _bulk_item_status(paper_id: str, source: str, job: Optional[Dict[str, Any]]) -> BulkIngestItem:
+    """批量入库中单篇论文的当前状态（任务记录不存在时查询论文目录，在线程池中调用）"""
+    if job is None:
+        if _is_paper_ready(paper_id):
+            return BulkIngestItem(paper_id=paper_id, source=source, status=TaskStatus.COMPLETED, progress=100)
+        return BulkIngestItem(
+            paper_id=paper_id,
+            source=source,
+            status=paper_catalog.get_status(paper_id) or TaskStatus.FAILED,
+            error="任务记录不存在或已过期"
         )
     
-    # 创建任务
-    task_status[task_id] = {
-        "status": TaskStatus.PENDING,
-        "progress": 0,
-        "paper_id": None,
-        "metadata": None,
-        "error": None
-    }
-    
-    # 后台处理
-    background_tasks.add_task(
-        process_paper_background,
-        task_id=task_id,
-        file_id=task_id,
-        file_path=url,
-        is_url=True
+    return BulkIngestItem(
+        paper_id=paper_id,
+        source=source,
+        status=job["status"],
+        progress=job["progress"],
+        stage=job["stage"],
+        error=job["error"],
+        stage_durations={
+            name: stage["duration"]
+            for name, stage in job["stages"].items()
+            if stage.get("duration") is not None
+        }
     )
+
+
+async def _bulk_status(batch_id: str) -> BulkIngestStatusResponse:
+    """汇总批量入库的整体进度、吞吐量和各阶段耗时"""
+    entries = await run_in_threadpool(paper_catalog.get_batch, batch_id)
+    if not entries:
+        raise HTTPException(status_code=404, detail="批次不存在")
     
-    log.info(f"URL 解析任务创建: url={url}, task_id={task_id}")
+    items = []
+    finished_times = []
+    for entry in entries:
+        job = await job_manager.get(entry["paper_id"])
+        items.append(await run_in_threadpool(_bulk_item_status, entry["paper_id"], entry["source"], job))
+        if job and job["finished_at"]:
+            finished_times.append(job["finished_at"])
     
-    return UploadResponse(
-        task_id=task_id,
-        status=TaskStatus.PENDING,
-        message="解析任务已创建..."
+    counts: Dict[str, int] = {status.value: 0 for status in TaskStatus}
+    for item in items:
+        counts[item.status.value] += 1
+    
+    # 仍有未结束的论文时按当前时间计算，全部结束后按最后完成时间计算
+    started_at = entries[0]["created_at"]
+    active = counts[TaskStatus.PENDING.value] + counts[TaskStatus.PROCESSING.value]
+    ended_at = time.time() if active or not finished_times else max(finished_times)
+    elapsed = max(ended_at - started_at, 0.0)
+    
+    stage_totals: Dict[str, List[float]] = {}
+    for item in items:
+        for name, duration in item.stage_durations.items():
+            stage_totals.setdefault(name, []).append(duration)
+    
+    return BulkIngestStatusResponse(
+        batch_id=batch_id,
+        total=len(items),
+        counts=counts,
+        elapsed_seconds=round(elapsed, 1),
+        papers_per_minute=round(counts[TaskStatus.COMPLETED.value] / elapsed * 60, 2) if elapsed > 0 else None,
+        stage_avg_seconds={
+            name: round(sum(durations) / len(durations), 3)
+            for name, durations in stage_totals.items()
+        },
+        # 阶段限制在执行任务的进程内生效，任务由独立 worker 执行时这里没有数据
+        stage_limits=ingest_limits.stats() if job_manager.is_running else {},
+        items=items
     )
 
 
+@router.post("/bulk_ingest", response_model=BulkIngestStatusResponse)
+async def bulk_ingest(request: BulkIngestRequest):
+    """
+    批量入库：一次提交多个 URL 和/或已上传的文件
+    各阶段（MinerU、解析、LLM、Embedding、写入索引）的并发和速率由 INGEST_* 配置分别限制
+    """
+    total = len(request.urls) + len(request.file_ids)
+    if total == 0:
+        raise HTTPException(status_code=400, detail="请至少提供一个 URL 或文件ID")
+    if total > settings.bulk_ingest_max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"单次最多提交 {settings.bulk_ingest_max_items} 篇论文，当前 {total} 篇"
+        )
+    
+    # 先校验全部文件，避免只提交了一部分
+    pending = []
+    for file_id in request.file_ids:
+        try:
+            pending.append((file_id, file_id, str(_get_upload_path(file_id)), False))
+        except HTTPException as e:
+            raise HTTPException(status_code=e.status_code, detail=f"{file_id}: {e.detail}")
+    for url in request.urls:
+        pending.append((await run_in_threadpool(paper_catalog.resolve_url, url), url, url, True))
+    
+    # 同一批次中重复的论文（如同一 arXiv 论文的不同链接）只保留一次
+    items = []
+    seen = set()
+    for paper_id, source, file_path, is_url in pending:
+        if paper_id in seen:
+            continue
+        seen.add(paper_id)
+        await _submit_parse(paper_id, file_path, is_url, engine=request.engine)
+        items.append((paper_id, source))
+    
+    batch_id = uuid.uuid4().hex
+    await run_in_threadpool(paper_catalog.create_batch, batch_id, items)
+    log.info(f"批量入库任务创建: batch_id={batch_id}, 论文数={len(items)}")
+    
+    return await _bulk_status(batch_id)
+
+
+@router.get("/bulk_ingest/{batch_id}", response_model=BulkIngestStatusResponse)
+async def get_bulk_ingest_status(batch_id: str):
+    """
+    查询批量入库进度：每篇论文的状态，以及整体吞吐量和各阶段平均耗时
+    """
+    return await _bulk_status(batch_id)
+
+
 @router.get("/parse_status/{task_id}", response_model=ParseStatusResponse)
 async def get_parse_status(task_id: str):
     """
     查询解析状态
     """
-    if task_id not in task_status:
+    job = await job_manager.get(task_id)
+    
+    if job is None:
+        # 任务记录已过期或来自重复上传，已入库的论文直接返回完成状态
+        if await run_in_threadpool(_is_paper_ready, task_id):
+            metadata = await FileManager.load_parsed_metadata(task_id)
+            return ParseStatusResponse(
+                task_id=task_id,
+                status=TaskStatus.COMPLETED,
+                progress=100,
+                paper_id=task_id,
+                metadata=metadata
+            )
         raise HTTPException(status_code=404, detail="任务不存在")
     
-    status_info = task_status[task_id]
+    result = job["result"] or {}
     
     return ParseStatusResponse(
         task_id=task_id,
-        status=status_info["status"],
-        progress=status_info["progress"],
-        paper_id=status_info["paper_id"],
-        metadata=status_info["metadata"],
-        error=status_info["error"]
+        status=job["status"],
+        progress=job["progress"],
+        paper_id=result.get("paper_id"),
+        metadata=result.get("metadata"),
+        error=job["error"]
     )
 
 
@@ -250,38 +561,37 @@ async def get_paper(paper_id: str):
 
 
 @router.get("/papers/list")
-async def list_papers():
-    """
-    获取所有已解析的论文列表
+async def list_papers(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    sort: str = "modified",
+    order: str = "desc",
+    title: Optional[str] = None,
+    author: Optional[str] = None,
+    fields: Optional[str] = None
+):
     """
-    papers = []
-    parsed_dir = settings.parsed_dir
-    
-    # 遍历所有解析后的JSON文件
-    for json_file in parsed_dir.glob("*.json"):
-        try:
-            paper_data = await FileManager.load_parsed_content(json_file.stem)
-            if paper_data and "metadata" in paper_data:
-                metadata = paper_data["metadata"]
-                papers.append({
-                    "paper_id": json_file.stem,
-                    "title": metadata.get("title", "未知标题"),
-                    "authors": metadata.get("authors", []),
-                    "abstract": metadata.get("abstract", ""),
-                    "created_at": json_file.stat().st_ctime,
-                    "modified_at": json_file.stat().st_mtime
-                })
-        except Exception as e:
-            log.error(f"加载论文失败: {json_file}, error={e}")
-            continue
-    
-    # 按修改时间倒序排序
-    papers.sort(key=lambda x: x["modified_at"], reverse=True)
+    分页获取已解析的论文列表
     
-    return {
-        "total": len(papers),
-        "papers": papers
-    }
+    - sort: modified（默认）/ created / title；order: desc（默认）/ asc
+    - title / author: 标题、作者前缀过滤（不区分大小写）
+    - fields: 逗号分隔的返回字段，如 title,authors；默认全部
+    - cursor: 上一页返回的 next_cursor
+    """
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    try:
+        return await run_in_threadpool(
+            paper_catalog.list_papers,
+            limit=limit,
+            cursor=cursor,
+            sort=sort,
+            order=order,
+            title_prefix=title,
+            author_prefix=author,
+            fields=field_list
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.delete("/paper/{paper_id}")
@@ -292,6 +602,10 @@ async def delete_paper(paper_id: str):
     # 删除向量数据
     count = await vectorization_service.delete_paper_vectors(paper_id)
     
+    # 删除解析结果和目录记录，之后重新上传会重新解析
+    await run_in_threadpool(FileManager.delete_parsed_content, paper_id)
+    await run_in_threadpool(paper_catalog.remove_paper, paper_id)
+    
     log.info(f"删除论文: {paper_id}, 向量数: {count}")
     
     return {
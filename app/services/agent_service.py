@@ -296,6 +296,10 @@ class AgentOrchestrator:
         for i, result in enumerate(search_results, 1):
             text = result["text"]
             section = result["metadata"].get("section_title", "未知章节")
+            page_start = result["metadata"].get("page_start")
+            if page_start is not None:
+                page_end = result["metadata"].get("page_end") or page_start
+                section += f", 页码: {page_start}" if page_end == page_start else f", 页码: {page_start}-{page_end}"
             score = result["score"]
             context_parts.append(f"[片段 {i}] (章节: {section}, 相关度: {score:.3f})\n{text}\n")
         return "\n---\n\n".join(context_parts)
@@ -312,12 +316,11 @@ class AgentOrchestrator:
         return deduplicated
     
     async def _get_section_titles(self, paper_id: str) -> List[str]:
-        """从论文 JSON 文件中直接读取章节标题列表"""
+        """从解析结果中读取章节标题列表"""
         try:
-            # 直接从保存的 JSON 文件读取章节标题，效率更高
-            paper_data = await FileManager.load_parsed_content(paper_id)
-            if paper_data and "sections" in paper_data:
-                sections = paper_data["sections"]
+            # 只读取章节列表，不加载正文
+            sections = await FileManager.load_section_list(paper_id)
+            if sections:
                 return [section.get("title", "") for section in sections if section.get("title")]
         except Exception as e:
             log.warning(f"获取章节标题失败: {e}")
@@ -390,12 +393,13 @@ class AgentOrchestrator:
                     content=f"第 {current_round} 轮检索 (关键词: {', '.join(search_keywords)})"
                 )
                 
-                # 执行多关键词检索
+                # 执行多关键词检索（第一轮优先检索意图识别出的目标章节及其子章节）
                 for keyword in search_keywords[:3]:  # 限制关键词数量
                     results = await vectorization_service.search_similar_chunks(
                         query_text=keyword,
                         paper_id=paper_id,
-                        top_k=settings.top_k_retrieval
+                        top_k=settings.top_k_retrieval,
+                        section_filter=intent_result.target_sections if current_round == 1 else None
                     )
                     all_results.extend(results)
                 
@@ -417,7 +421,9 @@ class AgentOrchestrator:
                 # === 第3步：信息完备性评估 ===
                 yield AgentStreamEvent(type="thinking", content="正在评估信息完备性...")
                 
-                context = self._format_context(all_results)
+                # 命中的小块在 token 预算内扩展为父块
+                context_results = await vectorization_service.expand_to_parents(all_results)
+                context = self._format_context(context_results)
                 evaluation_result = await CompletenessEvaluator.evaluate(
                     question=question,
                     retrieved_content=context,
@@ -448,7 +454,8 @@ class AgentOrchestrator:
                 answer = "抱歉，我在论文中没有找到与您问题相关的内容。您可以尝试换一个问法或问其他问题。"
                 yield AgentStreamEvent(type="content", content=answer)
             else:
-                context = self._format_context(all_results)
+                context_results = await vectorization_service.expand_to_parents(all_results)
+                context = self._format_context(context_results)
                 prompt = self.ANSWER_PROMPT.format(
                     context=context,
                     question=question
@@ -486,6 +493,7 @@ class AgentOrchestrator:
                 content=[{
                     "chunk_id": r.get("chunk_id"),
                     "section": r.get("metadata", {}).get("section_title", ""),
+                    "page": r.get("metadata", {}).get("page_start"),
                     "score": r.get("score", 0),
                     "text_preview": r.get("text", "")[:100] + "..."
                 } for r in all_results[:5]]
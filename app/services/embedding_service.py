@@ -2,12 +2,131 @@
 Embedding 服务
 支持多个 Embedding 提供商
 """
-from typing import List, Optional
-from openai import AsyncOpenAI
+import asyncio
+import time
+from collections import deque
+from contextlib import aclosing
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI
 
 from app.config import settings
+from app.services.ingest_limits import ingest_limits
+from app.services.text_processor import count_batch_tokens
 from app.utils.logger import log
-from app.utils.async_helper import async_retry
+from app.utils.async_helper import RateLimiter, async_retry
+from app.utils.cpu_executor import cpu_executor
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """从限流响应的 Retry-After（秒数或 HTTP 日期）/ retry-after-ms 头中取出等待时间"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable(error: Exception) -> bool:
+    """限流、超时、连接错误和服务端错误可以重试"""
+    if isinstance(error, APIConnectionError):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+class EmbeddingScheduler:
+    """
+    Embedding 批次调度（进程内共享）
+
+    每个批次先按 token 数等待 TPM 令牌和限流冷却，再占用 ingest_limits.embed 的并发名额和请求速率；
+    失败时只重试该批次，优先按响应的 Retry-After 等待（并让其他批次一起暂停），否则指数退避。
+    TPM 令牌每个批次只扣一次，重试不重复计入
+    """
+
+    def __init__(self, tpm: Optional[int] = None, max_retries: Optional[int] = None, base_delay: float = 1.0):
+        self.tpm = settings.embedding_tpm if tpm is None else tpm
+        self.max_retries = settings.embedding_max_retries if max_retries is None else max_retries
+        self.base_delay = base_delay
+        self._token_limiter = RateLimiter(self.tpm / 60, burst=self.tpm) if self.tpm > 0 else RateLimiter(0)
+        self._cooldown_until = 0.0
+        self.batches = 0
+        self.retries = 0
+        self.throttled = 0
+        self.tokens = 0
+
+    async def run(
+        self,
+        request: Callable[[List[str]], Awaitable[List[List[float]]]],
+        batch: List[str],
+        batch_no: int,
+        tokens: Optional[int] = None
+    ) -> List[List[float]]:
+        """
+        执行一个批次请求，失败时只重试该批次
+
+        Args:
+            request: 请求一个批次的协程函数
+            batch: 批次文本
+            batch_no: 批次序号（用于日志）
+            tokens: 批次的 token 数，未提供时在 CPU 进程池中计算
+        """
+        if tokens is None:
+            tokens = (await cpu_executor.run(count_batch_tokens, [batch]))[0]
+        await self._token_limiter.acquire(tokens)
+        attempt = 0
+        while True:
+            delay = self._cooldown_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                async with ingest_limits.embed.slot():
+                    embeddings = await request(batch)
+                self.batches += 1
+                self.tokens += tokens
+                return embeddings
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    log.error(f"批量生成 embedding 失败 (批次 {batch_no}): {e}")
+                    raise
+                retry_after = _retry_after(e)
+                if retry_after is not None:
+                    # 提供商要求等待时，其他批次也暂停到同一时间
+                    self.throttled += 1
+                    delay = max(0.0, retry_after)
+                    self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+                else:
+                    delay = self.base_delay * (2 ** attempt)
+                attempt += 1
+                self.retries += 1
+                log.warning(
+                    f"embedding 批次 {batch_no} 失败 (尝试 {attempt}/{self.max_retries + 1}): {e}, "
+                    f"等待 {delay:.2f}s 后重试该批次"
+                )
+                await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """调度统计"""
+        return {
+            "tpm": self.tpm,
+            "batches": self.batches,
+            "tokens": self.tokens,
+            "retries": self.retries,
+            "throttled": self.throttled,
+        }
 
 
 class EmbeddingService:
@@ -28,9 +147,11 @@ class EmbeddingService:
         if not self.config["api_key"]:
             raise ValueError(f"{self.provider} API Key 未配置")
         
+        # 重试由 async_retry / EmbeddingScheduler 负责，关闭 SDK 内置重试以免重复
         self.client = AsyncOpenAI(
             api_key=self.config["api_key"],
-            base_url=self.config["base_url"]
+            base_url=self.config["base_url"],
+            max_retries=0
         )
         
         log.info(f"初始化 Embedding 服务: {self.provider}, 模型: {self.model}")
@@ -60,10 +181,9 @@ class EmbeddingService:
             log.error(f"生成 embedding 失败: {e}")
             raise
     
-    @async_retry(max_retries=3, delay=1.0)
     async def embed_batch(self, texts: List[str], batch_size: int = 10) -> List[List[float]]:
         """
-        批量生成 embedding
+        批量生成 embedding（各批次并发执行，结果按输入顺序返回）
         
         Args:
             texts: 文本列表
@@ -76,29 +196,58 @@ class EmbeddingService:
             return []
         
         all_embeddings = []
-        
-        # 分批处理
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            
-            try:
-                response = await self.client.embeddings.create(
-                    model=self.model,
-                    input=batch
-                )
-                
-                batch_embeddings = [item.embedding for item in response.data]
+        async with aclosing(self.embed_batches(texts, batch_size)) as batches:
+            async for batch_embeddings in batches:
                 all_embeddings.extend(batch_embeddings)
-                
-                log.debug(f"批量生成 embedding: {i+1}-{i+len(batch)}/{len(texts)}")
-                
-            except Exception as e:
-                log.error(f"批量生成 embedding 失败 (批次 {i//batch_size + 1}): {e}")
-                raise
         
         log.info(f"批量 embedding 完成: 总数={len(all_embeddings)}, 维度={len(all_embeddings[0])}")
         return all_embeddings
     
+    async def embed_batches(self, texts: List[str], batch_size: int = 10) -> AsyncIterator[List[List[float]]]:
+        """
+        并发生成各批次的 embedding，按批次顺序逐批产出
+        
+        最多提前发出 INGEST_EMBED_CONCURRENCY + 1 个批次，调用方处理较慢时不会无限领先；
+        每个批次单独重试，调用方停止迭代或出错时取消尚未完成的批次
+        
+        Args:
+            texts: 文本列表
+            batch_size: 批次大小
+            
+        Yields:
+            每个批次的 Embedding 向量列表
+        """
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        # 所有批次的 token 数一次性在 CPU 进程池中统计，不占用事件循环
+        token_counts = await cpu_executor.run(count_batch_tokens, batches)
+        window = ingest_limits.embed.concurrency + 1
+        pending: Deque[asyncio.Task] = deque()
+        next_batch = 0
+        
+        try:
+            while pending or next_batch < len(batches):
+                while next_batch < len(batches) and len(pending) < window:
+                    pending.append(asyncio.create_task(
+                        embedding_scheduler.run(
+                            self._embed_once, batches[next_batch], next_batch + 1, tokens=token_counts[next_batch]
+                        )
+                    ))
+                    next_batch += 1
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+    
+    async def _embed_once(self, batch: List[str]) -> List[List[float]]:
+        """请求一个批次（不重试）"""
+        response = await self.client.embeddings.create(
+            model=self.model,
+            input=batch
+        )
+        return [item.embedding for item in response.data]
+    
     def get_dimension(self) -> int:
         """
         获取 embedding 维度
@@ -122,6 +271,10 @@ class EmbeddingService:
         return 1536
 
 
+# 全局 Embedding 批次调度实例
+embedding_scheduler = EmbeddingScheduler()
+
+
 # 创建全局服务实例的工厂函数
 def create_embedding_service(
     provider: Optional[str] = None,
@@ -0,0 +1,108 @@
+"""
+论文入库各阶段的并发与限速控制
+MinerU、LLM、Embedding 的限额各不相同，每个阶段单独限制并发数和请求速率，
+批量入库时各阶段都能跑满而不会触发 429
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
+from app.config import settings
+from app.utils.async_helper import RateLimiter
+
+
+class StageLimiter:
+    """单个阶段的并发上限 + 令牌桶限速，并统计排队和执行情况"""
+
+    def __init__(self, name: str, concurrency: int, rate: float = 0):
+        """
+        Args:
+            name: 阶段名称
+            concurrency: 同时执行的最大数量
+            rate: 每秒允许进入阶段的次数，<= 0 表示不限速
+        """
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._rate_limiter = RateLimiter(rate)
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    @asynccontextmanager
+    async def slot(self):
+        """占用一个执行名额（先等并发名额，再等限速令牌）"""
+        self.waiting += 1
+        wait_started = time.monotonic()
+        try:
+            await self._semaphore.acquire()
+            try:
+                await self._rate_limiter.acquire()
+            except BaseException:
+                self._semaphore.release()
+                raise
+        finally:
+            self.waiting -= 1
+            self.wait_seconds += time.monotonic() - wait_started
+
+        self.in_flight += 1
+        started = time.monotonic()
+        try:
+            yield
+            self.completed += 1
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.busy_seconds += time.monotonic() - started
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """阶段统计信息"""
+        finished = self.completed + self.failed
+        return {
+            "concurrency": self.concurrency,
+            "rate": self.rate,
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_seconds": round(self.busy_seconds / finished, 3) if finished else None,
+            "avg_wait_seconds": round(self.wait_seconds / finished, 3) if finished else None,
+        }
+
+
+class IngestLimits:
+    """
+    入库流水线的各阶段限制（进程内生效）
+
+    - mineru: 同时在 MinerU 解析中的论文数（提交速率由 MinerU 客户端按请求限制，一个批次只算一次）
+    - parse: 章节提取等 CPU 工作
+    - llm: 元数据提取等 LLM 请求
+    - embed: 每批 Embedding 请求
+    - index: 每次写入 Milvus
+    """
+
+    def __init__(self):
+        self.mineru = StageLimiter("mineru", settings.ingest_mineru_concurrency)
+        self.parse = StageLimiter("parse", settings.ingest_parse_concurrency)
+        self.llm = StageLimiter("llm", settings.ingest_llm_concurrency, settings.ingest_llm_rate)
+        self.embed = StageLimiter("embed", settings.ingest_embed_concurrency, settings.ingest_embed_rate)
+        self.index = StageLimiter("index", settings.ingest_index_concurrency)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """所有阶段的统计信息"""
+        return {
+            limiter.name: limiter.stats()
+            for limiter in (self.mineru, self.parse, self.llm, self.embed, self.index)
+        }
+
+
+# 全局阶段限制实例
+ingest_limits = IngestLimits()
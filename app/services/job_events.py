@@ -0,0 +1,74 @@
+"""
+后台任务事件总线
+任务进度变化时推送给订阅者（SSE / WebSocket），替代前端轮询
+"""
+import asyncio
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+from app.models.schemas import TaskStatus
+
+
+# 任务结束状态，推送后订阅结束
+TERMINAL_STATUSES = (TaskStatus.COMPLETED, TaskStatus.FAILED)
+
+
+def job_snapshot(job: Dict[str, Any]) -> Dict[str, Any]:
+    """任务记录转换为推送给客户端的快照"""
+    status = TaskStatus(job["status"])
+    return {
+        "job_id": job["job_id"],
+        "job_type": job["job_type"],
+        "status": status.value,
+        "progress": job["progress"],
+        "stage": job["stage"],
+        "stages": job["stages"],
+        "attempts": job["attempts"],
+        "error": job["error"],
+        "result": job["result"] if status == TaskStatus.COMPLETED else None,
+    }
+
+
+class JobEventBus:
+    """
+    进程内的任务事件总线
+
+    只能感知当前进程执行的任务；任务由其他进程（独立 worker）执行时，
+    订阅方需要定期读取任务存储作为补充。
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    def has_subscribers(self, job_id: str) -> bool:
+        """任务是否有订阅者"""
+        return bool(self._subscribers.get(job_id))
+
+    @contextmanager
+    def subscribe(self, job_id: str) -> Iterator[asyncio.Queue]:
+        """订阅任务事件，退出上下文时自动取消订阅"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(job_id, []).append(queue)
+        try:
+            yield queue
+        finally:
+            queues = self._subscribers.get(job_id, [])
+            if queue in queues:
+                queues.remove(queue)
+            if not queues:
+                self._subscribers.pop(job_id, None)
+
+    def publish(self, job_id: str, event: Dict[str, Any]):
+        """发布事件；订阅者处理过慢时丢弃最旧的事件（快照包含完整状态，丢弃中间事件不影响结果）"""
+        for queue in self._subscribers.get(job_id, []):
+            if queue.full():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            queue.put_nowait(event)
+
+
+# 全局事件总线实例
+job_event_bus = JobEventBus()
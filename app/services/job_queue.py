@@ -0,0 +1,661 @@
+"""
+后台任务队列
+持久化保存解析、翻译、摘要等后台任务的状态，支持租约、失败重试、过期清理和重启后恢复
+"""
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from app.config import settings
+from app.models.schemas import TaskStatus
+from app.services.job_events import job_event_bus, job_snapshot
+from app.utils.async_helper import run_in_threadpool
+from app.utils.logger import log
+
+
+class PermanentJobError(Exception):
+    """不可重试的任务错误（如论文不存在），抛出后任务直接失败"""
+
+
+# 未结束的任务状态
+ACTIVE_STATUSES = (TaskStatus.PENDING, TaskStatus.PROCESSING)
+
+
+class BaseJobStore(ABC):
+    """任务存储基类"""
+
+    @abstractmethod
+    def create(self, job_id: str, job_type: str, payload: Dict[str, Any], max_attempts: int) -> Dict[str, Any]:
+        """
+        创建任务；同 ID 的任务未结束时保持不变，已结束时重置为待执行
+
+        Returns:
+            任务记录
+        """
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务记录"""
+
+    @abstractmethod
+    def lease(self, job_types: Iterable[str], owner: str, lease_seconds: int) -> Optional[Dict[str, Any]]:
+        """领取一个可执行的任务（待执行且到期，或租约已过期），成功时返回任务记录"""
+
+    @abstractmethod
+    def renew_lease(self, job_id: str, owner: str, lease_seconds: int) -> bool:
+        """续租，任务已被他人接管时返回 False"""
+
+    @abstractmethod
+    def update(self, job_id: str, **fields) -> None:
+        """更新任务的进度字段（progress / stage / stages）"""
+
+    @abstractmethod
+    def complete(self, job_id: str, result: Optional[Dict[str, Any]] = None, owner: Optional[str] = None) -> bool:
+        """
+        标记任务完成
+
+        指定 owner 时只在该执行者仍持有租约时生效（租约已被他人接管时不覆盖），返回是否生效
+        """
+
+    @abstractmethod
+    def fail(self, job_id: str, error: str, retry_at: Optional[float] = None, owner: Optional[str] = None) -> bool:
+        """标记任务失败；指定 retry_at 时重新进入待执行状态；owner 的含义同 complete"""
+
+    @abstractmethod
+    def release(self, job_id: str, owner: str) -> None:
+        """释放租约（进程退出时），任务重新进入待执行状态且不计入尝试次数"""
+
+    @abstractmethod
+    def recover_expired(self) -> int:
+        """将租约已过期的执行中任务重新置为待执行，返回数量"""
+
+    @abstractmethod
+    def purge_finished(self, older_than: float) -> int:
+        """删除结束时间早于 older_than 的已结束任务，返回数量"""
+
+    def close(self) -> None:
+        """关闭存储"""
+
+
+class SQLiteJobStore(BaseJobStore):
+    """基于 SQLite 的任务存储（WAL 模式，可被同一主机上的多个进程共享）"""
+
+    _COLUMNS = (
+        "job_id", "job_type", "payload", "status", "progress", "stage", "stages",
+        "result", "error", "attempts", "max_attempts", "run_after",
+        "lease_owner", "lease_expires_at", "created_at", "updated_at", "finished_at"
+    )
+    _JSON_COLUMNS = ("payload", "stages", "result")
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or settings.job_db_path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """获取（必要时创建）数据库连接"""
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                str(self.db_path),
+                check_same_thread=False,
+                isolation_level=None,
+                timeout=30
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    job_type TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress INTEGER NOT NULL DEFAULT 0,
+                    stage TEXT,
+                    stages TEXT NOT NULL DEFAULT '{}',
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    run_after REAL NOT NULL,
+                    lease_owner TEXT,
+                    lease_expires_at REAL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    finished_at REAL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, run_after)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs(finished_at)")
+            self._conn = conn
+        return self._conn
+
+    def _row_to_job(self, row) -> Dict[str, Any]:
+        """数据库行转换为任务字典"""
+        job = dict(zip(self._COLUMNS, row))
+        for column in self._JSON_COLUMNS:
+            job[column] = json.loads(job[column]) if job[column] else None
+        job["stages"] = job["stages"] or {}
+        job["status"] = TaskStatus(job["status"])
+        return job
+
+    def _select(self, conn, job_id: str) -> Optional[Dict[str, Any]]:
+        row = conn.execute(
+            f"SELECT {', '.join(self._COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def create(self, job_id: str, job_type: str, payload: Dict[str, Any], max_attempts: int) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = self._select(conn, job_id)
+                if existing is None:
+                    conn.execute(
+                        """
+                        INSERT INTO jobs (job_id, job_type, payload, status, max_attempts, run_after, created_at, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        """,
+                        (job_id, job_type, json.dumps(payload, ensure_ascii=False),
+                         TaskStatus.PENDING.value, max_attempts, now, now, now)
+                    )
+                elif existing["status"] not in ACTIVE_STATUSES:
+                    conn.execute(
+                        """
+                        UPDATE jobs SET job_type = ?, payload = ?, status = ?, progress = 0, stage = NULL,
+                            stages = '{}', result = NULL, error = NULL, attempts = 0, max_attempts = ?,
+                            run_after = ?, lease_owner = NULL, lease_expires_at = NULL,
+                            created_at = ?, updated_at = ?, finished_at = NULL
+                        WHERE job_id = ?
+                        """,
+                        (job_type, json.dumps(payload, ensure_ascii=False), TaskStatus.PENDING.value,
+                         max_attempts, now, now, now, job_id)
+                    )
+                job = self._select(conn, job_id)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._select(self._get_conn(), job_id)
+
+    def lease(self, job_types: Iterable[str], owner: str, lease_seconds: int) -> Optional[Dict[str, Any]]:
+        job_types = list(job_types)
+        if not job_types:
+            return None
+
+        now = time.time()
+        placeholders = ", ".join("?" for _ in job_types)
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = conn.execute(
+                        f"""
+                        SELECT job_id, attempts, max_attempts FROM jobs
+                        WHERE job_type IN ({placeholders})
+                          AND ((status = ? AND run_after <= ?) OR (status = ? AND lease_expires_at < ?))
+                        ORDER BY run_after, created_at
+                        LIMIT 1
+                        """,
+                        (*job_types, TaskStatus.PENDING.value, now, TaskStatus.PROCESSING.value, now)
+                    ).fetchone()
+                    if row is None:
+                        conn.execute("COMMIT")
+                        return None
+
+                    job_id, attempts, max_attempts = row
+                    if attempts >= max_attempts:
+                        # 执行者多次中途失联，不再继续尝试
+                        conn.execute(
+                            """
+                            UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, lease_expires_at = NULL,
+                                updated_at = ?, finished_at = ?
+                            WHERE job_id = ?
+                            """,
+                            (TaskStatus.FAILED.value, "任务执行中断次数超过上限", now, now, job_id)
+                        )
+                        continue
+
+                    conn.execute(
+                        """
+                        UPDATE jobs SET status = ?, attempts = attempts + 1, lease_owner = ?,
+                            lease_expires_at = ?, updated_at = ?
+                        WHERE job_id = ?
+                        """,
+                        (TaskStatus.PROCESSING.value, owner, now + lease_seconds, now, job_id)
+                    )
+                    job = self._select(conn, job_id)
+                    conn.execute("COMMIT")
+                    return job
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def renew_lease(self, job_id: str, owner: str, lease_seconds: int) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self._get_conn().execute(
+                "UPDATE jobs SET lease_expires_at = ?, updated_at = ? WHERE job_id = ? AND lease_owner = ? AND status = ?",
+                (now + lease_seconds, now, job_id, owner, TaskStatus.PROCESSING.value)
+            )
+        return cursor.rowcount > 0
+
+    def update(self, job_id: str, **fields) -> None:
+        allowed = {"progress", "stage", "stages"}
+        unknown = set(fields) - allowed
+        if unknown:
+            raise ValueError(f"不支持更新的字段: {unknown}")
+        if not fields:
+            return
+
+        values = [
+            json.dumps(value, ensure_ascii=False) if key in self._JSON_COLUMNS else value
+            for key, value in fields.items()
+        ]
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock:
+            self._get_conn().execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? WHERE job_id = ?",
+                (*values, time.time(), job_id)
+            )
+
+    @staticmethod
+    def _owner_clause(job_id: str, owner: Optional[str]):
+        """WHERE 条件：指定 owner 时要求仍持有租约"""
+        if owner is None:
+            return "job_id = ?", (job_id,)
+        return "job_id = ? AND lease_owner = ?", (job_id, owner)
+
+    def complete(self, job_id: str, result: Optional[Dict[str, Any]] = None, owner: Optional[str] = None) -> bool:
+        now = time.time()
+        where, params = self._owner_clause(job_id, owner)
+        with self._lock:
+            cursor = self._get_conn().execute(
+                f"""
+                UPDATE jobs SET status = ?, progress = 100, result = ?, error = NULL,
+                    lease_owner = NULL, lease_expires_at = NULL, updated_at = ?, finished_at = ?
+                WHERE {where}
+                """,
+                (TaskStatus.COMPLETED.value, json.dumps(result or {}, ensure_ascii=False, default=str),
+                 now, now, *params)
+            )
+        return cursor.rowcount > 0
+
+    def fail(self, job_id: str, error: str, retry_at: Optional[float] = None, owner: Optional[str] = None) -> bool:
+        now = time.time()
+        where, params = self._owner_clause(job_id, owner)
+        with self._lock:
+            conn = self._get_conn()
+            if retry_at is None:
+                cursor = conn.execute(
+                    f"""
+                    UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, lease_expires_at = NULL,
+                        updated_at = ?, finished_at = ?
+                    WHERE {where}
+                    """,
+                    (TaskStatus.FAILED.value, error, now, now, *params)
+                )
+            else:
+                cursor = conn.execute(
+                    f"""
+                    UPDATE jobs SET status = ?, error = ?, run_after = ?, lease_owner = NULL,
+                        lease_expires_at = NULL, updated_at = ?
+                    WHERE {where}
+                    """,
+                    (TaskStatus.PENDING.value, error, retry_at, now, *params)
+                )
+        return cursor.rowcount > 0
+
+    def release(self, job_id: str, owner: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._get_conn().execute(
+                """
+                UPDATE jobs SET status = ?, attempts = MAX(attempts - 1, 0), run_after = ?,
+                    lease_owner = NULL, lease_expires_at = NULL, updated_at = ?
+                WHERE job_id = ? AND lease_owner = ? AND status = ?
+                """,
+                (TaskStatus.PENDING.value, now, now, job_id, owner, TaskStatus.PROCESSING.value)
+            )
+
+    def recover_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            cursor = self._get_conn().execute(
+                """
+                UPDATE jobs SET status = ?, run_after = ?, lease_owner = NULL, lease_expires_at = NULL, updated_at = ?
+                WHERE status = ? AND lease_expires_at < ?
+                """,
+                (TaskStatus.PENDING.value, now, now, TaskStatus.PROCESSING.value, now)
+            )
+        return cursor.rowcount
+
+    def purge_finished(self, older_than: float) -> int:
+        with self._lock:
+            cursor = self._get_conn().execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (TaskStatus.COMPLETED.value, TaskStatus.FAILED.value, older_than)
+            )
+        return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class JobContext:
+    """传递给任务处理函数的上下文，用于读取参数和上报进度"""
+
+    def __init__(self, manager: "JobManager", job: Dict[str, Any]):
+        self.manager = manager
+        self.job_id: str = job["job_id"]
+        self.job_type: str = job["job_type"]
+        self.payload: Dict[str, Any] = job["payload"] or {}
+        self.attempt: int = job["attempts"]
+        self.stages: Dict[str, Dict[str, Any]] = dict(job.get("stages") or {})
+        self.progress: int = job.get("progress") or 0
+
+    async def update(self, progress: Optional[int] = None, stage: Optional[str] = None, **stage_fields):
+        """
+        上报进度
+
+        Args:
+            progress: 整体进度（0-100）
+            stage: 当前阶段名称
+            **stage_fields: 写入当前阶段记录的附加信息（如 chunks_embedded）
+        """
+        fields: Dict[str, Any] = {}
+        if progress is not None:
+            self.progress = max(0, min(100, int(progress)))
+            fields["progress"] = self.progress
+        if stage is not None:
+            fields["stage"] = stage
+            if stage_fields:
+                self.stages.setdefault(stage, {}).update(stage_fields)
+                fields["stages"] = self.stages
+        await run_in_threadpool(self.manager.store.update, self.job_id, **fields)
+        await self.manager.notify(self.job_id)
+
+    @asynccontextmanager
+    async def stage(self, name: str, progress: Optional[int] = None):
+        """
+        记录一个阶段的起止时间和耗时
+
+        Args:
+            name: 阶段名称
+            progress: 阶段结束时的整体进度
+        """
+        started_at = time.time()
+        await self.update(stage=name, status=TaskStatus.PROCESSING.value, started_at=started_at)
+        try:
+            yield
+        except Exception:
+            await self.update(stage=name, status=TaskStatus.FAILED.value, duration=round(time.time() - started_at, 3))
+            raise
+        await self.update(
+            progress=progress,
+            stage=name,
+            status=TaskStatus.COMPLETED.value,
+            duration=round(time.time() - started_at, 3)
+        )
+
+
+def create_job_store(backend: Optional[str] = None) -> BaseJobStore:
+    """
+    按配置创建任务存储
+
+    Args:
+        backend: sqlite（默认，单机多进程共享）或 redis（多节点共享）
+    """
+    backend = (backend or settings.job_queue_backend).lower()
+    if backend == "sqlite":
+        return SQLiteJobStore()
+    if backend == "redis":
+        from app.services.redis_job_store import RedisJobStore
+        return RedisJobStore()
+    raise ValueError(f"Unknown job queue backend: {backend}")
+
+
+JobHandler = Callable[[JobContext], Awaitable[Optional[Dict[str, Any]]]]
+
+
+class JobManager:
+    """
+    任务管理器
+
+    负责提交任务、在后台循环领取并执行任务、失败后按指数退避重试，
+    并定期清理过期的已结束任务。
+    存储的读写都在线程池中执行，SQLite 等待写锁或 Redis 网络往返时不阻塞事件循环。
+    """
+
+    def __init__(self, store: Optional[BaseJobStore] = None):
+        self.store: BaseJobStore = store or create_job_store()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = settings.job_lease_seconds
+        self.poll_interval = settings.job_poll_interval
+        self.max_attempts = settings.job_max_attempts
+        self.retry_base_delay = settings.job_retry_base_delay
+        self.ttl_seconds = settings.job_ttl_hours * 3600
+        self._handlers: Dict[str, JobHandler] = {}
+        self._loops: List[asyncio.Task] = []
+        self._lease_types: List[str] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def register(self, job_type: str, handler: JobHandler):
+        """注册任务处理函数"""
+        self._handlers[job_type] = handler
+
+    @property
+    def job_types(self) -> List[str]:
+        """已注册的任务类型"""
+        return list(self._handlers)
+
+    @property
+    def is_running(self) -> bool:
+        """后台执行循环是否已启动"""
+        return bool(self._loops)
+
+    async def submit(
+        self,
+        job_type: str,
+        job_id: str,
+        payload: Optional[Dict[str, Any]] = None,
+        max_attempts: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        提交任务；同 ID 的任务未结束时直接返回已有任务
+
+        Returns:
+            任务记录
+        """
+        job = await run_in_threadpool(
+            self.store.create, job_id, job_type, payload or {}, max_attempts or self.max_attempts
+        )
+        if self._wakeup is not None:
+            self._wakeup.set()
+        await self.notify(job_id)
+        log.info(f"提交任务: job_id={job_id}, type={job_type}, status={job['status'].value}")
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务记录"""
+        return await run_in_threadpool(self.store.get, job_id)
+
+    async def notify(self, job_id: str):
+        """把任务的最新状态推送给订阅者（没有订阅者时不读取存储）"""
+        if not job_event_bus.has_subscribers(job_id):
+            return
+        try:
+            job = await run_in_threadpool(self.store.get, job_id)
+        except Exception as e:
+            log.warning(f"读取任务状态失败: job_id={job_id}, error={e}")
+            return
+        if job is not None:
+            job_event_bus.publish(job_id, job_snapshot(job))
+
+    async def is_active(self, job_id: str) -> bool:
+        """任务是否存在且尚未结束"""
+        job = await run_in_threadpool(self.store.get, job_id)
+        return job is not None and job["status"] in ACTIVE_STATUSES
+
+    async def start(self, concurrency: Optional[int] = None, job_types: Optional[Iterable[str]] = None):
+        """
+        启动后台执行循环，并恢复上次中断的任务
+
+        Args:
+            concurrency: 并发执行数，默认使用配置
+            job_types: 只执行这些类型的任务，默认执行所有已注册类型
+        """
+        if self._loops:
+            return
+
+        lease_types = list(job_types) if job_types else self.job_types
+        unknown = set(lease_types) - set(self._handlers)
+        if unknown:
+            raise ValueError(f"未注册的任务类型: {unknown}")
+        self._lease_types = lease_types
+
+        recovered = await run_in_threadpool(self.store.recover_expired)
+        if recovered:
+            log.info(f"恢复中断的任务: {recovered} 个")
+
+        self._wakeup = asyncio.Event()
+        concurrency = concurrency or settings.job_workers
+        self._loops = [
+            asyncio.create_task(self._worker_loop(i), name=f"job-worker-{i}")
+            for i in range(concurrency)
+        ]
+        self._loops.append(asyncio.create_task(self._purge_loop(), name="job-purge"))
+        log.info(f"任务执行器已启动: worker_id={self.worker_id}, 并发数={concurrency}, 任务类型={self._lease_types}")
+
+    async def stop(self):
+        """停止后台执行循环，正在执行的任务释放租约以便下次启动时继续"""
+        for task in self._loops:
+            task.cancel()
+        await asyncio.gather(*self._loops, return_exceptions=True)
+        self._loops = []
+        self._wakeup = None
+        log.info("任务执行器已停止")
+
+    async def _worker_loop(self, index: int):
+        """领取并执行任务的循环"""
+        while True:
+            try:
+                job = await run_in_threadpool(self.store.lease, self._lease_types, self.worker_id, self.lease_seconds)
+            except Exception as e:
+                log.error(f"领取任务失败: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self.run_job(job)
+
+    async def run_job(self, job: Dict[str, Any]):
+        """执行一个已领取的任务，负责续租、完成、失败重试"""
+        job_id = job["job_id"]
+        handler = self._handlers.get(job["job_type"])
+        if handler is None:
+            error = f"未注册的任务类型: {job['job_type']}"
+            await run_in_threadpool(self.store.fail, job_id, error, owner=self.worker_id)
+            return
+
+        ctx = JobContext(self, job)
+        handler_task = asyncio.create_task(handler(ctx))
+        lease_lost = asyncio.Event()
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, handler_task, lease_lost))
+        log.info(f"开始执行任务: job_id={job_id}, type={job['job_type']}, 第 {ctx.attempt} 次尝试")
+        await self.notify(job_id)
+
+        try:
+            result = await handler_task
+            if await run_in_threadpool(self.store.complete, job_id, result, owner=self.worker_id):
+                log.info(f"任务完成: job_id={job_id}")
+            else:
+                log.warning(f"任务已被其他执行者接管，丢弃本次结果: job_id={job_id}")
+
+        except asyncio.CancelledError:
+            if lease_lost.is_set():
+                # 租约被接管后由心跳取消处理函数，任务由新的执行者负责
+                log.warning(f"任务租约已失效，已停止执行: job_id={job_id}")
+                return
+            await run_in_threadpool(self.store.release, job_id, self.worker_id)
+            log.info(f"任务被中断，已释放租约: job_id={job_id}")
+            raise
+
+        except PermanentJobError as e:
+            log.error(f"任务失败（不可重试）: job_id={job_id}, error={e}")
+            await run_in_threadpool(self.store.fail, job_id, str(e), owner=self.worker_id)
+
+        except Exception as e:
+            if ctx.attempt < job["max_attempts"]:
+                delay = self.retry_base_delay * (2 ** (ctx.attempt - 1))
+                log.warning(f"任务失败，{delay:.1f}s 后重试: job_id={job_id}, error={e}")
+                await run_in_threadpool(
+                    self.store.fail, job_id, str(e), retry_at=time.time() + delay, owner=self.worker_id
+                )
+            else:
+                log.error(f"任务失败，已达最大尝试次数: job_id={job_id}, error={e}")
+                await run_in_threadpool(self.store.fail, job_id, str(e), owner=self.worker_id)
+
+        finally:
+            heartbeat.cancel()
+            if not handler_task.done():
+                handler_task.cancel()
+            await self.notify(job_id)
+
+    async def _heartbeat(self, job_id: str, handler_task: asyncio.Task, lease_lost: asyncio.Event):
+        """定期续租，防止长任务被其他执行者接管；租约已被接管时取消处理函数"""
+        interval = max(self.lease_seconds / 3, 0.1)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                renewed = await run_in_threadpool(self.store.renew_lease, job_id, self.worker_id, self.lease_seconds)
+            except Exception as e:
+                log.warning(f"任务续租失败: job_id={job_id}, error={e}")
+                continue
+            if not renewed:
+                log.warning(f"任务租约已失效，取消执行: job_id={job_id}")
+                lease_lost.set()
+                handler_task.cancel()
+                return
+
+    async def _purge_loop(self):
+        """定期清理过期的已结束任务"""
+        interval = min(max(self.ttl_seconds / 10, 60), 3600)
+        while True:
+            try:
+                purged = await run_in_threadpool(self.store.purge_finished, time.time() - self.ttl_seconds)
+                if purged:
+                    log.info(f"清理过期任务: {purged} 个")
+            except Exception as e:
+                log.warning(f"清理过期任务失败: {e}")
+            await asyncio.sleep(interval)
+
+
+# 全局任务管理器实例
+job_manager = JobManager()
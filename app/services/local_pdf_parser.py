@@ -0,0 +1,276 @@
+"""
+本地 PDF 解析引擎
+基于 PyMuPDF 提取文本层，按字号识别标题，并提取页面中的图片，输出与 MinerU 结果相同格式的 Markdown。
+各页在进程池中并行解析，适合 arXiv 等带文本层的论文；扫描件、公式和表格的效果不如 MinerU
+"""
+import asyncio
+import math
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiofiles
+import httpx
+
+from app.config import settings
+from app.utils.async_helper import run_in_threadpool
+from app.utils.logger import log
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:  # 可选依赖
+    fitz = None
+
+
+# PyMuPDF span flags 中表示粗体的位
+BOLD_FLAG = 1 << 4
+# 小于该尺寸（像素）的图片视为图标或装饰，不提取
+MIN_IMAGE_SIZE = 64
+# 标题块的最大字符数
+MAX_HEADING_CHARS = 150
+# 字号至少为正文字号的多少倍才视为标题
+HEADING_SIZE_RATIO = 1.15
+# 编号标题：1 Introduction / 2.1 Setup / IV. Results / A Appendix
+NUMBERED_HEADING_PATTERN = re.compile(r'^(\d+(\.\d+)*\.?|[IVX]+\.|[A-Z]\.?)\s+[A-Z]')
+# 常见的无编号章节名
+NAMED_HEADINGS = {
+    "abstract", "introduction", "related work", "background", "method", "methods",
+    "experiments", "results", "discussion", "conclusion", "conclusions",
+    "acknowledgments", "acknowledgements", "references", "appendix",
+}
+
+
+def local_engine_available() -> bool:
+    """是否安装了 PyMuPDF"""
+    return fitz is not None
+
+
+def _parse_pages(pdf_path: str, start: int, end: int, images_dir: Optional[str]) -> Tuple[List[Dict[str, Any]], Dict[float, int]]:
+    """
+    在子进程中解析 [start, end) 页
+
+    Returns:
+        (页面记录列表, {字号: 字符数})；页面记录为 {"page", "blocks", "images"}，
+        文本块为 {"lines", "size", "bold"}
+    """
+    font_sizes: Counter = Counter()
+    pages = []
+    images_path = Path(images_dir) if images_dir else None
+
+    with fitz.open(pdf_path) as doc:
+        for page_no in range(start, end):
+            page = doc[page_no]
+            blocks = []
+            for block in page.get_text("dict")["blocks"]:
+                if block.get("type") != 0:
+                    continue
+                lines = []
+                sizes: Counter = Counter()
+                bold_chars = 0
+                for line in block["lines"]:
+                    text = "".join(span["text"] for span in line["spans"]).strip()
+                    if not text:
+                        continue
+                    lines.append(text)
+                    for span in line["spans"]:
+                        chars = len(span["text"].strip())
+                        size = round(span["size"], 1)
+                        sizes[size] += chars
+                        font_sizes[size] += chars
+                        if span["flags"] & BOLD_FLAG:
+                            bold_chars += chars
+                if not lines:
+                    continue
+                total_chars = sum(sizes.values())
+                blocks.append({
+                    "lines": lines,
+                    "size": sizes.most_common(1)[0][0],
+                    "bold": total_chars > 0 and bold_chars * 2 > total_chars,
+                })
+
+            images = []
+            if images_path is not None:
+                for index, image in enumerate(page.get_images(full=True)):
+                    info = doc.extract_image(image[0])
+                    if not info or info["width"] < MIN_IMAGE_SIZE or info["height"] < MIN_IMAGE_SIZE:
+                        continue
+                    name = f"page{page_no + 1}_img{index}.{info['ext']}"
+                    (images_path / name).write_bytes(info["image"])
+                    images.append(name)
+
+            pages.append({"page": page_no + 1, "blocks": blocks, "images": images})
+
+    return pages, dict(font_sizes)
+
+
+def _page_count(pdf_path: str) -> int:
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def _join_lines(lines: List[str]) -> str:
+    """把文本块中的多行合并为一段，去掉行尾连字符"""
+    text = ""
+    for line in lines:
+        if text.endswith("-") and line[:1].islower():
+            text = text[:-1] + line
+        elif text:
+            text += " " + line
+        else:
+            text = line
+    return text
+
+
+def _is_heading(block: Dict[str, Any], text: str, body_size: float) -> bool:
+    """按字号、粗体和常见章节名判断文本块是否为标题"""
+    if len(text) > MAX_HEADING_CHARS or len(block["lines"]) > 3 or text.endswith("."):
+        return False
+    if block["size"] >= body_size * HEADING_SIZE_RATIO:
+        return True
+    if block["bold"] and block["size"] >= body_size:
+        return bool(NUMBERED_HEADING_PATTERN.match(text)) or text.lower() in NAMED_HEADINGS
+    return False
+
+
+def build_markdown(pages: List[Dict[str, Any]], font_sizes: Dict[float, int]) -> str:
+    """
+    由页面记录生成 Markdown
+
+    正文字号取字符数最多的字号；第一页字号最大的标题作为论文标题（#），
+    其他标题按字号从大到小依次为 ## 和 ###；图片追加在所在页的文本之后
+    """
+    body_size = max(font_sizes.items(), key=lambda item: item[1])[0] if font_sizes else 0.0
+
+    headings = []
+    for page in pages:
+        for block in page["blocks"]:
+            block["text"] = _join_lines(block["lines"])
+            if _is_heading(block, block["text"], body_size):
+                headings.append(block)
+
+    title_block = None
+    first_page_ids = {id(b) for b in pages[0]["blocks"]} if pages else set()
+    first_page_headings = [b for b in headings if id(b) in first_page_ids]
+    if first_page_headings:
+        title_block = max(first_page_headings, key=lambda b: b["size"])
+    heading_sizes = sorted({b["size"] for b in headings if b is not title_block}, reverse=True)
+    heading_ids = {id(b) for b in headings}
+
+    parts = []
+    for page in pages:
+        for block in page["blocks"]:
+            if block is title_block:
+                parts.append(f"# {block['text']}")
+            elif id(block) in heading_ids:
+                level = 2 if heading_sizes.index(block["size"]) == 0 else 3
+                parts.append(f"{'#' * level} {block['text']}")
+            else:
+                parts.append(block["text"])
+        for name in page["images"]:
+            parts.append(f"![](images/{name})")
+
+    return "\n\n".join(parts) + "\n"
+
+
+class LocalPDFParser:
+    """
+    本地 PDF 解析器
+
+    页数按进程数切分，每个子进程用 PyMuPDF 解析一段页面；图片由子进程直接写入论文图片目录
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers if workers is not None else settings.local_parser_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.papers_parsed = 0
+
+    @property
+    def available(self) -> bool:
+        """是否可以使用本地解析（需要安装 PyMuPDF）"""
+        return local_engine_available()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def download_pdf(self, url: str, dest: Path) -> Path:
+        """下载 URL 对应的 PDF（本地解析 URL 提交的论文时使用）"""
+        async with httpx.AsyncClient(follow_redirects=True, timeout=httpx.Timeout(60.0, connect=10.0)) as client:
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+                async with aiofiles.open(dest, "wb") as f:
+                    async for chunk in response.aiter_bytes(64 * 1024):
+                        await f.write(chunk)
+        return dest
+
+    async def parse_pdf(
+        self,
+        file_path: Path,
+        paper_id: Optional[str] = None,
+        max_pages: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        解析本地 PDF
+
+        Args:
+            file_path: PDF 文件路径
+            paper_id: 论文ID，提供时把图片保存到 parsed/<paper_id>/images
+            max_pages: 只解析前几页（用于快速预览）
+
+        Returns:
+            与 MinerU 结果相同格式的字典：{"content", "format", "filename", "images_saved", "engine"}
+        """
+        if not self.available:
+            raise RuntimeError("未安装 PyMuPDF，无法使用本地解析引擎")
+
+        page_count = await run_in_threadpool(_page_count, str(file_path))
+        if page_count == 0:
+            raise ValueError("PDF 没有页面")
+        if max_pages:
+            page_count = min(page_count, max_pages)
+
+        images_dir = None
+        if paper_id:
+            images_dir = settings.parsed_dir / paper_id / "images"
+            images_dir.mkdir(parents=True, exist_ok=True)
+
+        # 每个子进程解析一段连续页面，减少重复打开文档的开销
+        per_worker = math.ceil(page_count / max(1, self.workers))
+        ranges = [(start, min(start + per_worker, page_count)) for start in range(0, page_count, per_worker)]
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(executor, _parse_pages, str(file_path), start, end, str(images_dir) if images_dir else None)
+            for start, end in ranges
+        ))
+
+        pages: List[Dict[str, Any]] = []
+        font_sizes: Counter = Counter()
+        for range_pages, range_sizes in results:
+            pages.extend(range_pages)
+            font_sizes.update(range_sizes)
+
+        markdown_content = build_markdown(pages, font_sizes)
+        self.papers_parsed += 1
+        images_saved = sum(len(page["images"]) for page in pages)
+        log.info(f"本地解析完成: {file_path.name}, 页数={page_count}, 图片={images_saved}, 进程={len(ranges)}")
+        return {
+            "content": markdown_content,
+            "format": "markdown",
+            "filename": f"{file_path.stem}.md",
+            "images_saved": images_saved,
+            "engine": "local",
+        }
+
+    def close(self):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 全局本地解析器实例
+local_pdf_parser = LocalPDFParser()
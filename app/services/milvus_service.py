@@ -17,6 +17,7 @@ import asyncio
 
 from app.config import settings
 from app.utils.logger import log
+from app.utils.async_helper import run_in_threadpool
 
 
 class MilvusService:
@@ -25,6 +26,8 @@ class MilvusService:
     # 重试配置
     MAX_RETRIES = 3
     RETRY_DELAY = 1.0  # 秒
+    # section_path 字段的最大长度
+    SECTION_PATH_MAX_LENGTH = 256
     
     def __init__(self):
         self.host = settings.milvus_host
@@ -88,6 +91,11 @@ class MilvusService:
                 if existing_dim == dimension:
                     log.info(f"Collection {self.collection_name} 已存在，维度匹配: {dimension}")
                     self.collection = existing_collection
+                    if not self.has_section_path:
+                        log.warning(
+                            f"Collection {self.collection_name} 没有 section_path 字段，"
+                            f"按章节检索时改为在检索结果中过滤；删除并重建 collection 后可使用章节前缀过滤"
+                        )
                     return
                 else:
                     # 维度不匹配，抛出错误提示用户手动处理
@@ -122,7 +130,9 @@ class MilvusService:
             FieldSchema(name="paper_id", dtype=DataType.VARCHAR, max_length=100),
             FieldSchema(name="chunk_text", dtype=DataType.VARCHAR, max_length=10000),
             FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=dimension),
-            FieldSchema(name="metadata", dtype=DataType.VARCHAR, max_length=65535)  # JSON string
+            FieldSchema(name="metadata", dtype=DataType.VARCHAR, max_length=65535),  # JSON string
+            # 章节路径加结尾的 "."（如 "3.2.1."），按前缀过滤一个章节及其所有子章节
+            FieldSchema(name="section_path", dtype=DataType.VARCHAR, max_length=self.SECTION_PATH_MAX_LENGTH)
         ]
         
         schema = CollectionSchema(
@@ -147,6 +157,12 @@ class MilvusService:
             field_name="embedding",
             index_params=index_params
         )
+        # 章节路径的标量索引，加速前缀过滤
+        self.collection.create_index(
+            field_name="section_path",
+            index_params={"index_type": "Trie"},
+            index_name="section_path_index"
+        )
         
         log.info(f"成功创建 collection: {self.collection_name}, 维度: {dimension}")
     
@@ -173,13 +189,42 @@ class MilvusService:
                 f"请先上传论文以创建 collection，或检查 Milvus 连接配置。"
             )
     
+    @property
+    def has_section_path(self) -> bool:
+        """collection 是否有 section_path 字段（旧版 collection 没有，需要重建才能按章节前缀过滤）"""
+        try:
+            return any(field.name == "section_path" for field in self.collection.schema.fields)
+        except AttributeError:
+            return False
+    
+    async def supports_section_paths(self) -> bool:
+        """是否可以按章节路径前缀检索"""
+        await self._ensure_collection_loaded()
+        return self.has_section_path
+    
+    @staticmethod
+    def section_path_value(path: Optional[str]) -> str:
+        """章节路径的存储值：加上结尾的 "."，使 "3.2." 前缀不会匹配到 "3.20" """
+        return f"{path}." if path else ""
+    
+    @staticmethod
+    def section_path_expr(section_paths: List[str]) -> str:
+        """章节及其所有子章节的过滤表达式（每个章节一个前缀条件）"""
+        terms = [
+            f'section_path like "{MilvusService.section_path_value(path)}%"'
+            for path in section_paths
+        ]
+        return terms[0] if len(terms) == 1 else "(" + " or ".join(terms) + ")"
+    
     async def insert_chunks(
         self,
         chunk_ids: List[str],
         paper_ids: List[str],
         texts: List[str],
         embeddings: List[List[float]],
-        metadatas: List[Dict[str, Any]]
+        metadatas: List[Dict[str, Any]],
+        flush: bool = True,
+        section_paths: Optional[List[Optional[str]]] = None
     ) -> List[int]:
         """
         插入文本块
@@ -190,14 +235,16 @@ class MilvusService:
             texts: 文本列表
             embeddings: Embedding 列表
             metadatas: 元数据列表
+            flush: 是否立即刷新；分批插入时设为 False，全部插入后调用一次 flush()
+            section_paths: 每个块所在章节的路径（如 "3.2.1"），旧版 collection 没有该字段时忽略
             
         Returns:
             插入的ID列表
         """
         await self._ensure_collection_loaded()
         
-        # 将元数据转为 JSON 字符串
-        metadata_strs = [json.dumps(m, ensure_ascii=False) for m in metadatas]
+        # 将元数据转为紧凑的 JSON 字符串
+        metadata_strs = [json.dumps(m, ensure_ascii=False, separators=(",", ":")) for m in metadatas]
         
         # 准备数据
         data = [
@@ -207,13 +254,16 @@ class MilvusService:
             embeddings,
             metadata_strs
         ]
+        if self.has_section_path:
+            data.append([self.section_path_value(path) for path in (section_paths or [None] * len(chunk_ids))])
         
         try:
-            # 插入数据
-            insert_result = self.collection.insert(data)
+            # 插入数据（在线程池中执行，不阻塞事件循环，可与下一批 Embedding 请求并行）
+            insert_result = await run_in_threadpool(self.collection.insert, data)
             
             # 刷新确保数据持久化
-            self.collection.flush()
+            if flush:
+                await run_in_threadpool(self.collection.flush)
             
             log.info(f"成功插入 {len(chunk_ids)} 个文本块")
             return insert_result.primary_keys
@@ -222,6 +272,35 @@ class MilvusService:
             log.error(f"插入数据失败: {e}")
             raise
     
+    async def flush(self):
+        """刷新 collection，确保已插入的数据持久化"""
+        await self._ensure_collection_loaded()
+        await run_in_threadpool(self.collection.flush)
+    
+    async def delete_by_ids(self, ids: List[int]) -> int:
+        """
+        按主键删除数据（用于回滚部分插入的文本块）
+        
+        Args:
+            ids: 主键列表
+            
+        Returns:
+            删除的数量
+        """
+        if not ids:
+            return 0
+        
+        await self._ensure_collection_loaded()
+        
+        try:
+            delete_result = await run_in_threadpool(self.collection.delete, f"id in {list(ids)}")
+            await run_in_threadpool(self.collection.flush)
+            return delete_result.delete_count
+            
+        except Exception as e:
+            log.error(f"删除数据失败: {e}")
+            raise
+    
     async def _load_collection_with_wait(self):
         """
         加载 collection 到内存，并等待时间戳同步
@@ -241,7 +320,7 @@ class MilvusService:
         query_embedding: List[float],
         top_k: int = 5,
         paper_id: Optional[str] = None,
-        section_filter: Optional[List[str]] = None
+        section_paths: Optional[List[str]] = None
     ) -> List[Dict[str, Any]]:
         """
         向量检索（带重试机制）
@@ -250,7 +329,7 @@ class MilvusService:
             query_embedding: 查询向量
             top_k: 返回结果数量
             paper_id: 可选的论文ID过滤
-            section_filter: 可选的章节标题过滤列表
+            section_paths: 可选的章节路径列表，只检索这些章节及其子章节
             
         Returns:
             检索结果列表
@@ -270,9 +349,9 @@ class MilvusService:
         expr_parts = []
         if paper_id:
             expr_parts.append(f'paper_id == "{paper_id}"')
+        if section_paths:
+            expr_parts.append(self.section_path_expr(section_paths))
         
-        # 注意：section_filter 需要在 metadata JSON 中过滤，Milvus 不直接支持
-        # 这里我们只使用 paper_id 过滤，section 过滤在结果后处理中进行
         expr = " and ".join(expr_parts) if expr_parts else None
         
         last_error = None
@@ -344,6 +423,26 @@ class MilvusService:
         log.error(f"向量检索失败，重试 {self.MAX_RETRIES} 次后仍然失败: {last_error}")
         raise last_error
     
+    async def get_ids_by_paper_id(self, paper_id: str) -> List[int]:
+        """
+        查询论文所有文本块的主键（替换论文的文本块时使用）
+        
+        Args:
+            paper_id: 论文ID
+            
+        Returns:
+            主键列表
+        """
+        await self._ensure_collection_loaded()
+        await self._load_collection_with_wait()
+        
+        rows = await run_in_threadpool(
+            self.collection.query,
+            expr=f'paper_id == "{paper_id}"',
+            output_fields=["id"]
+        )
+        return [row["id"] for row in rows]
+    
     async def delete_by_paper_id(self, paper_id: str) -> int:
         """
         删除指定论文的所有数据
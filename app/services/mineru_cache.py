@@ -0,0 +1,145 @@
+"""
+MinerU 解析结果的磁盘缓存
+按 PDF 内容的 SHA-256 和 MinerU model_version 缓存原始结果 zip（Markdown、图片和结构化 JSON），
+重新解析同一篇论文时直接从本地 zip 提取，不再提交到 MinerU
+"""
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from app.utils.logger import log
+
+
+class MinerUResultCache:
+    """
+    MinerU 结果缓存
+
+    每个条目是一个结果 zip，文件名为 "<内容哈希>-<model_version>.zip"；
+    总大小超过上限时按最近使用时间（命中时更新 mtime）淘汰最旧的条目
+    """
+
+    # 计算文件哈希时每次读取的字节数
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_bytes: Optional[int] = None):
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else settings.mineru_cache_dir
+        self.max_bytes = max_bytes if max_bytes is not None else settings.mineru_cache_max_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        """缓存上限为 0 时不缓存"""
+        return self.max_bytes > 0
+
+    @classmethod
+    def key_for_file(cls, file_path: Path) -> str:
+        """PDF 文件内容的 SHA-256（同步，较大文件请在线程池中调用）"""
+        sha256 = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(cls.HASH_CHUNK_SIZE), b""):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    @staticmethod
+    def key_for_url(canonical_url: str) -> str:
+        """URL 提交时本地没有 PDF 内容，以规范化 URL 的哈希作为键"""
+        return "url_" + hashlib.sha256(canonical_url.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str, model_version: str) -> Path:
+        return self.cache_dir / f"{key}-{model_version}.zip"
+
+    def get(self, key: str, model_version: str) -> Optional[Path]:
+        """
+        查询缓存
+
+        Returns:
+            命中时返回结果 zip 的路径，否则返回 None
+        """
+        if not self.enabled:
+            return None
+        path = self._path(key, model_version)
+        try:
+            # 更新 mtime，作为最近使用时间
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def store(self, key: str, model_version: str, zip_path: Path) -> Optional[Path]:
+        """
+        把下载的结果 zip 移入缓存（原文件不再保留），超出容量时淘汰最旧的条目
+
+        Returns:
+            缓存中的路径；缓存未启用或文件超过上限时返回 None
+        """
+        if not self.enabled or zip_path.stat().st_size > self.max_bytes:
+            return None
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        target = self._path(key, model_version)
+        # 先移到缓存目录下的临时文件，再原子替换，读取方不会看到写了一半的 zip
+        tmp_path = self.cache_dir / f".{uuid.uuid4().hex}.tmp"
+        shutil.move(str(zip_path), tmp_path)
+        os.replace(tmp_path, target)
+        self.stores += 1
+        self._evict()
+        return target
+
+    def discard(self, key: str, model_version: str):
+        """删除损坏的条目"""
+        self._path(key, model_version).unlink(missing_ok=True)
+
+    def _evict(self):
+        """按最近使用时间淘汰，直到总大小不超过上限"""
+        with self._lock:
+            entries = []
+            for path in self.cache_dir.glob("*.zip"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                self.evictions += 1
+                log.info(f"淘汰 MinerU 结果缓存: {path.name}")
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        lookups = self.hits + self.misses
+        total = entries = 0
+        if self.cache_dir.exists():
+            for path in self.cache_dir.glob("*.zip"):
+                try:
+                    total += path.stat().st_size
+                except FileNotFoundError:
+                    continue
+                entries += 1
+        return {
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+
+# 全局缓存实例
+mineru_result_cache = MinerUResultCache()
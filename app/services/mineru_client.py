@@ -3,30 +3,557 @@ MinerU API 客户端
 用于调用 MinerU 在线服务解析 PDF
 """
 import asyncio
+import json
+import os
+import re
+import uuid
+import aiofiles
 import httpx
 import zipfile
 import tempfile
 import shutil
-from typing import Optional, Dict, Any
-from pathlib import Path
+from typing import Optional, Dict, Any, AsyncIterator, Callable, Awaitable, List, Set, Tuple
+from pathlib import Path, PurePosixPath
 
 from app.config import settings
+from app.services.mineru_cache import mineru_result_cache
+from app.services.paper_catalog import PaperCatalog
 from app.utils.logger import log
-from app.utils.async_helper import async_retry
+from app.utils.async_helper import RateLimiter, async_retry, run_in_threadpool
+
+
+# MinerU 任务状态回调：接收 check_status 返回的状态信息
+StatusCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# 结果 zip 中需要保存的图片类型
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg'}
+# 结果 zip 中按阅读顺序排列的结构化内容（含块类型和页码）
+CONTENT_LIST_SUFFIX = 'content_list.json'
+
+
+# MinerU 单个任务/批次成员的状态查询：返回 {成员ID: 状态信息}
+FetchStatuses = Callable[[], Awaitable[Dict[str, Dict[str, Any]]]]
+
+
+class _WatchedTask:
+    """
+    轮询器的一个查询单元
+
+    单个任务的成员只有它自己；批量提交的任务以 batch_id 为单元，一次查询得到所有成员的状态
+    """
+    
+    def __init__(self, key: str, fetch: FetchStatuses, now: float, interval: float):
+        self.key = key
+        self.fetch = fetch
+        # 成员ID -> (Future, 状态回调)
+        self.members: Dict[str, Tuple[asyncio.Future, Optional[StatusCallback]]] = {}
+        self.started_at = now
+        self.interval = interval
+        self.next_poll_at = now + interval
+        self.polls = 0
+        self.errors = 0
+        self.in_flight = False
+        self.last_pages: Optional[int] = None
+        self.running_since: Optional[float] = None
+
+
+class MinerUPoller:
+    """
+    MinerU 任务状态的集中轮询器
+
+    所有等待中的 MinerU 任务由一个协程统一轮询，批量提交的任务每个批次只查询一次。
+    每个查询单元的轮询间隔自适应：
+    - 从最短间隔开始，进度没有变化时按倍数退避，直到最长间隔
+    - 返回了已解析页数时，按解析速度估算剩余时间，接近完成时缩短间隔，避免增加完成延迟
+    所有单元合计的查询速率不超过 MINERU_POLL_QPS；任务结束时唤醒对应的 Future
+    """
+    
+    # 连续查询失败的次数上限（check_status 内部已有重试）
+    MAX_CONSECUTIVE_ERRORS = 5
+    
+    def __init__(
+        self,
+        client: "MinerUClient",
+        min_interval: Optional[float] = None,
+        max_interval: Optional[float] = None,
+        backoff: Optional[float] = None,
+        qps: Optional[float] = None,
+        timeout: Optional[float] = None
+    ):
+        self.client = client
+        self.min_interval = min_interval if min_interval is not None else settings.mineru_poll_interval
+        self.max_interval = max(self.min_interval, max_interval if max_interval is not None else settings.mineru_poll_max_interval)
+        self.backoff = backoff if backoff is not None else settings.mineru_poll_backoff
+        self.qps = qps if qps is not None else settings.mineru_poll_qps
+        self.timeout = timeout if timeout is not None else settings.mineru_timeout
+        self._tasks: Dict[str, _WatchedTask] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._rate_limiter = RateLimiter(self.qps)
+        self._poll_tasks: Set[asyncio.Task] = set()
+        self.polls = 0
+        self.tasks_completed = 0
+        self.tasks_failed = 0
+    
+    async def watch(self, task_id: str, on_status: Optional[StatusCallback] = None) -> Dict[str, Any]:
+        """
+        等待单个 MinerU 任务完成
+        
+        Args:
+            task_id: MinerU 任务ID
+            on_status: 每次查询到任务状态后调用 on_status(status_info)
+            
+        Returns:
+            任务完成时的状态信息（包含 result_url）
+            
+        Raises:
+            TimeoutError: 超过 MINERU_TIMEOUT 仍未完成
+            Exception: MinerU 任务失败或持续查询失败
+        """
+        async def fetch():
+            return {task_id: await self.client.check_status(task_id)}
+        
+        return await self._watch(f"task:{task_id}", task_id, fetch, on_status)
+    
+    async def watch_batch(self, batch_id: str, data_id: str, on_status: Optional[StatusCallback] = None) -> Dict[str, Any]:
+        """
+        等待批量提交中的一个文件完成（同一批次的所有成员共用一次查询）
+        
+        Args:
+            batch_id: MinerU 批次ID
+            data_id: 提交时为该文件指定的 data_id
+            on_status: 每次查询到该文件的状态后调用
+        """
+        async def fetch():
+            return await self.client.check_batch(batch_id)
+        
+        return await self._watch(f"batch:{batch_id}", data_id, fetch, on_status)
+    
+    async def _watch(self, key: str, member_id: str, fetch: FetchStatuses, on_status: Optional[StatusCallback]) -> Dict[str, Any]:
+        """把成员加入查询单元并等待其结束"""
+        loop = asyncio.get_running_loop()
+        watched = self._tasks.get(key)
+        if watched is None:
+            watched = _WatchedTask(key, fetch, loop.time(), self.min_interval)
+            self._tasks[key] = watched
+        future = loop.create_future()
+        watched.members[member_id] = (future, on_status)
+        self._ensure_running()
+        try:
+            return await future
+        finally:
+            # 调用方被取消时也停止跟踪
+            watched.members.pop(member_id, None)
+            if not watched.members:
+                self._tasks.pop(key, None)
+    
+    def _ensure_running(self):
+        """启动（或唤醒）轮询协程"""
+        if self._loop_task is None or self._loop_task.done():
+            self._wakeup = asyncio.Event()
+            self._loop_task = asyncio.create_task(self._run(), name="mineru-poller")
+        else:
+            self._wakeup.set()
+    
+    async def _run(self):
+        """轮询循环：没有待跟踪的任务时退出，有新任务时重新启动"""
+        loop = asyncio.get_running_loop()
+        while self._tasks:
+            now = loop.time()
+            due = sorted(
+                (t for t in self._tasks.values() if not t.in_flight and t.next_poll_at <= now),
+                key=lambda t: t.next_poll_at
+            )
+            for watched in due:
+                await self._rate_limiter.acquire()
+                if not watched.members:
+                    continue
+                watched.in_flight = True
+                task = asyncio.create_task(self._poll(watched))
+                self._poll_tasks.add(task)
+                task.add_done_callback(self._poll_tasks.discard)
+            
+            pending = [t.next_poll_at for t in self._tasks.values() if not t.in_flight]
+            delay = max(0.0, min(pending) - loop.time()) if pending else self.max_interval
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+    
+    def _next_interval(self, watched: _WatchedTask, status_info: Dict[str, Any], now: float) -> float:
+        """根据进度计算下一次轮询的间隔"""
+        extracted, total = status_info.get("extracted_pages"), status_info.get("total_pages")
+        if extracted and total:
+            if watched.running_since is None:
+                watched.running_since = now
+            progressed = watched.last_pages is None or extracted > watched.last_pages
+            watched.last_pages = extracted
+            elapsed = now - watched.running_since
+            if progressed and elapsed > 0:
+                # 按已解析页数的速度估算剩余时间，在预计完成时刻的一半处再查询
+                remaining = (total - extracted) * elapsed / extracted
+                return min(self.max_interval, max(self.min_interval, remaining / 2))
+        return min(self.max_interval, watched.interval * self.backoff)
+    
+    async def _poll(self, watched: _WatchedTask):
+        """查询一个单元的状态，结束的成员唤醒等待方"""
+        loop = asyncio.get_running_loop()
+        try:
+            self.polls += 1
+            watched.polls += 1
+            try:
+                statuses = await watched.fetch()
+                watched.errors = 0
+            except Exception as e:
+                watched.errors += 1
+                log.warning(f"查询 MinerU 任务状态失败: {watched.key}, 连续失败 {watched.errors} 次: {e}")
+                if watched.errors >= self.MAX_CONSECUTIVE_ERRORS:
+                    self._finish_all(watched, e)
+                    return
+                statuses = None
+            
+            extracted = total = 0
+            for member_id, (future, on_status) in list(watched.members.items()):
+                status_info = (statuses or {}).get(member_id)
+                if status_info is None:
+                    continue
+                status = status_info["status"]
+                log.info(
+                    f"MinerU 任务状态: {member_id} - {status} ({status_info.get('progress', 0)}%), "
+                    f"第 {watched.polls} 次查询"
+                )
+                
+                if on_status:
+                    try:
+                        await on_status(status_info)
+                    except Exception as e:
+                        log.warning(f"MinerU 状态回调失败: {member_id}, {e}")
+                
+                if status == "completed":
+                    self._finish(watched, member_id, result=status_info)
+                elif status == "failed":
+                    error = status_info.get("error") or "未知错误"
+                    self._finish(watched, member_id, error=Exception(f"MinerU 任务失败: {error}"))
+                elif status_info.get("extracted_pages") and status_info.get("total_pages"):
+                    extracted += status_info["extracted_pages"]
+                    total += status_info["total_pages"]
+            
+            if not watched.members:
+                self._tasks.pop(watched.key, None)
+                return
+            
+            now = loop.time()
+            if now - watched.started_at > self.timeout:
+                self._finish_all(watched, TimeoutError(f"MinerU 任务超时 (>{self.timeout}s): {watched.key}"))
+                return
+            
+            # 批次按未完成成员的页数合计估算
+            watched.interval = (
+                self._next_interval(watched, {"extracted_pages": extracted, "total_pages": total}, now)
+                if statuses is not None
+                else min(self.max_interval, watched.interval * self.backoff)
+            )
+            watched.next_poll_at = now + watched.interval
+        finally:
+            watched.in_flight = False
+            if self._wakeup is not None:
+                self._wakeup.set()
+    
+    def _finish(
+        self,
+        watched: _WatchedTask,
+        member_id: str,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[BaseException] = None
+    ):
+        """结束一个成员的跟踪并设置 Future 的结果"""
+        future, _ = watched.members.pop(member_id)
+        if future.done():
+            return
+        if error is not None:
+            self.tasks_failed += 1
+            future.set_exception(error)
+        else:
+            self.tasks_completed += 1
+            future.set_result(result)
+    
+    def _finish_all(self, watched: _WatchedTask, error: BaseException):
+        """单元整体失败（超时或持续查询失败）"""
+        for member_id in list(watched.members):
+            self._finish(watched, member_id, error=error)
+        self._tasks.pop(watched.key, None)
+    
+    def stats(self) -> Dict[str, Any]:
+        """轮询统计"""
+        finished = self.tasks_completed + self.tasks_failed
+        return {
+            "active_units": len(self._tasks),
+            "active_tasks": sum(len(t.members) for t in self._tasks.values()),
+            "polls": self.polls,
+            "tasks_completed": self.tasks_completed,
+            "tasks_failed": self.tasks_failed,
+            "avg_polls_per_task": round(self.polls / finished, 2) if finished else None,
+            "max_qps": self.qps,
+        }
+
+
+class _PendingSubmission:
+    """等待合并提交的一个文件或 URL"""
+    
+    def __init__(self, data_id: str, future: asyncio.Future, url: Optional[str] = None, file_path: Optional[Path] = None):
+        self.data_id = data_id
+        self.future = future
+        self.url = url
+        self.file_path = file_path
+
+
+class MinerUBatcher:
+    """
+    合并提交 MinerU 任务
+
+    短时间内（MINERU_BATCH_LINGER 秒）到达的 URL / 文件分别合并成一个批次，
+    通过批量接口一次提交，达到 MINERU_BATCH_SIZE 时立即提交；只有一个时使用单任务接口
+    """
+    
+    def __init__(self, client: "MinerUClient", batch_size: Optional[int] = None, linger: Optional[float] = None):
+        self.client = client
+        self.batch_size = batch_size if batch_size is not None else settings.mineru_batch_size
+        self.linger = linger if linger is not None else settings.mineru_batch_linger
+        self._pending: Dict[str, List[_PendingSubmission]] = {"url": [], "file": []}
+        self._timers: Dict[str, asyncio.Task] = {}
+        self._flush_tasks: Set[asyncio.Task] = set()
+        self.batches_submitted = 0
+        self.items_submitted = 0
+    
+    @property
+    def enabled(self) -> bool:
+        """是否启用合并提交"""
+        return self.batch_size > 1
+    
+    async def submit(
+        self,
+        url: Optional[str] = None,
+        file_path: Optional[Path] = None,
+        data_id: Optional[str] = None
+    ) -> Tuple[Optional[str], str]:
+        """
+        加入待提交队列，等待所在批次提交完成
+        
+        Returns:
+            (batch_id, data_id)；单独提交时为 (None, task_id)
+        """
+        kind = "url" if url else "file"
+        pending = self._pending[kind]
+        if not data_id or any(item.data_id == data_id for item in pending):
+            data_id = uuid.uuid4().hex
+        item = _PendingSubmission(data_id, asyncio.get_running_loop().create_future(), url=url, file_path=file_path)
+        pending.append(item)
+        
+        if len(pending) >= self.batch_size:
+            self._start_flush(kind)
+        elif kind not in self._timers:
+            self._timers[kind] = asyncio.create_task(self._flush_later(kind))
+        try:
+            return await item.future
+        except asyncio.CancelledError:
+            # 调用方被取消时，批次尚未提交则移出队列，不再上传
+            if item in self._pending[kind]:
+                self._pending[kind].remove(item)
+            raise
+    
+    async def _flush_later(self, kind: str):
+        """等待 linger 时间后提交"""
+        await asyncio.sleep(self.linger)
+        self._timers.pop(kind, None)
+        self._start_flush(kind)
+    
+    def _start_flush(self, kind: str):
+        """取出当前积攒的条目并提交"""
+        timer = self._timers.pop(kind, None)
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+        items, self._pending[kind] = self._pending[kind], []
+        items = [item for item in items if not item.future.done()]
+        if not items:
+            return
+        task = asyncio.create_task(self._flush(kind, items))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+    
+    async def _flush(self, kind: str, items: List[_PendingSubmission]):
+        """提交一个批次，并把结果分发给各条目"""
+        try:
+            if len(items) == 1:
+                item = items[0]
+                task_id = await self.client.submit_task(url=item.url, file_path=item.file_path)
+                results = [(None, task_id)]
+            else:
+                if kind == "url":
+                    batch_id = await self.client.submit_url_batch([(item.data_id, item.url) for item in items])
+                else:
+                    batch_id = await self.client.submit_file_batch([(item.data_id, item.file_path) for item in items])
+                results = [(batch_id, item.data_id) for item in items]
+            self.batches_submitted += 1
+            self.items_submitted += len(items)
+        except Exception as e:
+            for item in items:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+        
+        for item, result in zip(items, results):
+            if not item.future.done():
+                item.future.set_result(result)
+    
+    def stats(self) -> Dict[str, Any]:
+        """合并提交统计"""
+        return {
+            "batch_size": self.batch_size,
+            "submit_calls": self.batches_submitted,
+            "items_submitted": self.items_submitted,
+            "pending": sum(len(items) for items in self._pending.values()),
+        }
 
 
 class MinerUClient:
-    """MinerU API 客户端"""
+    """
+    MinerU API 客户端
+
+    进程内共享一个带连接池的 httpx.AsyncClient，提交、轮询、下载复用长连接，
+    避免每次请求重新建立 TCP / TLS 连接；应用关闭时调用 close()
+    """
+    
+    # 各类请求的超时时间（秒）
+    SUBMIT_TIMEOUT = 30.0
+    STATUS_TIMEOUT = 10.0
+    DOWNLOAD_TIMEOUT = 60.0
+    CONNECT_TIMEOUT = 10.0
+    # 下载结果时每次写盘的块大小（字节）
+    DOWNLOAD_CHUNK_SIZE = 64 * 1024
+    # 上传文件时每次读取的块大小（字节）
+    UPLOAD_CHUNK_SIZE = 256 * 1024
+    # 批量上传时单个文件上传失败的重试间隔（秒）
+    UPLOAD_RETRY_DELAY = 2.0
     
     def __init__(self):
         self.base_url = settings.mineru_api_base
         self.token = settings.mineru_token
+        self.model_version = settings.mineru_model_version
+        self.result_cache = mineru_result_cache
         self.headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.token}"
         }
-        self.timeout = settings.mineru_timeout
-        self.poll_interval = settings.mineru_poll_interval
+        self._client: Optional[httpx.AsyncClient] = None
+        self.poller = MinerUPoller(self)
+        self.batcher = MinerUBatcher(self)
+        # 提交请求（单任务或一个批次）的速率限制
+        self._submit_limiter = RateLimiter(settings.ingest_mineru_rate)
+        self.requests = 0
+        self.connections_opened = 0
+        self.http2_responses = 0
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """获取（必要时创建）共享的 HTTP 客户端"""
+        if self._client is None or self._client.is_closed:
+            http2 = settings.mineru_http2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    log.warning("未安装 h2，MinerU 请求使用 HTTP/1.1")
+                    http2 = False
+            self._client = httpx.AsyncClient(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=settings.mineru_max_connections,
+                    max_keepalive_connections=settings.mineru_max_keepalive,
+                    keepalive_expiry=settings.mineru_keepalive_expiry
+                ),
+                timeout=httpx.Timeout(self.SUBMIT_TIMEOUT, connect=self.CONNECT_TIMEOUT)
+            )
+        return self._client
+    
+    async def _trace(self, event_name: str, info: Dict[str, Any]):
+        """httpcore 追踪回调：统计新建连接数"""
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+    
+    async def _request(self, method: str, url: str, timeout: float, **kwargs) -> httpx.Response:
+        """通过共享客户端发送请求，并统计连接复用情况"""
+        self.requests += 1
+        response = await self._get_client().request(
+            method,
+            url,
+            timeout=httpx.Timeout(timeout, connect=self.CONNECT_TIMEOUT),
+            extensions={"trace": self._trace},
+            **kwargs
+        )
+        if response.http_version == "HTTP/2":
+            self.http2_responses += 1
+        return response
+    
+    def http_stats(self) -> Dict[str, Any]:
+        """连接复用统计"""
+        reused = max(0, self.requests - self.connections_opened)
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "reused_requests": reused,
+            "reuse_rate": round(reused / self.requests, 4) if self.requests else None,
+            "http2_responses": self.http2_responses,
+        }
+    
+    async def close(self):
+        """关闭共享的 HTTP 客户端"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    # MinerU 任务状态到标准状态的映射
+    STATUS_MAP = {
+        "pending": "pending",
+        "waiting-file": "pending",
+        "running": "processing",
+        "converting": "processing",
+        "processing": "processing",
+        "done": "completed",
+        "failed": "failed"
+    }
+    
+    @classmethod
+    def _status_info(cls, data: Dict[str, Any]) -> Dict[str, Any]:
+        """把单任务或批次成员的状态数据转换为标准状态信息"""
+        # MinerU API 实际返回的字段名与预期不同
+        # state: pending, running, done, failed
+        # full_zip_url: 结果下载链接
+        state = data.get("state")
+        # 解析中的任务返回 extract_progress（已解析页数 / 总页数）
+        extract_progress = data.get("extract_progress") or {}
+        return {
+            "status": cls.STATUS_MAP.get(state, state),
+            "state": state,
+            "progress": data.get("progress", 0),
+            "extracted_pages": extract_progress.get("extracted_pages"),
+            "total_pages": extract_progress.get("total_pages"),
+            "result_url": data.get("full_zip_url"),  # MinerU 使用 full_zip_url
+            "error": data.get("err_msg")  # MinerU 使用 err_msg
+        }
+    
+    @staticmethod
+    def _parse_response(response: httpx.Response) -> Any:
+        """检查 HTTP 状态和 MinerU 的 code，返回 data 字段"""
+        response.raise_for_status()
+        result = response.json()
+        if not isinstance(result, dict):
+            raise Exception(f"MinerU API 返回格式错误，期望 dict，实际为 {type(result)}")
+        # MinerU API 约定：code=0 表示成功，code!=0 表示失败
+        if result.get("code") != 0:
+            error_msg = result.get('message') or result.get('msg') or '未知错误'
+            log.error(f"MinerU API 返回错误: code={result.get('code')}, message={error_msg}, full_response={result}")
+            raise Exception(f"MinerU API 错误: {error_msg}")
+        return result.get("data") or {}
     
     @async_retry(max_retries=3, delay=2.0)
     async def submit_task(self, url: Optional[str] = None, file_path: Optional[Path] = None) -> str:
@@ -47,60 +574,49 @@ class MinerUClient:
             raise ValueError("url 和 file_path 只能提供其中一个")
         
         endpoint = f"{self.base_url}/extract/task"
+        await self._submit_limiter.acquire()
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                if url:
-                    # 使用 URL 提交
-                    data = {
-                        "url": url,
-                        "model_version": "vlm"
-                    }
-                    log.info(f"提交 MinerU 任务: endpoint={endpoint}, data={data}")
-                    response = await client.post(endpoint, headers=self.headers, json=data)
-                else:
-                    # 使用文件上传
-                    log.info(f"提交 MinerU 任务（文件上传）: endpoint={endpoint}, file={file_path.name}")
-                    with open(file_path, 'rb') as f:
-                        files = {'file': (file_path.name, f, 'application/pdf')}
-                        # 文件上传需要不同的 header
-                        upload_headers = {"Authorization": f"Bearer {self.token}"}
-                        response = await client.post(
-                            endpoint,
-                            headers=upload_headers,
-                            files=files,
-                            data={"model_version": "vlm"}
-                        )
-                
-                response.raise_for_status()
-                result = response.json()
-                
-                log.info(f"MinerU API 响应: status={response.status_code}, code={result.get('code')}")
-                
-                # 检查响应格式
-                if not isinstance(result, dict):
-                    raise Exception(f"MinerU API 返回格式错误，期望 dict，实际为 {type(result)}")
-                
-                # MinerU API 约定：code=0 表示成功，code!=0 表示失败
-                if result.get("code") != 0:
-                    error_msg = result.get('message') or result.get('msg') or '未知错误'
-                    log.error(f"MinerU API 返回错误: code={result.get('code')}, message={error_msg}, full_response={result}")
-                    raise Exception(f"MinerU API 错误: {error_msg}")
-                
-                # 从响应中提取 task_id
-                data = result.get("data", {})
-                if isinstance(data, dict):
-                    task_id = data.get("task_id")
-                else:
-                    # 如果 data 直接是字符串（旧版 API）
-                    task_id = data
-                
-                if not task_id:
-                    raise Exception(f"MinerU API 未返回 task_id, 完整响应: {result}")
-                
-                log.info(f"MinerU 任务提交成功: task_id={task_id}")
-                return task_id
-                
+            if url:
+                # 使用 URL 提交
+                data = {
+                    "url": url,
+                    "model_version": self.model_version
+                }
+                log.info(f"提交 MinerU 任务: endpoint={endpoint}, data={data}")
+                response = await self._request(
+                    "POST", endpoint, self.SUBMIT_TIMEOUT, headers=self.headers, json=data
+                )
+            else:
+                # 使用文件上传
+                log.info(f"提交 MinerU 任务（文件上传）: endpoint={endpoint}, file={file_path.name}")
+                with open(file_path, 'rb') as f:
+                    files = {'file': (file_path.name, f, 'application/pdf')}
+                    # 文件上传需要不同的 header
+                    upload_headers = {"Authorization": f"Bearer {self.token}"}
+                    response = await self._request(
+                        "POST",
+                        endpoint,
+                        self.SUBMIT_TIMEOUT,
+                        headers=upload_headers,
+                        files=files,
+                        data={"model_version": self.model_version}
+                    )
+            
+            # 从响应中提取 task_id
+            data = self._parse_response(response)
+            if isinstance(data, dict):
+                task_id = data.get("task_id")
+            else:
+                # 如果 data 直接是字符串（旧版 API）
+                task_id = data
+            
+            if not task_id:
+                raise Exception(f"MinerU API 未返回 task_id, data={data}")
+            
+            log.info(f"MinerU 任务提交成功: task_id={task_id}")
+            return task_id
+            
         except httpx.HTTPError as e:
             log.error(f"提交 MinerU 任务失败（HTTP 错误）: {e}")
             raise
@@ -122,40 +638,13 @@ class MinerUClient:
         endpoint = f"{self.base_url}/extract/task/{task_id}"
         
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(endpoint, headers=self.headers)
-                response.raise_for_status()
-                result = response.json()
-                
-                # MinerU API 约定：code=0 表示成功
-                if result.get("code") != 0:
-                    raise Exception(f"MinerU API 错误: {result.get('message') or result.get('msg')}")
-                
-                data = result.get("data", {})
-                
-                # MinerU API 实际返回的字段名与预期不同
-                # state: pending, done, failed
-                # full_zip_url: 结果下载链接
-                state = data.get("state")
-                
-                # 将 MinerU 的状态映射到标准状态
-                status_map = {
-                    "pending": "pending",
-                    "processing": "processing",
-                    "done": "completed",
-                    "failed": "failed"
-                }
-                
-                status_info = {
-                    "status": status_map.get(state, state),
-                    "progress": data.get("progress", 0),
-                    "result_url": data.get("full_zip_url"),  # MinerU 使用 full_zip_url
-                    "error": data.get("err_msg")  # MinerU 使用 err_msg
-                }
-                
-                log.info(f"任务 {task_id} 状态: {state} -> {status_info['status']}")
-                return status_info
-                
+            response = await self._request("GET", endpoint, self.STATUS_TIMEOUT, headers=self.headers)
+            status_info = self._status_info(self._parse_response(response))
+            state = status_info["state"]
+            
+            log.info(f"任务 {task_id} 状态: {state} -> {status_info['status']}")
+            return status_info
+            
         except httpx.HTTPError as e:
             log.error(f"查询 MinerU 任务状态失败: {e}")
             raise
@@ -163,127 +652,259 @@ class MinerUClient:
             log.error(f"查询 MinerU 任务状态异常: {e}")
             raise
     
-    async def wait_for_completion(self, task_id: str, paper_id: Optional[str] = None) -> Dict[str, Any]:
+    @async_retry(max_retries=3, delay=2.0)
+    async def submit_url_batch(self, items: List[Tuple[str, str]]) -> str:
+        """
+        批量提交 URL 解析任务（一次请求）
+        
+        Args:
+            items: [(data_id, url), ...]，data_id 用于在批次结果中区分各文件
+            
+        Returns:
+            batch_id
+        """
+        endpoint = f"{self.base_url}/extract/task/batch"
+        payload = {
+            "files": [{"url": url, "data_id": data_id} for data_id, url in items],
+            "model_version": self.model_version
+        }
+        await self._submit_limiter.acquire()
+        log.info(f"批量提交 MinerU 任务: endpoint={endpoint}, files={len(items)}")
+        response = await self._request("POST", endpoint, self.SUBMIT_TIMEOUT, headers=self.headers, json=payload)
+        batch_id = self._parse_response(response).get("batch_id")
+        if not batch_id:
+            raise Exception("MinerU API 未返回 batch_id")
+        log.info(f"MinerU 批量任务提交成功: batch_id={batch_id}, files={len(items)}")
+        return batch_id
+    
+    async def _read_chunks(self, file_path: Path) -> AsyncIterator[bytes]:
+        """按块读取文件，作为流式请求体"""
+        async with aiofiles.open(file_path, "rb") as f:
+            while True:
+                chunk = await f.read(self.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    
+    @async_retry(max_retries=3, delay=2.0)
+    async def _request_upload_urls(self, items: List[Tuple[str, Path]]) -> Tuple[str, List[str]]:
+        """
+        申请一批上传地址（尚未上传任何文件，失败时可以整体重试）
+        
+        Returns:
+            (batch_id, 与 items 一一对应的上传地址)
+        """
+        endpoint = f"{self.base_url}/file-urls/batch"
+        payload = {
+            "files": [{"name": file_path.name, "data_id": data_id} for data_id, file_path in items],
+            "model_version": self.model_version
+        }
+        await self._submit_limiter.acquire()
+        log.info(f"申请 MinerU 批量上传地址: endpoint={endpoint}, files={len(items)}")
+        response = await self._request("POST", endpoint, self.SUBMIT_TIMEOUT, headers=self.headers, json=payload)
+        data = self._parse_response(response)
+        batch_id = data.get("batch_id")
+        upload_urls = data.get("file_urls") or []
+        if not batch_id or len(upload_urls) != len(items):
+            raise Exception(f"MinerU API 返回的上传地址数量不正确: {len(upload_urls)} != {len(items)}")
+        return batch_id, upload_urls
+    
+    async def submit_file_batch(self, items: List[Tuple[str, Path]]) -> str:
+        """
+        批量上传本地文件：先申请一批上传地址，再并发上传文件，上传完成后 MinerU 自动开始解析
+        
+        开始上传后不再整体重试（会得到新的 batch_id，已上传的文件被丢弃），只重试失败的单个文件
+        
+        Args:
+            items: [(data_id, file_path), ...]
+            
+        Returns:
+            batch_id
+        """
+        batch_id, upload_urls = await self._request_upload_urls(items)
+        
+        @async_retry(max_retries=3, delay=self.UPLOAD_RETRY_DELAY)
+        async def upload(upload_url: str, file_path: Path):
+            # 从文件流式上传，不把整个 PDF 读入内存；上传地址是预签名 URL，不能带 Authorization 和 Content-Type
+            response = await self._request(
+                "PUT",
+                upload_url,
+                self.SUBMIT_TIMEOUT,
+                content=self._read_chunks(file_path),
+                headers={"Content-Length": str(file_path.stat().st_size)}
+            )
+            response.raise_for_status()
+        
+        await asyncio.gather(*(
+            upload(upload_url, file_path)
+            for upload_url, (_, file_path) in zip(upload_urls, items)
+        ))
+        log.info(f"MinerU 批量上传完成: batch_id={batch_id}, files={len(items)}")
+        return batch_id
+    
+    @async_retry(max_retries=2, delay=1.0)
+    async def check_batch(self, batch_id: str) -> Dict[str, Dict[str, Any]]:
+        """
+        查询批次中所有文件的状态
+        
+        Returns:
+            {data_id: 状态信息}
+        """
+        endpoint = f"{self.base_url}/extract-results/batch/{batch_id}"
+        response = await self._request("GET", endpoint, self.STATUS_TIMEOUT, headers=self.headers)
+        data = self._parse_response(response)
+        return {
+            item.get("data_id"): self._status_info(item)
+            for item in data.get("extract_result") or []
+        }
+    
+    async def wait_for_completion(
+        self,
+        task_id: str,
+        paper_id: Optional[str] = None,
+        on_status: Optional[StatusCallback] = None
+    ) -> Dict[str, Any]:
         """
         等待任务完成
         
         Args:
             task_id: 任务ID
             paper_id: 论文ID，用于保存图片
+            on_status: 每次查询到任务状态后调用 on_status(status_info)
             
         Returns:
             任务结果
         """
-        start_time = asyncio.get_event_loop().time()
+        # 由集中轮询器查询状态，直到任务完成或失败
+        status_info = await self.poller.watch(task_id, on_status=on_status)
         
-        while True:
-            elapsed = asyncio.get_event_loop().time() - start_time
-            if elapsed > self.timeout:
-                raise TimeoutError(f"MinerU 任务超时 (>{self.timeout}s): {task_id}")
-            
-            status_info = await self.check_status(task_id)
-            status = status_info["status"]
-            
-            log.info(f"MinerU 任务状态: {task_id} - {status} ({status_info.get('progress', 0)}%)")
+        result_url = status_info.get("result_url")
+        if not result_url:
+            raise Exception("任务完成但未返回结果 URL")
+        
+        # 下载结果，传入 paper_id 以保存图片
+        return await self._download_result(result_url, paper_id=paper_id)
+    
+    async def _download_to_file(self, url: str, dest: Path):
+        """流式下载到文件，不在内存中保留完整内容"""
+        self.requests += 1
+        async with self._get_client().stream(
+            "GET",
+            url,
+            timeout=httpx.Timeout(self.DOWNLOAD_TIMEOUT, connect=self.CONNECT_TIMEOUT),
+            extensions={"trace": self._trace}
+        ) as response:
+            response.raise_for_status()
+            if response.http_version == "HTTP/2":
+                self.http2_responses += 1
+            async with aiofiles.open(dest, 'wb') as f:
+                async for chunk in response.aiter_bytes(self.DOWNLOAD_CHUNK_SIZE):
+                    await f.write(chunk)
+    
+    @staticmethod
+    def _referenced_images(markdown_content: str) -> Set[str]:
+        """Markdown 中引用的图片文件名"""
+        refs = re.findall(r'!\[[^\]]*\]\(\s*<?([^)\s>]+)', markdown_content)
+        refs += re.findall(r'<img[^>]+src=["\']([^"\']+)', markdown_content)
+        return {PurePosixPath(ref).name for ref in refs}
+    
+    @staticmethod
+    def _extract_result(zip_path: Path, paper_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        从结果 zip 中只取出主 Markdown、结构化内容列表和它们引用的图片
+        
+        只遍历一次中央目录：按记录的大小选出主 Markdown 和 content_list.json，
+        图片直接写入最终目录，不解压其他文件
+        """
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            entries = [info for info in zip_ref.infolist() if not info.is_dir()]
+            md_entries = [info for info in entries if info.filename.lower().endswith('.md')]
+            if not md_entries:
+                raise Exception("在解压结果中未找到 .md 文件")
             
-            if status == "completed":
-                result_url = status_info.get("result_url")
-                if not result_url:
-                    raise Exception("任务完成但未返回结果 URL")
-                
-                # 下载结果，传入 paper_id 以保存图片
-                result_content = await self._download_result(result_url, paper_id=paper_id)
-                return result_content
+            # 如果有多个 .md 文件，选择最大的一个（通常是主文档）
+            md_info = max(md_entries, key=lambda info: info.file_size)
+            md_name = PurePosixPath(md_info.filename).name
+            log.info(f"找到 markdown 文件: {md_name}, zip 内文件数: {len(entries)}")
+            markdown_content = zip_ref.read(md_info).decode('utf-8')
             
-            elif status == "failed":
-                error = status_info.get("error", "未知错误")
-                raise Exception(f"MinerU 任务失败: {error}")
+            # 结构化内容列表（块类型、阅读顺序、页码），缺失或损坏时只使用 Markdown
+            content_list = None
+            list_entries = [info for info in entries if info.filename.lower().endswith(CONTENT_LIST_SUFFIX)]
+            if list_entries:
+                list_info = max(list_entries, key=lambda info: info.file_size)
+                try:
+                    content_list = json.loads(zip_ref.read(list_info).decode('utf-8'))
+                except ValueError as e:
+                    log.warning(f"content_list.json 解析失败，只使用 Markdown: {e}")
+                if not isinstance(content_list, list):
+                    content_list = None
             
-            # 继续等待
-            await asyncio.sleep(self.poll_interval)
+            # 只保存 Markdown 和内容列表中引用的图片，按文件名平铺到论文图片目录
+            images_saved = 0
+            if paper_id:
+                referenced = MinerUClient._referenced_images(markdown_content)
+                for block in content_list or []:
+                    if isinstance(block, dict) and block.get("img_path"):
+                        referenced.add(PurePosixPath(block["img_path"]).name)
+                image_entries = [
+                    info for info in entries
+                    if PurePosixPath(info.filename).suffix.lower() in IMAGE_EXTENSIONS
+                    and PurePosixPath(info.filename).name in referenced
+                ]
+                if image_entries:
+                    paper_images_dir = settings.parsed_dir / paper_id / "images"
+                    paper_images_dir.mkdir(parents=True, exist_ok=True)
+                    for info in image_entries:
+                        dest_path = paper_images_dir / PurePosixPath(info.filename).name
+                        with zip_ref.open(info) as src, open(dest_path, 'wb') as dst:
+                            shutil.copyfileobj(src, dst)
+                        images_saved += 1
+                    log.info(f"已保存 {images_saved} 张图片到: {paper_images_dir}")
+        
+        result = {
+            "content": markdown_content,
+            "format": "markdown",
+            "filename": md_name,
+            "images_saved": images_saved
+        }
+        if content_list is not None:
+            result["content_list"] = content_list
+        return result
     
     @async_retry(max_retries=3, delay=2.0)
-    async def _download_result(self, result_url: str, paper_id: Optional[str] = None) -> Dict[str, Any]:
+    async def _download_result(
+        self,
+        result_url: str,
+        paper_id: Optional[str] = None,
+        cache_key: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
-        下载解析结果（zip文件）并解压提取markdown和图片
+        下载解析结果（zip文件）并提取 markdown 和图片
+        
+        zip 流式写入临时文件，再只解压主 Markdown 和被引用的图片到最终目录
         
         Args:
             result_url: 结果 URL（zip文件）
             paper_id: 论文ID，用于保存图片到对应目录
+            cache_key: PDF 内容哈希，提供时把结果 zip 存入本地缓存
             
         Returns:
             解析结果（Markdown 等）
         """
+        fd, tmp_name = tempfile.mkstemp(suffix='.zip')
+        os.close(fd)
+        tmp_zip_path = Path(tmp_name)
+        
         try:
-            # 下载 zip 文件
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                log.info(f"开始下载 MinerU 结果: {result_url}")
-                response = await client.get(result_url)
-                response.raise_for_status()
-                
-                # 创建临时文件保存 zip
-                with tempfile.NamedTemporaryFile(suffix='.zip', delete=False) as tmp_zip:
-                    tmp_zip.write(response.content)
-                    tmp_zip_path = tmp_zip.name
-                
-                log.info(f"zip 文件已下载到: {tmp_zip_path}")
-                
-                # 创建临时目录用于解压
-                with tempfile.TemporaryDirectory() as tmp_dir:
-                    # 解压 zip 文件
-                    with zipfile.ZipFile(tmp_zip_path, 'r') as zip_ref:
-                        zip_ref.extractall(tmp_dir)
-                        log.info(f"zip 文件已解压到: {tmp_dir}")
-                        
-                        # 列出解压后的文件
-                        extracted_files = list(Path(tmp_dir).rglob('*'))
-                        log.info(f"解压后的文件列表: {[str(f) for f in extracted_files]}")
-                        
-                        # 查找 .md 文件
-                        md_files = list(Path(tmp_dir).rglob('*.md'))
-                        
-                        if not md_files:
-                            raise Exception(f"在解压结果中未找到 .md 文件")
-                        
-                        # 如果有多个 .md 文件，选择最大的一个（通常是主文档）
-                        md_file = max(md_files, key=lambda f: f.stat().st_size)
-                        log.info(f"找到 markdown 文件: {md_file.name}")
-                        
-                        # 读取 markdown 内容
-                        with open(md_file, 'r', encoding='utf-8') as f:
-                            markdown_content = f.read()
-                        
-                        # 保存图片文件到持久化目录
-                        images_saved = 0
-                        if paper_id:
-                            # 查找所有图片文件
-                            image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg'}
-                            image_files = [
-                                f for f in extracted_files 
-                                if f.is_file() and f.suffix.lower() in image_extensions
-                            ]
-                            
-                            if image_files:
-                                # 创建论文图片目录
-                                paper_images_dir = settings.parsed_dir / paper_id / "images"
-                                paper_images_dir.mkdir(parents=True, exist_ok=True)
-                                
-                                for img_file in image_files:
-                                    dest_path = paper_images_dir / img_file.name
-                                    shutil.copy2(img_file, dest_path)
-                                    images_saved += 1
-                                
-                                log.info(f"已保存 {images_saved} 张图片到: {paper_images_dir}")
-                        
-                        # 清理临时 zip 文件
-                        Path(tmp_zip_path).unlink()
-                        
-                        return {
-                            "content": markdown_content,
-                            "format": "markdown",
-                            "filename": md_file.name,
-                            "images_saved": images_saved
-                        }
+            log.info(f"开始下载 MinerU 结果: {result_url}")
+            await self._download_to_file(result_url, tmp_zip_path)
+            log.info(f"zip 文件已下载到: {tmp_zip_path}, 大小: {tmp_zip_path.stat().st_size} 字节")
+            
+            result = await run_in_threadpool(self._extract_result, tmp_zip_path, paper_id)
+            if cache_key:
+                await run_in_threadpool(self.result_cache.store, cache_key, self.model_version, tmp_zip_path)
+            return result
                     
         except httpx.HTTPError as e:
             log.error(f"下载 MinerU 结果失败: {e}")
@@ -294,8 +915,16 @@ class MinerUClient:
         except Exception as e:
             log.error(f"下载 MinerU 结果异常: {e}")
             raise
+        finally:
+            tmp_zip_path.unlink(missing_ok=True)
     
-    async def parse_pdf(self, url: Optional[str] = None, file_path: Optional[Path] = None, paper_id: Optional[str] = None) -> Dict[str, Any]:
+    async def parse_pdf(
+        self,
+        url: Optional[str] = None,
+        file_path: Optional[Path] = None,
+        paper_id: Optional[str] = None,
+        on_status: Optional[StatusCallback] = None
+    ) -> Dict[str, Any]:
         """
         完整的 PDF 解析流程（提交 -> 等待 -> 获取结果）
         
@@ -303,19 +932,66 @@ class MinerUClient:
             url: 论文 URL
             file_path: 本地文件路径
             paper_id: 论文ID，用于保存图片到对应目录
+            on_status: 每次轮询到 MinerU 任务状态后调用，用于上报细粒度进度
             
         Returns:
             解析结果
         """
         log.info(f"开始解析 PDF: url={url}, file={file_path}, paper_id={paper_id}")
         
-        # 提交任务
-        task_id = await self.submit_task(url=url, file_path=file_path)
+        if not url and not file_path:
+            raise ValueError("必须提供 url 或 file_path 之一")
         
-        # 等待完成，传入 paper_id 以保存图片
-        result = await self.wait_for_completion(task_id, paper_id=paper_id)
+        if url and file_path:
+            raise ValueError("url 和 file_path 只能提供其中一个")
+        
+        # 同一 PDF（内容哈希 + model_version）解析过时直接使用缓存的结果 zip
+        if file_path:
+            cache_key = await run_in_threadpool(self.result_cache.key_for_file, file_path)
+        else:
+            cache_key = self.result_cache.key_for_url(PaperCatalog.canonicalize_url(url))
+        cached = await self._load_cached_result(cache_key, paper_id)
+        if cached is not None:
+            return cached
+        
+        if not self.batcher.enabled:
+            # 提交任务
+            task_id = await self.submit_task(url=url, file_path=file_path)
+            
+            # 由集中轮询器查询状态，直到任务完成或失败
+            status_info = await self.poller.watch(task_id, on_status=on_status)
+            member_id = task_id
+        else:
+            # 与同时到达的其他论文合并提交，同一批次共用一次状态查询
+            batch_id, member_id = await self.batcher.submit(url=url, file_path=file_path, data_id=paper_id)
+            if batch_id is None:
+                status_info = await self.poller.watch(member_id, on_status=on_status)
+            else:
+                status_info = await self.poller.watch_batch(batch_id, member_id, on_status=on_status)
         
-        log.info(f"PDF 解析完成: task_id={task_id}")
+        result_url = status_info.get("result_url")
+        if not result_url:
+            raise Exception("任务完成但未返回结果 URL")
+        # 下载结果，传入 paper_id 以保存图片
+        result = await self._download_result(result_url, paper_id=paper_id, cache_key=cache_key)
+        
+        log.info(f"PDF 解析完成: id={member_id}")
+        return result
+    
+    async def _load_cached_result(self, cache_key: str, paper_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """从本地缓存的结果 zip 提取，未命中或缓存损坏时返回 None"""
+        zip_path = self.result_cache.get(cache_key, self.model_version)
+        if zip_path is None:
+            return None
+        try:
+            result = await run_in_threadpool(self._extract_result, zip_path, paper_id)
+        except Exception as e:
+            # zip 损坏、未找到 .md 等
+            log.warning(f"MinerU 结果缓存不可用，重新解析: {zip_path.name}, {e}")
+            self.result_cache.discard(cache_key, self.model_version)
+            return None
+        log.info(f"使用缓存的 MinerU 结果: paper_id={paper_id}, key={cache_key[:16]}")
+        result["cached"] = True
         return result
 
 
@@ -0,0 +1,485 @@
+"""
+论文目录服务
+基于内容哈希和规范化 URL 识别论文，避免同一篇论文被重复解析和向量化；
+同时维护论文列表索引（标题、作者、摘要），列表查询无需读取解析结果文件
+"""
+import base64
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from app.config import settings
+from app.models.schemas import TaskStatus
+from app.utils import parsed_format
+from app.utils.file_manager import FileManager
+from app.utils.logger import log
+
+
+class PaperCatalog:
+    """
+    论文目录
+
+    维护 "别名 -> paper_id" 的映射，别名可以是 PDF 内容的 SHA-256，也可以是规范化后的 URL；
+    同时记录每篇论文的处理状态，只有完整入库（解析 + 向量化）的论文才会被复用。
+    """
+
+    KIND_SHA256 = "sha256"
+    KIND_URL = "url"
+
+    # 列表可选的排序方式 -> 排序列
+    SORT_COLUMNS = {
+        "modified": "modified_at",
+        "created": "created_at",
+        "title": "title_key",
+    }
+    # 列表可返回的字段
+    LIST_FIELDS = ("paper_id", "title", "authors", "abstract", "source", "created_at", "modified_at")
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or settings.catalog_db_path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """获取（必要时创建）数据库连接"""
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            # WAL 模式：API 和 worker 进程可以同时读写
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS paper_aliases (
+                    alias TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    paper_id TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_aliases_paper_id ON paper_aliases(paper_id)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS papers (
+                    paper_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ingest_batches (
+                    batch_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    paper_id TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (batch_id, position)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS paper_index (
+                    paper_id TEXT PRIMARY KEY,
+                    title TEXT,
+                    title_key TEXT NOT NULL,
+                    authors TEXT NOT NULL,
+                    abstract TEXT,
+                    source TEXT,
+                    created_at REAL NOT NULL,
+                    modified_at REAL NOT NULL
+                )
+                """
+            )
+            for column in self.SORT_COLUMNS.values():
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_paper_index_{column} ON paper_index({column}, paper_id)"
+                )
+            # 每位作者的全名和名字中的每个词各一行，用于作者前缀查询
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS paper_author_keys (
+                    author_key TEXT NOT NULL,
+                    paper_id TEXT NOT NULL,
+                    PRIMARY KEY (author_key, paper_id)
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_author_keys_paper_id ON paper_author_keys(paper_id)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def paper_id_for_hash(content_hash: str) -> str:
+        """由 PDF 内容哈希得到 paper_id（与上传文件的 file_id 一致）"""
+        return FileManager.generate_content_id(content_hash)
+
+    @staticmethod
+    def paper_id_for_url(canonical_url: str) -> str:
+        """由规范化 URL 得到 paper_id"""
+        return hashlib.md5(canonical_url.encode()).hexdigest()
+
+    @staticmethod
+    def canonicalize_url(url: str) -> str:
+        """
+        规范化论文 URL，使同一论文的不同写法映射到同一个键
+
+        - 去除首尾空白、fragment 和末尾斜杠
+        - scheme 和 host 转小写，http 统一为 https，去掉 www. 前缀
+        - arXiv 的 abs/pdf 链接统一为 https://arxiv.org/pdf/<id>
+        """
+        parts = urlsplit(url.strip())
+        scheme = (parts.scheme or "https").lower()
+        if scheme == "http":
+            scheme = "https"
+
+        host = parts.netloc.lower()
+        if host.startswith("www."):
+            host = host[4:]
+
+        path = parts.path.rstrip("/")
+        if host in ("arxiv.org", "export.arxiv.org"):
+            host = "arxiv.org"
+            for prefix in ("/abs/", "/pdf/"):
+                if path.startswith(prefix):
+                    arxiv_id = path[len(prefix):]
+                    if arxiv_id.endswith(".pdf"):
+                        arxiv_id = arxiv_id[:-4]
+                    path = f"/pdf/{arxiv_id}"
+                    break
+
+        return urlunsplit((scheme, host, path, parts.query, ""))
+
+    def resolve(self, alias: str) -> Optional[str]:
+        """查询别名对应的 paper_id"""
+        with self._lock:
+            row = self._get_conn().execute(
+                "SELECT paper_id FROM paper_aliases WHERE alias = ?", (alias,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def register(self, alias: str, kind: str, paper_id: str) -> str:
+        """
+        注册别名；若别名已存在则保留原有映射
+
+        Returns:
+            别名最终对应的 paper_id
+        """
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute(
+                "INSERT OR IGNORE INTO paper_aliases (alias, kind, paper_id, created_at) VALUES (?, ?, ?, ?)",
+                (alias, kind, paper_id, time.time())
+            )
+            conn.commit()
+            row = conn.execute(
+                "SELECT paper_id FROM paper_aliases WHERE alias = ?", (alias,)
+            ).fetchone()
+        return row[0]
+
+    def resolve_hash(self, content_hash: str) -> str:
+        """根据 PDF 内容哈希获取 paper_id，未登记时按哈希派生并登记"""
+        return self.register(
+            content_hash, self.KIND_SHA256, self.paper_id_for_hash(content_hash)
+        )
+
+    def resolve_url(self, url: str) -> str:
+        """根据 URL 获取 paper_id，未登记时按规范化 URL 派生并登记"""
+        canonical_url = self.canonicalize_url(url)
+        return self.register(
+            canonical_url, self.KIND_URL, self.paper_id_for_url(canonical_url)
+        )
+
+    def get_content_hash(self, paper_id: str) -> Optional[str]:
+        """获取论文对应的 PDF 内容哈希（URL 导入的论文可能没有）"""
+        with self._lock:
+            row = self._get_conn().execute(
+                "SELECT alias FROM paper_aliases WHERE paper_id = ? AND kind = ?",
+                (paper_id, self.KIND_SHA256)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_status(self, paper_id: str, status: TaskStatus):
+        """记录论文的处理状态"""
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO papers (paper_id, status, updated_at) VALUES (?, ?, ?)",
+                (paper_id, TaskStatus(status).value, time.time())
+            )
+            conn.commit()
+
+    def get_status(self, paper_id: str) -> Optional[TaskStatus]:
+        """获取论文的处理状态，未登记时返回 None"""
+        with self._lock:
+            row = self._get_conn().execute(
+                "SELECT status FROM papers WHERE paper_id = ?", (paper_id,)
+            ).fetchone()
+        return TaskStatus(row[0]) if row else None
+
+    def remove_paper(self, paper_id: str) -> int:
+        """删除论文的所有别名、状态和列表索引"""
+        with self._lock:
+            conn = self._get_conn()
+            cursor = conn.execute("DELETE FROM paper_aliases WHERE paper_id = ?", (paper_id,))
+            conn.execute("DELETE FROM papers WHERE paper_id = ?", (paper_id,))
+            conn.execute("DELETE FROM paper_index WHERE paper_id = ?", (paper_id,))
+            conn.execute("DELETE FROM paper_author_keys WHERE paper_id = ?", (paper_id,))
+            conn.commit()
+        log.info(f"删除论文别名: {paper_id}, 数量: {cursor.rowcount}")
+        return cursor.rowcount
+
+    def create_batch(self, batch_id: str, items: List[Tuple[str, str]]):
+        """
+        记录一次批量入库包含的论文
+
+        Args:
+            batch_id: 批次ID
+            items: (paper_id, 来源 URL 或文件 ID) 列表，按提交顺序
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            conn.executemany(
+                "INSERT INTO ingest_batches (batch_id, position, paper_id, source, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(batch_id, i, paper_id, source, now) for i, (paper_id, source) in enumerate(items)]
+            )
+            conn.commit()
+
+    def get_batch(self, batch_id: str) -> List[Dict[str, Any]]:
+        """获取批次中的论文（按提交顺序），批次不存在时返回空列表"""
+        with self._lock:
+            rows = self._get_conn().execute(
+                "SELECT paper_id, source, created_at FROM ingest_batches WHERE batch_id = ? ORDER BY position",
+                (batch_id,)
+            ).fetchall()
+        return [{"paper_id": row[0], "source": row[1], "created_at": row[2]} for row in rows]
+
+    @staticmethod
+    def _sort_key(text: Optional[str]) -> str:
+        """排序和前缀匹配使用的键（去除首尾空白并转小写）"""
+        return (text or "").strip().casefold()
+
+    @staticmethod
+    def _prefix_range(prefix: str) -> Tuple[str, str]:
+        """前缀查询转换为 [start, end) 区间，可以走索引"""
+        return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+    @classmethod
+    def _author_keys(cls, authors: List[str]) -> set:
+        """作者全名及名字中的每个词"""
+        keys = set()
+        for author in authors:
+            key = cls._sort_key(author)
+            if key:
+                keys.add(key)
+                keys.update(key.replace(",", " ").split())
+        return keys
+
+    def index_paper(
+        self,
+        paper_id: str,
+        metadata: Dict[str, Any],
+        created_at: Optional[float] = None,
+        modified_at: Optional[float] = None
+    ):
+        """
+        写入或更新论文列表索引（保存解析结果后调用）
+
+        Args:
+            paper_id: 论文ID
+            metadata: 论文元数据（title / authors / abstract / source）
+            created_at: 首次入库时间，默认当前时间；更新时保留原值
+            modified_at: 最后修改时间，默认当前时间
+        """
+        now = time.time()
+        title = metadata.get("title") or "未知标题"
+        authors = [a for a in (metadata.get("authors") or []) if a]
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute(
+                """
+                INSERT INTO paper_index (paper_id, title, title_key, authors, abstract, source, created_at, modified_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(paper_id) DO UPDATE SET
+                    title = excluded.title,
+                    title_key = excluded.title_key,
+                    authors = excluded.authors,
+                    abstract = excluded.abstract,
+                    source = excluded.source,
+                    modified_at = excluded.modified_at
+                """,
+                (
+                    paper_id, title, self._sort_key(title), json.dumps(authors, ensure_ascii=False),
+                    metadata.get("abstract") or "", metadata.get("source"),
+                    created_at or now, modified_at or now
+                )
+            )
+            conn.execute("DELETE FROM paper_author_keys WHERE paper_id = ?", (paper_id,))
+            conn.executemany(
+                "INSERT OR IGNORE INTO paper_author_keys (author_key, paper_id) VALUES (?, ?)",
+                [(key, paper_id) for key in self._author_keys(authors)]
+            )
+            conn.commit()
+
+    @staticmethod
+    def _encode_cursor(sort: str, order: str, value: Any, paper_id: str) -> str:
+        """生成分页游标（记录排序方式和上一页最后一条的位置）"""
+        payload = json.dumps([sort, order, value, paper_id], ensure_ascii=False)
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def _decode_cursor(cursor: str, sort: str, order: str) -> Tuple[Any, str]:
+        """解析分页游标，返回 (排序值, paper_id)"""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            cursor_sort, cursor_order, value, paper_id = json.loads(base64.urlsafe_b64decode(padded))
+        except Exception:
+            raise ValueError("无效的分页游标")
+        if (cursor_sort, cursor_order) != (sort, order):
+            raise ValueError("分页游标与排序方式不一致")
+        return value, paper_id
+
+    def list_papers(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        sort: str = "modified",
+        order: str = "desc",
+        title_prefix: Optional[str] = None,
+        author_prefix: Optional[str] = None,
+        fields: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        分页查询论文列表（游标分页，翻页开销与已翻过的页数无关）
+
+        Args:
+            limit: 每页数量
+            cursor: 上一页返回的 next_cursor
+            sort: 排序方式（modified / created / title）
+            order: asc / desc
+            title_prefix: 标题前缀（不区分大小写）
+            author_prefix: 作者姓名或其中某个词的前缀（不区分大小写）
+            fields: 返回的字段，默认全部；paper_id 总是返回
+
+        Returns:
+            {"total": 符合条件的论文数, "papers": [...], "next_cursor": 下一页游标或 None}
+
+        Raises:
+            ValueError: 参数无效
+        """
+        if sort not in self.SORT_COLUMNS:
+            raise ValueError(f"不支持的排序方式: {sort}")
+        if order not in ("asc", "desc"):
+            raise ValueError(f"不支持的排序方向: {order}")
+        fields = list(fields) if fields else list(self.LIST_FIELDS)
+        unknown = set(fields) - set(self.LIST_FIELDS)
+        if unknown:
+            raise ValueError(f"不支持的字段: {', '.join(sorted(unknown))}")
+        if "paper_id" not in fields:
+            fields.insert(0, "paper_id")
+
+        sort_column = self.SORT_COLUMNS[sort]
+        conditions: List[str] = []
+        params: List[Any] = []
+
+        title_key = self._sort_key(title_prefix)
+        if title_key:
+            conditions.append("title_key >= ? AND title_key < ?")
+            params.extend(self._prefix_range(title_key))
+
+        author_key = self._sort_key(author_prefix)
+        if author_key:
+            conditions.append(
+                "paper_id IN (SELECT paper_id FROM paper_author_keys WHERE author_key >= ? AND author_key < ?)"
+            )
+            params.extend(self._prefix_range(author_key))
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        count_params = list(params)
+
+        if cursor:
+            value, last_id = self._decode_cursor(cursor, sort, order)
+            op = "<" if order == "desc" else ">"
+            conditions.append(f"({sort_column}, paper_id) {op} (?, ?)")
+            params.extend([value, last_id])
+
+        page_where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        direction = "DESC" if order == "desc" else "ASC"
+        columns = ", ".join(dict.fromkeys(fields + [sort_column]))
+
+        with self._lock:
+            conn = self._get_conn()
+            total = conn.execute(f"SELECT COUNT(*) FROM paper_index {where}", count_params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT {columns} FROM paper_index {page_where} "
+                f"ORDER BY {sort_column} {direction}, paper_id {direction} LIMIT ?",
+                params + [limit + 1]
+            ).fetchall()
+
+        names = list(dict.fromkeys(fields + [sort_column]))
+        records = [dict(zip(names, row)) for row in rows]
+        next_cursor = None
+        if len(records) > limit:
+            records = records[:limit]
+            last = records[-1]
+            next_cursor = self._encode_cursor(sort, order, last[sort_column], last["paper_id"])
+
+        papers = []
+        for record in records:
+            if "authors" in record:
+                record["authors"] = json.loads(record["authors"])
+            papers.append({name: record[name] for name in fields})
+
+        return {"total": total, "papers": papers, "next_cursor": next_cursor}
+
+    def backfill_index(self, parsed_dir: Optional[Path] = None) -> int:
+        """
+        把尚未索引的解析结果补充到列表索引中（升级后首次启动时执行，之后只需比较文件名）
+
+        Returns:
+            新索引的论文数
+        """
+        parsed_dir = Path(parsed_dir or settings.parsed_dir)
+        with self._lock:
+            indexed = {row[0] for row in self._get_conn().execute("SELECT paper_id FROM paper_index")}
+
+        count = 0
+        for file_path in [*parsed_dir.glob("*.pwp"), *parsed_dir.glob("*.json")]:
+            if file_path.stem in indexed:
+                continue
+            try:
+                if file_path.suffix == ".pwp":
+                    metadata = parsed_format.read_header(file_path).get("metadata") or {}
+                else:
+                    with open(file_path, "r", encoding="utf-8") as f:
+                        metadata = json.load(f).get("metadata") or {}
+                stat = file_path.stat()
+                self.index_paper(file_path.stem, metadata, created_at=stat.st_ctime, modified_at=stat.st_mtime)
+                indexed.add(file_path.stem)
+                count += 1
+            except Exception as e:
+                log.error(f"索引论文失败: {file_path}, error={e}")
+
+        if count:
+            log.info(f"补充论文列表索引: {count} 篇")
+        return count
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# 全局目录实例
+paper_catalog = PaperCatalog()
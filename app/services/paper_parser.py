@@ -4,17 +4,30 @@
 """
 import re
 import json
-from typing import Dict, Any, List
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
+from pathlib import PurePosixPath
 
-from app.models.schemas import PaperMetadata, PaperSection, PaperStructure
+from app.models.schemas import PaperElement, PaperMetadata, PaperSection, PaperStructure, SectionNode
 from app.services.llm_factory import llm_factory
+from app.utils.cpu_executor import cpu_executor
 from app.utils.logger import log
 
 
+# Markdown 标题行（# ## ### 等），整篇文本一次扫描
+HEADER_PATTERN = re.compile(r'^(#{1,6})[^\S\n]+(.+?)$', re.MULTILINE)
+
+
 class PaperParser:
     """论文解析器"""
     
+    # content_list 中不属于正文的块类型（页眉、页脚、页码、边注等）
+    SKIPPED_BLOCK_TYPES = {
+        "header", "footer", "page_number", "page_header", "page_footer",
+        "page_footnote", "aside_text", "discarded",
+    }
+    
     @staticmethod
     def replace_image_paths(markdown_content: str, paper_id: str) -> str:
         """
@@ -167,6 +180,55 @@ class PaperParser:
         
         return metadata
     
+    @staticmethod
+    def index_sections(markdown_content: str) -> List[Dict[str, Any]]:
+        """
+        扫描一次 Markdown，记录每个章节正文在原文中的 [start, end) 字符偏移（不复制正文）
+        
+        Args:
+            markdown_content: Markdown 格式的论文内容
+            
+        Returns:
+            章节索引列表：{"section_id", "title", "level", "order", "start", "end", "start_line"}
+        """
+        sections = []
+        line_no = 0
+        line_pos = 0
+        current_section = None
+        
+        for match in HEADER_PATTERN.finditer(markdown_content):
+            if current_section:
+                current_section["end"] = match.start()
+                sections.append(current_section)
+            
+            # 标题行号只统计上一个标题之后的换行，整体线性
+            line_no += markdown_content.count("\n", line_pos, match.start())
+            line_pos = match.start()
+            order = len(sections)
+            current_section = {
+                "section_id": f"section_{order}",
+                "title": match.group(2).strip(),
+                "level": len(match.group(1)),
+                "order": order,
+                "start": match.end(),
+                "end": len(markdown_content),
+                "start_line": line_no
+            }
+        
+        if current_section:
+            sections.append(current_section)
+        
+        # 去掉正文首尾的空白（只移动偏移）
+        for section in sections:
+            start, end = section["start"], section["end"]
+            while start < end and markdown_content[start].isspace():
+                start += 1
+            while end > start and markdown_content[end - 1].isspace():
+                end -= 1
+            section["start"], section["end"] = start, end
+        
+        return sections
+    
     @staticmethod
     def extract_sections(markdown_content: str) -> List[Dict[str, Any]]:
         """
@@ -176,52 +238,366 @@ class PaperParser:
             markdown_content: Markdown 格式的论文内容
             
         Returns:
-            章节列表
+            章节列表（章节索引加上正文 content）
+        """
+        return [
+            {**section, "content": markdown_content[section["start"]:section["end"]]}
+            for section in PaperParser.index_sections(markdown_content)
+        ]
+    
+    @staticmethod
+    def sections_from_index(full_content: str, records: List[Dict[str, Any]]) -> Optional[List[PaperSection]]:
+        """
+        按保存的章节偏移从全文中取出章节正文
+        
+        Args:
+            full_content: 论文全文
+            records: 保存的章节记录（需要带 start / end）
+            
+        Returns:
+            章节列表；记录中没有偏移（旧版解析结果）或偏移越界时返回 None
         """
         sections = []
+        for record in records:
+            start, end = record.get("start"), record.get("end")
+            if start is None or end is None or not 0 <= start <= end <= len(full_content):
+                return None
+            fields = {k: v for k, v in record.items() if k in PaperSection.model_fields and k != "content"}
+            sections.append(PaperSection(**fields, content=full_content[start:end]))
+        return sections
+    
+    @staticmethod
+    def build_section_tree(sections: List[PaperSection]) -> List[SectionNode]:
+        """
+        由按顺序排列的章节构建章节树，并为每个章节设置 path
         
-        # 匹配标题行（# ## ### 等）
-        header_pattern = r'^(#{1,6})\s+(.+?)$'
+        章节的父节点是它之前最近的层级更浅的章节（跳级的标题也挂在最近的祖先下），用一个栈一次遍历完成
         
-        lines = markdown_content.split('\n')
-        current_section = None
-        section_order = 0
+        Args:
+            sections: 章节列表（会被设置 path）
+            
+        Returns:
+            先序排列的节点列表，与 sections 一一对应
+        """
+        nodes: List[SectionNode] = []
+        stack: List[SectionNode] = []
+        root_count = 0
+        
+        for index, section in enumerate(sections):
+            while stack and stack[-1].level >= section.level:
+                stack.pop().subtree_end = index
+            parent = stack[-1] if stack else None
+            if parent is not None:
+                path = f"{parent.path}.{len(parent.children) + 1}"
+                parent.children.append(path)
+            else:
+                root_count += 1
+                path = str(root_count)
+            section.path = path
+            node = SectionNode(
+                path=path,
+                section_id=section.section_id,
+                title=section.title,
+                level=section.level,
+                order=section.order,
+                parent=parent.path if parent is not None else None,
+                subtree_end=len(sections),
+                start=section.start,
+                end=section.end
+            )
+            nodes.append(node)
+            stack.append(node)
+        
+        # 子树的结束偏移是最后一个子孙章节的结束偏移
+        for node in nodes:
+            last = sections[node.subtree_end - 1]
+            if last.end is not None:
+                node.end = last.end
+        
+        return nodes
+    
+    @staticmethod
+    def _joined(block: Dict[str, Any], *keys: str) -> str:
+        """取出块中第一个非空的字段，列表（如多行图注）按行合并"""
+        for key in keys:
+            value = block.get(key)
+            if isinstance(value, list):
+                value = "\n".join(str(item).strip() for item in value if str(item).strip())
+            if value:
+                return str(value).strip()
+        return ""
+    
+    @staticmethod
+    def _render_block(paper_id: str, block_type: str, block: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        把 content_list 中的一个非标题块渲染为 Markdown
+        
+        Returns:
+            (Markdown 文本, 图/表/公式记录或 None)
+        """
+        image_url = None
+        if block.get("img_path"):
+            image_url = f"/api/images/{paper_id}/images/{PurePosixPath(block['img_path']).name}"
+        
+        if block_type == "equation":
+            text = PaperParser._joined(block, "text", "latex")
+            if not text:
+                return "", None
+            latex = text.strip("$").strip()
+            if not text.startswith("$$"):
+                text = f"$$\n{latex}\n$$"
+            return text, {"type": "equation", "content": latex, "image_url": image_url}
+        
+        if block_type == "image":
+            if not image_url:
+                return "", None
+            caption = PaperParser._joined(block, "img_caption", "image_caption")
+            footnote = PaperParser._joined(block, "img_footnote", "image_footnote")
+            text = "\n\n".join(part for part in (f"![]({image_url})", caption, footnote) if part)
+            return text, {"type": "figure", "caption": caption or None, "image_url": image_url}
+        
+        if block_type == "table":
+            caption = PaperParser._joined(block, "table_caption")
+            footnote = PaperParser._joined(block, "table_footnote")
+            body = PaperParser._joined(block, "table_body")
+            if not body and image_url:
+                body = f"![]({image_url})"
+            if not body:
+                return "", None
+            text = "\n\n".join(part for part in (caption, body, footnote) if part)
+            return text, {
+                "type": "table",
+                "caption": caption or None,
+                "image_url": image_url,
+                "content": PaperParser._joined(block, "table_body") or None,
+            }
+        
+        if block_type == "list":
+            return PaperParser._joined(block, "list_items", "text"), None
+        
+        if block_type == "code":
+            return PaperParser._joined(block, "code_body", "text"), None
+        
+        return PaperParser._joined(block, "text"), None
+    
+    @staticmethod
+    def parse_content_list(paper_id: str, content_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        单次遍历 MinerU 的 content_list.json，生成 Markdown、章节和图表公式
+        
+        块已按阅读顺序排列，text_level 不为 0 的文本块开始新章节；
+        章节正文是生成的 Markdown 的子串（记录 start / end 偏移），图片直接使用 API 路径
+        
+        Args:
+            paper_id: 论文ID
+            content_list: MinerU 结果中的内容列表
+            
+        Returns:
+            {"markdown", "sections", "elements"}；章节带起止页码，图表公式带页码和所在章节
+        """
+        parts: List[str] = []
+        length = 0  # 已生成的 Markdown 长度（各块之间以空行分隔）
+        sections: List[Dict[str, Any]] = []
+        elements: List[Dict[str, Any]] = []
+        element_counts: Counter = Counter()
+        current = None
+        
+        def append(text: str) -> Tuple[int, int]:
+            """追加一个块，返回它在 Markdown 中的 [start, end) 偏移"""
+            nonlocal length
+            start = length + 2 if parts else 0
+            parts.append(text)
+            length = start + len(text)
+            return start, length
         
-        for i, line in enumerate(lines):
-            match = re.match(header_pattern, line)
+        for block in content_list:
+            if not isinstance(block, dict):
+                continue
+            block_type = block.get("type") or "text"
+            if block_type in PaperParser.SKIPPED_BLOCK_TYPES:
+                continue
+            page_idx = block.get("page_idx")
+            page = page_idx + 1 if isinstance(page_idx, int) else None
             
-            if match:
-                # 保存上一个章节
-                if current_section:
-                    sections.append(current_section)
-                
-                # 开始新章节
-                level = len(match.group(1))
-                title = match.group(2).strip()
-                
-                current_section = {
-                    "section_id": f"section_{section_order}",
+            level = block.get("text_level") or 0
+            if block_type == "text" and level:
+                title = PaperParser._joined(block, "text")
+                if not title:
+                    continue
+                level = min(int(level), 6)
+                _, heading_end = append(f"{'#' * level} {title}")
+                current = {
+                    "section_id": f"section_{len(sections)}",
                     "title": title,
                     "level": level,
-                    "order": section_order,
-                    "content": "",
-                    "start_line": i
+                    "order": len(sections),
+                    "page_start": page,
+                    "page_end": page,
+                    "start": heading_end,
+                    "end": heading_end,
                 }
-                section_order += 1
+                sections.append(current)
+                continue
             
-            elif current_section:
-                # 添加内容到当前章节
-                current_section["content"] += line + "\n"
+            text, element = PaperParser._render_block(paper_id, block_type, block)
+            if not text:
+                continue
+            start, end = append(text)
+            if current is not None:
+                if current["end"] == current["start"]:
+                    current["start"] = start
+                current["end"] = end
+                if page is not None:
+                    current["page_start"] = current["page_start"] or page
+                    current["page_end"] = max(current["page_end"] or page, page)
+            if element is not None:
+                element_type = element["type"]
+                element["element_id"] = f"{element_type}_{element_counts[element_type]}"
+                element["page"] = page
+                element["section_id"] = current["section_id"] if current is not None else None
+                element_counts[element_type] += 1
+                elements.append(element)
         
-        # 保存最后一个章节
-        if current_section:
-            sections.append(current_section)
-        
-        # 清理内容
+        markdown_content = "\n\n".join(parts) + "\n"
         for section in sections:
-            section["content"] = section["content"].strip()
+            section["content"] = markdown_content[section["start"]:section["end"]]
+        return {
+            "markdown": markdown_content,
+            "sections": sections,
+            "elements": elements,
+        }
+    
+    @staticmethod
+    def prepare_markdown(paper_id: str, mineru_result: Dict[str, Any]) -> str:
+        """
+        从 MinerU 返回的结果中取出 Markdown 内容，并替换图片路径
         
-        return sections
+        Args:
+            paper_id: 论文ID
+            mineru_result: MinerU 返回的结果
+            
+        Returns:
+            Markdown 内容
+        """
+        if isinstance(mineru_result, str):
+            markdown_content = mineru_result
+        elif "content" in mineru_result:
+            markdown_content = mineru_result["content"]
+        else:
+            markdown_content = str(mineru_result)
+        
+        # 替换图片路径为 API 路径
+        return PaperParser.replace_image_paths(markdown_content, paper_id)
+    
+    @staticmethod
+    async def extract_metadata(markdown_content: str) -> Dict[str, Any]:
+        """
+        提取元数据：优先使用 LLM，失败时回退到正则方法
+        
+        Args:
+            markdown_content: Markdown 格式的论文内容
+            
+        Returns:
+            元数据字典
+        """
+        try:
+            metadata_dict = await PaperParser.extract_metadata_with_llm(markdown_content)
+            log.info("LLM 元数据提取成功")
+            return metadata_dict
+        except Exception as e:
+            log.warning(f"LLM 提取元数据失败，回退到正则方法: {e}")
+            return PaperParser._extract_metadata_regex(markdown_content)
+    
+    @staticmethod
+    def build_metadata(paper_id: str, metadata_dict: Dict[str, Any]) -> PaperMetadata:
+        """由元数据字典构建 PaperMetadata"""
+        return PaperMetadata(
+            paper_id=paper_id,
+            title=metadata_dict.get("title") or f"Paper {paper_id}",
+            authors=metadata_dict.get("authors"),
+            abstract=metadata_dict.get("abstract"),
+            keywords=metadata_dict.get("keywords"),
+            created_at=datetime.now()
+        )
+    
+    @staticmethod
+    def build_structure(
+        paper_id: str,
+        markdown_content: str,
+        metadata_dict: Optional[Dict[str, Any]] = None,
+        content_list: Optional[List[Dict[str, Any]]] = None
+    ) -> PaperStructure:
+        """
+        提取章节并构建论文结构（不调用 LLM）
+        
+        有 MinerU 的结构化内容列表时直接由它生成章节、图表公式和页码，
+        全文也改用由内容列表生成的 Markdown；没有或其中没有标题时按 Markdown 标题提取章节
+        
+        Args:
+            paper_id: 论文ID
+            markdown_content: 已替换图片路径的 Markdown 内容
+            metadata_dict: 元数据字典，为空时使用正则方法快速提取
+            content_list: MinerU 结果中的 content_list.json
+            
+        Returns:
+            PaperStructure 对象
+        """
+        sections_data = None
+        elements_data: List[Dict[str, Any]] = []
+        if content_list:
+            parsed = PaperParser.parse_content_list(paper_id, content_list)
+            if parsed["sections"]:
+                markdown_content = parsed["markdown"]
+                sections_data = parsed["sections"]
+                elements_data = parsed["elements"]
+        if sections_data is None:
+            sections_data = PaperParser.extract_sections(markdown_content)
+        
+        if metadata_dict is None:
+            metadata_dict = PaperParser._extract_metadata_regex(markdown_content)
+        
+        sections = [
+            PaperSection(
+                section_id=s["section_id"],
+                title=s["title"],
+                content=s["content"],
+                level=s["level"],
+                order=s["order"],
+                page_start=s.get("page_start"),
+                page_end=s.get("page_end"),
+                start=s["start"],
+                end=s["end"]
+            )
+            for s in sections_data
+        ]
+        
+        section_tree = PaperParser.build_section_tree(sections)
+        
+        return PaperStructure(
+            paper_id=paper_id,
+            metadata=PaperParser.build_metadata(paper_id, metadata_dict),
+            sections=sections,
+            full_content=markdown_content,
+            elements=[PaperElement(**e) for e in elements_data],
+            section_tree=section_tree
+        )
+    
+    @staticmethod
+    def structure_from_result(paper_id: str, mineru_result: Dict[str, Any]) -> PaperStructure:
+        """
+        由解析结果构建论文结构：替换图片路径、提取章节和章节树（纯计算，可在 CPU 进程池中执行）
+        
+        Args:
+            paper_id: 论文ID
+            mineru_result: MinerU 或本地解析返回的结果
+            
+        Returns:
+            PaperStructure 对象（元数据由正则提取）
+        """
+        markdown_content = PaperParser.prepare_markdown(paper_id, mineru_result)
+        content_list = mineru_result.get("content_list") if isinstance(mineru_result, dict) else None
+        # 结果带结构化内容列表时直接由它生成章节、页码和图表
+        return PaperParser.build_structure(paper_id, markdown_content, content_list=content_list)
     
     @staticmethod
     async def parse_result(paper_id: str, mineru_result: Dict[str, Any]) -> PaperStructure:
@@ -236,58 +612,17 @@ class PaperParser:
             PaperStructure 对象
         """
         try:
-            # 获取 Markdown 内容
-            if "content" in mineru_result:
-                markdown_content = mineru_result["content"]
-            elif isinstance(mineru_result, str):
-                markdown_content = mineru_result
-            else:
-                markdown_content = str(mineru_result)
-            
-            # 替换图片路径为 API 路径
-            markdown_content = PaperParser.replace_image_paths(markdown_content, paper_id)
+            paper_structure = await cpu_executor.run(PaperParser.structure_from_result, paper_id, mineru_result)
             
             # 使用 LLM 提取元数据，失败时回退到正则方法
-            try:
-                log.info(f"使用 LLM 提取论文元数据: {paper_id}")
-                metadata_dict = await PaperParser.extract_metadata_with_llm(markdown_content)
-                log.info(f"LLM 元数据提取成功: {paper_id}")
-            except Exception as e:
-                log.warning(f"LLM 提取元数据失败，回退到正则方法: {e}")
-                metadata_dict = PaperParser._extract_metadata_regex(markdown_content)
-            
-            metadata = PaperMetadata(
-                paper_id=paper_id,
-                title=metadata_dict.get("title") or f"Paper {paper_id}",
-                authors=metadata_dict.get("authors"),
-                abstract=metadata_dict.get("abstract"),
-                keywords=metadata_dict.get("keywords"),
-                created_at=datetime.now()
-            )
+            log.info(f"使用 LLM 提取论文元数据: {paper_id}")
+            metadata_dict = await PaperParser.extract_metadata(paper_structure.full_content)
+            paper_structure.metadata = PaperParser.build_metadata(paper_id, metadata_dict)
             
-            # 提取章节
-            sections_data = PaperParser.extract_sections(markdown_content)
-            
-            sections = [
-                PaperSection(
-                    section_id=s["section_id"],
-                    title=s["title"],
-                    content=s["content"],
-                    level=s["level"],
-                    order=s["order"]
-                )
-                for s in sections_data
-            ]
-            
-            # 构建完整结构
-            paper_structure = PaperStructure(
-                paper_id=paper_id,
-                metadata=metadata,
-                sections=sections,
-                full_content=markdown_content
+            log.info(
+                f"论文解析完成: {paper_id}, 标题: {paper_structure.metadata.title}, "
+                f"章节数: {len(paper_structure.sections)}"
             )
-            
-            log.info(f"论文解析完成: {paper_id}, 标题: {metadata.title}, 章节数: {len(sections)}")
             return paper_structure
             
         except Exception as e:
@@ -86,6 +86,10 @@ class RAGService:
         for i, result in enumerate(search_results, 1):
             text = result["text"]
             section = result["metadata"].get("section_title", "未知章节")
+            page_start = result["metadata"].get("page_start")
+            if page_start is not None:
+                page_end = result["metadata"].get("page_end") or page_start
+                section += f", 页码: {page_start}" if page_end == page_start else f", 页码: {page_start}-{page_end}"
             score = result["score"]
             
             context_parts.append(f"[片段 {i}] (章节: {section}, 相关度: {score:.3f})\n{text}\n")
@@ -183,8 +187,9 @@ class RAGService:
                 answer = "抱歉，我在论文中没有找到与您问题相关的内容。您可以尝试换一个问法或问其他问题。"
                 sources = []
             else:
-                # 2. 构建上下文
-                context = self._format_context(search_results)
+                # 2. 构建上下文（命中的小块在 token 预算内扩展为父块）
+                context_results = await vectorization_service.expand_to_parents(search_results)
+                context = self._format_context(context_results)
                 
                 # 3. 构建消息
                 messages = self._build_messages(
@@ -270,8 +275,9 @@ class RAGService:
                 yield "抱歉，我在论文中没有找到与您问题相关的内容。"
                 return
             
-            # 构建上下文和消息
-            context = self._format_context(search_results)
+            # 构建上下文和消息（命中的小块在 token 预算内扩展为父块）
+            context_results = await vectorization_service.expand_to_parents(search_results)
+            context = self._format_context(context_results)
             messages = self._build_messages(question, context, session.messages)
             
             # 流式生成
@@ -0,0 +1,399 @@
+"""
+基于 Redis Streams 的任务存储
+多个 API 进程和 worker 进程共享同一个 Redis 分发任务
+（论文目录和数据目录仍要求单机，见 app/worker.py）
+需要 Redis 6.2 及以上版本（使用 XAUTOCLAIM）
+"""
+import json
+import time
+from typing import Any, Dict, Iterable, Optional
+
+import redis
+from redis.exceptions import ResponseError, WatchError
+
+from app.config import settings
+from app.models.schemas import TaskStatus
+from app.services.job_queue import ACTIVE_STATUSES, BaseJobStore
+from app.utils.logger import log
+
+
+# Redis 命令和建立连接的超时（秒）
+SOCKET_TIMEOUT = 10.0
+
+
+class RedisJobStore(BaseJobStore):
+    """
+    基于 Redis 的任务存储
+
+    数据布局（均以 key_prefix 开头）：
+        job:{job_id}     任务记录（hash）
+        stream:{type}    每种任务类型一个 Stream，消息只携带 job_id，由消费组分发给 worker
+        delayed          等待重试的任务（zset，score 为 run_after）
+        leases           执行中任务的租约（zset，score 为 lease_expires_at）
+        finished         已结束的任务（zset，score 为 finished_at），用于过期清理
+
+    任务状态以 hash 为准，Stream 只负责分发：领取消息后检查任务仍为待执行才认领，
+    重复或过期的消息直接确认丢弃。
+
+    使用同步客户端（连接池线程安全），由 JobManager 在线程池中调用，不阻塞事件循环；
+    设置了 socket 超时，Redis 无响应时不会无限期占用线程池。
+    """
+
+    GROUP = "workers"
+
+    _INT_FIELDS = ("progress", "attempts", "max_attempts")
+    _FLOAT_FIELDS = ("run_after", "lease_expires_at", "created_at", "updated_at", "finished_at")
+    _JSON_FIELDS = ("payload", "stages", "result")
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        client: Optional[redis.Redis] = None,
+        key_prefix: str = "paperwhisperer:jobs",
+        claim_idle_seconds: Optional[int] = None
+    ):
+        """
+        Args:
+            url: Redis 连接地址，默认使用配置中的 REDIS_URL
+            client: 已创建的 Redis 客户端（需 decode_responses=True），优先于 url
+            key_prefix: 键名前缀
+            claim_idle_seconds: Stream 消息被领取后多久未确认视为领取者失联，默认与任务租约一致
+        """
+        self._redis = client or redis.Redis.from_url(
+            url or settings.redis_url,
+            decode_responses=True,
+            socket_timeout=SOCKET_TIMEOUT,
+            socket_connect_timeout=SOCKET_TIMEOUT
+        )
+        self.key_prefix = key_prefix
+        self.claim_idle_ms = int((claim_idle_seconds or settings.job_lease_seconds) * 1000)
+        self._groups_ready = set()
+
+    # ---- 键名 ----
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.key_prefix}:job:{job_id}"
+
+    def _stream_key(self, job_type: str) -> str:
+        return f"{self.key_prefix}:stream:{job_type}"
+
+    @property
+    def _delayed_key(self) -> str:
+        return f"{self.key_prefix}:delayed"
+
+    @property
+    def _leases_key(self) -> str:
+        return f"{self.key_prefix}:leases"
+
+    @property
+    def _finished_key(self) -> str:
+        return f"{self.key_prefix}:finished"
+
+    # ---- 序列化 ----
+
+    def _dump(self, fields: Dict[str, Any]) -> Dict[str, str]:
+        """任务字段转换为 hash 值（None 存为空字符串）"""
+        dumped = {}
+        for key, value in fields.items():
+            if key in self._JSON_FIELDS:
+                dumped[key] = "" if value is None else json.dumps(value, ensure_ascii=False, default=str)
+            elif isinstance(value, TaskStatus):
+                dumped[key] = value.value
+            else:
+                dumped[key] = "" if value is None else str(value)
+        return dumped
+
+    def _load(self, raw: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """hash 值转换为任务字典"""
+        if not raw:
+            return None
+        job: Dict[str, Any] = {key: (value if value != "" else None) for key, value in raw.items()}
+        for key in self._INT_FIELDS:
+            job[key] = int(job[key]) if job.get(key) is not None else 0
+        for key in self._FLOAT_FIELDS:
+            job[key] = float(job[key]) if job.get(key) is not None else None
+        for key in self._JSON_FIELDS:
+            job[key] = json.loads(job[key]) if job.get(key) is not None else None
+        job["stages"] = job["stages"] or {}
+        job["status"] = TaskStatus(job["status"])
+        return job
+
+    def _ensure_group(self, job_type: str):
+        """确保任务类型对应的 Stream 和消费组存在"""
+        if job_type in self._groups_ready:
+            return
+        try:
+            self._redis.xgroup_create(self._stream_key(job_type), self.GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._groups_ready.add(job_type)
+
+    # ---- 接口实现 ----
+
+    def create(self, job_id: str, job_type: str, payload: Dict[str, Any], max_attempts: int) -> Dict[str, Any]:
+        key = self._job_key(job_id)
+
+        def _create(pipe):
+            existing = self._load(pipe.hgetall(key))
+            if existing is not None and existing["status"] in ACTIVE_STATUSES:
+                return existing
+
+            now = time.time()
+            job = {
+                "job_id": job_id, "job_type": job_type, "payload": payload,
+                "status": TaskStatus.PENDING, "progress": 0, "stage": None, "stages": {},
+                "result": None, "error": None, "attempts": 0, "max_attempts": max_attempts,
+                "run_after": now, "lease_owner": None, "lease_expires_at": None,
+                "created_at": now, "updated_at": now, "finished_at": None
+            }
+            pipe.multi()
+            pipe.delete(key)
+            pipe.hset(key, mapping=self._dump(job))
+            pipe.zrem(self._finished_key, job_id)
+            pipe.zrem(self._delayed_key, job_id)
+            pipe.xadd(self._stream_key(job_type), {"job_id": job_id})
+            return job
+
+        return self._redis.transaction(_create, key, value_from_callable=True)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._load(self._redis.hgetall(self._job_key(job_id)))
+
+    def lease(self, job_types: Iterable[str], owner: str, lease_seconds: int) -> Optional[Dict[str, Any]]:
+        job_types = list(job_types)
+        if not job_types:
+            return None
+
+        self._promote_delayed()
+        self._requeue_expired(fail_exhausted=True)
+
+        for job_type in job_types:
+            self._ensure_group(job_type)
+            stream = self._stream_key(job_type)
+            while True:
+                message = self._read_message(stream, owner)
+                if message is None:
+                    break
+                message_id, fields = message
+                job = self._claim((fields or {}).get("job_id"), owner, lease_seconds)
+                # 认领完成后再确认消息，领取者在两步之间失联时消息会被其他 worker 接管
+                self._redis.xack(stream, self.GROUP, message_id)
+                self._redis.xdel(stream, message_id)
+                if job is not None:
+                    return job
+        return None
+
+    def _read_message(self, stream: str, consumer: str):
+        """读取一条消息：优先接管长时间未确认的消息，其次读取新消息"""
+        _, claimed, *_ = self._redis.xautoclaim(
+            stream, self.GROUP, consumer, min_idle_time=self.claim_idle_ms, start_id="0-0", count=1
+        )
+        if claimed:
+            return claimed[0]
+
+        response = self._redis.xreadgroup(self.GROUP, consumer, {stream: ">"}, count=1)
+        if response:
+            return response[0][1][0]
+        return None
+
+    def _claim(self, job_id: Optional[str], owner: str, lease_seconds: int) -> Optional[Dict[str, Any]]:
+        """认领待执行的任务，任务已被他人认领或已结束时返回 None"""
+        if not job_id:
+            return None
+        key = self._job_key(job_id)
+
+        def _do_claim(pipe):
+            job = self._load(pipe.hgetall(key))
+            now = time.time()
+            if job is None or job["status"] != TaskStatus.PENDING:
+                return None
+            if pipe.zscore(self._delayed_key, job_id) is not None:
+                # 等待重试的任务由 delayed 集合到期后重新入队，这里的消息是重复的
+                return None
+
+            pipe.multi()
+            if job["attempts"] >= job["max_attempts"]:
+                # 执行者多次中途失联，不再继续尝试
+                self._mark_finished(pipe, job_id, now, status=TaskStatus.FAILED, error="任务执行中断次数超过上限")
+                return None
+
+            job.update(
+                status=TaskStatus.PROCESSING,
+                attempts=job["attempts"] + 1,
+                lease_owner=owner,
+                lease_expires_at=now + lease_seconds,
+                updated_at=now
+            )
+            pipe.hset(key, mapping=self._dump({
+                field: job[field]
+                for field in ("status", "attempts", "lease_owner", "lease_expires_at", "updated_at")
+            }))
+            pipe.zadd(self._leases_key, {job_id: job["lease_expires_at"]})
+            return job
+
+        return self._redis.transaction(_do_claim, key, value_from_callable=True)
+
+    def _mark_finished(self, pipe, job_id: str, now: float, status: TaskStatus, **fields):
+        """在事务中把任务标记为已结束"""
+        fields.update(status=status, lease_owner=None, lease_expires_at=None, updated_at=now, finished_at=now)
+        pipe.hset(self._job_key(job_id), mapping=self._dump(fields))
+        pipe.zrem(self._leases_key, job_id)
+        pipe.zadd(self._finished_key, {job_id: now})
+
+    def _promote_delayed(self) -> int:
+        """把已到重试时间的任务放回 Stream（移出 delayed 和写入 Stream 在同一个事务中完成）"""
+        now = time.time()
+        promoted = 0
+        for job_id in self._redis.zrangebyscore(self._delayed_key, "-inf", now):
+            key = self._job_key(job_id)
+
+            def _promote(pipe):
+                # 其他 worker 已入队或任务已被重新安排时跳过，避免重复入队
+                score = pipe.zscore(self._delayed_key, job_id)
+                if score is None or score > now:
+                    return False
+                job_type = pipe.hget(key, "job_type")
+                pipe.multi()
+                pipe.zrem(self._delayed_key, job_id)
+                if not job_type:
+                    return False
+                pipe.xadd(self._stream_key(job_type), {"job_id": job_id})
+                return True
+
+            if self._redis.transaction(_promote, self._delayed_key, key, value_from_callable=True):
+                promoted += 1
+        return promoted
+
+    def _requeue_expired(self, fail_exhausted: bool = False) -> int:
+        """把租约已过期的执行中任务重新置为待执行并放回 Stream"""
+        now = time.time()
+        requeued = 0
+        for job_id in self._redis.zrangebyscore(self._leases_key, "-inf", now):
+            key = self._job_key(job_id)
+
+            def _do_requeue(pipe):
+                job = self._load(pipe.hgetall(key))
+                pipe.multi()
+                if job is None or job["status"] != TaskStatus.PROCESSING:
+                    pipe.zrem(self._leases_key, job_id)
+                    return False
+                if (job["lease_expires_at"] or 0) >= now:
+                    # 已被续租
+                    return False
+                if fail_exhausted and job["attempts"] >= job["max_attempts"]:
+                    self._mark_finished(pipe, job_id, now, status=TaskStatus.FAILED, error="任务执行中断次数超过上限")
+                    return False
+                pipe.hset(key, mapping=self._dump({
+                    "status": TaskStatus.PENDING, "run_after": now,
+                    "lease_owner": None, "lease_expires_at": None, "updated_at": now
+                }))
+                pipe.zrem(self._leases_key, job_id)
+                pipe.xadd(self._stream_key(job["job_type"]), {"job_id": job_id})
+                return True
+
+            try:
+                if self._redis.transaction(_do_requeue, key, value_from_callable=True):
+                    requeued += 1
+            except WatchError:
+                continue
+        return requeued
+
+    def renew_lease(self, job_id: str, owner: str, lease_seconds: int) -> bool:
+        key = self._job_key(job_id)
+
+        def _renew(pipe):
+            status, lease_owner = pipe.hmget(key, "status", "lease_owner")
+            if status != TaskStatus.PROCESSING.value or lease_owner != owner:
+                return False
+            now = time.time()
+            pipe.multi()
+            pipe.hset(key, mapping={"lease_expires_at": str(now + lease_seconds), "updated_at": str(now)})
+            pipe.zadd(self._leases_key, {job_id: now + lease_seconds})
+            return True
+
+        return self._redis.transaction(_renew, key, value_from_callable=True)
+
+    def update(self, job_id: str, **fields) -> None:
+        allowed = {"progress", "stage", "stages"}
+        unknown = set(fields) - allowed
+        if unknown:
+            raise ValueError(f"不支持更新的字段: {unknown}")
+        if not fields:
+            return
+
+        key = self._job_key(job_id)
+        if not self._redis.exists(key):
+            return
+        self._redis.hset(key, mapping=self._dump({**fields, "updated_at": time.time()}))
+
+    def _finish(self, job_id: str, owner: Optional[str], write) -> bool:
+        """在事务中写入结束状态；指定 owner 时要求其仍持有租约"""
+        key = self._job_key(job_id)
+
+        def _write(pipe):
+            if owner is not None and pipe.hget(key, "lease_owner") != owner:
+                return False
+            pipe.multi()
+            write(pipe)
+            return True
+
+        return self._redis.transaction(_write, key, value_from_callable=True)
+
+    def complete(self, job_id: str, result: Optional[Dict[str, Any]] = None, owner: Optional[str] = None) -> bool:
+        return self._finish(job_id, owner, lambda pipe: self._mark_finished(
+            pipe, job_id, time.time(), status=TaskStatus.COMPLETED, progress=100, result=result or {}, error=None
+        ))
+
+    def fail(self, job_id: str, error: str, retry_at: Optional[float] = None, owner: Optional[str] = None) -> bool:
+        def _write(pipe):
+            now = time.time()
+            if retry_at is None:
+                self._mark_finished(pipe, job_id, now, status=TaskStatus.FAILED, error=error)
+                return
+            pipe.hset(self._job_key(job_id), mapping=self._dump({
+                "status": TaskStatus.PENDING, "error": error, "run_after": retry_at,
+                "lease_owner": None, "lease_expires_at": None, "updated_at": now
+            }))
+            pipe.zrem(self._leases_key, job_id)
+            pipe.zadd(self._delayed_key, {job_id: retry_at})
+
+        return self._finish(job_id, owner, _write)
+
+    def release(self, job_id: str, owner: str) -> None:
+        key = self._job_key(job_id)
+
+        def _release(pipe):
+            job = self._load(pipe.hgetall(key))
+            if job is None or job["status"] != TaskStatus.PROCESSING or job["lease_owner"] != owner:
+                return
+            now = time.time()
+            pipe.multi()
+            pipe.hset(key, mapping=self._dump({
+                "status": TaskStatus.PENDING, "attempts": max(job["attempts"] - 1, 0), "run_after": now,
+                "lease_owner": None, "lease_expires_at": None, "updated_at": now
+            }))
+            pipe.zrem(self._leases_key, job_id)
+            pipe.xadd(self._stream_key(job["job_type"]), {"job_id": job_id})
+
+        self._redis.transaction(_release, key)
+
+    def recover_expired(self) -> int:
+        return self._requeue_expired()
+
+    def purge_finished(self, older_than: float) -> int:
+        job_ids = self._redis.zrangebyscore(self._finished_key, "-inf", f"({older_than}")
+        if not job_ids:
+            return 0
+        pipe = self._redis.pipeline()
+        for job_id in job_ids:
+            pipe.delete(self._job_key(job_id))
+        pipe.zrem(self._finished_key, *job_ids)
+        pipe.execute()
+        return len(job_ids)
+
+    def close(self) -> None:
+        try:
+            self._redis.close()
+        except Exception as e:
+            log.warning(f"关闭 Redis 连接失败: {e}")
@@ -2,7 +2,8 @@
 文本处理服务
 包括文本分块、清洗等功能
 """
-from typing import List, Dict, Any, Optional
+from bisect import bisect_left, bisect_right
+from typing import Callable, List, Optional, Tuple
 import tiktoken
 import re
 
@@ -11,6 +12,85 @@ from app.utils.logger import log
 from app.models.schemas import PaperStructure, TextChunk
 
 
+# 句末标点（长段落按句子分割）
+SENTENCE_END_PATTERN = re.compile(r'[。！？.!?]+')
+# 近似计数时按 1 字 1 token 计算的中文字符
+CJK_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+
+
+def _strip_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    """去掉 text[start:end] 首尾空白后的区间（与 str.strip() 一致，只移动偏移）"""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _paragraph_spans(text: str) -> List[Tuple[int, int]]:
+    """与 text.split('\n\n') 后逐段 strip 相同的非空段落区间"""
+    spans = []
+    pos = 0
+    while pos <= len(text):
+        end = text.find('\n\n', pos)
+        if end < 0:
+            end = len(text)
+        start, stripped_end = _strip_span(text, pos, end)
+        if start < stripped_end:
+            spans.append((start, stripped_end))
+        pos = end + 2
+    return spans
+
+
+def _join_spans(text: str, spans: List[Tuple[int, int, int]]) -> str:
+    return '\n\n'.join(text[start:end] for start, end, _ in spans)
+
+
+def _span_chunk(text: str, spans: List[Tuple[int, int, int]]) -> Tuple[int, int, str]:
+    return spans[0][0], spans[-1][1], _join_spans(text, spans)
+
+
+class _OffsetTokenCounter:
+    """
+    整段文本只编码一次，用 token 的起始字符位置统计区间内的 token 数
+
+    与区间有重叠的 token 都计入（如区间前的空格与首个单词合成的 token），
+    接近把区间单独编码得到的数量
+    """
+    
+    def __init__(self, text: str, encoding):
+        _, self.starts = encoding.decode_with_offsets(encoding.encode(text))
+    
+    def count(self, start: int, end: int) -> int:
+        if start >= end:
+            return 0
+        # 包含 start 位置字符的 token，到第一个从 end 及之后开始的 token 之前
+        first = max(0, bisect_right(self.starts, start) - 1)
+        return bisect_left(self.starts, end) - first
+
+
+class _ApproxTokenCounter:
+    """未加载 tokenizer 时的近似计数（中文约1字1token，其他约4字1token），按中文字符位置二分统计"""
+    
+    def __init__(self, text: str):
+        self.cjk_positions = [match.start() for match in CJK_PATTERN.finditer(text)]
+    
+    def count(self, start: int, end: int) -> int:
+        chinese_chars = bisect_left(self.cjk_positions, end) - bisect_left(self.cjk_positions, start)
+        return chinese_chars + (end - start - chinese_chars) // 4
+
+
+class _ExactTokenCounter:
+    """兼容模式：每个区间单独编码计数"""
+    
+    def __init__(self, text: str, count_tokens: Callable[[str], int]):
+        self.text = text
+        self.count_tokens = count_tokens
+    
+    def count(self, start: int, end: int) -> int:
+        return self.count_tokens(self.text[start:end])
+
+
 class TextProcessor:
     """文本处理器"""
     
@@ -68,6 +148,14 @@ class TextProcessor:
         
         return text
     
+    def _token_counter(self, text: str):
+        """创建统计 text 任意区间 token 数的计数器"""
+        if settings.chunk_exact_token_counts:
+            return _ExactTokenCounter(text, self.count_tokens)
+        if self.encoding:
+            return _OffsetTokenCounter(text, self.encoding)
+        return _ApproxTokenCounter(text)
+    
     def split_text_by_tokens(
         self,
         text: str,
@@ -77,6 +165,10 @@ class TextProcessor:
         """
         按 token 数量分割文本
         
+        整段文本只编码一次，段落、句子和重叠部分的 token 数都按区间从 token 偏移表中得到，
+        只在输出块时才拼接字符串。CHUNK_EXACT_TOKEN_COUNTS 开启时每个区间单独编码计数，
+        分块边界与逐段编码的旧实现完全一致
+        
         Args:
             text: 输入文本
             chunk_size: 块大小（tokens）
@@ -85,135 +177,140 @@ class TextProcessor:
         Returns:
             文本块列表
         """
+        return [chunk for _, _, chunk in self.split_text_with_offsets(text, chunk_size, chunk_overlap)]
+    
+    def split_text_with_offsets(
+        self,
+        text: str,
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None
+    ) -> List[Tuple[int, int, str]]:
+        """
+        按 token 数量分割文本，同时返回每块在 text 中的区间
+        
+        Returns:
+            [(起点, 终点, 块文本)]；text[起点:终点] 包含块中的全部段落（段落间保留原始分隔）
+        """
         chunk_size = chunk_size or self.chunk_size
-        chunk_overlap = chunk_overlap or self.chunk_overlap
+        chunk_overlap = self.chunk_overlap if chunk_overlap is None else chunk_overlap
         
         if not text:
             return []
         
-        # 按段落分割
-        paragraphs = text.split('\n\n')
+        counter = self._token_counter(text)
         
-        chunks = []
-        current_chunk = []
+        chunks: List[Tuple[int, int, str]] = []
+        # 当前块中的段落：(起点, 终点, token 数)
+        current_chunk: List[Tuple[int, int, int]] = []
         current_tokens = 0
         
-        for para in paragraphs:
-            para = para.strip()
-            if not para:
-                continue
-            
-            para_tokens = self.count_tokens(para)
+        # 按段落分割
+        for start, end in _paragraph_spans(text):
+            para_tokens = counter.count(start, end)
             
             # 如果单个段落超过 chunk_size，需要进一步分割
             if para_tokens > chunk_size:
                 # 保存当前 chunk
                 if current_chunk:
-                    chunks.append('\n\n'.join(current_chunk))
+                    chunks.append(_span_chunk(text, current_chunk))
                     current_chunk = []
                     current_tokens = 0
                 
                 # 分割长段落
-                sub_chunks = self._split_long_paragraph(para, chunk_size)
-                chunks.extend(sub_chunks)
+                chunks.extend(
+                    (s, e, text[s:e]) for s, e in self._split_long_paragraph(text, start, end, chunk_size, counter)
+                )
                 continue
             
             # 检查是否超过 chunk_size
             if current_tokens + para_tokens > chunk_size and current_chunk:
                 # 保存当前 chunk
-                chunks.append('\n\n'.join(current_chunk))
+                chunks.append(_span_chunk(text, current_chunk))
                 
                 # 保留 overlap
-                overlap_chunk = self._get_overlap_text(current_chunk, chunk_overlap)
-                current_chunk = overlap_chunk
-                current_tokens = sum(self.count_tokens(p) for p in current_chunk)
+                current_chunk = self._get_overlap_spans(current_chunk, chunk_overlap)
+                current_tokens = sum(tokens for _, _, tokens in current_chunk)
             
             # 添加段落
-            current_chunk.append(para)
+            current_chunk.append((start, end, para_tokens))
             current_tokens += para_tokens
         
         # 保存最后一个 chunk
         if current_chunk:
-            chunks.append('\n\n'.join(current_chunk))
+            chunks.append(_span_chunk(text, current_chunk))
         
-        log.debug(f"文本分块完成: 总 tokens={self.count_tokens(text)}, 块数={len(chunks)}")
+        log.debug(f"文本分块完成: 总 tokens={counter.count(0, len(text))}, 块数={len(chunks)}")
         return chunks
     
-    def _split_long_paragraph(self, paragraph: str, chunk_size: int) -> List[str]:
-        """分割长段落"""
-        # 按句子分割（简单实现）
-        sentences = re.split(r'([。！？.!?]+)', paragraph)
-        
+    def _split_long_paragraph(self, text: str, start: int, end: int, chunk_size: int, counter) -> List[Tuple[int, int]]:
+        """按句子分割 text[start:end] 中的长段落（当前块始终是连续的句子区间），返回去掉首尾空白的区间"""
         chunks = []
-        current_chunk = ""
+        chunk_start: Optional[int] = None
+        chunk_end = start
         
-        for i in range(0, len(sentences), 2):
-            sentence = sentences[i]
-            if i + 1 < len(sentences):
-                sentence += sentences[i + 1]  # 加上标点
-            
-            if not sentence.strip():
+        # 句子以标点结尾，最后一句可能没有标点
+        boundaries = [match.end() for match in SENTENCE_END_PATTERN.finditer(text, start, end)]
+        boundaries.append(end)
+        sentence_start = start
+        
+        for sentence_end in boundaries:
+            s, e = sentence_start, sentence_end
+            sentence_start = sentence_end
+            if _strip_span(text, s, e)[0] == e:
                 continue
             
-            sentence_tokens = self.count_tokens(sentence)
-            current_tokens = self.count_tokens(current_chunk)
+            sentence_tokens = counter.count(s, e)
+            current_tokens = counter.count(chunk_start, chunk_end) if chunk_start is not None else 0
             
-            if current_tokens + sentence_tokens > chunk_size and current_chunk:
-                chunks.append(current_chunk.strip())
-                current_chunk = sentence
+            if current_tokens + sentence_tokens > chunk_size and chunk_start is not None:
+                chunks.append(_strip_span(text, chunk_start, chunk_end))
+                chunk_start, chunk_end = s, e
             else:
-                current_chunk += sentence
+                if chunk_start is None:
+                    chunk_start = s
+                chunk_end = e
         
-        if current_chunk.strip():
-            chunks.append(current_chunk.strip())
+        if chunk_start is not None and _strip_span(text, chunk_start, chunk_end)[0] < chunk_end:
+            chunks.append(_strip_span(text, chunk_start, chunk_end))
         
         return chunks
     
-    def _get_overlap_text(self, chunks: List[str], overlap_tokens: int) -> List[str]:
-        """获取重叠文本"""
+    @staticmethod
+    def _get_overlap_spans(spans: List[Tuple[int, int, int]], overlap_tokens: int) -> List[Tuple[int, int, int]]:
+        """从末尾取不超过 overlap_tokens 的段落作为下一块的开头（使用已计算的 token 数）"""
         overlap_chunk = []
         tokens = 0
         
-        for chunk in reversed(chunks):
-            chunk_tokens = self.count_tokens(chunk)
-            if tokens + chunk_tokens <= overlap_tokens:
-                overlap_chunk.insert(0, chunk)
-                tokens += chunk_tokens
+        for span in reversed(spans):
+            if tokens + span[2] <= overlap_tokens:
+                overlap_chunk.insert(0, span)
+                tokens += span[2]
             else:
                 break
         
         return overlap_chunk
     
-    def _build_section_hierarchy(self, sections) -> List[Dict[str, Any]]:
+    def _section_chunks(self, text: str) -> List[Tuple[str, Optional[Tuple[int, int]]]]:
         """
-        构建章节层级结构
+        分割清洗后的章节正文
         
-        Args:
-            sections: 论文章节列表
-            
-        Returns:
-            章节层级结构列表
-        """
-        hierarchy = []
-        for section in sections:
-            hierarchy.append({
-                "title": section.title,
-                "level": section.level,
-                "section_id": section.section_id
-            })
-        return hierarchy
-    
-    def _get_section_titles(self, sections) -> List[str]:
-        """
-        获取所有章节标题列表
+        CHUNK_CHILD_SIZE 大于 0 时先按 CHUNK_SIZE 分出不重叠的父块，再把每个父块切分为小块，
+        小块用于 Embedding 匹配，父块只记录区间（问答时按区间从章节正文中取出）；
+        否则按 CHUNK_SIZE 分块，不记录父块
         
-        Args:
-            sections: 论文章节列表
-            
         Returns:
-            章节标题列表
+            [(块文本, 父块区间或 None)]
         """
-        return [section.title for section in sections]
+        child_size = settings.chunk_child_size
+        if child_size <= 0 or child_size >= self.chunk_size:
+            return [(chunk, None) for chunk in self.split_text_by_tokens(text)]
+        
+        # 父块之间不重叠，相邻父块在问答时合并
+        chunks = []
+        for start, end, parent_text in self.split_text_with_offsets(text, self.chunk_size, 0):
+            for child in self.split_text_by_tokens(parent_text, child_size, 0):
+                chunks.append((child, (start, end)))
+        return chunks
     
     def create_chunks_from_paper(
         self,
@@ -233,10 +330,6 @@ class TextProcessor:
         chunks = []
         chunk_id = 0
         
-        # 预先构建章节标题列表和层级结构（用于 Agent 意图识别）
-        section_titles = self._get_section_titles(paper.sections) if paper.sections else []
-        section_hierarchy = self._build_section_hierarchy(paper.sections) if paper.sections else []
-        
         if preserve_sections and paper.sections:
             # 按章节分块
             for section in paper.sections:
@@ -246,23 +339,24 @@ class TextProcessor:
                 if not cleaned_text:
                     continue
                 
-                # 分割章节内容
-                section_chunks = self.split_text_by_tokens(cleaned_text)
+                # 分割章节内容：(文本, 父块区间)
+                section_chunks = self._section_chunks(cleaned_text)
                 
-                for chunk_text in section_chunks:
+                for chunk_text, parent in section_chunks:
+                    # 只保存章节引用；标题、层级、页码随论文的章节列表保存一份，检索时再关联
+                    metadata = {
+                        "section_id": section.section_id,
+                        "section_path": section.path,
+                        "chunk_index": chunk_id
+                    }
+                    if parent is not None:
+                        # 父块在清洗后章节正文中的区间，检索命中后扩展为父块
+                        metadata["parent_start"], metadata["parent_end"] = parent
                     chunk = TextChunk(
                         chunk_id=f"{paper.paper_id}_chunk_{chunk_id}",
                         paper_id=paper.paper_id,
                         text=chunk_text,
-                        metadata={
-                            "section_title": section.title,
-                            "section_id": section.section_id,
-                            "section_level": section.level,
-                            "chunk_index": chunk_id,
-                            # 新增：完整章节标题列表和层级结构
-                            "section_titles": section_titles,
-                            "section_hierarchy": section_hierarchy
-                        }
+                        metadata=metadata
                     )
                     chunks.append(chunk)
                     chunk_id += 1
@@ -276,12 +370,7 @@ class TextProcessor:
                     chunk_id=f"{paper.paper_id}_chunk_{i}",
                     paper_id=paper.paper_id,
                     text=chunk_text,
-                    metadata={
-                        "chunk_index": i,
-                        # 新增：完整章节标题列表和层级结构
-                        "section_titles": section_titles,
-                        "section_hierarchy": section_hierarchy
-                    }
+                    metadata={"chunk_index": i}
                 )
                 chunks.append(chunk)
         
@@ -292,3 +381,13 @@ class TextProcessor:
 # 全局处理器实例
 text_processor = TextProcessor()
 
+
+def chunk_paper(paper: PaperStructure, preserve_sections: bool = True) -> List[TextChunk]:
+    """使用全局处理器分块（模块级函数，供 CPU 进程池调用，子进程复用已加载的 tokenizer）"""
+    return text_processor.create_chunks_from_paper(paper, preserve_sections=preserve_sections)
+
+
+def count_batch_tokens(batches: List[List[str]]) -> List[int]:
+    """各批次文本的 token 总数（模块级函数，供 CPU 进程池调用）"""
+    return [sum(text_processor.count_tokens(text) for text in batch) for batch in batches]
+
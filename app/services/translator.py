@@ -2,7 +2,7 @@
 论文翻译服务
 提供高质量的学术论文翻译
 """
-from typing import List, Dict, Optional, Tuple
+from typing import Awaitable, Callable, List, Dict, Optional, Tuple
 import asyncio
 
 from app.models.schemas import PaperStructure, PaperSection, TranslationSegment, TranslationResult, TaskStatus
@@ -10,6 +10,9 @@ from app.services.llm_factory import llm_factory
 from app.utils.logger import log
 from datetime import datetime
 
+# 翻译进度回调：参数为 (已完成章节数, 章节总数)
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
 
 class TranslationService:
     """翻译服务"""
@@ -234,7 +237,8 @@ class TranslationService:
         source_lang: str = "英文",
         target_lang: str = "中文",
         provider: Optional[str] = None,
-        translate_by_section: bool = True
+        translate_by_section: bool = True,
+        progress_callback: Optional[ProgressCallback] = None
     ) -> TranslationResult:
         """
         翻译整篇论文（并行执行）
@@ -245,6 +249,7 @@ class TranslationService:
             target_lang: 目标语言
             provider: LLM 提供商
             translate_by_section: 是否按章节翻译
+            progress_callback: 每完成一个章节调用一次，参数为 (已完成章节数, 章节总数)
             
         Returns:
             翻译结果
@@ -270,6 +275,13 @@ class TranslationService:
                 
                 # 使用信号量限制并发数
                 semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_TRANSLATIONS)
+                done_count = 0
+                
+                async def report_progress():
+                    nonlocal done_count
+                    done_count += 1
+                    if progress_callback:
+                        await progress_callback(done_count, len(sections_to_translate))
                 
                 async def translate_with_limit(idx: int, section: PaperSection) -> Tuple[int, List[TranslationSegment]]:
                     """带并发限制的翻译任务"""
@@ -283,9 +295,11 @@ class TranslationService:
                                 provider
                             )
                             log.info(f"完成翻译章节 {idx+1}/{len(sections_to_translate)}: {section.title}")
+                            await report_progress()
                             return (idx, result)
                         except Exception as e:
                             log.error(f"章节翻译失败 {section.title}: {e}")
+                            await report_progress()
                             # 返回空列表，继续其他翻译
                             return (idx, [])
                 
@@ -2,14 +2,24 @@
 向量化服务
 将论文文本块向量化并存储到 Milvus
 """
-from typing import List, Optional
+import asyncio
+from contextlib import aclosing
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
-from app.models.schemas import PaperStructure, TextChunk
-from app.services.text_processor import text_processor
+from app.config import settings
+from app.models.schemas import PaperStructure
+from app.services.text_processor import chunk_paper, text_processor
 from app.services.embedding_service import create_embedding_service
 from app.services.milvus_service import milvus_service
+from app.services.ingest_limits import ingest_limits
+from app.utils.file_manager import FileManager
 from app.utils.logger import log
-from app.utils.async_helper import TaskQueue
+from app.utils.async_helper import gather_or_cancel
+from app.utils.cpu_executor import cpu_executor
+
+
+# 向量化进度回调：(已存储块数, 总块数)
+ProgressCallback = Callable[[int, int], Awaitable[None]]
 
 
 class VectorizationService:
@@ -19,23 +29,36 @@ class VectorizationService:
         self,
         paper: PaperStructure,
         embedding_provider: Optional[str] = None,
-        embedding_model: Optional[str] = None
+        embedding_model: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+        replace_existing: bool = False
     ) -> int:
         """
         向量化论文并存储到 Milvus
         
+        Embedding 按批生成，每批完成后立即写入 Milvus（不单独 flush），
+        写入与下一批 Embedding 请求并行进行，全部写入后统一 flush 一次。
+        中途失败时删除本次已写入的数据，避免重试后出现重复的文本块。
+        
+        replace_existing 为 True 时先记下论文已有文本块的主键，新文本块全部写入后再删除旧的，
+        替换过程中检索始终能查到论文的内容；失败时旧文本块保持不变。
+        
         Args:
             paper: 论文结构
             embedding_provider: Embedding 提供商
             embedding_model: Embedding 模型
+            batch_size: 每批 Embedding 的文本数，默认使用配置
+            progress_callback: 每批写入后调用 progress_callback(已存储数, 总块数)
+            replace_existing: 是否替换论文已有的文本块（如预览阶段写入的文本块）
             
         Returns:
             存储的块数量
         """
         log.info(f"开始向量化论文: {paper.paper_id}")
         
-        # 1. 文本分块
-        chunks = text_processor.create_chunks_from_paper(paper, preserve_sections=True)
+        # 1. 文本分块（清洗和 token 编码在 CPU 进程池中执行）
+        chunks = await cpu_executor.run(chunk_paper, paper, preserve_sections=True)
         
         if not chunks:
             log.warning(f"论文 {paper.paper_id} 没有可分块的内容")
@@ -52,28 +75,64 @@ class VectorizationService:
         # 3. 获取 Embedding 维度并初始化 Milvus collection
         dimension = embedding_service.get_dimension()
         await milvus_service.create_collection(dimension=dimension)
+        previous_ids = await milvus_service.get_ids_by_paper_id(paper.paper_id) if replace_existing else []
         
-        # 4. 批量生成 Embeddings
-        texts = [chunk.text for chunk in chunks]
-        embeddings = await embedding_service.embed_batch(texts)
+        # 4. 分批生成 Embeddings 并流式写入 Milvus
+        batch_size = batch_size or settings.embedding_batch_size
+        # 最多缓存两批，Embedding 领先写入过多时让生产者等待
+        queue: asyncio.Queue = asyncio.Queue(maxsize=2)
+        inserted_ids: List[int] = []
         
-        log.info(f"Embedding 生成完成: {len(embeddings)} 个向量")
+        async def produce():
+            # 各批次并发请求 Embedding（并发数、速率和 TPM 由 EmbeddingScheduler 控制），按顺序写入
+            texts = [chunk.text for chunk in chunks]
+            async with aclosing(embedding_service.embed_batches(texts, batch_size=batch_size)) as batches:
+                start = 0
+                async for embeddings in batches:
+                    await queue.put((chunks[start:start + batch_size], embeddings))
+                    start += batch_size
+            await queue.put(None)
         
-        # 5. 准备数据并插入 Milvus
-        chunk_ids = [chunk.chunk_id for chunk in chunks]
-        paper_ids = [chunk.paper_id for chunk in chunks]
-        metadatas = [chunk.metadata for chunk in chunks]
+        async def consume() -> int:
+            stored = 0
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return stored
+                batch, embeddings = item
+                async with ingest_limits.index.slot():
+                    primary_keys = await milvus_service.insert_chunks(
+                        chunk_ids=[chunk.chunk_id for chunk in batch],
+                        paper_ids=[chunk.paper_id for chunk in batch],
+                        texts=[chunk.text for chunk in batch],
+                        embeddings=embeddings,
+                        metadatas=[chunk.metadata for chunk in batch],
+                        flush=False,
+                        section_paths=[chunk.metadata.get("section_path") for chunk in batch]
+                    )
+                inserted_ids.extend(primary_keys or [])
+                stored += len(batch)
+                if progress_callback:
+                    await progress_callback(stored, len(chunks))
         
-        await milvus_service.insert_chunks(
-            chunk_ids=chunk_ids,
-            paper_ids=paper_ids,
-            texts=texts,
-            embeddings=embeddings,
-            metadatas=metadatas
-        )
+        try:
+            _, stored = await gather_or_cancel(produce(), consume())
+            await milvus_service.flush()
+        except BaseException:
+            if inserted_ids:
+                log.warning(f"论文 {paper.paper_id} 向量化中断，回滚已写入的 {len(inserted_ids)} 个块")
+                try:
+                    await milvus_service.delete_by_ids(inserted_ids)
+                except Exception as e:
+                    log.error(f"回滚已写入的文本块失败: {e}")
+            raise
         
-        log.info(f"论文 {paper.paper_id} 向量化完成: 共存储 {len(chunks)} 个块")
-        return len(chunks)
+        if previous_ids:
+            await milvus_service.delete_by_ids(previous_ids)
+            log.info(f"论文 {paper.paper_id} 已替换旧的 {len(previous_ids)} 个块")
+        
+        log.info(f"论文 {paper.paper_id} 向量化完成: 共存储 {stored} 个块")
+        return stored
     
     async def delete_paper_vectors(self, paper_id: str) -> int:
         """
@@ -105,7 +164,7 @@ class VectorizationService:
             query_text: 查询文本
             paper_id: 可选的论文ID限制
             top_k: 返回结果数量
-            section_filter: 可选的章节标题过滤列表
+            section_filter: 可选的章节标题过滤列表，匹配的章节及其所有子章节优先
             embedding_provider: Embedding 提供商
             embedding_model: Embedding 模型
             
@@ -120,45 +179,218 @@ class VectorizationService:
         
         query_embedding = await embedding_service.embed_text(query_text)
         
-        # 搜索相似向量（增加 top_k 以便后续过滤）
-        search_top_k = top_k * 2 if section_filter else top_k
+        section_paths = None
+        if section_filter and paper_id:
+            section_paths = await self._resolve_section_paths(paper_id, section_filter)
         
-        results = await milvus_service.search(
-            query_embedding=query_embedding,
-            top_k=search_top_k,
-            paper_id=paper_id
-        )
-        
-        # 如果有章节过滤，进行后处理过滤
-        if section_filter and results:
-            filtered_results = []
-            section_filter_lower = [s.lower() for s in section_filter]
-            
-            for result in results:
-                section_title = result.get("metadata", {}).get("section_title", "").lower()
-                # 模糊匹配：检查章节标题是否包含过滤词
-                if any(filter_term in section_title or section_title in filter_term 
-                       for filter_term in section_filter_lower):
-                    filtered_results.append(result)
-                
-                if len(filtered_results) >= top_k:
-                    break
-            
-            # 如果过滤后结果太少，补充未过滤的结果
-            if len(filtered_results) < top_k:
-                for result in results:
-                    if result not in filtered_results:
-                        filtered_results.append(result)
-                        if len(filtered_results) >= top_k:
-                            break
-            
-            results = filtered_results[:top_k]
+        if section_paths and await milvus_service.supports_section_paths():
+            # 按章节路径前缀只检索目标章节及其子章节
+            results = await milvus_service.search(
+                query_embedding=query_embedding,
+                top_k=top_k,
+                paper_id=paper_id,
+                section_paths=section_paths
+            )
+            # 目标章节内结果太少时，补充全文检索结果
+            if len(results) < top_k:
+                seen = {result.get("chunk_id") for result in results}
+                extra = await milvus_service.search(
+                    query_embedding=query_embedding,
+                    top_k=top_k,
+                    paper_id=paper_id
+                )
+                results += [result for result in extra if result.get("chunk_id") not in seen]
+            results = results[:top_k]
+        elif section_filter:
+            # 旧版解析结果或 collection 没有章节路径：多取一些结果，再按章节标题模糊匹配
+            results = await milvus_service.search(
+                query_embedding=query_embedding,
+                top_k=top_k * 2,
+                paper_id=paper_id
+            )
+            results = self._filter_by_section_titles(
+                await self._join_sections(results, paper_id), section_filter, top_k
+            )
         else:
+            results = await milvus_service.search(
+                query_embedding=query_embedding,
+                top_k=top_k,
+                paper_id=paper_id
+            )
             results = results[:top_k]
         
+        results = await self._join_sections(results, paper_id)
         log.info(f"搜索完成: 查询='{query_text[:50]}...', 结果数={len(results)}")
         return results
     
+    @staticmethod
+    async def _join_sections(results: List[dict], paper_id: Optional[str] = None) -> List[dict]:
+        """
+        为检索结果关联章节信息
+        
+        文本块元数据只保存章节引用（section_id / section_path / chunk_index），
+        章节标题、层级和页码从论文的章节列表（带缓存）中补充；旧版文本块已自带这些字段，保持不变
+        """
+        pending: Dict[str, List[dict]] = {}
+        for result in results:
+            metadata = result.setdefault("metadata", {})
+            if metadata.get("section_id") and "section_title" not in metadata:
+                pending.setdefault(result.get("paper_id") or paper_id, []).append(metadata)
+        
+        for pid, metadatas in pending.items():
+            if not pid:
+                continue
+            records = await FileManager.load_section_list(pid) or []
+            sections = {record.get("section_id"): record for record in records}
+            for metadata in metadatas:
+                section = sections.get(metadata["section_id"])
+                if section is None:
+                    continue
+                metadata["section_title"] = section.get("title", "")
+                metadata["section_level"] = section.get("level")
+                if section.get("page_start") is not None:
+                    metadata["page_start"] = section["page_start"]
+                    metadata["page_end"] = section.get("page_end")
+        return results
+    
+    async def expand_to_parents(self, results: List[dict], token_budget: Optional[int] = None) -> List[dict]:
+        """
+        把命中的小块扩展为父块，作为问答上下文
+        
+        按相关度从高到低处理：同一章节中区间重叠或相邻的父块合并为一段，合并后只计算新增的 token；
+        父块放不进预算时只使用小块本身。没有父块信息的文本块（旧版或 CHUNK_CHILD_SIZE=0）直接使用原文
+        
+        Args:
+            results: 检索结果（search_similar_chunks 的返回值）
+            token_budget: 上下文 token 预算，默认使用 CONTEXT_TOKEN_BUDGET
+            
+        Returns:
+            上下文片段列表，按其中最高的相关度排序；metadata.chunk_ids 为片段包含的命中文本块
+        """
+        budget = settings.context_token_budget if token_budget is None else token_budget
+        contexts: List[Dict[str, Any]] = []
+        by_section: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        section_texts: Dict[Tuple[str, str], Optional[str]] = {}
+        used = 0
+        
+        for result in sorted(results, key=lambda r: r.get("score", 0), reverse=True):
+            metadata = result.get("metadata", {})
+            key = (result.get("paper_id"), metadata.get("section_id"))
+            text = result.get("text", "")
+            
+            # 已被选中的父块包含的小块不再重复加入
+            covering = next((c for c in by_section.get(key, []) if text and text in c["text"]), None)
+            if covering is not None:
+                covering["metadata"]["chunk_ids"].append(result.get("chunk_id"))
+                continue
+            
+            if "parent_start" in metadata and all(key):
+                if key not in section_texts:
+                    section_texts[key] = await self._load_clean_section(*key)
+                section_text = section_texts[key]
+                start, end = metadata["parent_start"], metadata["parent_end"]
+                if section_text is not None and end <= len(section_text):
+                    merged = [c for c in by_section.get(key, []) if c["start"] <= end and start <= c["end"]]
+                    start = min([start] + [c["start"] for c in merged])
+                    end = max([end] + [c["end"] for c in merged])
+                    parent_text = section_text[start:end].strip()
+                    tokens = text_processor.count_tokens(parent_text)
+                    cost = tokens - sum(c["tokens"] for c in merged)
+                    if used + cost <= budget:
+                        used += cost
+                        if merged:
+                            target = merged[0]
+                            for other in merged[1:]:
+                                target["metadata"]["chunk_ids"].extend(other["metadata"]["chunk_ids"])
+                                contexts.remove(other)
+                                by_section[key].remove(other)
+                        else:
+                            target = self._new_context(result, metadata)
+                            contexts.append(target)
+                            by_section.setdefault(key, []).append(target)
+                        target["metadata"]["chunk_ids"].append(result.get("chunk_id"))
+                        target.update(text=parent_text, start=start, end=end, tokens=tokens)
+                        continue
+            
+            # 没有父块信息或父块超出预算：使用小块本身
+            tokens = text_processor.count_tokens(text)
+            if used + tokens > budget and contexts:
+                continue
+            used += tokens
+            context = self._new_context(result, metadata)
+            context["metadata"]["chunk_ids"].append(result.get("chunk_id"))
+            context.update(text=text, start=-1, end=-1, tokens=tokens)
+            contexts.append(context)
+        
+        log.info(f"上下文扩展完成: 命中 {len(results)} 块 -> {len(contexts)} 段, tokens={used}/{budget}")
+        return [
+            {key: value for key, value in context.items() if key not in ("start", "end", "tokens")}
+            for context in contexts
+        ]
+    
+    @staticmethod
+    def _new_context(result: dict, metadata: dict) -> Dict[str, Any]:
+        return {
+            "chunk_id": result.get("chunk_id"),
+            "paper_id": result.get("paper_id"),
+            "score": result.get("score", 0),
+            "metadata": {**metadata, "chunk_ids": []},
+        }
+    
+    @staticmethod
+    async def _load_clean_section(paper_id: str, section_id: str) -> Optional[str]:
+        """加载章节正文（带缓存）并按分块时的方式清洗，父块区间基于清洗后的正文"""
+        section = await FileManager.load_section(paper_id, section_id)
+        if not section:
+            return None
+        return text_processor.clean_text(section.get("content", ""))
+    
+    @staticmethod
+    def _title_matches(title: str, section_filter: List[str]) -> bool:
+        """模糊匹配：章节标题包含过滤词，或过滤词包含章节标题"""
+        title = title.lower()
+        return any(term.lower() in title or title in term.lower() for term in section_filter)
+    
+    async def _resolve_section_paths(self, paper_id: str, section_filter: List[str]) -> Optional[List[str]]:
+        """
+        把章节标题过滤词解析为章节路径
+        
+        已选中祖先章节的子章节不再单独列出（前缀过滤已经包含）
+        
+        Returns:
+            章节路径列表；旧版解析结果没有章节路径或没有匹配的章节时返回 None
+        """
+        records = await FileManager.load_section_list(paper_id) or []
+        paths = [
+            record["path"] for record in records
+            if record.get("path") and self._title_matches(record.get("title", ""), section_filter)
+        ]
+        selected: List[str] = []
+        for path in paths:
+            if not any(path.startswith(f"{parent}.") for parent in selected):
+                selected.append(path)
+        return selected or None
+    
+    def _filter_by_section_titles(self, results: List[dict], section_filter: List[str], top_k: int) -> List[dict]:
+        """按章节标题过滤检索结果，过滤后结果太少时补充未过滤的结果"""
+        filtered_results = []
+        for result in results:
+            section_title = result.get("metadata", {}).get("section_title", "")
+            if self._title_matches(section_title, section_filter):
+                filtered_results.append(result)
+            
+            if len(filtered_results) >= top_k:
+                break
+        
+        if len(filtered_results) < top_k:
+            for result in results:
+                if result not in filtered_results:
+                    filtered_results.append(result)
+                    if len(filtered_results) >= top_k:
+                        break
+        
+        return filtered_results[:top_k]
+    
     async def search_multi_keywords(
         self,
         keywords: List[str],
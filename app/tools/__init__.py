@@ -0,0 +1,4 @@
+"""
+命令行工具模块
+"""
+
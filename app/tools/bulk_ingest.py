@@ -0,0 +1,112 @@
+"""
+批量入库命令行工具
+通过 API 批量提交论文 URL 和本地 PDF，并持续输出整体进度和吞吐量
+
+用法:
+    python -m app.tools.bulk_ingest https://arxiv.org/abs/2401.00001 paper.pdf
+    python -m app.tools.bulk_ingest --list reading_list.txt --api http://localhost:8100
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import httpx
+
+from app.config import settings
+from app.models.schemas import TaskStatus
+
+
+def collect_sources(args: argparse.Namespace) -> Tuple[List[str], List[Path]]:
+    """整理命令行和列表文件中的来源，区分 URL 和本地 PDF"""
+    entries = list(args.sources)
+    if args.list:
+        for line in Path(args.list).read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                entries.append(line)
+
+    urls, files = [], []
+    for entry in entries:
+        if entry.startswith(("http://", "https://")):
+            urls.append(entry)
+        else:
+            files.append(Path(entry))
+    return urls, files
+
+
+def upload_files(client: httpx.Client, files: List[Path]) -> List[str]:
+    """上传本地 PDF，返回文件ID列表"""
+    file_ids = []
+    for path in files:
+        with open(path, "rb") as f:
+            response = client.post("/api/upload", files={"file": (path.name, f, "application/pdf")})
+        if response.status_code != 200:
+            print(f"上传失败: {path} ({response.status_code}) {response.text}", file=sys.stderr)
+            continue
+        file_ids.append(response.json()["file_id"])
+        print(f"已上传: {path}")
+    return file_ids
+
+
+def format_progress(status: dict) -> str:
+    """格式化一行整体进度"""
+    counts = status["counts"]
+    active = counts[TaskStatus.PENDING.value] + counts[TaskStatus.PROCESSING.value]
+    rate = status["papers_per_minute"]
+    return (
+        f"[{status['elapsed_seconds']:>7.0f}s] "
+        f"完成 {counts[TaskStatus.COMPLETED.value]}/{status['total']} | "
+        f"失败 {counts[TaskStatus.FAILED.value]} | 进行中 {active} | "
+        f"{rate if rate is not None else '-'} 篇/分钟"
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="PaperWhisperer 批量入库")
+    parser.add_argument("sources", nargs="*", help="论文 URL 或本地 PDF 路径")
+    parser.add_argument("--list", help="来源列表文件，每行一个 URL 或 PDF 路径，# 开头为注释")
+    parser.add_argument("--api", default=f"http://localhost:{settings.backend_port}", help="后端服务地址")
+    parser.add_argument("--interval", type=float, default=5.0, help="进度查询间隔（秒）")
+    parser.add_argument("--no-wait", action="store_true", help="提交后立即退出，不等待完成")
+    args = parser.parse_args(argv)
+
+    urls, files = collect_sources(args)
+    if not urls and not files:
+        parser.error("请提供至少一个 URL 或 PDF 路径")
+
+    with httpx.Client(base_url=args.api, timeout=60.0) as client:
+        file_ids = upload_files(client, files)
+
+        response = client.post("/api/bulk_ingest", json={"urls": urls, "file_ids": file_ids})
+        if response.status_code != 200:
+            print(f"提交失败 ({response.status_code}): {response.text}", file=sys.stderr)
+            return 1
+        status = response.json()
+        batch_id = status["batch_id"]
+        print(f"批次已创建: batch_id={batch_id}, 论文数={status['total']}")
+
+        if args.no_wait:
+            return 0
+
+        while True:
+            print(format_progress(status))
+            counts = status["counts"]
+            if counts[TaskStatus.PENDING.value] + counts[TaskStatus.PROCESSING.value] == 0:
+                break
+            time.sleep(args.interval)
+            status = client.get(f"/api/bulk_ingest/{batch_id}").json()
+
+    if status["stage_avg_seconds"]:
+        stages = ", ".join(f"{name}={seconds}s" for name, seconds in status["stage_avg_seconds"].items())
+        print(f"各阶段平均耗时: {stages}")
+
+    failed = [item for item in status["items"] if item["status"] == TaskStatus.FAILED.value]
+    for item in failed:
+        print(f"失败: {item['source']} ({item['paper_id']}): {item['error']}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+解析结果迁移工具
+把 data/parsed/*.json（旧版 JSON 格式）转换为 .pwp 紧凑格式，转换后校验内容一致再删除原文件
+
+用法:
+    python -m app.tools.migrate_parsed
+    python -m app.tools.migrate_parsed --compress --keep-json
+    python -m app.tools.migrate_parsed --dry-run
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Tuple
+
+from app.config import settings
+from app.utils import parsed_format
+
+
+def migrate_file(json_path: Path, compress: bool = False, keep_json: bool = False, dry_run: bool = False) -> Tuple[int, int]:
+    """
+    迁移单个解析结果
+
+    Returns:
+        (原文件大小, 新文件大小)
+    """
+    raw = json_path.read_bytes()
+    content = json.loads(raw)
+    data = parsed_format.encode(content, compress=compress)
+
+    # 校验：解码后与原内容一致（datetime 已是字符串，不受序列化影响）
+    if parsed_format.decode(data) != content:
+        raise ValueError("转换后内容不一致")
+
+    if not dry_run:
+        target = json_path.with_suffix(".pwp")
+        tmp_path = json_path.with_suffix(".pwp.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, target)
+        if not keep_json:
+            json_path.unlink()
+
+    return len(raw), len(data)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="把 JSON 格式的解析结果迁移为 .pwp 紧凑格式")
+    parser.add_argument("--dir", default=str(settings.parsed_dir), help="解析结果目录")
+    parser.add_argument("--compress", action="store_true", help="使用 zstd 压缩正文（需要安装 zstandard）")
+    parser.add_argument("--keep-json", action="store_true", help="保留原 JSON 文件")
+    parser.add_argument("--dry-run", action="store_true", help="只转换和校验，不写入文件")
+    args = parser.parse_args(argv)
+
+    if args.compress and not parsed_format.zstd_available():
+        print("未安装 zstandard，无法使用 --compress", file=sys.stderr)
+        return 2
+
+    files = sorted(Path(args.dir).glob("*.json"))
+    migrated = failed = 0
+    total_before = total_after = 0
+    for json_path in files:
+        try:
+            before, after = migrate_file(json_path, args.compress, args.keep_json, args.dry_run)
+        except Exception as e:
+            failed += 1
+            print(f"迁移失败: {json_path.name}: {e}", file=sys.stderr)
+            continue
+        migrated += 1
+        total_before += before
+        total_after += after
+
+    ratio = f"{total_after / total_before:.1%}" if total_before else "-"
+    print(
+        f"{'[dry-run] ' if args.dry_run else ''}迁移完成: {migrated} 个, 失败 {failed} 个, "
+        f"大小 {total_before / 1024 / 1024:.1f}MB -> {total_after / 1024 / 1024:.1f}MB ({ratio})"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
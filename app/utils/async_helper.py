@@ -2,6 +2,8 @@
 异步辅助工具
 """
 import asyncio
+import math
+import time
 from typing import Callable, Any, Optional
 from functools import wraps
 
@@ -59,6 +61,66 @@ async def run_in_threadpool(func: Callable, *args, **kwargs) -> Any:
     return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
 
 
+async def gather_or_cancel(*coros) -> list:
+    """
+    并发执行多个协程，任一失败时取消其余协程并抛出该异常
+
+    与 asyncio.gather 不同，失败后不会留下仍在运行的兄弟任务（例如阻塞在队列上的生产者）
+
+    Returns:
+        按参数顺序排列的结果列表
+    """
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+class RateLimiter:
+    """
+    令牌桶限速器
+
+    以 rate 次/秒的速度补充令牌，最多积攒 burst 个，acquire() 在没有令牌时等待
+    """
+    
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        """
+        Args:
+            rate: 每秒允许的次数，<= 0 表示不限速
+            burst: 允许的突发次数，默认为 ceil(rate)
+        """
+        self.rate = rate
+        self.capacity = burst or max(1, math.ceil(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self, amount: float = 1):
+        """
+        获取令牌
+        
+        Args:
+            amount: 令牌数（如按 token 数限速时为本次请求的 token 数），超过 burst 时按 burst 计
+        """
+        if self.rate <= 0:
+            return
+        
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+
+
 class TaskQueue:
     """简单的异步任务队列"""
     
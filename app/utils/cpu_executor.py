@@ -0,0 +1,182 @@
+"""
+CPU 密集任务执行器
+章节提取、分块（tiktoken 编码）、解析结果序列化等纯计算步骤在进程池中执行，不阻塞事件循环；
+同时提供事件循环延迟采样，用于观察这些步骤对并发请求的影响
+"""
+import asyncio
+import functools
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Deque, Dict, Optional
+
+from app.config import settings
+from app.utils.async_helper import run_in_threadpool
+from app.utils.logger import log
+
+
+# 事件循环延迟保留的采样数
+LAG_WINDOW = 1200
+
+
+def _init_worker():
+    """子进程初始化：预先加载 tokenizer，第一个分块任务不再承担加载开销"""
+    try:
+        from app.services.text_processor import text_processor  # noqa: F401
+    except Exception as e:  # 加载失败时分块会回退到近似计数
+        log.warning(f"CPU 子进程预加载 tokenizer 失败: {e}")
+
+
+def _ping() -> bool:
+    return True
+
+
+class CPUExecutor:
+    """
+    CPU 密集任务执行器
+
+    任务函数和参数需要可序列化（模块级函数、pydantic 模型、字典等）；
+    workers 为 0 时在线程池中执行，便于调试和在不支持多进程的环境中运行
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers if workers is not None else settings.cpu_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.in_flight = 0
+        self.tasks_completed = 0
+        self.tasks_failed = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        return self._executor
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        执行 CPU 密集函数并等待结果
+
+        Args:
+            func: 模块级函数（或类的静态方法）
+            *args, **kwargs: 函数参数
+
+        Returns:
+            函数返回值
+        """
+        started = time.perf_counter()
+        self.in_flight += 1
+        try:
+            if self.workers <= 0:
+                result = await run_in_threadpool(func, *args, **kwargs)
+            else:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(self._get_executor(), functools.partial(func, *args, **kwargs))
+        except BrokenProcessPool:
+            # 子进程异常退出（如被 OOM killer 终止）后重建进程池
+            log.error(f"CPU 进程池异常，将重建: {getattr(func, '__qualname__', func)}")
+            self.tasks_failed += 1
+            self.close()
+            raise
+        except Exception:
+            self.tasks_failed += 1
+            raise
+        else:
+            self.tasks_completed += 1
+            return result
+        finally:
+            self.in_flight -= 1
+            elapsed = time.perf_counter() - started
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+
+    async def warm_up(self):
+        """启动全部子进程（各自预加载 tokenizer），避免第一篇论文承担进程启动开销"""
+        if self.workers <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(*(loop.run_in_executor(executor, _ping) for _ in range(self.workers)))
+        log.info(f"CPU 进程池已就绪: workers={self.workers}")
+
+    def stats(self) -> Dict[str, Any]:
+        """执行统计"""
+        finished = self.tasks_completed + self.tasks_failed
+        return {
+            "workers": self.workers,
+            "mode": "process" if self.workers > 0 else "thread",
+            "in_flight": self.in_flight,
+            "tasks_completed": self.tasks_completed,
+            "tasks_failed": self.tasks_failed,
+            "avg_ms": round(self.total_seconds * 1000 / finished, 2) if finished else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 2),
+        }
+
+    def close(self):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class EventLoopLagMonitor:
+    """
+    事件循环延迟采样
+
+    每隔 interval 秒 sleep 一次，实际唤醒时间与预期的差值即为事件循环被阻塞的时长
+    """
+
+    def __init__(self, interval: Optional[float] = None, window: int = LAG_WINDOW):
+        self.interval = interval if interval is not None else settings.event_loop_lag_interval
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """开始采样（interval 为 0 时不采样）"""
+        if self.interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止采样"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def reset(self):
+        """清空采样"""
+        self.samples.clear()
+        self.max_lag = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """最近采样窗口内的延迟统计（毫秒），max_ms 为启动以来的最大值"""
+        samples = sorted(self.samples)
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] if samples else 0.0
+        return {
+            "interval": self.interval,
+            "samples": len(samples),
+            "avg_ms": round(sum(samples) * 1000 / len(samples), 2) if samples else 0.0,
+            "p99_ms": round(p99 * 1000, 2),
+            "max_ms": round(self.max_lag * 1000, 2),
+        }
+
+
+# 全局 CPU 任务执行器和事件循环延迟采样
+cpu_executor = CPUExecutor()
+loop_lag_monitor = EventLoopLagMonitor()
@@ -4,14 +4,19 @@
 """
 import aiofiles
 import hashlib
+import os
+import shutil
 import uuid
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
 import json
 
 from app.config import settings
+from app.utils import parsed_format
+from app.utils.cpu_executor import cpu_executor
 from app.utils.logger import log
+from app.utils.parsed_cache import FileVersion, file_version, parsed_content_cache
 
 
 def _json_serializer(obj):
@@ -21,6 +26,19 @@ def _json_serializer(obj):
     raise TypeError(f"Type {type(obj)} not serializable")
 
 
+def _dump_json(data: Any) -> str:
+    """序列化翻译、摘要结果（在 CPU 进程池中执行）"""
+    return json.dumps(data, ensure_ascii=False, indent=2, default=_json_serializer)
+
+
+class FileTooLargeError(Exception):
+    """上传文件超过大小限制"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"文件超过大小限制: {max_size} 字节")
+
+
 class FileManager:
     """文件管理器"""
     
@@ -30,6 +48,11 @@ class FileManager:
         timestamp = datetime.now().isoformat()
         unique_str = f"{filename}{timestamp}{uuid.uuid4()}"
         return hashlib.md5(unique_str.encode()).hexdigest()
+
+    @staticmethod
+    def generate_content_id(content_hash: str) -> str:
+        """由文件内容的 SHA-256 生成文件ID，相同内容得到相同ID"""
+        return content_hash[:32]
     
     @staticmethod
     async def save_upload_file(file_content: bytes, original_filename: str) -> tuple[str, Path]:
@@ -60,11 +83,89 @@ class FileManager:
         except Exception as e:
             log.error(f"保存文件失败: {e}")
             raise
-    
+
+    @staticmethod
+    async def save_upload_stream(
+        upload_file,
+        original_filename: str,
+        max_size_mb: Optional[int] = None,
+        chunk_size: Optional[int] = None
+    ) -> tuple[str, Path, int, str]:
+        """
+        流式保存上传的文件：分块写盘，同时计算 SHA-256 和文件大小
+
+        内存占用与文件大小无关（仅为一个分块），超过大小限制时立即中止并清理临时文件。
+
+        Args:
+            upload_file: 支持 async read(size) 的上传文件对象（如 FastAPI UploadFile）
+            original_filename: 原始文件名
+            max_size_mb: 最大文件大小（MB），默认使用 settings.max_upload_size
+            chunk_size: 每次读取的字节数，默认使用 settings.upload_chunk_size
+
+        Returns:
+            (file_id, file_path, file_size, sha256)，file_id 由内容哈希派生
+
+        Raises:
+            FileTooLargeError: 文件超过大小限制
+        """
+        max_size = (max_size_mb or settings.max_upload_size) * 1024 * 1024
+        chunk_size = chunk_size or settings.upload_chunk_size
+
+        # 先写入临时文件，完成后再重命名，避免留下不完整的文件
+        tmp_path = settings.upload_dir / f".{uuid.uuid4().hex}.part"
+        sha256 = hashlib.sha256()
+        file_size = 0
+
+        try:
+            async with aiofiles.open(tmp_path, 'wb') as f:
+                while True:
+                    chunk = await upload_file.read(chunk_size)
+                    if not chunk:
+                        break
+
+                    file_size += len(chunk)
+                    if file_size > max_size:
+                        raise FileTooLargeError(max_size)
+
+                    sha256.update(chunk)
+                    await f.write(chunk)
+
+            content_hash = sha256.hexdigest()
+            file_id = FileManager.generate_content_id(content_hash)
+            extension = Path(original_filename).suffix
+            file_path = settings.upload_dir / f"{file_id}{extension}"
+
+            # 相同内容的文件已存在时直接复用，临时文件在 finally 中清理
+            if not file_path.exists():
+                tmp_path.replace(file_path)
+
+            log.info(f"文件流式保存成功: {file_path.name}, size={file_size}")
+            return file_id, file_path, file_size, content_hash
+
+        except FileTooLargeError:
+            log.warning(f"上传文件超过大小限制，已中止: {original_filename}, 已读取 {file_size} 字节")
+            raise
+        except Exception as e:
+            log.error(f"流式保存文件失败: {e}")
+            raise
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    @staticmethod
+    def _parsed_path(paper_id: str) -> Path:
+        """解析结果文件路径（.pwp 格式）"""
+        return settings.parsed_dir / f"{paper_id}.pwp"
+
+    @staticmethod
+    def _legacy_parsed_path(paper_id: str) -> Path:
+        """旧版 JSON 格式的解析结果路径"""
+        return settings.parsed_dir / f"{paper_id}.json"
+
     @staticmethod
     async def save_parsed_content(paper_id: str, content: dict) -> Path:
         """
-        保存解析后的内容
+        保存解析后的内容（.pwp 格式，先写临时文件再原子替换）
         
         Args:
             paper_id: 论文ID
@@ -73,11 +174,24 @@ class FileManager:
         Returns:
             保存的文件路径
         """
-        file_path = settings.parsed_dir / f"{paper_id}.json"
+        file_path = FileManager._parsed_path(paper_id)
+        tmp_path = file_path.with_suffix(".pwp.tmp")
+        compress = settings.parsed_compression == "zstd"
+        if compress and not parsed_format.zstd_available():
+            log.warning("未安装 zstandard，解析结果不压缩保存")
+            compress = False
         
         try:
-            async with aiofiles.open(file_path, 'w', encoding='utf-8') as f:
-                await f.write(json.dumps(content, ensure_ascii=False, indent=2, default=_json_serializer))
+            data = await cpu_executor.run(parsed_format.encode, content, compress=compress)
+            async with aiofiles.open(tmp_path, 'wb') as f:
+                await f.write(data)
+            os.replace(tmp_path, file_path)
+            parsed_content_cache.invalidate(paper_id)
+            
+            # 新格式写入后删除旧版 JSON
+            legacy_path = FileManager._legacy_parsed_path(paper_id)
+            if legacy_path.exists():
+                legacy_path.unlink()
             
             log.info(f"解析内容保存成功: {paper_id}")
             return file_path
@@ -85,11 +199,82 @@ class FileManager:
         except Exception as e:
             log.error(f"保存解析内容失败: {e}")
             raise
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
     
     @staticmethod
-    async def load_parsed_content(paper_id: str) -> Optional[dict]:
+    def parsed_content_exists(paper_id: str) -> bool:
+        """检查论文是否已有解析结果"""
+        return (
+            FileManager._parsed_path(paper_id).exists()
+            or FileManager._legacy_parsed_path(paper_id).exists()
+        )
+
+    @staticmethod
+    def delete_parsed_content(paper_id: str) -> bool:
+        """
+        删除论文的解析结果和图片目录
+
+        Returns:
+            是否删除了解析结果文件
+        """
+        existed = False
+        for file_path in (FileManager._parsed_path(paper_id), FileManager._legacy_parsed_path(paper_id)):
+            if file_path.exists():
+                file_path.unlink()
+                existed = True
+
+        parsed_content_cache.invalidate(paper_id)
+
+        images_dir = settings.parsed_dir / paper_id
+        if images_dir.is_dir():
+            shutil.rmtree(images_dir, ignore_errors=True)
+
+        log.info(f"删除解析内容: {paper_id}, 存在={existed}")
+        return existed
+
+    @staticmethod
+    def delete_generated_results(paper_id: str) -> int:
+        """
+        删除由解析结果生成的翻译和摘要（解析结果被替换后需要重新生成）
+
+        Returns:
+            删除的文件数
+        """
+        deleted = 0
+        for suffix in ("translation", "summary"):
+            file_path = settings.summaries_dir / f"{paper_id}_{suffix}.json"
+            if file_path.exists():
+                file_path.unlink()
+                deleted += 1
+        return deleted
+
+    @staticmethod
+    async def _load_legacy_parsed(paper_id: str) -> Optional[dict]:
+        """加载旧版 JSON 格式的解析结果"""
+        file_path = FileManager._legacy_parsed_path(paper_id)
+        if not file_path.exists():
+            return None
+        async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
+            return json.loads(await f.read())
+
+    @staticmethod
+    async def _read_parsed_header(f) -> Tuple[int, int, Dict[str, Any]]:
         """
-        加载解析后的内容
+        从已打开的 .pwp 文件中读取 header
+
+        Returns:
+            (flags, 正文块起始位置, header)
+        """
+        flags, header_length = parsed_format.parse_prefix(await f.read(parsed_format.PREFIX_SIZE))
+        header = parsed_format.parse_header(await f.read(header_length))
+        return flags, parsed_format.PREFIX_SIZE + header_length, header
+
+    @staticmethod
+    async def _read_parsed_content(paper_id: str) -> Optional[dict]:
+        """
+        从磁盘加载解析后的完整内容（兼容旧版 JSON 格式）
         
         Args:
             paper_id: 论文ID
@@ -97,29 +282,184 @@ class FileManager:
         Returns:
             解析后的内容或 None
         """
-        file_path = settings.parsed_dir / f"{paper_id}.json"
+        file_path = FileManager._parsed_path(paper_id)
         
-        if not file_path.exists():
-            log.warning(f"解析内容不存在: {paper_id}")
+        try:
+            if not file_path.exists():
+                content = await FileManager._load_legacy_parsed(paper_id)
+                if content is None:
+                    log.warning(f"解析内容不存在: {paper_id}")
+                return content
+            
+            async with aiofiles.open(file_path, 'rb') as f:
+                return parsed_format.decode(await f.read())
+                
+        except Exception as e:
+            log.error(f"加载解析内容失败: {e}")
             return None
+
+    @staticmethod
+    async def _read_parsed_metadata(paper_id: str) -> Optional[dict]:
+        """只加载论文元数据（只读取 header，不读取正文）"""
+        file_path = FileManager._parsed_path(paper_id)
         
         try:
-            async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
-                content = await f.read()
-                return json.loads(content)
+            if not file_path.exists():
+                content = await FileManager._load_legacy_parsed(paper_id)
+                return content.get("metadata") if content else None
+            
+            async with aiofiles.open(file_path, 'rb') as f:
+                _, _, header = await FileManager._read_parsed_header(f)
+                return header["metadata"]
                 
         except Exception as e:
-            log.error(f"加载解析内容失败: {e}")
+            log.error(f"加载论文元数据失败: {e}")
+            return None
+
+    @staticmethod
+    async def _read_parsed_preview(paper_id: str) -> bool:
+        """解析结果是否为预览（只读取 header）"""
+        file_path = FileManager._parsed_path(paper_id)
+        
+        try:
+            if not file_path.exists():
+                content = await FileManager._load_legacy_parsed(paper_id)
+                return bool(content and content.get("preview"))
+            
+            async with aiofiles.open(file_path, 'rb') as f:
+                _, _, header = await FileManager._read_parsed_header(f)
+                return bool((header.get("extra") or {}).get("preview"))
+                
+        except Exception as e:
+            log.error(f"读取解析结果状态失败: {e}")
+            return False
+
+    @staticmethod
+    async def _read_section_list(paper_id: str) -> Optional[List[dict]]:
+        """只加载章节列表（section_id / title / level / order，不含正文）"""
+        file_path = FileManager._parsed_path(paper_id)
+        
+        try:
+            if not file_path.exists():
+                content = await FileManager._load_legacy_parsed(paper_id)
+                if content is None:
+                    return None
+                return [
+                    {k: v for k, v in section.items() if k != "content"}
+                    for section in content.get("sections", [])
+                ]
+            
+            async with aiofiles.open(file_path, 'rb') as f:
+                _, _, header = await FileManager._read_parsed_header(f)
+                return [parsed_format.section_record(record) for record in header["sections"]]
+                
+        except Exception as e:
+            log.error(f"加载章节列表失败: {e}")
+            return None
+
+    @staticmethod
+    async def _read_section(paper_id: str, section_id: str) -> Optional[dict]:
+        """
+        加载单个章节（含正文）
+        
+        未压缩时按字节区间只读取该章节；压缩时需要解压整个正文块
+        """
+        file_path = FileManager._parsed_path(paper_id)
+        
+        try:
+            if not file_path.exists():
+                content = await FileManager._load_legacy_parsed(paper_id)
+                for section in (content or {}).get("sections", []):
+                    if section.get("section_id") == section_id:
+                        return section
+                return None
+            
+            async with aiofiles.open(file_path, 'rb') as f:
+                flags, body_start, header = await FileManager._read_parsed_header(f)
+                record = parsed_format.find_section(header, section_id)
+                if record is None:
+                    return None
+                
+                if flags & parsed_format.FLAG_ZSTD:
+                    blob = parsed_format.decompress_body(flags, await f.read())
+                    text = parsed_format.section_text(blob, record)
+                else:
+                    await f.seek(body_start + record["offset"])
+                    text = (await f.read(record["length"])).decode("utf-8")
+                
+                return {**parsed_format.section_record(record), "content": text}
+                
+        except Exception as e:
+            log.error(f"加载章节失败: {e}")
             return None
     
+    @staticmethod
+    def _parsed_version(paper_id: str) -> Optional[FileVersion]:
+        """解析结果文件的当前版本，用于缓存校验"""
+        return file_version(FileManager._parsed_path(paper_id), FileManager._legacy_parsed_path(paper_id))
+
+    @staticmethod
+    async def load_parsed_content(paper_id: str) -> Optional[dict]:
+        """
+        加载解析后的完整内容（带缓存，返回值被共享，不要修改）
+        
+        Args:
+            paper_id: 论文ID
+            
+        Returns:
+            解析后的内容或 None
+        """
+        return await parsed_content_cache.get_or_load(
+            paper_id, "content", FileManager._parsed_version(paper_id),
+            lambda: FileManager._read_parsed_content(paper_id)
+        )
+
+    @staticmethod
+    async def load_parsed_metadata(paper_id: str) -> Optional[dict]:
+        """只加载论文元数据（带缓存）"""
+        return await parsed_content_cache.get_or_load(
+            paper_id, "metadata", FileManager._parsed_version(paper_id),
+            lambda: FileManager._read_parsed_metadata(paper_id)
+        )
+
+    @staticmethod
+    async def is_preview(paper_id: str) -> bool:
+        """当前解析结果是否为预览（完整解析尚未完成，带缓存）"""
+        return await parsed_content_cache.get_or_load(
+            paper_id, "preview", FileManager._parsed_version(paper_id),
+            lambda: FileManager._read_parsed_preview(paper_id)
+        )
+
+    @staticmethod
+    async def _is_stale_result(paper_id: str, result: dict) -> bool:
+        """基于预览生成、而解析结果已被完整解析替换的翻译或摘要视为过期"""
+        return bool(result.get("preview")) and not await FileManager.is_preview(paper_id)
+
+    @staticmethod
+    async def load_section_list(paper_id: str) -> Optional[List[dict]]:
+        """只加载章节列表（带缓存，不含正文）"""
+        return await parsed_content_cache.get_or_load(
+            paper_id, "sections", FileManager._parsed_version(paper_id),
+            lambda: FileManager._read_section_list(paper_id)
+        )
+
+    @staticmethod
+    async def load_section(paper_id: str, section_id: str) -> Optional[dict]:
+        """加载单个章节（带缓存，含正文）"""
+        return await parsed_content_cache.get_or_load(
+            paper_id, ("section", section_id), FileManager._parsed_version(paper_id),
+            lambda: FileManager._read_section(paper_id, section_id)
+        )
+    
     @staticmethod
     async def save_translation(paper_id: str, translation: dict) -> Path:
         """保存翻译结果"""
         file_path = settings.summaries_dir / f"{paper_id}_translation.json"
         
         try:
+            text = await cpu_executor.run(_dump_json, translation)
             async with aiofiles.open(file_path, 'w', encoding='utf-8') as f:
-                await f.write(json.dumps(translation, ensure_ascii=False, indent=2, default=_json_serializer))
+                await f.write(text)
             
             log.info(f"翻译结果保存成功: {paper_id}")
             return file_path
@@ -130,7 +470,7 @@ class FileManager:
     
     @staticmethod
     async def load_translation(paper_id: str) -> Optional[dict]:
-        """加载翻译结果"""
+        """加载翻译结果（基于预览生成、已被完整解析取代的结果视为不存在）"""
         file_path = settings.summaries_dir / f"{paper_id}_translation.json"
         
         if not file_path.exists():
@@ -138,8 +478,11 @@ class FileManager:
         
         try:
             async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
-                content = await f.read()
-                return json.loads(content)
+                result = json.loads(await f.read())
+            if await FileManager._is_stale_result(paper_id, result):
+                log.info(f"忽略基于预览生成的翻译结果: {paper_id}")
+                return None
+            return result
                 
         except Exception as e:
             log.error(f"加载翻译结果失败: {e}")
@@ -151,8 +494,9 @@ class FileManager:
         file_path = settings.summaries_dir / f"{paper_id}_summary.json"
         
         try:
+            text = await cpu_executor.run(_dump_json, summary)
             async with aiofiles.open(file_path, 'w', encoding='utf-8') as f:
-                await f.write(json.dumps(summary, ensure_ascii=False, indent=2, default=_json_serializer))
+                await f.write(text)
             
             log.info(f"摘要保存成功: {paper_id}")
             return file_path
@@ -163,7 +507,7 @@ class FileManager:
     
     @staticmethod
     async def load_summary(paper_id: str) -> Optional[dict]:
-        """加载摘要结果"""
+        """加载摘要结果（基于预览生成、已被完整解析取代的结果视为不存在）"""
         file_path = settings.summaries_dir / f"{paper_id}_summary.json"
         
         if not file_path.exists():
@@ -171,8 +515,11 @@ class FileManager:
         
         try:
             async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
-                content = await f.read()
-                return json.loads(content)
+                result = json.loads(await f.read())
+            if await FileManager._is_stale_result(paper_id, result):
+                log.info(f"忽略基于预览生成的摘要: {paper_id}")
+                return None
+            return result
                 
         except Exception as e:
             log.error(f"加载摘要失败: {e}")
@@ -0,0 +1,158 @@
+"""
+解析结果的进程内缓存
+按内存占用限制大小的 LRU 缓存，以文件的 (mtime, size) 作为版本，文件被改写或删除后自动失效
+"""
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from app.config import settings
+
+
+# 文件版本：(路径, mtime_ns, 大小)
+FileVersion = Tuple[str, int, int]
+
+
+def estimate_size(value: Any) -> int:
+    """粗略估算对象占用的内存（字节），只需保证量级正确"""
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def file_version(*paths: Path) -> Optional[FileVersion]:
+    """返回第一个存在的文件的版本，都不存在时返回 None（只 stat，不读取内容）"""
+    for path in paths:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        return str(path), stat.st_mtime_ns, stat.st_size
+    return None
+
+
+class ParsedContentCache:
+    """
+    解析结果缓存
+
+    缓存键为 (paper_id, 视图)，视图可以是完整内容、元数据、章节列表或单个章节。
+    命中时只比较文件版本，不读取文件也不解析；返回的对象被多个调用方共享，不要修改。
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes if max_bytes is not None else settings.parsed_cache_max_mb * 1024 * 1024
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[FileVersion, Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _remove(self, key: Tuple[str, Hashable]):
+        _, _, size = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def get(self, paper_id: str, view: Hashable, version: FileVersion) -> Tuple[bool, Any]:
+        """
+        查询缓存
+
+        Returns:
+            (是否命中, 缓存值)
+        """
+        key = (paper_id, view)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == version:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, entry[1]
+                # 文件已被改写
+                self._remove(key)
+                self.invalidations += 1
+            self.misses += 1
+        return False, None
+
+    def put(self, paper_id: str, view: Hashable, version: FileVersion, value: Any):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        key = (paper_id, view)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (version, value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    async def get_or_load(
+        self,
+        paper_id: str,
+        view: Hashable,
+        version: Optional[FileVersion],
+        loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        命中时直接返回缓存值，否则调用 loader 加载并缓存（加载结果为 None 时不缓存）
+
+        Args:
+            paper_id: 论文ID
+            view: 视图名称
+            version: 当前文件版本，文件不存在时为 None
+            loader: 从磁盘加载的协程函数
+        """
+        if version is None:
+            self.invalidate(paper_id)
+            return await loader()
+
+        hit, value = self.get(paper_id, view, version)
+        if hit:
+            return value
+
+        value = await loader()
+        if value is not None:
+            self.put(paper_id, view, version, value)
+        return value
+
+    def invalidate(self, paper_id: str):
+        """删除论文的所有缓存（保存或删除解析结果时调用）"""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == paper_id]
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+# 全局缓存实例
+parsed_content_cache = ParsedContentCache()
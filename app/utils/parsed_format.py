@@ -0,0 +1,174 @@
+"""
+解析结果的紧凑存储格式（.pwp）
+
+文件布局:
+    magic (4 字节, b"PWP1") | flags (1 字节) | header 长度 (4 字节, 小端) | header (JSON) | 正文块
+
+- header: 元数据和章节偏移表，章节记录不含正文，只有正文块中的 [offset, offset + length) 字节区间
+- 正文块: full_content 的 UTF-8 编码；章节正文是 full_content 的子串时直接引用，
+  否则追加到正文块末尾，全文只存一份
+- flags 第 0 位表示正文块经过 zstd 压缩（需要安装 zstandard）
+
+只读元数据或章节标题时只需读取 header；未压缩时可以按字节区间单独读取一个章节。
+"""
+import json
+import struct
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖
+    zstandard = None
+
+
+MAGIC = b"PWP1"
+FLAG_ZSTD = 0x01
+# magic + flags + header 长度
+PREFIX_SIZE = len(MAGIC) + 1 + 4
+FORMAT_VERSION = 1
+
+
+class ParsedFormatError(Exception):
+    """文件不是有效的 .pwp 格式，或缺少解压所需的依赖"""
+
+
+def _json_default(obj):
+    """datetime 序列化为 ISO 格式"""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+
+def zstd_available() -> bool:
+    """是否安装了 zstandard"""
+    return zstandard is not None
+
+
+def encode(content: Dict[str, Any], compress: bool = False, level: int = 3) -> bytes:
+    """
+    把 {metadata, sections, full_content} 编码为 .pwp 文件内容
+
+    Args:
+        content: 解析结果
+        compress: 是否用 zstd 压缩正文块
+        level: zstd 压缩级别
+    """
+    if compress and zstandard is None:
+        raise ParsedFormatError("未安装 zstandard，无法压缩")
+
+    full_content: str = content.get("full_content") or ""
+    blob = bytearray(full_content.encode("utf-8"))
+
+    sections: List[Dict[str, Any]] = []
+    # 章节按顺序出现在全文中，从上一个章节结束处继续查找，整体线性
+    char_pos = 0
+    byte_pos = 0
+    for section in content.get("sections") or []:
+        text: str = section.get("content") or ""
+        record = {k: v for k, v in section.items() if k != "content"}
+        index = full_content.find(text, char_pos) if text else -1
+        if index >= 0:
+            byte_pos += len(full_content[char_pos:index].encode("utf-8"))
+            length = len(text.encode("utf-8"))
+            record["offset"] = byte_pos
+            record["length"] = length
+            char_pos = index + len(text)
+            byte_pos += length
+        else:
+            data = text.encode("utf-8")
+            record["offset"] = len(blob)
+            record["length"] = len(data)
+            blob.extend(data)
+        sections.append(record)
+
+    header = {
+        "version": FORMAT_VERSION,
+        "metadata": content.get("metadata") or {},
+        "sections": sections,
+        "full_content_length": len(full_content.encode("utf-8")),
+    }
+    extra = {k: v for k, v in content.items() if k not in ("metadata", "sections", "full_content")}
+    if extra:
+        header["extra"] = extra
+    header_bytes = json.dumps(header, ensure_ascii=False, default=_json_default).encode("utf-8")
+
+    flags = 0
+    body = bytes(blob)
+    if compress:
+        flags |= FLAG_ZSTD
+        body = zstandard.ZstdCompressor(level=level).compress(body)
+
+    return MAGIC + struct.pack("<BI", flags, len(header_bytes)) + header_bytes + body
+
+
+def parse_prefix(prefix: bytes) -> Tuple[int, int]:
+    """
+    解析文件开头的固定长度前缀
+
+    Returns:
+        (flags, header 长度)
+    """
+    if len(prefix) < PREFIX_SIZE or prefix[:len(MAGIC)] != MAGIC:
+        raise ParsedFormatError("不是有效的解析结果文件")
+    flags, header_length = struct.unpack("<BI", prefix[len(MAGIC):PREFIX_SIZE])
+    return flags, header_length
+
+
+def parse_header(data: bytes) -> Dict[str, Any]:
+    """解析 header JSON"""
+    header = json.loads(data.decode("utf-8"))
+    if header.get("version") != FORMAT_VERSION:
+        raise ParsedFormatError(f"不支持的格式版本: {header.get('version')}")
+    return header
+
+
+def read_header(file_path: Path) -> Dict[str, Any]:
+    """同步读取文件的 header（不读取正文块）"""
+    with open(file_path, "rb") as f:
+        _, header_length = parse_prefix(f.read(PREFIX_SIZE))
+        return parse_header(f.read(header_length))
+
+
+def decompress_body(flags: int, body: bytes) -> bytes:
+    """按 flags 解压正文块"""
+    if not flags & FLAG_ZSTD:
+        return body
+    if zstandard is None:
+        raise ParsedFormatError("解析结果经过 zstd 压缩，需要安装 zstandard")
+    return zstandard.ZstdDecompressor().decompress(body)
+
+
+def section_text(blob: bytes, record: Dict[str, Any]) -> str:
+    """从正文块中取出章节正文"""
+    return blob[record["offset"]:record["offset"] + record["length"]].decode("utf-8")
+
+
+def section_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """去掉偏移信息的章节记录（不含正文）"""
+    return {k: v for k, v in record.items() if k not in ("offset", "length")}
+
+
+def decode(data: bytes) -> Dict[str, Any]:
+    """把完整的 .pwp 文件内容解码为 {metadata, sections, full_content}"""
+    flags, header_length = parse_prefix(data[:PREFIX_SIZE])
+    header = parse_header(data[PREFIX_SIZE:PREFIX_SIZE + header_length])
+    blob = decompress_body(flags, data[PREFIX_SIZE + header_length:])
+
+    content: Dict[str, Any] = dict(header.get("extra") or {})
+    content["metadata"] = header["metadata"]
+    content["sections"] = [
+        {**section_record(record), "content": section_text(blob, record)}
+        for record in header["sections"]
+    ]
+    content["full_content"] = blob[:header["full_content_length"]].decode("utf-8")
+    return content
+
+
+def find_section(header: Dict[str, Any], section_id: str) -> Optional[Dict[str, Any]]:
+    """在 header 中按 section_id 查找章节记录"""
+    for record in header["sections"]:
+        if record.get("section_id") == section_id:
+            return record
+    return None
@@ -0,0 +1,93 @@
+"""
+独立的后台任务执行进程
+从任务队列领取解析、翻译、摘要任务并执行，与 API 服务分开部署和扩容
+
+用法:
+    python -m app.worker
+    python -m app.worker --concurrency 4 --types parse
+
+API 与 worker 分开部署时 API 进程设置 JOB_RUN_IN_API=False。
+论文目录（SQLite WAL）和数据目录依赖本机文件锁与共享内存，不能放在 NFS 等网络文件系统上，
+因此 API 和 worker 进程需运行在同一台主机上（可以是共享本地数据卷的多个容器）；
+使用 JOB_QUEUE_BACKEND=redis 时任务队列本身可以跨主机共享，但论文目录仍要求单机
+"""
+import argparse
+import asyncio
+import signal
+
+from app.config import settings
+from app.utils.logger import log
+from app.services.milvus_service import milvus_service
+from app.services.mineru_client import mineru_client
+from app.services.local_pdf_parser import local_pdf_parser
+from app.services.job_queue import job_manager
+from app.utils.cpu_executor import cpu_executor, loop_lag_monitor
+# 导入路由模块以注册各类任务的处理函数
+from app.routers import upload, translate, summary  # noqa: F401
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="PaperWhisperer 后台任务执行进程")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=settings.job_workers,
+        help="并发执行数（默认使用 JOB_WORKERS）"
+    )
+    parser.add_argument(
+        "--types",
+        default="",
+        help=f"只执行指定类型的任务，逗号分隔（可选: {','.join(job_manager.job_types)}）"
+    )
+    return parser.parse_args(argv)
+
+
+async def run_worker(concurrency: int, job_types=None):
+    """运行任务执行器，直到收到 SIGINT / SIGTERM"""
+    log.info("=" * 50)
+    log.info("PaperWhisperer worker 正在启动...")
+    log.info(f"任务队列后端: {settings.job_queue_backend}")
+    log.info("=" * 50)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            # Windows 不支持 add_signal_handler，依赖 KeyboardInterrupt 退出
+            pass
+
+    loop_lag_monitor.start()
+    try:
+        await cpu_executor.warm_up()
+    except Exception as e:
+        log.warning(f"CPU 进程池预启动失败（将在首次使用时重试）: {e}")
+    await job_manager.start(concurrency=concurrency, job_types=job_types)
+    try:
+        await stop_event.wait()
+    finally:
+        log.info("PaperWhisperer worker 正在关闭...")
+        # 正在执行的任务释放租约，由其他 worker 或下次启动时继续
+        await job_manager.stop()
+        job_manager.store.close()
+        await mineru_client.close()
+        local_pdf_parser.close()
+        cpu_executor.close()
+        await loop_lag_monitor.stop()
+        log.info(f"事件循环延迟: {loop_lag_monitor.stats()}")
+        try:
+            await milvus_service.disconnect()
+        except Exception as e:
+            log.warning(f"Milvus 断开连接失败: {e}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    job_types = [t.strip() for t in args.types.split(",") if t.strip()] or None
+    asyncio.run(run_worker(args.concurrency, job_types))
+
+
+if __name__ == "__main__":
+    main()
@@ -72,12 +72,44 @@ const api = {
     return client.get(`/parse_status/${taskId}`)
   },
 
+  /**
+   * 通过 Server-Sent Events 监听后台任务（解析/翻译/摘要）进度
+   * 任务结束时返回最终状态；浏览器不支持或连接失败时返回 null，调用方应回退到轮询
+   */
+  watchJob(taskId, onProgress) {
+    return new Promise((resolve) => {
+      if (typeof EventSource === 'undefined') {
+        resolve(null)
+        return
+      }
+      const source = new EventSource(`${API_BASE}/jobs/${taskId}/events`)
+      const handleEvent = (e) => {
+        const status = JSON.parse(e.data)
+        if (onProgress) {
+          onProgress(status)
+        }
+        if (status.status === 'completed' || status.status === 'failed') {
+          source.close()
+          resolve(status)
+        }
+      }
+      source.addEventListener('progress', handleEvent)
+      source.addEventListener('completed', handleEvent)
+      source.addEventListener('failed', handleEvent)
+      source.onerror = () => {
+        source.close()
+        resolve(null)
+      }
+    })
+  },
+
   getPaper(paperId) {
     return client.get(`/paper/${paperId}`)
   },
 
-  listPapers() {
-    return client.get('/papers/list')
+  // 分页获取论文列表，params: limit, cursor, sort, order, title, author, fields
+  listPapers(params = {}) {
+    return client.get('/papers/list', { params })
   },
 
   deletePaper(paperId) {
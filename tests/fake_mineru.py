@@ -0,0 +1,264 @@
+"""
+本地模拟 MinerU API 服务
+模拟单任务、批量 URL、批量文件上传和结果下载接口，可配置网络延迟和解析耗时，
+用于测试以及离线比较单任务 / 批量提交的吞吐
+
+用法:
+    python -m tests.fake_mineru --papers 50 --latency 0.05 --processing 2
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+
+class FakeTask:
+    """一个模拟的解析任务"""
+
+    def __init__(self, task_id: str, data_id: Optional[str], waiting_file: bool = False):
+        self.task_id = task_id
+        self.data_id = data_id
+        # 文件上传任务在收到文件后才开始解析
+        self.started_at = None if waiting_file else time.monotonic()
+
+
+class FakeMinerUHandler(BaseHTTPRequestHandler):
+    """模拟 MinerU API 的请求处理"""
+
+    # 支持 keep-alive
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body: bytes, content_type: str, status: int = 200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, data: Any, code: int = 0, msg: str = "ok"):
+        self._send(json.dumps({"code": code, "msg": msg, "data": data}).encode(), "application/json")
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length)
+
+    def _begin(self, method: str):
+        server: FakeMinerUServer = self.server
+        with server.lock:
+            server.requests.append((method, self.path))
+        if server.latency:
+            time.sleep(server.latency)
+
+    def do_GET(self):
+        self._begin("GET")
+        server: FakeMinerUServer = self.server
+        path = self.path.split("?", 1)[0]
+
+        if path.startswith("/results/"):
+            task_id = path.rsplit("/", 1)[-1].removesuffix(".zip")
+            self._send(server.result_zip(task_id), "application/zip")
+        elif path.startswith("/api/v4/extract/task/"):
+            task = server.tasks.get(path.rsplit("/", 1)[-1])
+            if task is None:
+                self._send_json(None, code=-60012, msg="task not found")
+                return
+            self._send_json({"task_id": task.task_id, **server.task_state(task)})
+        elif path.startswith("/api/v4/extract-results/batch/"):
+            task_ids = server.batches.get(path.rsplit("/", 1)[-1])
+            if task_ids is None:
+                self._send_json(None, code=-60012, msg="batch not found")
+                return
+            results = []
+            for task_id in task_ids:
+                task = server.tasks[task_id]
+                results.append({"data_id": task.data_id, "file_name": f"{task.data_id}.pdf", **server.task_state(task)})
+            self._send_json({"batch_id": path.rsplit("/", 1)[-1], "extract_result": results})
+        else:
+            self._send(b"not found", "text/plain", status=404)
+
+    def do_POST(self):
+        self._begin("POST")
+        server: FakeMinerUServer = self.server
+        body = self._read_body()
+        path = self.path.split("?", 1)[0]
+
+        if path == "/api/v4/extract/task":
+            # JSON（URL 提交）或 multipart（文件上传）
+            task = server.create_task(None)
+            self._send_json({"task_id": task.task_id})
+        elif path == "/api/v4/extract/task/batch":
+            files = json.loads(body)["files"]
+            batch_id = server.create_batch([item.get("data_id") for item in files])
+            self._send_json({"batch_id": batch_id})
+        elif path == "/api/v4/file-urls/batch":
+            files = json.loads(body)["files"]
+            batch_id = server.create_batch([item.get("data_id") for item in files], waiting_file=True)
+            file_urls = [f"{server.root_url}/upload/{task_id}" for task_id in server.batches[batch_id]]
+            self._send_json({"batch_id": batch_id, "file_urls": file_urls})
+        else:
+            self._send(b"not found", "text/plain", status=404)
+
+    def do_PUT(self):
+        self._begin("PUT")
+        server: FakeMinerUServer = self.server
+        body = self._read_body()
+        task = server.tasks.get(self.path.rsplit("/", 1)[-1])
+        if task is None:
+            self._send(b"not found", "text/plain", status=404)
+            return
+        with server.lock:
+            fail = server.upload_failures > 0
+            if fail:
+                server.upload_failures -= 1
+        if fail:
+            self._send(b"unavailable", "text/plain", status=503)
+            return
+        server.uploaded[task.task_id] = body
+        task.started_at = time.monotonic()
+        self._send(b"", "text/plain")
+
+
+class FakeMinerUServer(ThreadingHTTPServer):
+    """
+    模拟 MinerU 服务
+
+    Args:
+        latency: 每个请求的处理延迟（秒）
+        processing_time: 每个任务从开始到完成的解析耗时（秒），期间按比例返回已解析页数
+        total_pages: 每篇论文的页数
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0, processing_time: float = 0.0, total_pages: int = 10):
+        super().__init__(("127.0.0.1", 0), FakeMinerUHandler)
+        self.latency = latency
+        self.processing_time = processing_time
+        self.total_pages = total_pages
+        self.lock = threading.Lock()
+        self.requests: List[tuple] = []
+        self.tasks: Dict[str, FakeTask] = {}
+        self.batches: Dict[str, List[str]] = {}
+        self.uploaded: Dict[str, bytes] = {}
+        # 接下来这么多次上传请求返回 503
+        self.upload_failures = 0
+        # 设置后所有任务都返回这个结果 zip
+        self.zip_bytes: Optional[bytes] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def root_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    @property
+    def base_url(self) -> str:
+        """MinerU API 根地址"""
+        return f"{self.root_url}/api/v4"
+
+    def start(self) -> "FakeMinerUServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def count(self, method: str, prefix: str) -> int:
+        """统计某类请求的次数"""
+        with self.lock:
+            return sum(1 for m, path in self.requests if m == method and path.startswith(prefix))
+
+    def create_task(self, data_id: Optional[str], waiting_file: bool = False) -> FakeTask:
+        task = FakeTask(uuid.uuid4().hex, data_id, waiting_file)
+        with self.lock:
+            self.tasks[task.task_id] = task
+        return task
+
+    def create_batch(self, data_ids: List[Optional[str]], waiting_file: bool = False) -> str:
+        batch_id = uuid.uuid4().hex
+        task_ids = [self.create_task(data_id, waiting_file).task_id for data_id in data_ids]
+        with self.lock:
+            self.batches[batch_id] = task_ids
+        return batch_id
+
+    def task_state(self, task: FakeTask) -> Dict[str, Any]:
+        """按已经过的时间计算任务状态"""
+        if task.started_at is None:
+            return {"state": "waiting-file"}
+        elapsed = time.monotonic() - task.started_at
+        if elapsed >= self.processing_time:
+            return {"state": "done", "full_zip_url": f"{self.root_url}/results/{task.task_id}.zip"}
+        extracted = int(self.total_pages * elapsed / self.processing_time)
+        return {
+            "state": "running",
+            "extract_progress": {"extracted_pages": extracted, "total_pages": self.total_pages},
+        }
+
+    def result_zip(self, task_id: str) -> bytes:
+        """结果 zip：Markdown 中包含任务的 data_id，便于校验结果分发是否正确"""
+        if self.zip_bytes is not None:
+            return self.zip_bytes
+        task = self.tasks.get(task_id)
+        name = task.data_id if task and task.data_id else task_id
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zf:
+            zf.writestr(f"{task_id}/full.md", f"# {name}\n\n" + "text " * 100)
+        return buffer.getvalue()
+
+
+async def _benchmark(papers: int, latency: float, processing: float, batch_size: int) -> Dict[str, Any]:
+    """用给定的批次大小并发解析多篇论文，返回耗时和请求次数"""
+    from app.services.mineru_cache import MinerUResultCache
+    from app.services.mineru_client import MinerUBatcher, MinerUClient, MinerUPoller
+    from app.utils.async_helper import RateLimiter
+
+    server = FakeMinerUServer(latency=latency, processing_time=processing).start()
+    client = MinerUClient()
+    client.base_url = server.base_url
+    client._submit_limiter = RateLimiter(0)
+    client.result_cache = MinerUResultCache(max_bytes=0)
+    client.poller = MinerUPoller(client, min_interval=0.2, max_interval=2, qps=20)
+    client.batcher = MinerUBatcher(client, batch_size=batch_size, linger=0.2)
+    started = time.monotonic()
+    try:
+        await asyncio.gather(*(
+            client.parse_pdf(url=f"https://arxiv.org/abs/2401.{i:05d}", paper_id=f"paper_{i}")
+            for i in range(papers)
+        ))
+    finally:
+        await client.close()
+        server.stop()
+    return {
+        "batch_size": batch_size,
+        "seconds": round(time.monotonic() - started, 2),
+        "submit_requests": server.count("POST", "/api/v4/extract/task"),
+        "status_requests": server.count("GET", "/api/v4/extract"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="离线比较 MinerU 单任务提交与批量提交")
+    parser.add_argument("--papers", type=int, default=50, help="并发解析的论文数")
+    parser.add_argument("--latency", type=float, default=0.05, help="每个请求的延迟（秒）")
+    parser.add_argument("--processing", type=float, default=2.0, help="每篇论文的解析耗时（秒）")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("PARSED_DIR", tempfile.mkdtemp(prefix="fake_mineru_"))
+    for batch_size in (1, args.papers):
+        print(asyncio.run(_benchmark(args.papers, args.latency, args.processing, batch_size)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+CPU 任务执行器测试
+测试章节提取、分块在进程池中执行的结果与直接调用一致，以及卸载后事件循环不再被阻塞
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.services.paper_parser import PaperParser
+from app.services.text_processor import chunk_paper
+from app.utils import parsed_format
+from app.utils.cpu_executor import CPUExecutor, EventLoopLagMonitor
+
+
+MARKDOWN = "# Title\n\nabstract ![](images/a.png)\n\n## 1 Intro\n\n" + "intro sentence. " * 400 + "\n\n## 2 Method\n\nmethod\n"
+
+
+def _spin(seconds: float) -> int:
+    """占用 CPU 的计算"""
+    deadline = time.perf_counter() + seconds
+    count = 0
+    while time.perf_counter() < deadline:
+        count += 1
+    return count
+
+
+class TestCPUExecutor:
+    """CPU 任务执行器测试类"""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("workers", [0, 1])
+    async def test_same_results_as_inline(self, workers):
+        """测试 1: 进程池和线程池模式下章节提取、分块、序列化的结果与直接调用一致"""
+        executor = CPUExecutor(workers=workers)
+        try:
+            result = {"content": MARKDOWN}
+            paper = await executor.run(PaperParser.structure_from_result, "p1", result)
+            expected = PaperParser.structure_from_result("p1", result)
+            assert paper.sections == expected.sections
+            assert paper.section_tree == expected.section_tree
+            assert "/api/images/p1/images/a.png" in paper.full_content
+
+            chunks = await executor.run(chunk_paper, paper, preserve_sections=True)
+            assert chunks == chunk_paper(expected)
+            content = {"full_content": paper.full_content, "sections": [s.dict() for s in paper.sections]}
+            assert await executor.run(parsed_format.encode, content) == parsed_format.encode(content)
+
+            with pytest.raises(ValueError):
+                await executor.run(int, "not a number")
+            stats = executor.stats()
+            assert (stats["tasks_completed"], stats["tasks_failed"], stats["in_flight"]) == (3, 1, 0)
+            assert stats["mode"] == ("process" if workers else "thread")
+        finally:
+            executor.close()
+
+    @pytest.mark.asyncio
+    async def test_offload_keeps_event_loop_responsive(self):
+        """测试 2: 在事件循环中直接计算时延迟接近计算时长，卸载到进程池后延迟保持很低"""
+        executor = CPUExecutor(workers=1)
+        monitor = EventLoopLagMonitor(interval=0.005)
+        try:
+            await executor.warm_up()
+            monitor.start()
+            await asyncio.sleep(0.02)
+            _spin(0.3)
+            await asyncio.sleep(0.02)
+            inline_lag = monitor.stats()["max_ms"]
+
+            monitor.reset()
+            await executor.run(_spin, 0.3)
+            await asyncio.sleep(0.02)
+            offloaded = monitor.stats()
+        finally:
+            await monitor.stop()
+            executor.close()
+
+        assert inline_lag >= 250
+        assert offloaded["samples"] > 10
+        assert offloaded["max_ms"] < 100
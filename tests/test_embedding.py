@@ -2,8 +2,17 @@
 Embedding 服务测试
 测试 embedding 接口的各项功能
 """
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import openai
 import pytest
-from app.services.embedding_service import EmbeddingService, create_embedding_service
+from app.services import embedding_service as embedding_module
+from app.services.embedding_service import EmbeddingScheduler, EmbeddingService, create_embedding_service
+from app.services.ingest_limits import StageLimiter, ingest_limits
+from app.services.text_processor import text_processor
 from app.config import settings
 
 
@@ -141,3 +150,114 @@ class TestEmbeddingServiceUnit:
         assert settings.default_embedding_provider is not None
         assert settings.default_embedding_model is not None
 
+
+def _status_error(error_class, status_code, headers=None):
+    response = httpx.Response(status_code, headers=headers, request=httpx.Request("POST", "http://embedding.test"))
+    return error_class("error", response=response, body=None)
+
+
+class TestEmbeddingScheduler:
+    """并发批量 Embedding 调度测试类（不需要 API 调用）"""
+
+    @pytest.fixture
+    def scheduler(self, monkeypatch):
+        scheduler = EmbeddingScheduler(tpm=0, max_retries=2, base_delay=0.01)
+        monkeypatch.setattr(ingest_limits, "embed", StageLimiter("embed", 3))
+        monkeypatch.setattr(embedding_module, "embedding_scheduler", scheduler)
+        return scheduler
+
+    @pytest.fixture
+    def service(self, monkeypatch):
+        """使用占位 API Key 创建服务，请求由各测试替换"""
+        monkeypatch.setattr(settings, "qwen_api_key", "test-key")
+        return EmbeddingService(provider="qwen")
+
+    @pytest.mark.asyncio
+    async def test_concurrent_batches_in_order(self, scheduler, service, monkeypatch):
+        """测试 9: 各批次在并发上限内同时请求，按输入顺序返回；限流的批次按 Retry-After 等待后只重试该批次"""
+        calls = []
+        state = {"active": 0, "peak": 0}
+
+        async def create(model, input):
+            batch_no = int(input[0].split()[1]) // 10
+            calls.append(batch_no)
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            try:
+                await asyncio.sleep(0.02)
+                if batch_no == 2 and calls.count(2) == 1:
+                    raise _status_error(openai.RateLimitError, 429, {"retry-after": "0.1"})
+                return SimpleNamespace(data=[SimpleNamespace(embedding=[float(t.split()[1])]) for t in input])
+            finally:
+                state["active"] -= 1
+
+        monkeypatch.setattr(service.client.embeddings, "create", create)
+        texts = [f"text {i}" for i in range(45)]
+
+        started = time.monotonic()
+        embeddings = await service.embed_batch(texts, batch_size=10)
+
+        assert embeddings == [[float(i)] for i in range(45)]
+        assert sorted(calls) == [0, 1, 2, 2, 3, 4]
+        assert state["peak"] == 3
+        assert time.monotonic() - started >= 0.1
+        assert (scheduler.stats()["retries"], scheduler.stats()["throttled"]) == (1, 1)
+
+    @pytest.mark.asyncio
+    async def test_non_retryable_error(self, scheduler, service, monkeypatch):
+        """测试 10: 请求错误（如 400）不重试，直接抛出"""
+        calls = []
+
+        async def create(model, input):
+            calls.append(input)
+            raise _status_error(openai.BadRequestError, 400)
+
+        monkeypatch.setattr(service.client.embeddings, "create", create)
+        with pytest.raises(openai.BadRequestError):
+            await service.embed_batch(["a", "b"], batch_size=10)
+        assert len(calls) == 1
+        assert scheduler.stats()["retries"] == 0
+
+    @pytest.mark.asyncio
+    async def test_token_rate_pacing(self, monkeypatch):
+        """测试 11: TPM 令牌用完后，批次按其 token 数等待补充令牌再发出请求"""
+        scheduler = EmbeddingScheduler(tpm=60000, max_retries=0)
+        monkeypatch.setattr(ingest_limits, "embed", StageLimiter("embed", 3))
+        batch = ["attention layer " * 25]
+        tokens = sum(text_processor.count_tokens(text) for text in batch)
+
+        async def request(texts):
+            return [[0.0] for _ in texts]
+
+        # 先用完突发额度，之后按 1000 token/秒补充
+        await scheduler._token_limiter.acquire(60000)
+        started = time.monotonic()
+        assert await scheduler.run(request, batch, 1) == [[0.0]]
+        assert time.monotonic() - started >= tokens / 1000 * 0.9
+        assert scheduler.stats()["tokens"] == tokens
+
+    @pytest.mark.asyncio
+    async def test_retry_charges_tokens_once(self, monkeypatch):
+        """测试 12: 限流后重试的批次不重复扣除 TPM 令牌"""
+        scheduler = EmbeddingScheduler(tpm=60000, max_retries=2, base_delay=0.01)
+        monkeypatch.setattr(ingest_limits, "embed", StageLimiter("embed", 3))
+        acquired = []
+        acquire = scheduler._token_limiter.acquire
+
+        async def record(amount=1):
+            acquired.append(amount)
+            await acquire(amount)
+
+        monkeypatch.setattr(scheduler._token_limiter, "acquire", record)
+        calls = []
+
+        async def request(texts):
+            calls.append(texts)
+            if len(calls) < 3:
+                raise _status_error(openai.RateLimitError, 429, {"retry-after": "0.01"})
+            return [[0.0] for _ in texts]
+
+        assert await scheduler.run(request, ["a b c"], 1, tokens=120) == [[0.0]]
+        assert len(calls) == 3
+        assert acquired == [120]
+        assert scheduler.stats()["tokens"] == 120
@@ -0,0 +1,234 @@
+"""
+文件管理工具测试
+测试流式上传保存、解析结果存储格式和缓存等功能
+"""
+import hashlib
+import json
+import pytest
+
+from app.tools import migrate_parsed
+from app.utils import file_manager, parsed_format
+from app.utils.file_manager import FileManager, FileTooLargeError
+from app.utils.parsed_cache import ParsedContentCache
+
+
+class FakeUploadFile:
+    """模拟 UploadFile，记录每次 read 的大小"""
+
+    def __init__(self, content: bytes):
+        self.content = content
+        self.position = 0
+        self.read_sizes = []
+
+    async def read(self, size: int = -1) -> bytes:
+        self.read_sizes.append(size)
+        if size < 0:
+            size = len(self.content) - self.position
+        chunk = self.content[self.position:self.position + size]
+        self.position += len(chunk)
+        return chunk
+
+
+class TestSaveUploadStream:
+    """流式上传保存测试类"""
+
+    @pytest.fixture(autouse=True)
+    def upload_dir(self, tmp_path, monkeypatch):
+        """将上传目录指向临时目录"""
+        monkeypatch.setenv("UPLOAD_DIR", str(tmp_path))
+        return tmp_path
+
+    @pytest.mark.asyncio
+    async def test_save_and_hash(self, upload_dir):
+        """测试 1: 分块写盘并计算 SHA-256"""
+        content = b"%PDF-1.4\n" + b"x" * 10000
+        upload = FakeUploadFile(content)
+
+        file_id, file_path, file_size, content_hash = await FileManager.save_upload_stream(
+            upload, "paper.pdf", chunk_size=1024
+        )
+
+        assert file_path.parent == upload_dir
+        assert file_path.name == f"{file_id}.pdf"
+        assert file_path.read_bytes() == content
+        assert file_size == len(content)
+        assert content_hash == hashlib.sha256(content).hexdigest()
+        # 每次只读取一个分块，而不是一次读入整个文件
+        assert all(size == 1024 for size in upload.read_sizes)
+
+    @pytest.mark.asyncio
+    async def test_abort_when_too_large(self, upload_dir):
+        """测试 2: 超过大小限制时提前中止并清理临时文件"""
+        content = b"x" * (3 * 1024 * 1024)
+        upload = FakeUploadFile(content)
+
+        with pytest.raises(FileTooLargeError):
+            await FileManager.save_upload_stream(
+                upload, "big.pdf", max_size_mb=1, chunk_size=256 * 1024
+            )
+
+        # 读取到超限后立即停止，不会读完整个文件
+        assert upload.position < len(content)
+        assert list(upload_dir.iterdir()) == []
+
+
+PARSED_CONTENT = {
+    "metadata": {"paper_id": "p1", "title": "测试论文", "authors": ["张三"]},
+    "sections": [
+        {"section_id": "section_0", "title": "Introduction", "level": 1, "order": 0, "content": "引言内容 intro"},
+        {"section_id": "section_1", "title": "Method", "level": 2, "order": 1, "content": "方法 method"},
+        # 不在全文中的章节正文追加到正文块末尾
+        {"section_id": "section_2", "title": "Extra", "level": 1, "order": 2, "content": "附加内容"},
+    ],
+    "full_content": "# Introduction\n引言内容 intro\n\n## Method\n方法 method\n",
+}
+
+
+class TestParsedContent:
+    """解析结果存储测试类"""
+
+    @pytest.fixture(autouse=True)
+    def parsed_dir(self, tmp_path, monkeypatch):
+        """将解析结果目录指向临时目录"""
+        monkeypatch.setenv("PARSED_DIR", str(tmp_path))
+        return tmp_path
+
+    def test_format_roundtrip_stores_text_once(self):
+        """测试 3: 编码后可完整还原，章节正文引用全文而不重复存储"""
+        data = parsed_format.encode(PARSED_CONTENT)
+        assert parsed_format.decode(data) == PARSED_CONTENT
+        assert data.count("引言内容".encode("utf-8")) == 1
+        assert data.count("附加内容".encode("utf-8")) == 1
+
+    @pytest.mark.skipif(not parsed_format.zstd_available(), reason="未安装 zstandard")
+    def test_format_zstd_roundtrip(self):
+        """测试 4: zstd 压缩后可完整还原"""
+        data = parsed_format.encode(PARSED_CONTENT, compress=True)
+        assert parsed_format.decode(data) == PARSED_CONTENT
+
+    @pytest.mark.asyncio
+    async def test_partial_reads(self, parsed_dir):
+        """测试 5: 保存为 .pwp，可以只读元数据、章节列表或单个章节"""
+        file_path = await FileManager.save_parsed_content("p1", PARSED_CONTENT)
+        assert file_path == parsed_dir / "p1.pwp"
+        assert not list(parsed_dir.glob("*.tmp"))
+
+        assert await FileManager.load_parsed_content("p1") == PARSED_CONTENT
+        assert await FileManager.load_parsed_metadata("p1") == PARSED_CONTENT["metadata"]
+        sections = await FileManager.load_section_list("p1")
+        assert [s["title"] for s in sections] == ["Introduction", "Method", "Extra"]
+        assert "content" not in sections[0]
+
+        section = await FileManager.load_section("p1", "section_1")
+        assert section["content"] == "方法 method"
+        assert section["level"] == 2
+        assert (await FileManager.load_section("p1", "section_2"))["content"] == "附加内容"
+        assert await FileManager.load_section("p1", "missing") is None
+
+    @pytest.mark.asyncio
+    async def test_legacy_json_and_migration(self, parsed_dir):
+        """测试 6: 兼容读取旧版 JSON，迁移工具转换后内容不变"""
+        (parsed_dir / "p1.json").write_text(json.dumps(PARSED_CONTENT, ensure_ascii=False), encoding="utf-8")
+        assert FileManager.parsed_content_exists("p1")
+        assert await FileManager.load_parsed_metadata("p1") == PARSED_CONTENT["metadata"]
+        assert (await FileManager.load_section("p1", "section_0"))["content"] == "引言内容 intro"
+
+        assert migrate_parsed.main(["--dir", str(parsed_dir)]) == 0
+        assert not (parsed_dir / "p1.json").exists()
+        assert await FileManager.load_parsed_content("p1") == PARSED_CONTENT
+
+        assert FileManager.delete_parsed_content("p1")
+        assert not FileManager.parsed_content_exists("p1")
+
+
+class TestParsedContentCache:
+    """解析结果缓存测试类"""
+
+    @pytest.fixture(autouse=True)
+    def cache(self, tmp_path, monkeypatch):
+        """使用临时目录和独立的缓存实例"""
+        monkeypatch.setenv("PARSED_DIR", str(tmp_path))
+        cache = ParsedContentCache(max_bytes=10 * 1024 * 1024)
+        monkeypatch.setattr(file_manager, "parsed_content_cache", cache)
+        return cache
+
+    @pytest.mark.asyncio
+    async def test_hit_without_disk_read(self, cache, monkeypatch):
+        """测试 7: 重复读取命中缓存，不再读取和解析文件"""
+        await FileManager.save_parsed_content("p1", PARSED_CONTENT)
+        first = await FileManager.load_parsed_content("p1")
+        await FileManager.load_section_list("p1")
+
+        async def fail(*args, **kwargs):
+            raise AssertionError("不应读取磁盘")
+
+        monkeypatch.setattr(FileManager, "_read_parsed_content", fail)
+        monkeypatch.setattr(FileManager, "_read_section_list", fail)
+        for _ in range(3):
+            assert await FileManager.load_parsed_content("p1") is first
+            assert len(await FileManager.load_section_list("p1")) == 3
+
+        stats = cache.stats()
+        assert stats["misses"] == 2
+        assert stats["hits"] == 6
+
+    @pytest.mark.asyncio
+    async def test_invalidated_by_file_version(self, cache, tmp_path):
+        """测试 8: 文件被其他进程改写或删除后缓存失效"""
+        await FileManager.save_parsed_content("p1", PARSED_CONTENT)
+        assert (await FileManager.load_parsed_metadata("p1"))["title"] == "测试论文"
+
+        # 模拟其他进程直接改写文件（不经过本进程的失效通知）
+        updated = {**PARSED_CONTENT, "metadata": {**PARSED_CONTENT["metadata"], "title": "新标题（更长）"}}
+        (tmp_path / "p1.pwp").write_bytes(parsed_format.encode(updated))
+        assert (await FileManager.load_parsed_metadata("p1"))["title"] == "新标题（更长）"
+        assert cache.stats()["invalidations"] == 1
+
+        (tmp_path / "p1.pwp").unlink()
+        assert await FileManager.load_parsed_metadata("p1") is None
+        assert cache.stats()["entries"] == 0
+
+    def test_lru_eviction_by_size(self):
+        """测试 9: 超出内存上限时淘汰最久未使用的条目"""
+        cache = ParsedContentCache(max_bytes=3000)
+        version = ("p.pwp", 1, 1)
+        for paper_id in ("a", "b", "c"):
+            cache.put(paper_id, "content", version, "x" * 900)
+        # 访问 a 之后，b 成为最久未使用
+        assert cache.get("a", "content", version)[0]
+        cache.put("d", "content", version, "x" * 900)
+
+        assert not cache.get("b", "content", version)[0]
+        assert cache.get("a", "content", version)[0]
+        assert cache.stats()["evictions"] == 1
+        assert cache.current_bytes <= 3000
+
+
+class TestGeneratedResults:
+    """翻译和摘要结果测试类"""
+
+    @pytest.fixture(autouse=True)
+    def data_dirs(self, tmp_path, monkeypatch):
+        """将解析结果和摘要目录指向临时目录"""
+        monkeypatch.setenv("PARSED_DIR", str(tmp_path))
+        monkeypatch.setenv("SUMMARIES_DIR", str(tmp_path))
+        return tmp_path
+
+    @pytest.mark.asyncio
+    async def test_preview_results_expire_after_full_parse(self):
+        """测试 10: 基于预览生成的结果在完整解析保存后视为不存在，即使保存晚于完整解析"""
+        await FileManager.save_parsed_content("p1", {**PARSED_CONTENT, "preview": True})
+        assert await FileManager.is_preview("p1")
+        await FileManager.save_summary("p1", {"summary": "preview", "preview": True})
+        assert (await FileManager.load_summary("p1"))["summary"] == "preview"
+
+        await FileManager.save_parsed_content("p1", PARSED_CONTENT)
+        assert FileManager.delete_generated_results("p1") == 1
+        assert not await FileManager.is_preview("p1")
+
+        # 预览阶段开始的任务在完整解析之后才保存
+        await FileManager.save_translation("p1", {"sections": [], "preview": True})
+        assert await FileManager.load_translation("p1") is None
+
+        await FileManager.save_summary("p1", {"summary": "full"})
+        assert (await FileManager.load_summary("p1"))["summary"] == "full"
@@ -0,0 +1,98 @@
+"""
+入库阶段限制测试
+测试令牌桶限速、阶段并发上限和批量入库接口
+"""
+import asyncio
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.models.schemas import TaskStatus
+from app.routers import upload
+from app.services.ingest_limits import StageLimiter
+from app.services.job_queue import JobManager, SQLiteJobStore
+from app.services.paper_catalog import PaperCatalog
+from app.utils.async_helper import RateLimiter
+
+
+class TestStageLimiter:
+    """阶段限制测试类"""
+
+    @pytest.mark.asyncio
+    async def test_rate_limiter(self):
+        """测试 1: 令牌用完后按速率放行"""
+        limiter = RateLimiter(rate=20, burst=2)
+        started = time.monotonic()
+        for _ in range(6):
+            await limiter.acquire()
+        # 前 2 次使用积攒的令牌，其余 4 次约需 4 / 20 = 0.2 秒
+        assert time.monotonic() - started >= 0.15
+
+    @pytest.mark.asyncio
+    async def test_concurrency_cap_and_stats(self):
+        """测试 2: 同时执行数不超过上限，并统计完成和失败次数"""
+        limiter = StageLimiter("embed", concurrency=2)
+        peak = 0
+
+        async def work(fail: bool):
+            nonlocal peak
+            async with limiter.slot():
+                peak = max(peak, limiter.in_flight)
+                await asyncio.sleep(0.01)
+                if fail:
+                    raise RuntimeError("boom")
+
+        results = await asyncio.gather(*(work(i == 0) for i in range(6)), return_exceptions=True)
+
+        assert peak == 2
+        assert sum(isinstance(r, RuntimeError) for r in results) == 1
+        stats = limiter.stats()
+        assert stats["completed"] == 5
+        assert stats["failed"] == 1
+        assert stats["in_flight"] == 0 and stats["waiting"] == 0
+        assert stats["avg_seconds"] > 0
+
+
+class TestBulkIngest:
+    """批量入库接口测试类"""
+
+    @pytest.fixture
+    def client(self, tmp_path, monkeypatch):
+        """使用临时任务库和目录的测试客户端（不启动任务执行器）"""
+        manager = JobManager(store=SQLiteJobStore(db_path=tmp_path / "jobs.db"))
+        catalog = PaperCatalog(db_path=tmp_path / "catalog.db")
+        monkeypatch.setattr(upload, "job_manager", manager)
+        monkeypatch.setattr(upload, "paper_catalog", catalog)
+
+        app = FastAPI()
+        app.include_router(upload.router, prefix="/api")
+        yield TestClient(app)
+        manager.store.close()
+        catalog.close()
+
+    def test_bulk_ingest_dedup_and_status(self, client):
+        """测试 3: 批量提交时合并同一论文的不同链接，并可查询批次进度"""
+        response = client.post("/api/bulk_ingest", json={"urls": [
+            "https://arxiv.org/abs/2401.00001",
+            "http://arxiv.org/pdf/2401.00001.pdf",
+            "https://arxiv.org/abs/2401.00002",
+        ]})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 2
+        assert data["counts"][TaskStatus.PENDING.value] == 2
+        assert [item["source"] for item in data["items"]] == [
+            "https://arxiv.org/abs/2401.00001",
+            "https://arxiv.org/abs/2401.00002",
+        ]
+
+        status = client.get(f"/api/bulk_ingest/{data['batch_id']}").json()
+        assert status["total"] == 2
+        assert status["items"][0]["paper_id"] == data["items"][0]["paper_id"]
+
+    def test_bulk_ingest_validation(self, client):
+        """测试 4: 空请求、不存在的文件和批次返回错误"""
+        assert client.post("/api/bulk_ingest", json={}).status_code == 400
+        assert client.post("/api/bulk_ingest", json={"file_ids": ["missing"]}).status_code == 404
+        assert client.get("/api/bulk_ingest/unknown").status_code == 404
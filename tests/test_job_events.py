@@ -0,0 +1,133 @@
+"""
+任务进度推送测试
+测试事件总线、SSE 和 WebSocket 进度接口
+"""
+import asyncio
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.models.schemas import TaskStatus
+from app.routers import jobs
+from app.services.job_events import JobEventBus
+from app.services.job_queue import JobManager, SQLiteJobStore
+
+
+class TestJobEventBus:
+    """事件总线测试类"""
+
+    @pytest.mark.asyncio
+    async def test_publish_and_unsubscribe(self):
+        """测试 1: 订阅者收到事件，退出订阅后自动清理"""
+        bus = JobEventBus()
+        with bus.subscribe("job-1") as queue:
+            assert bus.has_subscribers("job-1")
+            bus.publish("job-1", {"progress": 10})
+            bus.publish("job-2", {"progress": 99})
+            assert await queue.get() == {"progress": 10}
+            assert queue.empty()
+        assert not bus.has_subscribers("job-1")
+
+    @pytest.mark.asyncio
+    async def test_slow_subscriber_drops_oldest(self):
+        """测试 2: 队列满时丢弃最旧的事件，保留最新状态"""
+        bus = JobEventBus(queue_size=2)
+        with bus.subscribe("job-1") as queue:
+            for progress in (10, 20, 30):
+                bus.publish("job-1", {"progress": progress})
+            assert [queue.get_nowait()["progress"] for _ in range(2)] == [20, 30]
+
+
+class TestJobEventStream:
+    """任务进度接口测试类"""
+
+    @pytest.fixture
+    async def manager(self, tmp_path, monkeypatch):
+        """使用临时数据库的任务管理器"""
+        manager = JobManager(store=SQLiteJobStore(db_path=tmp_path / "jobs.db"))
+        manager.poll_interval = 0.05
+        monkeypatch.setattr(jobs, "job_manager", manager)
+        yield manager
+        await manager.stop()
+        manager.store.close()
+
+    @pytest.fixture
+    def client(self, manager):
+        """挂载任务路由的测试客户端"""
+        app = FastAPI()
+        app.include_router(jobs.router, prefix="/api")
+        return TestClient(app)
+
+    @pytest.mark.asyncio
+    async def test_watch_job_receives_progress(self, manager):
+        """测试 3: 本进程执行的任务，每次进度更新都会推送，结束后停止"""
+        release = asyncio.Event()
+
+        async def handler(ctx):
+            await release.wait()
+            for done in (1, 2):
+                await ctx.update(progress=10 + 40 * done, stage="translate", sections_done=done)
+            return {"paper_id": "p1"}
+
+        manager.register("translate", handler)
+        await manager.submit("translate", "p1_translation")
+        await manager.start(concurrency=1)
+
+        snapshots = []
+        async for snapshot in jobs.watch_job("p1_translation", poll_interval=5):
+            snapshots.append(snapshot)
+            release.set()
+
+        assert snapshots[0]["status"] in (TaskStatus.PENDING.value, TaskStatus.PROCESSING.value)
+        assert [s["progress"] for s in snapshots if s["stage"] == "translate"][:2] == [50, 90]
+        assert snapshots[-1]["status"] == TaskStatus.COMPLETED.value
+        assert snapshots[-1]["result"] == {"paper_id": "p1"}
+
+    @pytest.mark.asyncio
+    async def test_watch_job_polls_store(self, manager):
+        """测试 4: 其他进程执行的任务（无事件推送）通过读取任务存储获取进度"""
+        manager.store.create("p2", "parse", {}, 1)
+
+        async def finish_elsewhere():
+            await asyncio.sleep(0.05)
+            manager.store.update("p2", progress=50, stage="mineru")
+            await asyncio.sleep(0.05)
+            manager.store.complete("p2", {"paper_id": "p2"})
+
+        finisher = asyncio.create_task(finish_elsewhere())
+        statuses = [
+            (s["status"], s["progress"])
+            async for s in jobs.watch_job("p2", poll_interval=0.01)
+            if s is not None
+        ]
+        await finisher
+
+        assert statuses[0] == (TaskStatus.PENDING.value, 0)
+        assert (TaskStatus.PENDING.value, 50) in statuses
+        assert statuses[-1][0] == TaskStatus.COMPLETED.value
+
+    def test_sse_and_websocket(self, manager, client):
+        """测试 5: 已结束的任务通过 SSE / WebSocket 立即返回最终状态，未知任务返回 404"""
+        manager.store.create("p3", "parse", {}, 1)
+        manager.store.fail("p3", "MinerU 解析失败")
+
+        response = client.get("/api/jobs/p3/events")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert "event: failed" in response.text
+        data_line = next(line for line in response.text.splitlines() if line.startswith("data: "))
+        assert json.loads(data_line[len("data: "):])["error"] == "MinerU 解析失败"
+
+        with client.websocket_connect("/api/jobs/p3/ws") as websocket:
+            message = websocket.receive_json()
+            assert message["type"] == TaskStatus.FAILED.value
+
+        assert client.get("/api/jobs/unknown").status_code == 404
+        assert client.get("/api/jobs/unknown/events").status_code == 404
+        with client.websocket_connect("/api/jobs/unknown/ws") as websocket:
+            assert websocket.receive_json()["type"] == "error"
+            with pytest.raises(WebSocketDisconnect) as exc_info:
+                websocket.receive_json()
+            assert exc_info.value.code == 4404
@@ -0,0 +1,210 @@
+"""
+后台任务队列测试
+测试任务持久化、租约、重试和过期清理
+"""
+import asyncio
+import time
+import pytest
+
+from app.models.schemas import TaskStatus
+from app.services.job_queue import JobManager, PermanentJobError, SQLiteJobStore
+
+
+async def wait_for_status(manager: JobManager, job_id: str, status: TaskStatus, timeout: float = 5.0):
+    """等待任务进入指定状态"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = await manager.get(job_id)
+        if job and job["status"] == status:
+            return job
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"任务 {job_id} 未进入状态 {status}: {await manager.get(job_id)}")
+
+
+class TestSQLiteJobStore:
+    """任务存储测试类"""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        """创建使用临时数据库的任务存储"""
+        store = SQLiteJobStore(db_path=tmp_path / "jobs.db")
+        yield store
+        store.close()
+
+    def test_create_is_idempotent_while_active(self, store):
+        """测试 1: 未结束的任务重复提交保持不变，已结束的任务重置"""
+        store.create("job-1", "parse", {"a": 1}, max_attempts=3)
+        store.lease(["parse"], "worker-a", 60)
+
+        job = store.create("job-1", "parse", {"a": 2}, max_attempts=3)
+        assert job["status"] == TaskStatus.PROCESSING
+        assert job["payload"] == {"a": 1}
+
+        store.complete("job-1", {"ok": True})
+        job = store.create("job-1", "parse", {"a": 2}, max_attempts=3)
+        assert job["status"] == TaskStatus.PENDING
+        assert job["payload"] == {"a": 2}
+        assert job["attempts"] == 0
+
+    def test_expired_lease_is_taken_over(self, store):
+        """测试 2: 执行者失联（租约过期）后任务可被其他执行者接管"""
+        store.create("job-1", "parse", {}, max_attempts=3)
+        assert store.lease(["parse"], "worker-a", -1)["lease_owner"] == "worker-a"
+
+        job = store.lease(["parse"], "worker-b", 60)
+        assert job["job_id"] == "job-1"
+        assert job["lease_owner"] == "worker-b"
+        assert job["attempts"] == 2
+        assert not store.renew_lease("job-1", "worker-a", 60)
+
+        # 原执行者迟到的结果不覆盖新执行者
+        assert not store.complete("job-1", {"stale": True}, owner="worker-a")
+        assert not store.fail("job-1", "stale", owner="worker-a")
+        assert store.get("job-1")["status"] == TaskStatus.PROCESSING
+        assert store.complete("job-1", {"ok": True}, owner="worker-b")
+
+    def test_lease_respects_job_types_and_run_after(self, store):
+        """测试 3: 只领取指定类型且已到期的任务"""
+        store.create("job-1", "translate", {}, max_attempts=3)
+        assert store.lease(["parse"], "worker-a", 60) is None
+
+        store.create("job-2", "parse", {}, max_attempts=3)
+        store.lease(["parse"], "worker-a", 60)
+        store.fail("job-2", "boom", retry_at=time.time() + 60)
+        assert store.lease(["parse"], "worker-a", 60) is None
+
+    def test_purge_finished(self, store):
+        """测试 4: 清理过期的已结束任务"""
+        store.create("done", "parse", {}, max_attempts=3)
+        store.complete("done")
+        store.create("pending", "parse", {}, max_attempts=3)
+
+        assert store.purge_finished(time.time() + 1) == 1
+        assert store.get("done") is None
+        assert store.get("pending") is not None
+
+
+class TestJobManager:
+    """任务管理器测试类"""
+
+    @pytest.fixture
+    async def manager(self, tmp_path):
+        """创建使用临时数据库的任务管理器"""
+        manager = JobManager(store=SQLiteJobStore(db_path=tmp_path / "jobs.db"))
+        manager.poll_interval = 0.05
+        manager.retry_base_delay = 0.01
+        yield manager
+        await manager.stop()
+        manager.store.close()
+
+    @pytest.mark.asyncio
+    async def test_run_job_with_stages(self, manager):
+        """测试 5: 执行任务并记录阶段进度"""
+        async def handler(ctx):
+            async with ctx.stage("parse", progress=50):
+                await asyncio.sleep(0.01)
+            await ctx.update(progress=80, stage="embed", chunks_embedded=3)
+            return {"value": ctx.payload["value"] * 2}
+
+        manager.register("double", handler)
+        await manager.start(concurrency=1)
+        await manager.submit("double", "job-1", {"value": 21})
+
+        job = await wait_for_status(manager, "job-1", TaskStatus.COMPLETED)
+        assert job["result"] == {"value": 42}
+        assert job["progress"] == 100
+        assert job["stages"]["parse"]["status"] == TaskStatus.COMPLETED.value
+        assert job["stages"]["parse"]["duration"] >= 0
+        assert job["stages"]["embed"]["chunks_embedded"] == 3
+
+    @pytest.mark.asyncio
+    async def test_retry_with_backoff(self, manager):
+        """测试 6: 失败后重试，直到成功"""
+        calls = []
+
+        async def flaky(ctx):
+            calls.append(ctx.attempt)
+            if ctx.attempt < 3:
+                raise RuntimeError("transient")
+            return {}
+
+        manager.register("flaky", flaky)
+        await manager.start(concurrency=1)
+        await manager.submit("flaky", "job-1", max_attempts=3)
+
+        job = await wait_for_status(manager, "job-1", TaskStatus.COMPLETED)
+        assert calls == [1, 2, 3]
+        assert job["attempts"] == 3
+
+    @pytest.mark.asyncio
+    async def test_permanent_error_not_retried(self, manager):
+        """测试 7: 不可重试错误直接失败"""
+        calls = []
+
+        async def broken(ctx):
+            calls.append(ctx.attempt)
+            raise PermanentJobError("论文不存在")
+
+        manager.register("broken", broken)
+        await manager.start(concurrency=1)
+        await manager.submit("broken", "job-1", max_attempts=3)
+
+        job = await wait_for_status(manager, "job-1", TaskStatus.FAILED)
+        assert calls == [1]
+        assert job["error"] == "论文不存在"
+
+    @pytest.mark.asyncio
+    async def test_stop_releases_running_job(self, manager):
+        """测试 8: 停止时释放正在执行的任务，重启后继续执行"""
+        started = asyncio.Event()
+
+        async def slow(ctx):
+            started.set()
+            await asyncio.sleep(60)
+
+        manager.register("slow", slow)
+        await manager.start(concurrency=1)
+        await manager.submit("slow", "job-1")
+        await asyncio.wait_for(started.wait(), timeout=5)
+        await manager.stop()
+
+        job = await manager.get("job-1")
+        assert job["status"] == TaskStatus.PENDING
+        assert job["attempts"] == 0
+
+        async def fast(ctx):
+            return {"resumed": True}
+
+        manager.register("slow", fast)
+        await manager.start(concurrency=1)
+        job = await wait_for_status(manager, "job-1", TaskStatus.COMPLETED)
+        assert job["result"] == {"resumed": True}
+
+    @pytest.mark.asyncio
+    async def test_lost_lease_cancels_handler(self, manager):
+        """测试 9: 租约被其他执行者接管后取消处理函数，且不写回结果"""
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def slow(ctx):
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return {"stale": True}
+
+        manager.lease_seconds = 0.3
+        manager.register("slow", slow)
+        await manager.start(concurrency=1)
+        await manager.submit("slow", "job-1")
+        await asyncio.wait_for(started.wait(), timeout=5)
+
+        with manager.store._lock:
+            manager.store._get_conn().execute("UPDATE jobs SET lease_owner = 'worker-b' WHERE job_id = 'job-1'")
+        await asyncio.wait_for(cancelled.wait(), timeout=5)
+
+        job = await manager.get("job-1")
+        assert job["status"] == TaskStatus.PROCESSING
+        assert job["lease_owner"] == "worker-b"
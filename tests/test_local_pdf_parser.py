@@ -0,0 +1,229 @@
+"""
+本地 PDF 解析引擎测试
+测试标题识别和 Markdown 生成、解析引擎的选择与回退，以及基于 PyMuPDF 的实际解析
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.models.schemas import ParseEngine
+from app.routers import upload
+from app.services.local_pdf_parser import LocalPDFParser, build_markdown, local_engine_available
+from app.services.paper_catalog import PaperCatalog
+from app.utils.file_manager import FileManager
+
+
+def _block(text, size, bold=False):
+    return {"lines": text.split("\n"), "size": size, "bold": bold}
+
+
+class FakeContext:
+    """只记录阶段名称的任务上下文"""
+
+    def __init__(self, job_id="p1", payload=None):
+        self.job_id = job_id
+        self.payload = payload or {}
+        self.stages = []
+        self.updates = []
+
+    async def update(self, **kwargs):
+        self.updates.append(kwargs)
+
+    @asynccontextmanager
+    async def stage(self, name, progress=None):
+        self.stages.append(name)
+        yield
+
+
+class TestBuildMarkdown:
+    """Markdown 生成测试类"""
+
+    def test_headings_by_font_size(self):
+        """测试 1: 第一页最大字号为标题，其余标题按字号分级，正文合并行并去掉连字符"""
+        pages = [
+            {"page": 1, "images": ["page1_img0.png"], "blocks": [
+                _block("Attention Is All You Need", 17.0),
+                _block("Ashish Vaswani, Noam Shazeer", 10.0),
+                _block("Abstract", 10.0, bold=True),
+                _block("The dominant sequence trans-\nduction models are based on\ncomplex networks.", 10.0),
+            ]},
+            {"page": 2, "images": [], "blocks": [
+                _block("1 Introduction", 12.0),
+                _block("Recurrent neural networks have been firmly established.", 10.0),
+                _block("1.1 Background", 11.5),
+                _block("This is a long body paragraph that is clearly not a heading at all.", 10.0),
+            ]},
+        ]
+        font_sizes = {10.0: 500, 12.0: 14, 11.5: 14, 17.0: 25}
+
+        markdown = build_markdown(pages, font_sizes)
+
+        lines = [line for line in markdown.split("\n\n") if line.strip()]
+        assert lines[0] == "# Attention Is All You Need"
+        assert "## Abstract" not in lines  # 粗体正文字号的章节名为较低级标题
+        assert "### Abstract" in lines
+        assert "The dominant sequence transduction models are based on complex networks." in lines
+        assert "![](images/page1_img0.png)" in lines
+        assert "## 1 Introduction" in lines
+        assert "### 1.1 Background" in lines
+        assert lines.index("![](images/page1_img0.png)") < lines.index("## 1 Introduction")
+
+
+class TestParseEngine:
+    """解析引擎选择测试类"""
+
+    @pytest.fixture
+    def engines(self, monkeypatch):
+        """替换 MinerU 和本地解析，记录调用"""
+        calls = []
+
+        class FakeMinerU:
+            error = None
+            delay = 0
+
+            async def parse_pdf(self, url=None, file_path=None, paper_id=None, on_status=None):
+                calls.append("mineru")
+                await asyncio.sleep(self.delay)
+                if self.error:
+                    raise self.error
+                return {"content": "# mineru", "format": "markdown"}
+
+        class FakeLocal:
+            available = True
+
+            async def parse_pdf(self, file_path, paper_id=None):
+                calls.append("local")
+                return {"content": "# local", "format": "markdown", "engine": "local"}
+
+        mineru, local = FakeMinerU(), FakeLocal()
+        monkeypatch.setattr(upload, "mineru_client", mineru)
+        monkeypatch.setattr(upload, "local_pdf_parser", local)
+        return calls, mineru, local
+
+    @pytest.mark.asyncio
+    async def test_engine_selection_and_fallback(self, engines, monkeypatch):
+        """测试 2: mineru / local 按指定引擎解析；auto 在 MinerU 失败或超时时改用本地解析"""
+        calls, mineru, local = engines
+        monkeypatch.setattr(upload.settings, "parse_auto_mineru_timeout", 0.05)
+
+        result = await upload._parse_pdf(FakeContext(), "/tmp/a.pdf", False, ParseEngine.MINERU, None)
+        assert result["content"] == "# mineru"
+        result = await upload._parse_pdf(FakeContext(), "/tmp/a.pdf", False, ParseEngine.LOCAL, None)
+        assert result["content"] == "# local"
+        assert calls == ["mineru", "local"]
+
+        calls.clear()
+        mineru.error = RuntimeError("MinerU 服务不可用")
+        ctx = FakeContext()
+        result = await upload._parse_pdf(ctx, "/tmp/a.pdf", False, ParseEngine.AUTO, None)
+        assert result["content"] == "# local"
+        assert ctx.stages == ["mineru", "local_parse"]
+
+        calls.clear()
+        mineru.error, mineru.delay = None, 1
+        result = await upload._parse_pdf(FakeContext(), "/tmp/a.pdf", False, ParseEngine.AUTO, None)
+        assert result["content"] == "# local"
+        assert calls == ["mineru", "local"]
+
+        # 未安装 PyMuPDF 时 auto 只使用 MinerU
+        calls.clear()
+        local.available = False
+        mineru.error = RuntimeError("MinerU 服务不可用")
+        with pytest.raises(RuntimeError):
+            await upload._parse_pdf(FakeContext(), "/tmp/a.pdf", False, ParseEngine.AUTO, None)
+        assert calls == ["mineru"]
+
+
+class TestTwoPhaseIngest:
+    """预览入库 + 完整解析替换测试类"""
+
+    @pytest.mark.asyncio
+    async def test_preview_then_replace(self, tmp_path, monkeypatch):
+        """测试 3: 等待 MinerU 期间先保存并索引预览，MinerU 结果到达后替换解析结果和文本块"""
+        monkeypatch.setenv("PARSED_DIR", str(tmp_path / "parsed"))
+        monkeypatch.setenv("SUMMARIES_DIR", str(tmp_path / "summaries"))
+        (tmp_path / "parsed").mkdir()
+        (tmp_path / "summaries").mkdir()
+        (tmp_path / "summaries" / "p1_summary.json").write_text("{}")
+        monkeypatch.setattr(upload.settings, "ingest_preview", True)
+        monkeypatch.setattr(upload, "paper_catalog", PaperCatalog(db_path=tmp_path / "catalog.db"))
+        events = []
+        mineru_release = asyncio.Event()
+
+        class FakeMinerU:
+            async def parse_pdf(self, url=None, file_path=None, paper_id=None, on_status=None):
+                await asyncio.wait_for(mineru_release.wait(), timeout=5)
+                events.append("mineru")
+                return {"content": "# Full Paper\n\n## Method\n\nfull text\n\n## Results\n\nmore text"}
+
+        class FakeLocal:
+            available = True
+
+            async def parse_pdf(self, file_path, paper_id=None, max_pages=None):
+                events.append(f"local:{max_pages}")
+                return {"content": "# Full Paper\n\n## Abstract\n\npreview text"}
+
+        class FakeVectorization:
+            async def vectorize_and_store_paper(self, paper, replace_existing=False, progress_callback=None):
+                events.append(("vectorize", len(paper.sections), replace_existing))
+                if len(paper.sections) == 2:
+                    # 预览入库后才让 MinerU 返回
+                    mineru_release.set()
+                return len(paper.sections)
+
+        async def extract_metadata(markdown_content):
+            return {"title": "Full Paper"}
+
+        monkeypatch.setattr(upload, "mineru_client", FakeMinerU())
+        monkeypatch.setattr(upload, "local_pdf_parser", FakeLocal())
+        monkeypatch.setattr(upload, "vectorization_service", FakeVectorization())
+        monkeypatch.setattr(upload.paper_parser, "extract_metadata", extract_metadata)
+
+        ctx = FakeContext(payload={"file_path": str(tmp_path / "p1.pdf"), "engine": "mineru"})
+        result = await upload.process_paper_background(ctx)
+
+        assert result["paper_id"] == "p1"
+        preview_pages = upload.settings.ingest_preview_pages
+        assert events == [
+            f"local:{preview_pages}", ("vectorize", 2, True), "mineru", ("vectorize", 3, True)
+        ]
+        assert {"stage": "preview", "preview_ready": True} in ctx.updates
+        content = await FileManager.load_parsed_content("p1")
+        assert "preview" not in content
+        assert [s["title"] for s in content["sections"]] == ["Full Paper", "Method", "Results"]
+        assert not (tmp_path / "summaries" / "p1_summary.json").exists()
+
+
+@pytest.mark.skipif(not local_engine_available(), reason="未安装 PyMuPDF")
+class TestLocalPDFParser:
+    """基于 PyMuPDF 的本地解析测试类"""
+
+    @pytest.mark.asyncio
+    async def test_parse_generated_pdf(self, tmp_path, monkeypatch):
+        """测试 4: 多进程解析多页 PDF，识别标题并按页序输出正文"""
+        import fitz
+
+        monkeypatch.setenv("PARSED_DIR", str(tmp_path / "parsed"))
+        pdf_path = tmp_path / "paper.pdf"
+        with fitz.open() as doc:
+            for page_no in range(4):
+                page = doc.new_page()
+                if page_no == 0:
+                    page.insert_text((72, 72), "A Local Parsing Engine", fontsize=20)
+                page.insert_text((72, 120), f"{page_no + 1} Section {page_no + 1}", fontsize=14)
+                for line in range(10):
+                    page.insert_text((72, 150 + line * 14), f"Body text line {line} on page {page_no + 1}", fontsize=10)
+            doc.save(pdf_path)
+
+        parser = LocalPDFParser(workers=2)
+        try:
+            result = await parser.parse_pdf(pdf_path, paper_id="p1")
+        finally:
+            parser.close()
+
+        content = result["content"]
+        assert result["engine"] == "local"
+        assert content.startswith("# A Local Parsing Engine")
+        assert [f"## {i} Section {i}" in content for i in range(1, 5)] == [True] * 4
+        assert content.index("page 1") < content.index("page 4")
@@ -129,7 +129,9 @@ class TestMilvusService:
             await service.create_collection(dimension=1536)
             
             assert service.collection is not None
-            mock_collection.create_index.assert_called_once()
+            # 向量索引和 section_path 标量索引
+            indexed = [call.kwargs["field_name"] for call in mock_collection.create_index.call_args_list]
+            assert indexed == ["embedding", "section_path"]
     
     @pytest.mark.asyncio
     async def test_create_collection_exists(self, service, mock_collection):
@@ -447,3 +449,46 @@ def test_module_imports():
     
     assert milvus_service is not None
     assert isinstance(milvus_service, MilvusService)
+
+
+class TestSectionPathFilter:
+    """章节路径前缀过滤测试类"""
+    
+    @pytest.fixture
+    def service(self):
+        service = MilvusService()
+        service._connected = True
+        service._collection_loaded = True
+        collection = Mock()
+        collection.insert = Mock(return_value=Mock(primary_keys=[1, 2]))
+        collection.search = Mock(return_value=[[]])
+        collection.schema = Mock(fields=[Mock(), Mock()])
+        collection.schema.fields[0].name = "metadata"
+        collection.schema.fields[1].name = "section_path"
+        service.collection = collection
+        return service
+    
+    @pytest.mark.asyncio
+    async def test_insert_section_paths(self, service):
+        """测试 23: 有 section_path 字段时写入带结尾 "." 的章节路径，旧版 collection 不写入"""
+        await service.insert_chunks(
+            ["c1", "c2"], ["p1", "p1"], ["t1", "t2"], [[0.1], [0.2]], [{}, {}],
+            flush=False, section_paths=["3.2", None]
+        )
+        assert service.collection.insert.call_args[0][0][5] == ["3.2.", ""]
+        
+        service.collection.schema = "test_schema"
+        await service.insert_chunks(["c1"], ["p1"], ["t1"], [[0.1]], [{}], flush=False)
+        assert len(service.collection.insert.call_args[0][0]) == 5
+    
+    @pytest.mark.asyncio
+    async def test_search_by_section_prefix(self, service):
+        """测试 24: 每个章节一个前缀条件，"3.2" 只匹配自身及子章节而不匹配 "3.20" """
+        await service.search([0.1], top_k=5, paper_id="p1", section_paths=["3.2"])
+        assert service.collection.search.call_args[1]["expr"] == 'paper_id == "p1" and section_path like "3.2.%"'
+        
+        await service.search([0.1], top_k=5, section_paths=["1", "4.1"])
+        assert service.collection.search.call_args[1]["expr"] == (
+            '(section_path like "1.%" or section_path like "4.1.%")'
+        )
+        assert not "3.20.".startswith(service.section_path_value("3.2"))
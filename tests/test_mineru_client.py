@@ -0,0 +1,361 @@
+"""
+MinerU 客户端测试
+使用本地 HTTP 服务模拟 MinerU API，测试连接复用、结果下载和集中轮询等功能
+"""
+import asyncio
+import io
+import os
+import zipfile
+
+import pytest
+
+from app.services.mineru_cache import MinerUResultCache
+from app.services.mineru_client import MinerUBatcher, MinerUClient, MinerUPoller, _WatchedTask
+from app.utils.async_helper import RateLimiter
+from tests.fake_mineru import FakeMinerUServer
+
+
+@pytest.fixture
+def mineru_server():
+    """启动本地模拟 MinerU 服务，返回 (服务, API 根地址)"""
+    server = FakeMinerUServer(processing_time=1000).start()
+    yield server, server.base_url
+    server.stop()
+
+
+@pytest.fixture
+def batch_client(monkeypatch, tmp_path):
+    """连接模拟服务、启用合并提交的客户端"""
+    monkeypatch.setenv("PARSED_DIR", str(tmp_path / "parsed"))
+    server = FakeMinerUServer(processing_time=0.2).start()
+    client = MinerUClient()
+    client.base_url = server.base_url
+    client._submit_limiter = RateLimiter(0)
+    client.result_cache = MinerUResultCache(tmp_path / "mineru_cache")
+    client.poller = MinerUPoller(client, min_interval=0.05, max_interval=0.2, qps=0)
+    client.batcher = MinerUBatcher(client, batch_size=50, linger=0.05)
+    yield server, client
+    server.stop()
+
+
+class TestMinerUClient:
+    """MinerU 客户端测试类"""
+
+    @pytest.mark.asyncio
+    async def test_connection_reuse(self, mineru_server):
+        """测试 1: 提交和多次轮询复用同一个长连接"""
+        server, base_url = mineru_server
+        client = MinerUClient()
+        client.base_url = base_url
+        try:
+            task_id = await client.submit_task(url="https://arxiv.org/abs/2401.00001")
+            for _ in range(5):
+                status = await client.check_status(task_id)
+            assert status["status"] == "processing"
+            assert status["total_pages"] == 10
+
+            stats = client.http_stats()
+            assert stats["requests"] == 6
+            assert stats["connections_opened"] == 1
+            assert stats["reused_requests"] == 5
+        finally:
+            await client.close()
+
+        assert len(server.requests) == 6
+
+    @pytest.mark.asyncio
+    async def test_client_recreated_after_close(self, mineru_server):
+        """测试 2: close() 之后再次请求会重新创建客户端"""
+        _, base_url = mineru_server
+        client = MinerUClient()
+        client.base_url = base_url
+        task_id = await client.submit_task(url="https://arxiv.org/abs/2401.00001")
+        await client.close()
+
+        await client.check_status(task_id)
+        assert client.http_stats()["connections_opened"] == 2
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_download_extracts_only_referenced_images(self, mineru_server, tmp_path, monkeypatch):
+        """测试 3: 流式下载结果 zip，只提取主 Markdown、内容列表和被引用的图片"""
+        monkeypatch.setenv("PARSED_DIR", str(tmp_path / "parsed"))
+        server, base_url = mineru_server
+        markdown = "# Title\n\n![fig](images/fig1.jpg)\n\n<img src=\"images/fig2.png\">\n" + "text " * 200
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zf:
+            zf.writestr("paper/full.md", markdown)
+            zf.writestr("paper/layout.md", "# short")
+            zf.writestr("paper/images/fig1.jpg", b"jpg-data")
+            zf.writestr("paper/images/fig2.png", b"png-data")
+            zf.writestr("paper/images/fig3.jpg", b"jpg-data")
+            zf.writestr("paper/images/unused.jpg", b"unused")
+            zf.writestr("paper/paper_content_list.json", '[{"type": "image", "img_path": "images/fig3.jpg", "page_idx": 0}]')
+        server.zip_bytes = buffer.getvalue()
+
+        client = MinerUClient()
+        try:
+            result = await client._download_result(f"{server.root_url}/results/x.zip", paper_id="p1")
+        finally:
+            await client.close()
+
+        assert result["content"] == markdown
+        assert result["filename"] == "full.md"
+        assert result["content_list"] == [{"type": "image", "img_path": "images/fig3.jpg", "page_idx": 0}]
+        assert result["images_saved"] == 3
+        images_dir = tmp_path / "parsed" / "p1" / "images"
+        assert sorted(p.name for p in images_dir.iterdir()) == ["fig1.jpg", "fig2.png", "fig3.jpg"]
+        assert (images_dir / "fig1.jpg").read_bytes() == b"jpg-data"
+
+
+class FakeStatusClient:
+    """模拟 check_status：每个任务在固定次数查询后完成，并记录查询时间"""
+
+    def __init__(self, polls_to_finish: dict, total_pages: int = 10):
+        self.polls_to_finish = polls_to_finish
+        self.total_pages = total_pages
+        self.calls = {task_id: 0 for task_id in polls_to_finish}
+        self.call_times = []
+
+    async def check_status(self, task_id: str):
+        self.call_times.append(asyncio.get_running_loop().time())
+        self.calls[task_id] += 1
+        needed = self.polls_to_finish[task_id]
+        if needed < 0:
+            return {"status": "failed", "error": "bad pdf"}
+        if self.calls[task_id] >= needed:
+            return {"status": "completed", "result_url": f"http://example.com/{task_id}.zip"}
+        return {"status": "processing", "extracted_pages": None, "total_pages": None}
+
+
+class TestMinerUPoller:
+    """集中轮询器测试类"""
+
+    @pytest.mark.asyncio
+    async def test_multiplexed_polling(self):
+        """测试 4: 多个任务共用一个轮询协程，完成时分别返回状态"""
+        client = FakeStatusClient({f"t{i}": 3 for i in range(10)})
+        poller = MinerUPoller(client, min_interval=0.01, max_interval=0.05, backoff=2, qps=0)
+        seen = []
+
+        async def on_status(status_info):
+            seen.append(status_info["status"])
+
+        results = await asyncio.gather(*(poller.watch(f"t{i}", on_status=on_status) for i in range(10)))
+
+        assert [r["result_url"] for r in results] == [f"http://example.com/t{i}.zip" for i in range(10)]
+        assert all(count == 3 for count in client.calls.values())
+        assert seen.count("completed") == 10
+        stats = poller.stats()
+        assert stats["tasks_completed"] == 10
+        assert stats["active_tasks"] == 0
+        assert stats["avg_polls_per_task"] == 3
+
+    @pytest.mark.asyncio
+    async def test_qps_cap(self):
+        """测试 5: 所有任务合计的查询速率不超过上限"""
+        client = FakeStatusClient({f"t{i}": 2 for i in range(10)})
+        poller = MinerUPoller(client, min_interval=0.001, max_interval=0.001, qps=100)
+        poller._rate_limiter = RateLimiter(100, burst=1)
+
+        await asyncio.gather(*(poller.watch(f"t{i}") for i in range(10)))
+
+        # 20 次查询，100 次/秒，至少需要约 0.19 秒
+        assert len(client.call_times) == 20
+        assert client.call_times[-1] - client.call_times[0] >= 0.15
+
+    @pytest.mark.asyncio
+    async def test_backoff_and_progress_estimate(self):
+        """测试 6: 没有进度时间隔按倍数退避；有页数进度时按剩余时间缩短间隔"""
+        poller = MinerUPoller(FakeStatusClient({}), min_interval=1, max_interval=16, backoff=2, qps=0)
+        watched = _WatchedTask("task:t", FakeStatusClient({}).check_status, 0.0, 1)
+
+        no_progress = {"status": "processing", "extracted_pages": None, "total_pages": None}
+        intervals = []
+        for _ in range(6):
+            watched.interval = poller._next_interval(watched, no_progress, 0.0)
+            intervals.append(watched.interval)
+        assert intervals == [2, 4, 8, 16, 16, 16]
+
+        # 10 秒内解析了 9/10 页，预计还需约 1 秒，下一次查询不会等到最长间隔
+        poller._next_interval(watched, {"extracted_pages": 1, "total_pages": 10}, 100.0)
+        interval = poller._next_interval(watched, {"extracted_pages": 9, "total_pages": 10}, 110.0)
+        assert interval == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_and_timeout(self):
+        """测试 7: 任务失败或超时时抛出异常，并停止跟踪"""
+        client = FakeStatusClient({"bad": -1, "slow": 1000})
+        poller = MinerUPoller(client, min_interval=0.01, max_interval=0.01, qps=0, timeout=0.1)
+
+        with pytest.raises(Exception, match="bad pdf"):
+            await poller.watch("bad")
+        with pytest.raises(TimeoutError):
+            await poller.watch("slow")
+
+        assert poller.stats()["tasks_failed"] == 2
+        assert poller.stats()["active_tasks"] == 0
+
+
+class TestMinerUBatch:
+    """合并提交测试类"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_urls_share_one_batch(self, batch_client):
+        """测试 8: 同时解析的多篇论文合并为一次批量提交，每个批次只查询一次状态，结果分发到各论文"""
+        server, client = batch_client
+        progress = {}
+
+        def on_status_for(paper_id):
+            async def on_status(status_info):
+                progress.setdefault(paper_id, []).append(status_info["status"])
+            return on_status
+
+        try:
+            results = await asyncio.gather(*(
+                client.parse_pdf(
+                    url=f"https://arxiv.org/abs/2401.{i:05d}",
+                    paper_id=f"paper_{i}",
+                    on_status=on_status_for(f"paper_{i}")
+                )
+                for i in range(20)
+            ))
+        finally:
+            await client.close()
+
+        assert [r["content"].splitlines()[0] for r in results] == [f"# paper_{i}" for i in range(20)]
+        assert server.count("POST", "/api/v4/extract/task/batch") == 1
+        assert server.count("POST", "/api/v4/extract/task") == 1
+        assert server.count("GET", "/api/v4/extract/task/") == 0
+        # 20 篇论文的状态查询次数与单篇相同
+        assert server.count("GET", "/api/v4/extract-results/batch/") == client.poller.polls
+        assert all(statuses[-1] == "completed" for statuses in progress.values())
+        assert len(progress) == 20
+        assert client.batcher.stats()["items_submitted"] == 20
+
+    @pytest.mark.asyncio
+    async def test_file_batch_uploads(self, batch_client, tmp_path):
+        """测试 9: 本地文件批量申请上传地址后并发上传，上传完成后开始解析；上传失败时只重试该文件"""
+        server, client = batch_client
+        server.upload_failures = 1
+        client.UPLOAD_RETRY_DELAY = 0.01
+        # 按块流式上传
+        client.UPLOAD_CHUNK_SIZE = 4
+        files = []
+        for i in range(3):
+            path = tmp_path / f"paper_{i}.pdf"
+            path.write_bytes(f"%PDF-{i}".encode() * 100)
+            files.append(path)
+
+        try:
+            results = await asyncio.gather(*(
+                client.parse_pdf(file_path=path, paper_id=path.stem) for path in files
+            ))
+        finally:
+            await client.close()
+
+        assert [r["content"].splitlines()[0] for r in results] == [f"# paper_{i}" for i in range(3)]
+        assert server.count("POST", "/api/v4/file-urls/batch") == 1
+        assert server.count("PUT", "/upload/") == 4
+        assert sorted(server.uploaded.values()) == [f"%PDF-{i}".encode() * 100 for i in range(3)]
+
+    @pytest.mark.asyncio
+    async def test_single_item_and_duplicate_ids(self, batch_client):
+        """测试 10: 只有一篇时使用单任务接口；同一批次内 data_id 重复时自动换成唯一 ID"""
+        server, client = batch_client
+        try:
+            result = await client.parse_pdf(url="https://arxiv.org/abs/2401.00001", paper_id="solo")
+            assert result["content"]
+            assert server.count("POST", "/api/v4/extract/task/batch") == 0
+            assert server.count("GET", "/api/v4/extract/task/") >= 1
+
+            results = await asyncio.gather(*(
+                client.parse_pdf(url=f"https://arxiv.org/abs/2402.0000{i}", paper_id="same") for i in range(2)
+            ))
+        finally:
+            await client.close()
+
+        first_lines = {r["content"].splitlines()[0] for r in results}
+        assert len(first_lines) == 2
+        assert "# same" in first_lines
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_leaves_batch(self, batch_client):
+        """测试 11: 等待批次提交时被取消的调用方移出队列，不随批次提交"""
+        server, client = batch_client
+        try:
+            tasks = [
+                asyncio.create_task(client.batcher.submit(url=f"https://arxiv.org/abs/2401.{i:05d}", data_id=f"p{i}"))
+                for i in range(3)
+            ]
+            await asyncio.sleep(0)
+            tasks[1].cancel()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            await client.close()
+
+        assert isinstance(results[1], asyncio.CancelledError)
+        assert [data_id for _, data_id in (results[0], results[2])] == ["p0", "p2"]
+        assert server.count("POST", "/api/v4/extract/task/batch") == 1
+        assert [len(task_ids) for task_ids in server.batches.values()] == [2]
+        assert client.batcher.stats()["items_submitted"] == 2
+        assert client.batcher.stats()["pending"] == 0
+
+
+class TestMinerUResultCache:
+    """MinerU 结果缓存测试类"""
+
+    @pytest.mark.asyncio
+    async def test_reparse_uses_cache(self, batch_client, tmp_path):
+        """测试 12: 同一 PDF 再次解析时直接使用缓存的结果 zip，不再请求 MinerU"""
+        server, client = batch_client
+        server.zip_bytes = None
+        pdf_path = tmp_path / "paper.pdf"
+        pdf_path.write_bytes(b"%PDF-cached")
+        copy_path = tmp_path / "copy.pdf"
+        copy_path.write_bytes(b"%PDF-cached")
+
+        try:
+            first = await client.parse_pdf(file_path=pdf_path, paper_id="p1")
+            requests_after_first = len(server.requests)
+            second = await client.parse_pdf(file_path=copy_path, paper_id="p2")
+        finally:
+            await client.close()
+
+        assert len(server.requests) == requests_after_first
+        assert second["content"] == first["content"]
+        assert second["cached"] is True
+        assert "cached" not in first
+        assert client.result_cache.stats()["hits"] == 1
+
+        # model_version 不同时不使用缓存
+        client.model_version = "pipeline"
+        assert client.result_cache.get(client.result_cache.key_for_file(pdf_path), "pipeline") is None
+
+    def test_eviction_by_size_and_recency(self, tmp_path):
+        """测试 13: 超出大小上限时淘汰最久未使用的条目，损坏的条目可以删除"""
+        cache = MinerUResultCache(tmp_path / "cache", max_bytes=250)
+        for i, key in enumerate(("a", "b")):
+            src = tmp_path / f"{key}.zip"
+            src.write_bytes(b"x" * 100)
+            assert cache.store(key, "vlm", src) is not None
+            assert not src.exists()
+            # 保证 mtime 有先后顺序
+            os.utime(cache._path(key, "vlm"), ns=(i * 10**9, i * 10**9))
+
+        # 命中 a 之后，b 成为最久未使用的条目
+        assert cache.get("a", "vlm") is not None
+        src = tmp_path / "c.zip"
+        src.write_bytes(b"x" * 100)
+        cache.store("c", "vlm", src)
+
+        assert cache.get("b", "vlm") is None
+        assert cache.get("a", "vlm") is not None
+        assert cache.get("c", "vlm") is not None
+        assert cache.stats()["evictions"] == 1
+        assert cache.stats()["bytes"] <= 250
+
+        cache.discard("a", "vlm")
+        assert cache.get("a", "vlm") is None
+        assert MinerUResultCache(tmp_path / "off", max_bytes=0).get("c", "vlm") is None
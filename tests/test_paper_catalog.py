@@ -0,0 +1,141 @@
+"""
+论文目录测试
+测试内容哈希 / URL 去重映射
+"""
+import json
+import pytest
+
+from app.models.schemas import TaskStatus
+from app.services.paper_catalog import PaperCatalog
+
+
+class TestPaperCatalog:
+    """论文目录测试类"""
+
+    @pytest.fixture
+    def catalog(self, tmp_path):
+        """创建使用临时数据库的目录实例"""
+        catalog = PaperCatalog(db_path=tmp_path / "catalog.db")
+        yield catalog
+        catalog.close()
+
+    def test_canonicalize_arxiv_urls(self):
+        """测试 1: arXiv 的不同链接写法规范化为同一个 URL"""
+        variants = [
+            "https://arxiv.org/abs/2401.00001v2",
+            "http://arxiv.org/pdf/2401.00001v2.pdf",
+            "https://www.arxiv.org/abs/2401.00001v2/",
+            "  https://arxiv.org/pdf/2401.00001v2#page=3 ",
+        ]
+        canonical = {PaperCatalog.canonicalize_url(url) for url in variants}
+        assert canonical == {"https://arxiv.org/pdf/2401.00001v2"}
+
+    def test_canonicalize_keeps_query(self):
+        """测试 2: 普通 URL 保留查询参数"""
+        url = "HTTP://Example.com/paper.pdf?id=42"
+        assert PaperCatalog.canonicalize_url(url) == "https://example.com/paper.pdf?id=42"
+
+    def test_resolve_hash_is_stable(self, catalog):
+        """测试 3: 相同内容哈希始终映射到同一个 paper_id"""
+        content_hash = "ab" * 32
+        first = catalog.resolve_hash(content_hash)
+        second = catalog.resolve_hash(content_hash)
+
+        assert first == second == content_hash[:32]
+        assert catalog.get_content_hash(first) == content_hash
+
+    def test_resolve_url_dedup(self, catalog):
+        """测试 4: 同一论文的不同 URL 得到同一个 paper_id"""
+        first = catalog.resolve_url("https://arxiv.org/abs/2401.00001")
+        second = catalog.resolve_url("http://arxiv.org/pdf/2401.00001.pdf")
+        assert first == second
+
+    def test_status_and_remove(self, catalog):
+        """测试 5: 状态记录与删除"""
+        paper_id = catalog.resolve_hash("cd" * 32)
+        assert catalog.get_status(paper_id) is None
+
+        catalog.set_status(paper_id, TaskStatus.COMPLETED)
+        assert catalog.get_status(paper_id) == TaskStatus.COMPLETED
+
+        catalog.remove_paper(paper_id)
+        assert catalog.get_status(paper_id) is None
+        assert catalog.resolve("cd" * 32) is None
+
+    def _index_papers(self, catalog):
+        """写入 5 篇论文的列表索引，修改时间依次递增"""
+        papers = [
+            ("p1", "Attention Is All You Need", ["Ashish Vaswani", "Noam Shazeer"]),
+            ("p2", "BERT: Pre-training of Deep Bidirectional Transformers", ["Jacob Devlin"]),
+            ("p3", "Deep Residual Learning", ["Kaiming He"]),
+            ("p4", "attention over attention", ["Yiming Cui"]),
+            ("p5", "Generative Adversarial Nets", ["Ian Goodfellow"]),
+        ]
+        for i, (paper_id, title, authors) in enumerate(papers):
+            catalog.index_paper(
+                paper_id,
+                {"title": title, "authors": authors, "abstract": "x" * 100},
+                created_at=1000 + i,
+                modified_at=2000 + i
+            )
+
+    def test_list_cursor_pagination(self, catalog):
+        """测试 6: 游标分页按修改时间倒序遍历全部论文且不重复"""
+        self._index_papers(catalog)
+
+        seen = []
+        cursor = None
+        while True:
+            page = catalog.list_papers(limit=2, cursor=cursor)
+            assert page["total"] == 5
+            seen.extend(p["paper_id"] for p in page["papers"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        assert seen == ["p5", "p4", "p3", "p2", "p1"]
+
+    def test_list_sort_filter_and_fields(self, catalog):
+        """测试 7: 标题排序、标题/作者前缀过滤和字段投影"""
+        self._index_papers(catalog)
+
+        by_title = catalog.list_papers(sort="title", order="asc", fields=["title"])
+        assert [p["paper_id"] for p in by_title["papers"]] == ["p1", "p4", "p2", "p3", "p5"]
+        assert set(by_title["papers"][0]) == {"paper_id", "title"}
+
+        attention = catalog.list_papers(title_prefix="ATTENTION")
+        assert attention["total"] == 2
+        assert {p["paper_id"] for p in attention["papers"]} == {"p1", "p4"}
+
+        # 作者全名和姓名中的单词都可以作为前缀
+        assert [p["paper_id"] for p in catalog.list_papers(author_prefix="kaiming")["papers"]] == ["p3"]
+        assert [p["paper_id"] for p in catalog.list_papers(author_prefix="shaz")["papers"]] == ["p1"]
+        assert catalog.list_papers(author_prefix="nobody")["total"] == 0
+
+        with pytest.raises(ValueError):
+            catalog.list_papers(fields=["full_content"])
+        with pytest.raises(ValueError):
+            catalog.list_papers(sort="title", cursor=catalog.list_papers(limit=1)["next_cursor"])
+
+    def test_index_update_remove_and_backfill(self, catalog, tmp_path):
+        """测试 8: 重新入库时更新索引，删除论文时移除索引，已有解析结果可补充索引"""
+        catalog.index_paper("p1", {"title": "Old Title", "authors": ["A"]}, created_at=1, modified_at=1)
+        catalog.index_paper("p1", {"title": "New Title", "authors": ["B"]}, modified_at=2)
+        paper = catalog.list_papers()["papers"][0]
+        assert paper["title"] == "New Title"
+        assert paper["authors"] == ["B"]
+        assert paper["created_at"] == 1
+        assert catalog.list_papers(author_prefix="a")["total"] == 0
+
+        catalog.remove_paper("p1")
+        assert catalog.list_papers()["total"] == 0
+
+        parsed_dir = tmp_path / "parsed"
+        parsed_dir.mkdir()
+        (parsed_dir / "p2.json").write_text(
+            json.dumps({"metadata": {"title": "Backfilled", "authors": []}, "full_content": "..."}),
+            encoding="utf-8"
+        )
+        assert catalog.backfill_index(parsed_dir) == 1
+        assert catalog.backfill_index(parsed_dir) == 0
+        assert catalog.list_papers(fields=["title"])["papers"] == [{"paper_id": "p2", "title": "Backfilled"}]
@@ -0,0 +1,198 @@
+"""
+论文解析器测试
+测试由 MinerU 结构化内容列表生成章节、页码和图表公式，以及回退到 Markdown 标题提取
+"""
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.models.schemas import TaskStatus, TranslationResult
+from app.routers import translate
+from app.services.paper_parser import PaperParser
+from app.utils import parsed_format
+from app.utils.file_manager import FileManager
+
+
+CONTENT_LIST = [
+    {"type": "text", "text": "Attention Is All You Need", "text_level": 1, "page_idx": 0},
+    {"type": "text", "text": "Ashish Vaswani, Noam Shazeer", "page_idx": 0},
+    {"type": "header", "text": "arXiv:1706.03762v7", "page_idx": 0},
+    {"type": "text", "text": "Abstract", "text_level": 1, "page_idx": 0},
+    {"type": "text", "text": "The dominant sequence transduction models are based on RNNs.", "page_idx": 0},
+    {"type": "text", "text": "1 Introduction", "text_level": 1, "page_idx": 1},
+    {"type": "text", "text": "Recurrent neural networks have been firmly established.", "page_idx": 1},
+    {"type": "image", "img_path": "images/arch.jpg", "img_caption": ["Figure 1: The Transformer."],
+     "img_footnote": [], "page_idx": 2},
+    {"type": "equation", "text": "$$\n\\mathrm{softmax}(QK^T)V\n$$", "text_format": "latex", "page_idx": 3},
+    {"type": "page_number", "text": "4", "page_idx": 3},
+    {"type": "text", "text": "2 Results", "text_level": 1, "page_idx": 4},
+    {"type": "table", "img_path": "images/table1.jpg", "table_caption": ["Table 1: BLEU scores."],
+     "table_body": "<table><tr><td>28.4</td></tr></table>", "table_footnote": [], "page_idx": 5},
+]
+
+
+class TestContentList:
+    """结构化内容列表解析测试类"""
+
+    def test_sections_pages_and_elements(self):
+        """测试 1: 一次遍历生成章节、起止页码和图表公式，跳过页眉页码，章节正文是全文的子串"""
+        paper = PaperParser.build_structure("p1", "# ignored markdown\n", content_list=CONTENT_LIST)
+
+        assert [s.title for s in paper.sections] == [
+            "Attention Is All You Need", "Abstract", "1 Introduction", "2 Results"
+        ]
+        assert [(s.page_start, s.page_end) for s in paper.sections] == [(1, 1), (1, 1), (2, 4), (5, 6)]
+        assert paper.metadata.title == "Attention Is All You Need"
+        assert "arXiv:1706" not in paper.full_content
+        assert "\n\n4\n\n" not in paper.full_content
+
+        intro = paper.sections[2]
+        assert "![](/api/images/p1/images/arch.jpg)\n\nFigure 1: The Transformer." in intro.content
+        assert "$$\n\\mathrm{softmax}(QK^T)V\n$$" in intro.content
+        for section in paper.sections:
+            assert section.content in paper.full_content
+
+        elements = [(e.element_id, e.type, e.page, e.section_id) for e in paper.elements]
+        assert elements == [
+            ("figure_0", "figure", 3, "section_2"),
+            ("equation_0", "equation", 4, "section_2"),
+            ("table_0", "table", 6, "section_3"),
+        ]
+        assert paper.elements[0].caption == "Figure 1: The Transformer."
+        assert paper.elements[1].content == "\\mathrm{softmax}(QK^T)V"
+        assert paper.elements[2].content == "<table><tr><td>28.4</td></tr></table>"
+
+    def test_stored_without_duplicating_text(self):
+        """测试 2: 章节正文在存储格式中直接引用全文，页码随章节记录保存"""
+        paper = PaperParser.build_structure("p1", "", content_list=CONTENT_LIST)
+        content = {
+            "metadata": paper.metadata.dict(),
+            "sections": [s.dict() for s in paper.sections],
+            "full_content": paper.full_content,
+            "elements": [e.dict() for e in paper.elements],
+        }
+
+        data = parsed_format.encode(content)
+        _, header_length = parsed_format.parse_prefix(data[:parsed_format.PREFIX_SIZE])
+        header = parsed_format.parse_header(data[parsed_format.PREFIX_SIZE:parsed_format.PREFIX_SIZE + header_length])
+        decoded = parsed_format.decode(data)
+
+        assert len(data) == parsed_format.PREFIX_SIZE + header_length + header["full_content_length"]
+        assert decoded["sections"][3]["page_start"] == 5
+        assert decoded["elements"][2]["type"] == "table"
+
+    def test_fallback_to_markdown(self):
+        """测试 3: 没有内容列表或其中没有标题时按 Markdown 标题提取章节"""
+        markdown = "# Title\n\nintro\n\n## Method\n\nbody\n"
+        for content_list in (None, [], [{"type": "text", "text": "plain text", "page_idx": 0}]):
+            paper = PaperParser.build_structure("p1", markdown, content_list=content_list)
+            assert [s.title for s in paper.sections] == ["Title", "Method"]
+            assert paper.full_content == markdown
+            assert paper.sections[0].page_start is None
+            assert paper.elements == []
+
+
+def _extract_sections_by_lines(markdown_content):
+    """按行拼接的原始实现，用于对照"""
+    import re
+
+    sections, current = [], None
+    for line in markdown_content.split("\n"):
+        match = re.match(r'^(#{1,6})\s+(.+?)$', line)
+        if match:
+            if current:
+                sections.append(current)
+            current = {"title": match.group(2).strip(), "level": len(match.group(1)), "content": ""}
+        elif current:
+            current["content"] += line + "\n"
+    if current:
+        sections.append(current)
+    return [(s["title"], s["level"], s["content"].strip()) for s in sections]
+
+
+class TestSectionIndex:
+    """章节偏移索引测试类"""
+
+    def test_index_matches_line_based_extraction(self):
+        """测试 4: 一次扫描得到的章节与逐行提取一致，正文按偏移切片，行号正确"""
+        markdown = (
+            "preface\n# Title  \n\n  intro text\n\n## 1 Method\nline a\n#not a heading\n"
+            "####### seven\n### 1.1 Detail\r\n\n| a | b |\n\n## Empty\n\n## Appendix\n" + "| 1 | 2 |\n" * 1000
+        )
+
+        index = PaperParser.index_sections(markdown)
+        sections = PaperParser.extract_sections(markdown)
+
+        assert [(s["title"], s["level"], s["content"]) for s in sections] == _extract_sections_by_lines(markdown)
+        assert [s["start_line"] for s in sections] == [1, 5, 9, 13, 15]
+        assert all(markdown[s["start"]:s["end"]] == s["content"] for s in sections)
+        assert "content" not in index[0]
+        assert index[3]["start"] == index[3]["end"]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("with_offsets", [True, False])
+    async def test_translate_reuses_stored_index(self, tmp_path, monkeypatch, with_offsets):
+        """测试 5: 翻译任务按保存的章节偏移取原文，旧版解析结果没有偏移时重新扫描"""
+        monkeypatch.setenv("PARSED_DIR", str(tmp_path))
+        markdown = "# Title\n\nintro\n\n## Method\n\nbody\n"
+        paper = PaperParser.build_structure("p1", markdown)
+        sections = [s.dict() for s in paper.sections]
+        sections[1]["content"] = "已修改的正文"
+        if not with_offsets:
+            sections = [{k: v for k, v in s.items() if k not in ("start", "end")} for s in sections]
+        await FileManager.save_parsed_content(
+            "p1", {"metadata": paper.metadata.dict(), "sections": sections, "full_content": markdown}
+        )
+
+        scans = []
+        extract_sections = PaperParser.extract_sections
+        translated = []
+
+        class FakeTranslation:
+            async def translate_paper(self, paper, **kwargs):
+                translated.append([(s.title, s.content) for s in paper.sections])
+                return TranslationResult(paper_id="p1", segments=[], status=TaskStatus.COMPLETED)
+
+        class FakeContext:
+            job_id = "t1"
+            payload = {"paper_id": "p1", "source_lang": "en", "target_lang": "zh"}
+
+            async def update(self, **kwargs):
+                pass
+
+        monkeypatch.setattr(translate, "translation_service", FakeTranslation())
+        monkeypatch.setattr(FileManager, "save_translation", AsyncMock())
+        monkeypatch.setattr(
+            translate.PaperParser, "extract_sections",
+            staticmethod(lambda content: scans.append(content) or extract_sections(content))
+        )
+
+        await translate.translate_paper_background(FakeContext())
+
+        assert translated == [[("Title", "intro"), ("Method", "body")]]
+        assert len(scans) == (0 if with_offsets else 1)
+
+
+class TestSectionTree:
+    """章节树测试类"""
+
+    def test_paths_parents_and_spans(self):
+        """测试 6: 按层级构建章节树，跳级标题挂在最近的祖先下，子树覆盖所有子孙章节"""
+        markdown = (
+            "# Title\n\nabstract\n\n## 1 Intro\n\nintro\n\n## 2 Method\n\nmethod\n\n"
+            "### 2.1 Setup\n\nsetup\n\n#### Details\n\ndetails\n\n### 2.2 Loss\n\nloss\n\n"
+            "# Appendix\n\n### A.1 Proofs\n\nproofs\n"
+        )
+        paper = PaperParser.build_structure("p1", markdown)
+        tree = {node.title: node for node in paper.section_tree}
+
+        assert [s.path for s in paper.sections] == ["1", "1.1", "1.2", "1.2.1", "1.2.1.1", "1.2.2", "2", "2.1"]
+        assert [node.path for node in paper.section_tree] == [s.path for s in paper.sections]
+        assert tree["2 Method"].parent == "1"
+        assert tree["2 Method"].children == ["1.2.1", "1.2.2"]
+        assert tree["A.1 Proofs"].parent == "2"
+        assert (tree["2 Method"].order, tree["2 Method"].subtree_end) == (2, 6)
+        assert tree["Title"].subtree_end == 6
+        assert markdown[tree["2 Method"].start:tree["2 Method"].end] == (
+            "method\n\n### 2.1 Setup\n\nsetup\n\n#### Details\n\ndetails\n\n### 2.2 Loss\n\nloss"
+        )
@@ -0,0 +1,198 @@
+"""
+Redis 任务存储测试
+使用 fakeredis 模拟 Redis，测试多个执行者共享队列时的领取、租约和重试
+"""
+import asyncio
+import threading
+import time
+import pytest
+import redis
+
+from app.models.schemas import TaskStatus
+from app.services.job_queue import JobManager
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.services.redis_job_store import RedisJobStore  # noqa: E402
+
+
+class TestRedisJobStore:
+    """Redis 任务存储测试类"""
+
+    @pytest.fixture
+    def server(self):
+        """同一个 fakeredis 服务端，模拟多个节点连接同一个 Redis"""
+        return fakeredis.FakeServer()
+
+    def make_store(self, server) -> RedisJobStore:
+        client = fakeredis.FakeRedis(server=server, decode_responses=True)
+        return RedisJobStore(client=client, key_prefix="test:jobs")
+
+    def test_create_is_idempotent_while_active(self, server):
+        """测试 1: 未结束的任务重复提交保持不变，已结束的任务重置"""
+        store = self.make_store(server)
+        store.create("job-1", "parse", {"a": 1}, max_attempts=3)
+        store.lease(["parse"], "worker-a", 60)
+
+        job = store.create("job-1", "parse", {"a": 2}, max_attempts=3)
+        assert job["status"] == TaskStatus.PROCESSING
+        assert job["payload"] == {"a": 1}
+
+        store.complete("job-1", {"ok": True})
+        assert store.get("job-1")["result"] == {"ok": True}
+
+        job = store.create("job-1", "parse", {"a": 2}, max_attempts=3)
+        assert job["status"] == TaskStatus.PENDING
+        assert store.get("job-1")["attempts"] == 0
+        assert store.lease(["parse"], "worker-a", 60)["payload"] == {"a": 2}
+
+    def test_each_job_leased_once_across_nodes(self, server):
+        """测试 2: 多个节点共享队列，每个任务只被一个执行者领取"""
+        api = self.make_store(server)
+        worker_a = self.make_store(server)
+        worker_b = self.make_store(server)
+        for i in range(4):
+            api.create(f"job-{i}", "parse", {}, max_attempts=3)
+        # 重复提交不会产生重复消息
+        api.create("job-0", "parse", {}, max_attempts=3)
+
+        leased = []
+        for store, owner in [(worker_a, "a"), (worker_b, "b")] * 3:
+            job = store.lease(["parse"], owner, 60)
+            if job:
+                leased.append(job["job_id"])
+
+        assert sorted(leased) == [f"job-{i}" for i in range(4)]
+        assert api.get("job-0")["status"] == TaskStatus.PROCESSING
+
+    def test_expired_lease_is_taken_over(self, server):
+        """测试 3: 执行者失联（租约过期）后任务可被其他执行者接管"""
+        worker_a = self.make_store(server)
+        worker_b = self.make_store(server)
+        worker_a.create("job-1", "parse", {}, max_attempts=3)
+        assert worker_a.lease(["parse"], "worker-a", -1)["lease_owner"] == "worker-a"
+
+        job = worker_b.lease(["parse"], "worker-b", 60)
+        assert job["job_id"] == "job-1"
+        assert job["lease_owner"] == "worker-b"
+        assert job["attempts"] == 2
+        assert not worker_a.renew_lease("job-1", "worker-a", 60)
+        assert worker_b.renew_lease("job-1", "worker-b", 60)
+
+        # 原执行者迟到的结果不覆盖新执行者
+        assert not worker_a.complete("job-1", {"stale": True}, owner="worker-a")
+        assert not worker_a.fail("job-1", "stale", owner="worker-a")
+        assert worker_b.get("job-1")["status"] == TaskStatus.PROCESSING
+        assert worker_b.complete("job-1", {"ok": True}, owner="worker-b")
+
+    def test_retry_delay_and_release(self, server):
+        """测试 4: 失败重试需等到 run_after，释放租约后立即可被领取且不计尝试次数"""
+        store = self.make_store(server)
+        store.create("job-1", "parse", {}, max_attempts=3)
+        store.lease(["parse"], "worker-a", 60)
+        store.fail("job-1", "boom", retry_at=time.time() + 60)
+        assert store.lease(["parse"], "worker-a", 60) is None
+
+        store.fail("job-1", "boom", retry_at=time.time() - 1)
+        job = store.lease(["parse"], "worker-a", 60)
+        assert job["attempts"] == 2
+
+        store.release("job-1", "worker-a")
+        assert store.get("job-1")["status"] == TaskStatus.PENDING
+        assert store.lease(["parse"], "worker-b", 60)["attempts"] == 2
+
+    def test_promote_delayed_is_atomic(self, server, monkeypatch):
+        """测试 5: 重试任务放回 Stream 时连接中断，任务仍留在等待队列，之后可以正常领取"""
+        store = self.make_store(server)
+        store.create("job-1", "parse", {}, max_attempts=3)
+        store.lease(["parse"], "worker-a", 60)
+        store.fail("job-1", "boom", retry_at=time.time() - 1)
+
+        # 写入 Stream 的命令失败（无论单独发送还是在事务中）
+        client = store._redis
+        original_pipeline = client.pipeline
+
+        def broken_xadd(*args, **kwargs):
+            raise redis.ConnectionError("connection lost")
+
+        def pipeline(*args, **kwargs):
+            pipe = original_pipeline(*args, **kwargs)
+            execute = pipe.execute
+
+            def guarded_execute(*e_args, **e_kwargs):
+                if any(command[0][0] == "XADD" for command in pipe.command_stack):
+                    pipe.reset()
+                    raise redis.ConnectionError("connection lost")
+                return execute(*e_args, **e_kwargs)
+
+            pipe.execute = guarded_execute
+            return pipe
+
+        monkeypatch.setattr(client, "xadd", broken_xadd)
+        monkeypatch.setattr(client, "pipeline", pipeline)
+        with pytest.raises(redis.ConnectionError):
+            store.lease(["parse"], "worker-a", 60)
+        monkeypatch.undo()
+
+        assert client.zscore(store._delayed_key, "job-1") is not None
+        job = store.lease(["parse"], "worker-b", 60)
+        assert job["job_id"] == "job-1"
+        assert job["attempts"] == 2
+
+    def test_purge_finished(self, server):
+        """测试 6: 清理过期的已结束任务"""
+        store = self.make_store(server)
+        store.create("done", "parse", {}, max_attempts=3)
+        store.lease(["parse"], "worker-a", 60)
+        store.complete("done")
+        store.create("pending", "translate", {}, max_attempts=3)
+
+        assert store.purge_finished(time.time() + 1) == 1
+        assert store.get("done") is None
+        assert store.get("pending") is not None
+
+    @pytest.mark.asyncio
+    async def test_manager_with_redis_store(self, server):
+        """测试 7: API 节点只提交任务，独立 worker 节点执行"""
+        api = JobManager(store=self.make_store(server))
+        worker = JobManager(store=self.make_store(server))
+        worker.poll_interval = 0.05
+
+        async def handler(ctx):
+            async with ctx.stage("parse", progress=90):
+                pass
+            return {"value": ctx.payload["value"] + 1}
+
+        worker.register("parse", handler)
+        await worker.start(concurrency=2, job_types=["parse"])
+        try:
+            await api.submit("parse", "job-1", {"value": 1})
+            deadline = time.monotonic() + 5
+            job = await api.get("job-1")
+            while job["status"] != TaskStatus.COMPLETED and time.monotonic() < deadline:
+                await asyncio.sleep(0.02)
+                job = await api.get("job-1")
+        finally:
+            await worker.stop()
+
+        assert job["status"] == TaskStatus.COMPLETED
+        assert job["result"] == {"value": 2}
+        assert job["stages"]["parse"]["status"] == TaskStatus.COMPLETED.value
+
+    @pytest.mark.asyncio
+    async def test_manager_calls_store_off_event_loop(self, server):
+        """测试 8: 任务管理器在线程池中调用 Redis 客户端，不阻塞事件循环"""
+        manager = JobManager(store=self.make_store(server))
+        loop_thread = threading.get_ident()
+        threads = []
+        execute_command = manager.store._redis.execute_command
+
+        def record(*args, **kwargs):
+            threads.append(threading.get_ident())
+            return execute_command(*args, **kwargs)
+
+        manager.store._redis.execute_command = record
+        await manager.submit("parse", "job-1")
+        assert (await manager.get("job-1"))["status"] == TaskStatus.PENDING
+        assert await manager.is_active("job-1")
+        assert threads and loop_thread not in threads
@@ -0,0 +1,154 @@
+"""
+文本处理测试
+测试基于 token 偏移的分块与逐段编码的旧实现分块边界一致，以及文本块只保存章节引用
+"""
+import random
+import re
+
+import pytest
+
+from app.models.schemas import PaperMetadata, PaperSection, PaperStructure
+from app.services.text_processor import TextProcessor
+
+
+def _legacy_split(processor, text, chunk_size, chunk_overlap):
+    """逐段、逐句重复编码的旧实现，用于对照"""
+    count = processor.count_tokens
+    if not text:
+        return []
+    chunks, current_chunk, current_tokens = [], [], 0
+    for para in text.split('\n\n'):
+        para = para.strip()
+        if not para:
+            continue
+        para_tokens = count(para)
+        if para_tokens > chunk_size:
+            if current_chunk:
+                chunks.append('\n\n'.join(current_chunk))
+                current_chunk, current_tokens = [], 0
+            sentences = re.split(r'([。！？.!?]+)', para)
+            sub_chunk = ""
+            for i in range(0, len(sentences), 2):
+                sentence = sentences[i] + (sentences[i + 1] if i + 1 < len(sentences) else "")
+                if not sentence.strip():
+                    continue
+                if count(sub_chunk) + count(sentence) > chunk_size and sub_chunk:
+                    chunks.append(sub_chunk.strip())
+                    sub_chunk = sentence
+                else:
+                    sub_chunk += sentence
+            if sub_chunk.strip():
+                chunks.append(sub_chunk.strip())
+            continue
+        if current_tokens + para_tokens > chunk_size and current_chunk:
+            chunks.append('\n\n'.join(current_chunk))
+            overlap, tokens = [], 0
+            for chunk in reversed(current_chunk):
+                if tokens + count(chunk) <= chunk_overlap:
+                    overlap.insert(0, chunk)
+                    tokens += count(chunk)
+                else:
+                    break
+            current_chunk = overlap
+            current_tokens = sum(count(p) for p in current_chunk)
+        current_chunk.append(para)
+        current_tokens += para_tokens
+    if current_chunk:
+        chunks.append('\n\n'.join(current_chunk))
+    return chunks
+
+
+def _random_text(seed, paragraphs=80):
+    """中英文混合、段落长度差异很大（含超长段落和多余空行）的文本"""
+    rng = random.Random(seed)
+    words = ["model", "attention", "layer", "训练", "数据", "results", "3.5", "e.g.", "Fig", "表格"]
+    parts = []
+    for _ in range(paragraphs):
+        sentences = []
+        for _ in range(rng.choice([1, 2, 5, 40, 120])):
+            sentence = " ".join(rng.choice(words) for _ in range(rng.randint(3, 25)))
+            sentences.append(sentence + rng.choice([".", "!", "?", "。", "", "..."]))
+        parts.append(" ".join(sentences))
+    return rng.choice(["\n\n", "\n\n\n", "  \n\n "]).join(parts)
+
+
+class TestSplitTextByTokens:
+    """分块测试类"""
+
+    @pytest.mark.parametrize("exact", [False, True])
+    def test_same_boundaries_as_legacy(self, monkeypatch, exact):
+        """测试 1: 默认模式和兼容模式的分块结果都与逐段编码的旧实现一致"""
+        processor = TextProcessor()
+        processor.encoding = None
+        monkeypatch.setattr("app.services.text_processor.settings.chunk_exact_token_counts", exact)
+
+        for seed in range(3):
+            text = _random_text(seed)
+            for chunk_size, overlap in ((800, 100), (120, 40)):
+                assert processor.split_text_by_tokens(text, chunk_size, overlap) == \
+                    _legacy_split(processor, text, chunk_size, overlap)
+        assert processor.split_text_by_tokens("") == []
+        assert processor.split_text_by_tokens("Ends with a stop.\n\n") == ["Ends with a stop."]
+
+    def test_tiktoken_offsets(self, monkeypatch):
+        """测试 2: 使用 tokenizer 时整节只编码一次；兼容模式与逐段编码的分块边界一致"""
+        processor = TextProcessor()
+        if processor.encoding is None:
+            pytest.skip("tiktoken 编码不可用")
+        text = _random_text(1)
+        legacy = _legacy_split(processor, text, 200, 50)
+
+        encodes = []
+        encode = processor.encoding.encode
+        monkeypatch.setattr(processor.encoding, "encode", lambda t, **kw: encodes.append(t) or encode(t, **kw))
+        chunks = processor.split_text_by_tokens(text, 200, 50)
+        assert encodes == [text]
+        assert abs(len(chunks) - len(legacy)) <= len(legacy) // 10
+
+        monkeypatch.setattr("app.services.text_processor.settings.chunk_exact_token_counts", True)
+        assert processor.split_text_by_tokens(text, 200, 50) == legacy
+
+
+class TestChunkMetadata:
+    """文本块元数据测试类"""
+
+    def test_chunks_reference_sections(self, monkeypatch):
+        """测试 3: 文本块元数据只保存章节引用，大小与论文章节数无关"""
+        processor = TextProcessor()
+        processor.encoding = None
+        monkeypatch.setattr("app.services.text_processor.settings.chunk_child_size", 0)
+
+        def chunk_metadata(section_count):
+            sections = [
+                PaperSection(section_id=f"section_{i}", title=f"{i} Section", content=f"body {i}. " * 5,
+                             level=2, order=i, path=f"1.{i}", page_start=i, page_end=i)
+                for i in range(section_count)
+            ]
+            paper = PaperStructure(paper_id="p1", metadata=PaperMetadata(paper_id="p1"),
+                                   sections=sections, full_content="")
+            return [chunk.metadata for chunk in processor.create_chunks_from_paper(paper)]
+
+        metadata = chunk_metadata(80)
+        assert len(metadata) == 80
+        assert metadata[3] == {"section_id": "section_3", "section_path": "1.3", "chunk_index": 3}
+        assert chunk_metadata(2)[1] == {"section_id": "section_1", "section_path": "1.1", "chunk_index": 1}
+
+    def test_children_map_to_parent_spans(self, monkeypatch):
+        """测试 4: 小块模式下父块按 CHUNK_SIZE 不重叠切分，小块不超过 CHUNK_CHILD_SIZE 且都位于所属父块区间内"""
+        processor = TextProcessor()
+        processor.encoding = None
+        monkeypatch.setattr("app.services.text_processor.settings.chunk_child_size", 60)
+        text = processor.clean_text(_random_text(2, paragraphs=30))
+        section = PaperSection(section_id="section_0", title="Method", content=text, level=2, order=0, path="1")
+        paper = PaperStructure(paper_id="p1", metadata=PaperMetadata(paper_id="p1"), sections=[section], full_content="")
+
+        chunks = processor.create_chunks_from_paper(paper)
+
+        parents = sorted({(c.metadata["parent_start"], c.metadata["parent_end"]) for c in chunks})
+        assert [(s, e) for s, e, _ in processor.split_text_with_offsets(text, processor.chunk_size, 0)] == parents
+        assert all(prev[1] <= cur[0] for prev, cur in zip(parents, parents[1:]))
+        assert len(chunks) > len(parents)
+        for chunk in chunks:
+            parent_text = text[chunk.metadata["parent_start"]:chunk.metadata["parent_end"]]
+            assert processor.count_tokens(chunk.text) <= 60 or "\n\n" not in chunk.text
+            assert all(part in parent_text for part in chunk.text.split("\n\n"))
@@ -0,0 +1,275 @@
+"""
+向量化服务测试
+测试分批 Embedding 与流式写入 Milvus 的流水线
+"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+
+from app.models.schemas import PaperMetadata, PaperStructure, TextChunk
+from app.services.text_processor import text_processor
+from app.services.vectorization_service import VectorizationService
+from app.utils.async_helper import gather_or_cancel
+from app.utils.cpu_executor import CPUExecutor
+
+
+def make_chunks(count: int):
+    return [
+        TextChunk(chunk_id=f"p1_chunk_{i}", paper_id="p1", text=f"text {i}", metadata={"chunk_index": i})
+        for i in range(count)
+    ]
+
+
+class FakeEmbeddingService:
+    """按批返回固定向量，可指定在第几批失败"""
+
+    def __init__(self, fail_on_batch=None):
+        self.calls = []
+        self.fail_on_batch = fail_on_batch
+
+    def get_dimension(self):
+        return 4
+
+    async def embed_batch(self, texts, batch_size=10):
+        self.calls.append(list(texts))
+        await asyncio.sleep(0)
+        if self.fail_on_batch is not None and len(self.calls) == self.fail_on_batch:
+            raise RuntimeError("embedding failed")
+        return [[0.1] * 4 for _ in texts]
+
+    async def embed_batches(self, texts, batch_size=10):
+        for start in range(0, len(texts), batch_size):
+            yield await self.embed_batch(texts[start:start + batch_size], batch_size)
+
+
+class TestVectorizationPipeline:
+    """向量化流水线测试类"""
+
+    @pytest.fixture
+    def paper(self):
+        return PaperStructure(
+            paper_id="p1",
+            metadata=PaperMetadata(paper_id="p1"),
+            sections=[],
+            full_content=""
+        )
+
+    @pytest.fixture
+    def milvus(self):
+        """模拟 Milvus 服务，每次插入返回递增的主键"""
+        counter = iter(range(1000))
+        milvus = Mock()
+        milvus.create_collection = AsyncMock()
+        milvus.insert_chunks = AsyncMock(
+            side_effect=lambda chunk_ids, **kwargs: [next(counter) for _ in chunk_ids]
+        )
+        milvus.flush = AsyncMock()
+        milvus.delete_by_ids = AsyncMock(return_value=0)
+        milvus.get_ids_by_paper_id = AsyncMock(return_value=[900, 901])
+        return milvus
+
+    async def run(self, paper, milvus, embedding, chunks, **kwargs):
+        with patch("app.services.vectorization_service.chunk_paper", return_value=chunks), \
+             patch("app.services.vectorization_service.cpu_executor", CPUExecutor(workers=0)), \
+             patch("app.services.vectorization_service.create_embedding_service", return_value=embedding), \
+             patch("app.services.vectorization_service.milvus_service", milvus):
+            return await VectorizationService().vectorize_and_store_paper(paper, **kwargs)
+
+    @pytest.mark.asyncio
+    async def test_batches_streamed_and_flushed_once(self, paper, milvus):
+        """测试 1: 每批 Embedding 完成后立即写入（不 flush），最后统一 flush 一次"""
+        embedding = FakeEmbeddingService()
+        progress = []
+
+        async def on_progress(stored, total):
+            progress.append((stored, total))
+
+        stored = await self.run(
+            paper, milvus, embedding, make_chunks(25), batch_size=10, progress_callback=on_progress
+        )
+
+        assert stored == 25
+        assert [len(call) for call in embedding.calls] == [10, 10, 5]
+        assert milvus.insert_chunks.await_count == 3
+        assert all(call.kwargs["flush"] is False for call in milvus.insert_chunks.await_args_list)
+        # 写入顺序与分块顺序一致
+        inserted = [cid for call in milvus.insert_chunks.await_args_list for cid in call.kwargs["chunk_ids"]]
+        assert inserted == [f"p1_chunk_{i}" for i in range(25)]
+        milvus.flush.assert_awaited_once()
+        assert progress == [(10, 25), (20, 25), (25, 25)]
+
+    @pytest.mark.asyncio
+    async def test_failure_rolls_back_inserted_batches(self, paper, milvus):
+        """测试 2: 中途失败时删除已写入的批次，不 flush"""
+        embedding = FakeEmbeddingService(fail_on_batch=3)
+
+        with pytest.raises(RuntimeError, match="embedding failed"):
+            await self.run(paper, milvus, embedding, make_chunks(30), batch_size=10)
+
+        milvus.flush.assert_not_awaited()
+        milvus.delete_by_ids.assert_awaited_once()
+        rolled_back = milvus.delete_by_ids.await_args.args[0]
+        assert rolled_back == list(range(milvus.insert_chunks.await_count * 10))
+
+    @pytest.mark.asyncio
+    async def test_empty_paper(self, paper, milvus):
+        """测试 3: 没有可分块的内容时不创建 Embedding 服务"""
+        with patch("app.services.vectorization_service.create_embedding_service") as factory:
+            stored = await self.run(paper, milvus, FakeEmbeddingService(), [])
+        assert stored == 0
+        factory.assert_not_called()
+        milvus.insert_chunks.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_replace_existing_chunks(self, paper, milvus):
+        """测试 4: 替换已有文本块时，新文本块全部写入后才删除旧的；失败时保留旧的"""
+        stored = await self.run(paper, milvus, FakeEmbeddingService(), make_chunks(5), replace_existing=True)
+
+        assert stored == 5
+        milvus.get_ids_by_paper_id.assert_awaited_once_with("p1")
+        milvus.delete_by_ids.assert_awaited_once_with([900, 901])
+        assert milvus.method_calls.index(("flush", (), {})) < [c[0] for c in milvus.method_calls].index("delete_by_ids")
+
+        milvus.delete_by_ids.reset_mock()
+        with pytest.raises(RuntimeError):
+            await self.run(paper, milvus, FakeEmbeddingService(fail_on_batch=2), make_chunks(30), batch_size=10, replace_existing=True)
+        assert [900, 901] not in [call.args[0] for call in milvus.delete_by_ids.await_args_list]
+
+
+class TestScopedSearch:
+    """按章节检索测试类"""
+
+    @pytest.fixture
+    def milvus(self):
+        milvus = Mock()
+        milvus.supports_section_paths = AsyncMock(return_value=True)
+
+        async def search(query_embedding, top_k, paper_id=None, section_paths=None):
+            if section_paths:
+                return [{"chunk_id": "c_method", "score": 0.9, "metadata": {}}]
+            return [{"chunk_id": f"c{i}", "score": 0.5, "metadata": {}} for i in range(top_k)]
+
+        milvus.search = AsyncMock(side_effect=search)
+        return milvus
+
+    @pytest.mark.asyncio
+    async def test_section_paths_with_fill(self, milvus):
+        """测试 7: 章节标题解析为路径（子章节不重复列出）并按前缀检索，结果不足时用全文结果补充"""
+        sections = [
+            {"title": "Title", "path": "1"},
+            {"title": "3 Method", "path": "1.3"},
+            {"title": "3.1 Method Details", "path": "1.3.1"},
+            {"title": "4 Results", "path": "1.4"},
+        ]
+        embedding = Mock()
+        embedding.embed_text = AsyncMock(return_value=[0.1])
+
+        with patch("app.services.vectorization_service.create_embedding_service", return_value=embedding), \
+             patch("app.services.vectorization_service.milvus_service", milvus), \
+             patch("app.services.vectorization_service.FileManager.load_section_list",
+                   AsyncMock(return_value=sections)):
+            results = await VectorizationService().search_similar_chunks(
+                "query", paper_id="p1", top_k=3, section_filter=["method"]
+            )
+
+        assert milvus.search.await_args_list[0].kwargs["section_paths"] == ["1.3"]
+        assert [r["chunk_id"] for r in results] == ["c_method", "c0", "c1"]
+
+    @pytest.mark.asyncio
+    async def test_join_section_records(self):
+        """测试 8: 检索结果按章节引用关联标题、层级和页码，每篇论文只读取一次章节列表，旧版文本块保持不变"""
+        sections = [
+            {"section_id": "section_0", "title": "Title", "level": 1, "path": "1"},
+            {"section_id": "section_1", "title": "Method", "level": 2, "path": "1.1", "page_start": 3, "page_end": 5},
+        ]
+        milvus = Mock()
+        milvus.search = AsyncMock(return_value=[
+            {"chunk_id": "c1", "paper_id": "p1", "metadata": {"section_id": "section_1", "section_path": "1.1", "chunk_index": 4}},
+            {"chunk_id": "c0", "paper_id": "p1", "metadata": {"section_id": "section_0", "section_path": "1", "chunk_index": 0}},
+            {"chunk_id": "old", "paper_id": "p1", "metadata": {"section_id": "section_9", "section_title": "Legacy"}},
+        ])
+        embedding = Mock()
+        embedding.embed_text = AsyncMock(return_value=[0.1])
+        load_section_list = AsyncMock(return_value=sections)
+
+        with patch("app.services.vectorization_service.create_embedding_service", return_value=embedding), \
+             patch("app.services.vectorization_service.milvus_service", milvus), \
+             patch("app.services.vectorization_service.FileManager.load_section_list", load_section_list):
+            results = await VectorizationService().search_similar_chunks("query", top_k=3)
+
+        load_section_list.assert_awaited_once_with("p1")
+        assert results[0]["metadata"] == {
+            "section_id": "section_1", "section_path": "1.1", "chunk_index": 4,
+            "section_title": "Method", "section_level": 2, "page_start": 3, "page_end": 5,
+        }
+        assert results[1]["metadata"]["section_title"] == "Title"
+        assert "page_start" not in results[1]["metadata"]
+        assert results[2]["metadata"] == {"section_id": "section_9", "section_title": "Legacy"}
+
+
+class TestParentExpansion:
+    """小块扩展为父块测试类"""
+
+    @pytest.mark.asyncio
+    async def test_merge_parents_within_budget(self):
+        """测试 9: 重叠的父块合并为一段，父块超出预算时只用小块，没有父块信息的文本块直接使用"""
+        section = "para one.\n\npara two.\n\npara three.\n\npara four starts here. " + "x" * 400
+        two, four = section.index("para two."), section.index("para four")
+        three_end = section.index("\n\npara four")
+
+        def hit(chunk_id, score, text, parent=None, section_id="section_1"):
+            metadata = {"section_id": section_id, "chunk_index": 0}
+            if parent:
+                metadata["parent_start"], metadata["parent_end"] = parent
+            return {"chunk_id": chunk_id, "paper_id": "p1", "score": score, "text": text, "metadata": metadata}
+
+        results = [
+            hit("c4", 0.6, "para four starts here.", (four, len(section))),
+            hit("c1", 0.9, "para one.", (0, two + len("para two."))),
+            hit("old", 0.7, "legacy text", section_id="section_2"),
+            hit("c2", 0.8, "para three.", (two, three_end)),
+        ]
+        count = text_processor.count_tokens
+        budget = count(section[:three_end]) + count("legacy text") + count("para four starts here.")
+        load_section = AsyncMock(return_value={"content": section})
+
+        with patch("app.services.vectorization_service.FileManager.load_section", load_section):
+            contexts = await VectorizationService().expand_to_parents(results, token_budget=budget)
+
+        load_section.assert_awaited_once_with("p1", "section_1")
+        assert [c["text"] for c in contexts] == [section[:three_end], "legacy text", "para four starts here."]
+        assert contexts[0]["metadata"]["chunk_ids"] == ["c1", "c2"]
+        assert [c["score"] for c in contexts] == [0.9, 0.7, 0.6]
+        assert "parent_start" in contexts[0]["metadata"] and "tokens" not in contexts[0]
+
+
+class TestGatherOrCancel:
+    """并发执行辅助函数测试类"""
+
+    @pytest.mark.asyncio
+    async def test_returns_results_in_order(self):
+        """测试 10: 按参数顺序返回结果"""
+        async def value(v, delay):
+            await asyncio.sleep(delay)
+            return v
+
+        assert await gather_or_cancel(value(1, 0.02), value(2, 0)) == [1, 2]
+
+    @pytest.mark.asyncio
+    async def test_failure_cancels_siblings(self):
+        """测试 11: 任一协程失败时取消其余协程"""
+        cancelled = asyncio.Event()
+
+        async def blocked():
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def broken():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            await gather_or_cancel(blocked(), broken())
+        assert cancelled.is_set()